@@ -15,6 +15,7 @@ class Category(db.Model):
     sgst_rate = db.Column(db.Numeric(5, 2), nullable=False, default=0)
     igst_rate = db.Column(db.Numeric(5, 2), nullable=False, default=0)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # products = db.relationship("Product", backref="category", lazy=True)  # Removed to avoid circular import
 
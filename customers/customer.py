@@ -1,19 +1,48 @@
 from datetime import datetime
+from sqlalchemy import text
 from src.extensions import db
 import pandas as pd
 
+BULK_IMPORT_CHUNK_SIZE = 1000
+BULK_IMPORT_TEXT_FIELDS = ('business_name', 'email', 'alternate_phone', 'billing_address', 'shipping_address',
+                           'gst_number', 'branch', 'pan_number', 'payment_terms', 'notes', 'documents')
+
+# Customer ids, shared by single creation and bulk imports so neither can take the other's ids
+customer_id_seq = db.Sequence("customer_id_seq", start=8001, metadata=db.metadata)
+
+
+def reserve_customer_ids(count):
+    """count ids from customer_id_seq in one round trip, ascending.
+
+    The block is contiguous unless a customer is created concurrently, in which case
+    that customer's id falls inside it; ids are never handed out twice either way.
+    """
+    if count <= 0:
+        return []
+    return sorted(row[0] for row in db.session.execute(
+        text("SELECT nextval('customer_id_seq') FROM generate_series(1, :count)"), {"count": count}
+    ))
+
+
+def normalize_phones(values):
+    """Phone column as text: numeric cells lose the float's '.0' (Excel reads phones as numbers), blanks become ''."""
+    if pd.api.types.is_numeric_dtype(values):
+        numeric = values
+    else:
+        numeric = pd.to_numeric(values.where(values.map(type) != str), errors="coerce")
+    numeric = numeric.where(numeric.abs() != float("inf"))
+    phones = values.astype(str).where(values.notna(), "")
+    is_number = numeric.notna()
+    phones[is_number] = numeric[is_number].astype("int64").astype(str)
+    return phones
+
+
 class Customer(db.Model):
     __tablename__ = "customers"
 
     # Customer ID (Unique Identifier)
-    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
-    
-    def __init__(self, **kwargs):
-        if 'id' not in kwargs:
-            # Get next customer ID starting from 8001
-            last_customer = Customer.query.order_by(Customer.id.desc()).first()
-            kwargs['id'] = (last_customer.id + 1) if last_customer and last_customer.id >= 8001 else 8001
-        super().__init__(**kwargs)
+    id = db.Column(db.Integer, customer_id_seq, primary_key=True, autoincrement=False,
+                   server_default=customer_id_seq.next_value())
     
     # Contact Person / Full Name
     contact_person = db.Column(db.String(255), nullable=False)
@@ -65,60 +94,100 @@ class Customer(db.Model):
     payments = db.relationship("Payment", backref="customer", lazy=True)
     
     @classmethod
-    def bulk_import(cls, df):
+    def bulk_import(cls, df, chunk_size=BULK_IMPORT_CHUNK_SIZE):
+        """
+        Create customers from an uploaded sheet (contact_person and phone required).
+
+        Column-wise: phones are normalized for the whole frame, phones repeated in the file
+        or already stored are found with one query, ids are reserved from customer_id_seq
+        in one block, and rows are inserted chunk by chunk, each chunk committed. A chunk
+        that fails as a whole is retried row by row so the error lands on the offending rows.
+        Returns (results, success_count); results has one entry per row, in file order.
+        """
+        rows = pd.Series(df.index + 1, index=df.index)
+        position = pd.Series(range(len(df)), index=df.index)
+        phones = normalize_phones(df['phone'])
+
+        if 'opening_balance' in df.columns:
+            balances = pd.to_numeric(df['opening_balance'], errors="coerce")
+            bad_balance = df['opening_balance'].notna() & balances.isna()
+            balances = balances.fillna(0)
+        else:
+            balances = pd.Series(0.0, index=df.index)
+            bad_balance = pd.Series(False, index=df.index)
+
+        existing = {row[0] for row in db.session.execute(
+            text("SELECT phone FROM customers WHERE phone = ANY(CAST(:phones AS varchar[]))"),
+            {"phones": list(phones.unique())}
+        )}
+        # As when rows were imported one at a time: the phone check comes first, and the
+        # first row that would be created with a phone takes it from the rows after it
+        in_db = phones.isin(existing)
+        claimable = ~in_db & ~bad_balance
+        first_claim = position[claimable].groupby(phones[claimable]).min()
+        phone_taken = in_db | (position > phones.map(first_claim))
+
+        errors = {index: "Phone number already exists" for index in df.index[phone_taken]}
+        for index in df.index[bad_balance & ~phone_taken]:
+            errors[index] = f"could not convert string to float: {str(df.at[index, 'opening_balance'])!r}"
+
+        valid = df.index[~df.index.isin(list(errors))]
+        now = datetime.utcnow()
+        records = pd.DataFrame({
+            'id': reserve_customer_ids(len(valid)),
+            'contact_person': df.loc[valid, 'contact_person'].astype(str).values,
+            'phone': phones[valid].values,
+            'opening_balance': balances[valid].values
+        }, index=valid)
+        for field in BULK_IMPORT_TEXT_FIELDS:
+            if field in df.columns:
+                column = df.loc[valid, field]
+                records[field] = column.astype(str).where(column.notna(), None)
+            else:
+                records[field] = None
+        records['created_at'] = now
+        records = records.astype(object).where(records.notna(), None)
+
+        created = {}
+        for start in range(0, len(records), chunk_size):
+            cls._insert_chunk(records.iloc[start:start + chunk_size], created, errors)
+
         results = []
-        success_count = 0
-        
-        for index, row in df.iterrows():
-            try:
-                # Convert phone to string first to avoid type casting issues
-                phone_value = row['phone']
-                if pd.notna(phone_value):
-                    phone_str = str(int(phone_value)) if isinstance(phone_value, (int, float)) else str(phone_value)
-                else:
-                    phone_str = ""
-                
-                if cls.query.filter_by(phone=phone_str).first():
-                    results.append({
-                        "row": index + 1,
-                        "status": "error",
-                        "error": "Phone number already exists"
-                    })
-                    continue
-                
-                customer_data = {
-                    'contact_person': str(row['contact_person']),
-                    'phone': phone_str
-                }
-                
-                for field in ['business_name', 'email', 'alternate_phone', 'billing_address', 
-                             'shipping_address', 'gst_number', 'branch', 'pan_number', 
-                             'payment_terms', 'notes', 'documents']:
-                    if field in row and pd.notna(row[field]):
-                        customer_data[field] = str(row[field])
-                
-                if 'opening_balance' in row and pd.notna(row['opening_balance']):
-                    customer_data['opening_balance'] = float(row['opening_balance'])
-                
-                customer = cls(**customer_data)
-                db.session.add(customer)
-                db.session.commit()
-                
+        for index, row_number in rows.items():
+            if index in created:
                 results.append({
-                    "row": index + 1,
+                    "row": int(row_number),
                     "status": "success",
-                    "customer_id": customer.id,
-                    "contact_person": customer.contact_person,
-                    "phone": customer.phone
+                    "customer_id": created[index]['id'],
+                    "contact_person": created[index]['contact_person'],
+                    "phone": created[index]['phone']
                 })
-                success_count += 1
-                
-            except Exception as e:
-                db.session.rollback()
-                results.append({
-                    "row": index + 1,
-                    "status": "error",
-                    "error": str(e)
-                })
-        
-        return results, success_count
+            else:
+                results.append({"row": int(row_number), "status": "error", "error": errors[index]})
+        return results, len(created)
+
+    @classmethod
+    def _insert_chunk(cls, chunk, created, errors):
+        entries = list(zip(chunk.index, chunk.to_dict("records")))
+        try:
+            cls._insert_records([record for _, record in entries])
+            db.session.commit()
+            created.update(entries)
+        except Exception:
+            db.session.rollback()
+            for index, record in entries:
+                try:
+                    cls._insert_records([record])
+                    db.session.commit()
+                    created[index] = record
+                except Exception as e:
+                    db.session.rollback()
+                    errors[index] = str(e)
+
+    @classmethod
+    def _insert_records(cls, records):
+        """Insert rows in the current transaction; Core bypasses the mapper events, so count them here."""
+        db.session.execute(cls.__table__.insert(), records)
+        from reports.dashboard_metrics import apply_metrics_delta
+        apply_metrics_delta(db.session.connection(), customer_count=len(records))
+        db.session.info.setdefault("report_cache_tables", set()).add("customers")
@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify, send_file, make_response
 from src.extensions import db
 from customers.customer import Customer
+from customers.customer_summary_service import CustomerSummaryService
 from user.enhanced_auth_middleware import require_permission_jwt
 from user.audit_logger import audit_decorator
 import pandas as pd
@@ -254,12 +255,12 @@ def get_customer_invoices(customer_id):
             
             # Get invoice items with product details
             from invoices.invoice_item import InvoiceItem
-            from products.product import Product
+            from products.catalog_cache import catalog_cache
             
             invoice_items = InvoiceItem.query.filter_by(invoice_id=invoice.id).all()
             items = []
             for item in invoice_items:
-                product = Product.query.get(item.product_id)
+                product = catalog_cache.get_product(item.product_id)
                 items.append({
                     "product_id": item.product_id,
                     "product_name": product.product_name if product else None,
@@ -319,6 +320,27 @@ def get_customer_invoices(customer_id):
         return jsonify({"error": str(e)}), 500
 
 
+# -------------------- CUSTOMER SUMMARY (360) --------------------
+@bp.route("/<customer_id>/summary", methods=["GET", "OPTIONS"])
+@require_permission_jwt('customers', 'read')
+def get_customer_summary(customer_id):
+    try:
+        customer_id = int(customer_id)
+    except ValueError:
+        return jsonify({"error": "Invalid customer ID"}), 400
+
+    try:
+        summary, cache_status = CustomerSummaryService.get_summary(customer_id)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    if summary is None:
+        return jsonify({"error": "Customer not found"}), 404
+
+    response = jsonify(summary)
+    response.headers["X-Report-Cache"] = cache_status
+    return response, 200
+
+
 # -------------------- EXPORT CUSTOMERS --------------------
 @bp.route("/export", methods=["GET", "OPTIONS"])
 @require_permission_jwt('customers', 'read')
@@ -0,0 +1,203 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session
+from src.extensions import db
+from customers.customer import Customer
+from invoices.invoice import Invoice
+from invoices.invoice_item import InvoiceItem
+from payments.payment import Payment
+from returns.product_return import ProductReturn
+from products.catalog_cache import catalog_cache
+from reports.report_cache import report_cache, ReportCache
+
+RECENT_INVOICES = 10
+TOP_PRODUCTS = 5
+# Days past due, by the due date or the invoice date where an invoice has none
+AGING_BUCKETS = (("1_30", 1, 30), ("31_60", 31, 60), ("61_90", 61, 90))
+
+
+def customer_summary_tag(customer_id):
+    return f"customer:{customer_id}"
+
+
+def _money(value):
+    return f"{Decimal(value or 0):.2f}"
+
+
+class CustomerSummaryService:
+    @staticmethod
+    def get_summary(customer_id):
+        """
+        Customer 360 as (summary, cache_status); summary is None for an unknown customer.
+        Cached per customer in the report cache; any committed write to the customer or
+        to its invoices, payments or returns drops the entry (see _tag_customer_writes).
+        """
+        key = ReportCache.make_key("customer-summary", {"customer_id": customer_id})
+
+        def compute():
+            summary = CustomerSummaryService.build(customer_id)
+            return summary, summary is not None
+
+        (summary, _), status = report_cache.get_or_compute(key, (customer_summary_tag(customer_id),), compute)
+        return summary, status
+
+    @staticmethod
+    def build(customer_id, now=None):
+        """
+        Lifetime revenue, outstanding with aging, last purchase, top products, returns
+        and recent invoices from five queries whatever the customer's history:
+        the customer, one invoice aggregate, recent invoices, top products and returns.
+        Cancelled invoices count towards nothing but the recent list.
+        """
+        customer = Customer.query.get(customer_id)
+        if not customer:
+            return None
+        now = now or datetime.utcnow()
+
+        # Excess over the invoice is not applied to it, as in the dashboard metrics
+        paid = db.session.query(
+            Payment.invoice_id.label("invoice_id"),
+            func.sum(Payment.amount_paid - func.coalesce(Payment.excess_amount, 0)).label("paid")
+        ).join(Invoice, Invoice.id == Payment.invoice_id).filter(
+            Invoice.customer_id == customer_id
+        ).group_by(Payment.invoice_id).subquery()
+
+        billed = db.session.query(
+            Invoice.id, Invoice.invoice_date, Invoice.grand_total,
+            func.coalesce(paid.c.paid, 0).label("paid"),
+            func.coalesce(Invoice.due_date, Invoice.invoice_date).label("due")
+        ).outerjoin(paid, paid.c.invoice_id == Invoice.id).filter(
+            Invoice.customer_id == customer_id,
+            func.coalesce(Invoice.status, "") != "Cancelled"
+        ).subquery()
+
+        balance = func.greatest(func.coalesce(billed.c.grand_total, 0) - billed.c.paid, 0)
+        aging = [func.coalesce(func.sum(balance).filter(billed.c.due >= now), 0)]
+        for _, low, high in AGING_BUCKETS:
+            aging.append(func.coalesce(func.sum(balance).filter(
+                billed.c.due < now - timedelta(days=low - 1),
+                billed.c.due >= now - timedelta(days=high)
+            ), 0))
+        oldest = now - timedelta(days=AGING_BUCKETS[-1][2])
+        aging.append(func.coalesce(func.sum(balance).filter(billed.c.due < oldest), 0))
+
+        totals = db.session.query(
+            func.count(billed.c.id),
+            func.coalesce(func.sum(billed.c.grand_total), 0),
+            func.coalesce(func.sum(billed.c.paid), 0),
+            func.coalesce(func.sum(balance), 0),
+            func.count(billed.c.id).filter(balance > 0),
+            func.min(billed.c.invoice_date),
+            func.max(billed.c.invoice_date),
+            *aging
+        ).one()
+        (invoice_count, revenue, received, outstanding, open_invoices,
+         first_purchase, last_purchase), aging = totals[:7], totals[7:]
+
+        recent = db.session.query(
+            Invoice.id, Invoice.invoice_number, Invoice.invoice_date, Invoice.due_date,
+            Invoice.grand_total, Invoice.status, func.coalesce(paid.c.paid, 0).label("paid")
+        ).outerjoin(paid, paid.c.invoice_id == Invoice.id).filter(
+            Invoice.customer_id == customer_id
+        ).order_by(Invoice.invoice_date.desc(), Invoice.id.desc()).limit(RECENT_INVOICES).all()
+
+        revenue_by_product = func.sum(InvoiceItem.total_price)
+        top = db.session.query(
+            InvoiceItem.product_id,
+            func.sum(InvoiceItem.quantity).label("quantity"),
+            revenue_by_product.label("revenue"),
+            func.count(func.distinct(InvoiceItem.invoice_id)).label("invoices")
+        ).join(Invoice, Invoice.id == InvoiceItem.invoice_id).filter(
+            Invoice.customer_id == customer_id,
+            func.coalesce(Invoice.status, "") != "Cancelled"
+        ).group_by(InvoiceItem.product_id).order_by(
+            revenue_by_product.desc(), InvoiceItem.product_id
+        ).limit(TOP_PRODUCTS).all()
+        products = catalog_cache.get_products({row.product_id for row in top})
+
+        returns = db.session.query(
+            ProductReturn.return_type,
+            func.count(ProductReturn.id),
+            func.coalesce(func.sum(ProductReturn.quantity_returned), 0),
+            func.coalesce(func.sum(ProductReturn.refund_amount), 0)
+        ).filter(ProductReturn.customer_id == customer_id).group_by(ProductReturn.return_type).all()
+
+        aging_keys = ["current"] + [name for name, _, _ in AGING_BUCKETS] + [f"over_{AGING_BUCKETS[-1][2]}"]
+        return {
+            "customer": {
+                "id": customer.id,
+                "contact_person": customer.contact_person,
+                "business_name": customer.business_name,
+                "phone": customer.phone,
+                "email": customer.email,
+                "branch": customer.branch,
+                "payment_terms": customer.payment_terms,
+                "opening_balance": _money(customer.opening_balance),
+                "created_at": customer.created_at.isoformat() if customer.created_at else None
+            },
+            "lifetime": {
+                "invoice_count": invoice_count,
+                "revenue": _money(revenue),
+                "payments_received": _money(received),
+                "average_invoice_value": _money(Decimal(revenue) / invoice_count if invoice_count else 0),
+                "first_purchase_date": first_purchase.isoformat() if first_purchase else None,
+                "last_purchase_date": last_purchase.isoformat() if last_purchase else None,
+                "days_since_last_purchase": (now - last_purchase).days if last_purchase else None
+            },
+            "outstanding": {
+                "total": _money(outstanding),
+                "open_invoices": open_invoices,
+                "aging": {name: _money(amount) for name, amount in zip(aging_keys, aging)}
+            },
+            "top_products": [{
+                "product_id": row.product_id,
+                "product_name": products[row.product_id].product_name if row.product_id in products else None,
+                "sku": products[row.product_id].sku if row.product_id in products else None,
+                "quantity": int(row.quantity or 0),
+                "revenue": _money(row.revenue),
+                "invoices": row.invoices
+            } for row in top],
+            "returns": {
+                "count": sum(count for _, count, _, _ in returns),
+                "quantity": sum(int(quantity) for _, _, quantity, _ in returns),
+                "refund_amount": _money(sum((Decimal(refund) for _, _, _, refund in returns), Decimal('0'))),
+                "by_type": {return_type or "unknown": count for return_type, count, _, _ in returns}
+            },
+            "recent_invoices": [{
+                "invoice_id": row.id,
+                "invoice_number": row.invoice_number,
+                "invoice_date": row.invoice_date.isoformat() if row.invoice_date else None,
+                "due_date": row.due_date.isoformat() if row.due_date else None,
+                "grand_total": _money(row.grand_total),
+                "amount_paid": _money(row.paid),
+                "balance_due": _money(max(Decimal('0'), Decimal(row.grand_total or 0) - Decimal(row.paid))),
+                "status": row.status
+            } for row in recent],
+            "generated_at": now.isoformat()
+        }
+
+
+def _written_customer_ids(obj):
+    if isinstance(obj, Customer):
+        return {obj.id}
+    if isinstance(obj, InvoiceItem):
+        # Items are written with their invoice, which names the customer
+        invoice = obj.__dict__.get("invoice")
+        return {invoice.customer_id} if invoice is not None else set()
+    if isinstance(obj, (Invoice, Payment, ProductReturn)):
+        # A record moved between customers changes both summaries
+        return {obj.customer_id, *inspect(obj).attrs.customer_id.history.deleted}
+    return set()
+
+
+# Per-customer tags ride with the written table names and are invalidated on commit
+@event.listens_for(Session, "after_flush")
+def _tag_customer_writes(session, flush_context):
+    customer_ids = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        customer_ids |= _written_customer_ids(obj)
+    if customer_ids:
+        session.info.setdefault("report_cache_tables", set()).update(
+            customer_summary_tag(customer_id) for customer_id in customer_ids if customer_id is not None
+        )
@@ -4,7 +4,8 @@ from damage.supplier_return import SupplierReturn
 from returns.product_return import DamagedProduct
 from products.product import Product
 from suppliers.supplier import Supplier
-from stock_transactions.stock_transaction import StockTransaction
+from stock_transactions.stock_engine import StockEngine, StockChange
+from purchases.purchase_history_service import PurchaseHistoryService
 from src.extensions import db
 from user.enhanced_auth_middleware import require_permission_jwt
 from user.audit_logger import audit_decorator
@@ -44,15 +45,12 @@ def return_damaged_to_supplier():
         supplier_id = data.get('supplier_id')
         if not supplier_id:
             # Find supplier from purchase history
-            purchase = StockTransaction.query.filter_by(
-                product_id=damaged_product.product_id,
-                transaction_type='Purchase'
-            ).order_by(StockTransaction.transaction_date.desc()).first()
+            supplier_id = PurchaseHistoryService.last_suppliers([damaged_product.product_id]).get(
+                damaged_product.product_id
+            )
             
-            if not purchase or not purchase.supplier_id:
+            if not supplier_id:
                 return jsonify({"error": "Cannot determine supplier. Please provide supplier_id"}), 400
-            
-            supplier_id = purchase.supplier_id
         
         # Validate supplier exists
         supplier = Supplier.query.get(supplier_id)
@@ -84,10 +82,8 @@ def return_damaged_to_supplier():
         damaged_product.action_date = datetime.utcnow()
         
         # If replacement, add quantity back to stock immediately
-        if data['return_type'] == 'replacement':
-            product = Product.query.get(damaged_product.product_id)
-            if product:
-                product.quantity_in_stock += damaged_product.quantity
+        if data['return_type'] == 'replacement' and Product.query.get(damaged_product.product_id):
+            StockEngine.apply([StockChange(damaged_product.product_id, damaged_product.quantity, None)])
         
         db.session.commit()
         
@@ -208,20 +204,13 @@ def receive_replacement_from_supplier():
         if not product:
             return jsonify({"error": "Original product not found"}), 404
         
-        # Add replacement quantity back to stock
-        product.quantity_in_stock += supplier_return.quantity_returned
-        
-        # Create stock transaction for replacement received
-        stock_transaction = StockTransaction(
-            product_id=product.id,
-            transaction_type='Purchase',
-            quantity=supplier_return.quantity_returned,
+        # Add replacement quantity back to stock; a free replacement, not a purchase (no purchase order)
+        new_stock = StockEngine.apply([StockChange(
+            product.id, supplier_return.quantity_returned, 'Replacement_Received',
             supplier_id=supplier_return.supplier_id,
             reference_number=supplier_return.return_number,
             notes=f"Replacement received for damaged product return {supplier_return.return_number}"
-        )
-        
-        db.session.add(stock_transaction)
+        )])
         
         # Update supplier return status
         supplier_return.status = 'Completed'
@@ -234,7 +223,7 @@ def receive_replacement_from_supplier():
             "product_id": product.id,
             "product_name": product.product_name,
             "quantity_added": supplier_return.quantity_returned,
-            "new_stock_quantity": product.quantity_in_stock,
+            "new_stock_quantity": new_stock[product.id],
             "return_number": supplier_return.return_number
         }), 200
         
@@ -4,6 +4,7 @@ from damage.supplier_return import SupplierReturn
 from returns.product_return import DamagedProduct
 from products.product import Product
 from suppliers.supplier import Supplier
+from purchases.purchase_history_service import PurchaseHistoryService
 
 class DamageService:
     
@@ -21,13 +22,11 @@ class DamageService:
                 return {"success": False, "error": "Already returned to supplier"}
             
             # Find supplier from purchase history
-            from stock_transactions.stock_transaction import StockTransaction
-            purchase = StockTransaction.query.filter_by(
-                product_id=damaged_product.product_id,
-                transaction_type='Purchase'
-            ).order_by(StockTransaction.transaction_date.desc()).first()
+            supplier_id = PurchaseHistoryService.last_suppliers([damaged_product.product_id]).get(
+                damaged_product.product_id
+            )
             
-            if not purchase or not purchase.supplier_id:
+            if not supplier_id:
                 return {"success": False, "error": "Cannot determine supplier"}
             
             # Calculate refund amount
@@ -40,7 +39,7 @@ class DamageService:
             # Create supplier return
             supplier_return = SupplierReturn(
                 damaged_product_id=damaged_product_id,
-                supplier_id=purchase.supplier_id,
+                supplier_id=supplier_id,
                 return_type=return_type,
                 quantity_returned=damaged_product.quantity,
                 refund_amount=refund_amount,
@@ -74,18 +73,16 @@ class DamageService:
             DamagedProduct.status.in_(['Stored', 'Repaired'])
         ).all()
         
+        # Each product's last supplier, from purchase orders, with one query for all of them
+        last_suppliers = PurchaseHistoryService.last_suppliers({dp.product_id for dp in damaged_products})
+        supplier_ids = set(last_suppliers.values())
+        suppliers = {s.id: s for s in Supplier.query.filter(Supplier.id.in_(supplier_ids)).all()} if supplier_ids else {}
+        
         returnable = []
         for dp in damaged_products:
             product = Product.query.get(dp.product_id) if dp.product_id else None
             
-            # Find supplier
-            from stock_transactions.stock_transaction import StockTransaction
-            purchase = StockTransaction.query.filter_by(
-                product_id=dp.product_id,
-                transaction_type='Purchase'
-            ).order_by(StockTransaction.transaction_date.desc()).first()
-            
-            supplier = Supplier.query.get(purchase.supplier_id) if purchase else None
+            supplier = suppliers.get(last_suppliers.get(dp.product_id))
             
             returnable.append({
                 "damaged_product_id": dp.id,
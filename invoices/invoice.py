@@ -6,6 +6,10 @@ import uuid
 
 class Invoice(db.Model):
     __tablename__ = "invoices"
+    __table_args__ = (
+        # A customer's invoices, newest first (customer summary, customer invoice lists)
+        db.Index("ix_invoices_customer_date", "customer_id", "invoice_date", "id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=False)
     invoice_number = db.Column(db.String(100), unique=True, nullable=True)
@@ -4,6 +4,9 @@ import uuid
 
 class InvoiceItem(db.Model):
     __tablename__ = "invoice_items"
+    __table_args__ = (
+        db.Index("ix_invoice_items_invoice", "invoice_id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     invoice_id = db.Column(db.Integer, db.ForeignKey("invoices.id"), nullable=False)
@@ -36,7 +36,8 @@ def create_invoice():
             shipping_charges=payload.get("shipping_charges", 0),
             other_charges=payload.get("other_charges", 0),
             additional_discount=payload.get("additional_discount", 0),
-            additional_discount_type=payload.get("additional_discount_type", "percentage")
+            additional_discount_type=payload.get("additional_discount_type", "percentage"),
+            cart_id=payload.get("cart_id")
         )
 
         from payments.payment import Payment
@@ -134,7 +135,7 @@ def list_invoices():
             from customers.customer import Customer
             from payments.payment import Payment
             from invoices.invoice_item import InvoiceItem
-            from products.product import Product
+            from products.catalog_cache import catalog_cache
 
             customer = Customer.query.get(i.customer_id)
 
@@ -146,7 +147,7 @@ def list_invoices():
             invoice_items = InvoiceItem.query.filter_by(invoice_id=i.id).all()
             items = []
             for item in invoice_items:
-                product = Product.query.get(item.product_id)
+                product = catalog_cache.get_product(item.product_id)
                 items.append({
                     "product_id": item.product_id,
                     "product_name": product.product_name if product else None,
@@ -199,7 +200,7 @@ def get_invoices_by_customer_id(customer_id):
         from customers.customer import Customer
         from payments.payment import Payment
         from invoices.invoice_item import InvoiceItem
-        from products.product import Product
+        from products.catalog_cache import catalog_cache
 
         customer = Customer.query.get(customer_id)
         if not customer:
@@ -223,7 +224,7 @@ def get_invoices_by_customer_id(customer_id):
             invoice_items = InvoiceItem.query.filter_by(invoice_id=invoice.id).all()
             items = []
             for item in invoice_items:
-                product = Product.query.get(item.product_id)
+                product = catalog_cache.get_product(item.product_id)
                 items.append({
                     "product_id": item.product_id,
                     "product_name": product.product_name if product else None,
@@ -267,7 +268,7 @@ def get_invoices_by_customer(customer_id):
         from customers.customer import Customer
         from payments.payment import Payment
         from invoices.invoice_item import InvoiceItem
-        from products.product import Product
+        from products.catalog_cache import catalog_cache
 
         customer = Customer.query.get(customer_id)
         if not customer:
@@ -309,7 +310,7 @@ def get_invoices_by_customer(customer_id):
             invoice_items = InvoiceItem.query.filter_by(invoice_id=invoice.id).all()
             items = []
             for item in invoice_items:
-                product = Product.query.get(item.product_id)
+                product = catalog_cache.get_product(item.product_id)
                 items.append({
                     "product_id": item.product_id,
                     "product_name": product.product_name if product else None,
@@ -357,7 +358,7 @@ def get_invoice_by_id(invoice_id):
         from customers.customer import Customer
         from payments.payment import Payment
         from invoices.invoice_item import InvoiceItem
-        from products.product import Product
+        from products.catalog_cache import catalog_cache
 
         customer = Customer.query.get(invoice.customer_id)
         payments = Payment.query.filter_by(invoice_id=invoice.id).all()
@@ -366,7 +367,7 @@ def get_invoice_by_id(invoice_id):
         invoice_items = InvoiceItem.query.filter_by(invoice_id=invoice.id).all()
         items = []
         for item in invoice_items:
-            product = Product.query.get(item.product_id)
+            product = catalog_cache.get_product(item.product_id)
             items.append({
                 "product_id": item.product_id,
                 "product_name": product.product_name if product else None,
@@ -443,7 +444,7 @@ def search_invoices():
         for i in invoices:
             from customers.customer import Customer
             from invoices.invoice_item import InvoiceItem
-            from products.product import Product
+            from products.catalog_cache import catalog_cache
 
             customer = Customer.query.get(i.customer_id)
 
@@ -451,7 +452,7 @@ def search_invoices():
             invoice_items = InvoiceItem.query.filter_by(invoice_id=i.id).all()
             items = []
             for item in invoice_items:
-                product = Product.query.get(item.product_id)
+                product = catalog_cache.get_product(item.product_id)
                 items.append({
                     "product_id": item.product_id,
                     "product_name": product.product_name if product else None,
@@ -497,7 +498,7 @@ def filter_invoices():
         for i in invoices:
             from customers.customer import Customer
             from invoices.invoice_item import InvoiceItem
-            from products.product import Product
+            from products.catalog_cache import catalog_cache
 
             customer = Customer.query.get(i.customer_id)
 
@@ -505,7 +506,7 @@ def filter_invoices():
             invoice_items = InvoiceItem.query.filter_by(invoice_id=i.id).all()
             items = []
             for item in invoice_items:
-                product = Product.query.get(item.product_id)
+                product = catalog_cache.get_product(item.product_id)
                 items.append({
                     "product_id": item.product_id,
                     "product_name": product.product_name if product else None,
@@ -546,7 +547,7 @@ def get_invoices_for_customer(customer_id):
         from customers.customer import Customer
         from payments.payment import Payment
         from invoices.invoice_item import InvoiceItem
-        from products.product import Product
+        from products.catalog_cache import catalog_cache
 
         customer = Customer.query.get(customer_id)
         if not customer:
@@ -570,7 +571,7 @@ def get_invoices_for_customer(customer_id):
             invoice_items = InvoiceItem.query.filter_by(invoice_id=invoice.id).all()
             items = []
             for item in invoice_items:
-                product = Product.query.get(item.product_id)
+                product = catalog_cache.get_product(item.product_id)
                 items.append({
                     "product_id": item.product_id,
                     "product_name": product.product_name if product else None,
@@ -614,9 +615,8 @@ def update_invoice(invoice_id):
     from datetime import datetime
     from decimal import Decimal
     from invoices.invoice_item import InvoiceItem
-    from products.product import Product
-    from category.category import Category
-    from stock_transactions.stock_transaction import StockTransaction
+    from products.catalog_cache import catalog_cache
+    from stock_transactions.stock_engine import StockEngine, StockChange
     from payments.payment import Payment
     
     invoice = Invoice.query.get(invoice_id)
@@ -628,23 +628,16 @@ def update_invoice(invoice_id):
         # Get current invoice items for stock reversal
         current_items = InvoiceItem.query.filter_by(invoice_id=invoice_id).all()
         
-        # Reverse stock for current items
-        for item in current_items:
-            product = Product.query.get(item.product_id)
-            if product:
-                product.quantity_in_stock += item.quantity
-                # Create reverse stock transaction
-                stock_txn = StockTransaction(
-                    product_id=product.id,
-                    transaction_type="Return",
-                    sale_type="Invoice Update",
-                    quantity=item.quantity,
-                    invoice_id=invoice.id
-                )
-                db.session.add(stock_txn)
+        # Reverse stock for current items (products deleted since are skipped)
+        existing_products = catalog_cache.get_products({item.product_id for item in current_items})
+        stock_changes = [
+            StockChange(item.product_id, item.quantity, "Return", sale_type="Invoice Update", invoice_id=invoice.id)
+            for item in current_items if item.product_id in existing_products
+        ]
         
-        # Delete current invoice items
-        InvoiceItem.query.filter_by(invoice_id=invoice_id).delete()
+        # Delete current invoice items (per row so the sales fact and dashboard events fire)
+        for item in current_items:
+            db.session.delete(item)
         
         # Process new items if provided
         new_items = data.get("items", [])
@@ -657,20 +650,18 @@ def update_invoice(invoice_id):
             total_discount = Decimal("0.00")
             
             for item_data in new_items:
-                product = Product.query.get(item_data["product_id"])
+                product = catalog_cache.get_product(item_data["product_id"])
                 if not product:
                     raise ValueError(f"Product {item_data['product_id']} not found")
                 
                 qty = int(item_data.get("quantity", 1))
-                if product.quantity_in_stock < qty:
-                    raise ValueError(f"Insufficient stock for {product.product_name}")
                 
                 unit_price = Decimal(product.selling_price)
                 discount_per_item = Decimal(item_data.get("discount_per_item", 0))
                 discount_type = item_data.get("discount_type", "percentage")
                 
                 # Get tax rates
-                category = Category.query.get(product.category_id) if product.category_id else None
+                category = catalog_cache.get_category(product.category_id)
                 if category:
                     cgst_rate = Decimal(category.cgst_rate)
                     sgst_rate = Decimal(category.sgst_rate)
@@ -714,16 +705,10 @@ def update_invoice(invoice_id):
                 )
                 db.session.add(invoice_item)
                 
-                # Update stock and create transaction
-                product.quantity_in_stock -= qty
-                stock_txn = StockTransaction(
-                    product_id=product.id,
-                    transaction_type="Sale",
-                    sale_type="With Bill",
-                    quantity=qty,
-                    invoice_id=invoice.id
-                )
-                db.session.add(stock_txn)
+                # Stock moves with the reversal in one conditional update below
+                stock_changes.append(StockChange(
+                    product.id, -qty, "Sale", recorded_quantity=qty, sale_type="With Bill", invoice_id=invoice.id
+                ))
                 
                 # Update totals
                 total_before_tax += line_after_discount
@@ -741,6 +726,9 @@ def update_invoice(invoice_id):
             invoice.igst_amount = total_igst.quantize(Decimal("0.00"))
             invoice.discount_amount = total_discount.quantize(Decimal("0.00"))
         
+        # Returned units count towards the new lines' availability
+        StockEngine.apply(stock_changes)
+        
         # Update other invoice fields
         invoice.payment_terms = data.get("payment_terms", invoice.payment_terms)
         invoice.notes = data.get("notes", invoice.notes)
@@ -991,8 +979,10 @@ def delete_invoice(invoice_id):
         from invoices.invoice_item import InvoiceItem
         from payments.payment import Payment
         
-        InvoiceItem.query.filter_by(invoice_id=invoice_id).delete()
-        Payment.query.filter_by(invoice_id=invoice_id).delete()
+        for item in InvoiceItem.query.filter_by(invoice_id=invoice_id).all():
+            db.session.delete(item)
+        for payment in Payment.query.filter_by(invoice_id=invoice_id).all():
+            db.session.delete(payment)
         
         db.session.delete(invoice)
         db.session.commit()
@@ -2,9 +2,8 @@ from decimal import Decimal
 from src.extensions import db
 from invoices.invoice import Invoice
 from invoices.invoice_item import InvoiceItem
-from products.product import Product
-from category.category import Category
-from stock_transactions.stock_transaction import StockTransaction
+from products.catalog_cache import catalog_cache
+from stock_transactions.stock_engine import StockEngine, StockChange, InsufficientStockError
 from datetime import datetime
 
 class InvoiceService:
@@ -15,7 +14,7 @@ class InvoiceService:
         return f"INV-{now.strftime('%Y')}-{now.strftime('%m')}-{invoice_id}"
 
     @staticmethod
-    def create_invoice(customer_id, items, payment_terms=None, currency="INR", notes=None, shipping_charges=0, other_charges=0, additional_discount=0, additional_discount_type="percentage", due_date=None):
+    def create_invoice(customer_id, items, payment_terms=None, currency="INR", notes=None, shipping_charges=0, other_charges=0, additional_discount=0, additional_discount_type="percentage", due_date=None, cart_id=None):
         """
         items: list of dicts [{product_id, quantity, discount_per_item(optional), discount_type(optional)}]
         This function:
@@ -48,6 +47,7 @@ class InvoiceService:
         total_sgst = Decimal("0.00")
         total_igst = Decimal("0.00")
         total_discount = Decimal("0.00")
+        stock_changes = []
 
         for it in items:
             # Validate item structure
@@ -55,7 +55,8 @@ class InvoiceService:
                 db.session.rollback()
                 raise ValueError(f"Invalid item format: {it}")
                 
-            product = Product.query.get(it["product_id"])
+            # Pricing comes from the catalog cache; stock moves atomically below
+            product = catalog_cache.get_product(it["product_id"])
             if not product:
                 db.session.rollback()
                 raise ValueError(f"Product id {it['product_id']} not found")
@@ -66,7 +67,7 @@ class InvoiceService:
             discount_type = it.get("discount_type", "percentage")
             
             # Get tax rates from product category
-            category = Category.query.get(product.category_id) if product.category_id else None
+            category = catalog_cache.get_category(product.category_id)
             if category:
                 cgst_rate = Decimal(category.cgst_rate)
                 sgst_rate = Decimal(category.sgst_rate)
@@ -125,20 +126,16 @@ class InvoiceService:
             total_igst += igst_amount
             total_discount += discount_amount
 
-            # Deduct stock and create stock transaction
-            if product.quantity_in_stock < qty:
-                db.session.rollback()
-                raise ValueError(f"Insufficient stock for product {product.product_name}")
+            stock_changes.append(StockChange(
+                product.id, -qty, "Sale", recorded_quantity=qty, sale_type="With Bill", invoice_id=invoice.id
+            ))
 
-            product.quantity_in_stock -= qty
-            stock_txn = StockTransaction(
-                product_id=product.id,
-                transaction_type="Sale",
-                sale_type="With Bill",
-                quantity=qty,
-                invoice_id=invoice.id,
-            )
-            db.session.add(stock_txn)
+        # Deduct stock for all lines in one conditional update, consuming the cart's reservations
+        try:
+            StockEngine.apply(stock_changes, cart_id=cart_id)
+        except InsufficientStockError:
+            db.session.rollback()
+            raise
 
         # Calculate subtotal with tax
         subtotal_with_tax = (total_before_tax + total_tax).quantize(Decimal("0.00"))
@@ -58,9 +58,8 @@ def send_invoice_email():
         
         items_data = []
         for item in invoice_items:
-            from products.product import Product
-            from category.category import Category
-            product = Product.query.get(item.product_id)
+            from products.catalog_cache import catalog_cache
+            product = catalog_cache.get_product(item.product_id)
             
             # Get HSN code from product's category if not in product
             hsn_code = 'N/A'
@@ -68,7 +67,7 @@ def send_invoice_email():
                 if hasattr(product, 'hsn_code') and product.hsn_code:
                     hsn_code = product.hsn_code
                 elif product.category_id:
-                    category = Category.query.get(product.category_id)
+                    category = catalog_cache.get_category(product.category_id)
                     if category and category.hsn_code:
                         hsn_code = category.hsn_code
             
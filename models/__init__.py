@@ -9,9 +9,17 @@ from invoices.invoice import Invoice
 from invoices.invoice_item import InvoiceItem
 from payments.payment import Payment
 from stock_transactions.stock_transaction import StockTransaction
+from stock_transactions.stock_reservation import StockReservation
+from stock_transactions.stock_batch import StockBatch
 from sales_no_invoice.sale_no_invoice import SaleNoInvoice
 from purchases.purchase_bill import PurchaseBill
+from purchases.purchase_order import PurchaseOrder, PurchaseOrderItem
 from returns.product_return import ProductReturn, DamagedProduct
+from reports.report import Report
+from reports.dashboard_metrics import DashboardMetrics
+from reports.daily_sales_fact import DailySalesFact
+from reports.sales_timeseries_bucket import SalesTimeseriesBucket
+from reports.inventory_snapshot import InventorySnapshot
 
 
 __all__ = [
@@ -24,9 +32,18 @@ __all__ = [
     "InvoiceItem",
     "Payment",
     "StockTransaction",
+    "StockReservation",
+    "StockBatch",
     "SaleNoInvoice",
     "SubCategory",
     "PurchaseBill",
+    "PurchaseOrder",
+    "PurchaseOrderItem",
     "ProductReturn",
     "DamagedProduct",
+    "Report",
+    "DashboardMetrics",
+    "DailySalesFact",
+    "SalesTimeseriesBucket",
+    "InventorySnapshot",
 ]
@@ -7,6 +7,10 @@ from sqlalchemy import event
 
 class Payment(db.Model):
     __tablename__ = "payments"
+    __table_args__ = (
+        # Amount paid per invoice
+        db.Index("ix_payments_invoice", "invoice_id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     invoice_id = db.Column(db.Integer, db.ForeignKey("invoices.id"), nullable=False)
@@ -25,6 +29,8 @@ class Payment(db.Model):
     transaction_reference = db.Column(db.String(255), nullable=True)
     payment_status = db.Column(db.String(50), default="Successful")  # Successful / Failed / Pending
     notes = db.Column(db.Text, nullable=True)
+    # Set on insert and on every update (balances are recalculated), so exports pick up changes
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     invoice = db.relationship("Invoice", back_populates="payments")
     
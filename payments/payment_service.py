@@ -350,9 +350,9 @@ class PaymentService:
     def _get_hsn_code(product):
         """Get HSN code from product's category"""
         try:
-            from category.category import Category
+            from products.catalog_cache import catalog_cache
             if product.category_id:
-                category = Category.query.get(product.category_id)
+                category = catalog_cache.get_category(product.category_id)
                 return category.hsn_code if category else None
             return None
         except:
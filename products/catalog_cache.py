@@ -0,0 +1,220 @@
+import threading
+from collections import namedtuple
+from cachetools import TTLCache
+from sqlalchemy import event, inspect, text
+from sqlalchemy.orm import Session, object_session
+from src.extensions import db
+from src.pg_listener import PgListener
+from products.product import Product
+from category.category import Category
+
+CATALOG_CACHE_MAXSIZE = 10000
+# Backstop for writes no notification reaches (raw SQL without notify_catalog_change)
+CATALOG_CACHE_TTL = 900
+NOTIFY_CHANNEL = "catalog_changes"
+# Keeps each NOTIFY payload well under Postgres' 8000 byte limit
+NOTIFY_IDS_PER_MESSAGE = 500
+
+# Read-mostly columns only; quantity_in_stock changes on every sale and is never cached
+PRODUCT_FIELDS = (
+    "id", "product_name", "sku", "description", "category_id", "subcategory_id", "unit_of_measure",
+    "selling_price", "purchase_price", "reorder_level", "max_stock_level", "supplier_id",
+    "batch_number", "expiry_date", "barcode"
+)
+CATEGORY_FIELDS = ("id", "name", "hsn_code", "cgst_rate", "sgst_rate", "igst_rate")
+
+ProductInfo = namedtuple("ProductInfo", PRODUCT_FIELDS)
+CategoryTax = namedtuple("CategoryTax", CATEGORY_FIELDS)
+
+_MODELS = {"product": (Product, PRODUCT_FIELDS, ProductInfo), "category": (Category, CATEGORY_FIELDS, CategoryTax)}
+
+
+class CatalogCache:
+    """Process-local read-through cache of product metadata and category tax rates.
+
+    Each gunicorn worker keeps its own copy. Product and category writes send a
+    NOTIFY inside the writing transaction, so Postgres delivers it to every
+    worker's listener only once the write commits. While this process is not
+    listening, lookups go to the database and nothing is cached.
+    """
+
+    def __init__(self, maxsize=CATALOG_CACHE_MAXSIZE, ttl=CATALOG_CACHE_TTL):
+        self._entries = {kind: TTLCache(maxsize=maxsize, ttl=ttl) for kind in _MODELS}
+        self._lock = threading.Lock()
+        # Bumped by every invalidation so a lookup racing a write never stores the old row
+        self._generation = 0
+        self._callbacks = []
+        self._listener = PgListener(NOTIFY_CHANNEL, self._apply, self.clear, name="catalog-cache-listener")
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def get_product(self, product_id):
+        """ProductInfo for product_id (attribute-compatible with Product), or None."""
+        return self._get("product", product_id)
+
+    def get_category(self, category_id):
+        """CategoryTax for category_id, or None."""
+        return self._get("category", category_id)
+
+    def get_products(self, product_ids):
+        """{product_id: ProductInfo} for the ids that exist, loading all misses in one query."""
+        return self._get_many("product", product_ids)
+
+    def get_categories(self, category_ids):
+        """{category_id: CategoryTax} for the ids that exist, loading all misses in one query."""
+        return self._get_many("category", category_ids)
+
+    @property
+    def listening(self):
+        """True while invalidations reach this process, i.e. cached data can be trusted."""
+        self._listener.ensure_started()
+        return self._listener.listening
+
+    def on_invalidate(self, callback):
+        """Call callback(kind, ids) after every invalidation; ids is None when a whole kind is dropped."""
+        self._callbacks.append(callback)
+
+    def _get(self, kind, entity_id):
+        if entity_id is None:
+            return None
+        return self._get_many(kind, [entity_id]).get(int(entity_id))
+
+    def _get_many(self, kind, entity_ids):
+        entity_ids = {int(i) for i in entity_ids if i is not None}
+        self._listener.ensure_started()
+        entries = self._entries[kind]
+        found = {}
+        with self._lock:
+            for entity_id in entity_ids:
+                if entity_id in entries:
+                    found[entity_id] = entries[entity_id]
+            missing = entity_ids - set(found)
+            self.stats["hits"] += len(found)
+            self.stats["misses"] += len(missing)
+            generation = self._generation
+            listening = self._listener.listening
+        if not missing:
+            return found
+
+        model, fields, row_type = _MODELS[kind]
+        rows = db.session.query(*[getattr(model, f) for f in fields]).filter(model.id.in_(missing)).all()
+        loaded = {row.id: row_type(*row) for row in rows}
+
+        # Rows changed by the current, uncommitted transaction must not be shared
+        pending = db.session.info.get("catalog_cache_keys", ())
+        if loaded and listening:
+            with self._lock:
+                if self._generation == generation and self._listener.listening:
+                    for entity_id, value in loaded.items():
+                        if (kind, entity_id) not in pending:
+                            entries[entity_id] = value
+        found.update(loaded)
+        return found
+
+    def invalidate(self, kind, ids=None):
+        """Drop the given ids of kind ('product' or 'category'); ids=None drops the whole kind."""
+        if ids is not None:
+            ids = [int(i) for i in ids]
+        with self._lock:
+            self._generation += 1
+            entries = self._entries[kind]
+            if ids is None:
+                self.stats["invalidations"] += len(entries)
+                entries.clear()
+            else:
+                for entity_id in ids:
+                    if entries.pop(entity_id, None) is not None:
+                        self.stats["invalidations"] += 1
+        for callback in self._callbacks:
+            callback(kind, ids)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            for entries in self._entries.values():
+                entries.clear()
+        for callback in self._callbacks:
+            for kind in _MODELS:
+                callback(kind, None)
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return dict(
+                self.stats,
+                reconnects=self._listener.reconnects,
+                listening=self._listener.listening,
+                products=len(self._entries["product"]),
+                categories=len(self._entries["category"]),
+                hit_ratio=round(self.stats["hits"] / lookups, 4) if lookups else 0.0
+            )
+
+    def _apply(self, payload):
+        kind, _, ids = payload.partition(":")
+        if kind not in _MODELS:
+            return
+        self.invalidate(kind, None if ids == "*" else [int(i) for i in ids.split(",") if i])
+
+
+catalog_cache = CatalogCache()
+
+
+def notify_catalog_change(connection, kind, ids=None):
+    """
+    Announce changed products or categories on connection's transaction; ids=None means
+    all of them. Bulk statements that bypass the ORM must call this to keep workers coherent.
+    """
+    if ids is None:
+        payloads = [f"{kind}:*"]
+    else:
+        ids = sorted({int(i) for i in ids})
+        payloads = [
+            f"{kind}:" + ",".join(str(i) for i in ids[start:start + NOTIFY_IDS_PER_MESSAGE])
+            for start in range(0, len(ids), NOTIFY_IDS_PER_MESSAGE)
+        ]
+    for payload in payloads:
+        connection.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": NOTIFY_CHANNEL, "payload": payload})
+
+
+def _announce(kind, fields, connection, target, check_changes):
+    if check_changes:
+        state = inspect(target)
+        if not any(state.attrs[f].history.has_changes() for f in fields):
+            return
+    notify_catalog_change(connection, kind, [target.id])
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("catalog_cache_keys", set()).add((kind, target.id))
+
+
+def _register(kind):
+    model, fields, _ = _MODELS[kind]
+
+    @event.listens_for(model, "after_insert")
+    def after_insert(mapper, connection, target):
+        _announce(kind, fields, connection, target, False)
+
+    @event.listens_for(model, "after_update")
+    def after_update(mapper, connection, target):
+        # Stock-only updates leave the cached columns untouched
+        _announce(kind, fields, connection, target, True)
+
+    @event.listens_for(model, "after_delete")
+    def after_delete(mapper, connection, target):
+        _announce(kind, fields, connection, target, False)
+
+
+for _kind in _MODELS:
+    _register(_kind)
+
+
+# The NOTIFY reaches this process too, but evict at once rather than a poll later
+@event.listens_for(Session, "after_commit")
+def _evict_committed(session):
+    keys = session.info.pop("catalog_cache_keys", None)
+    for kind, entity_id in keys or ():
+        catalog_cache.invalidate(kind, [entity_id])
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    session.info.pop("catalog_cache_keys", None)
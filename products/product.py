@@ -1,11 +1,50 @@
 from datetime import datetime
-from decimal import Decimal
+from decimal import Decimal, InvalidOperation
 from src.extensions import db
-from sqlalchemy import event
+from sqlalchemy import DDL, event
 import uuid
 
+
+def normalize_barcode(value):
+    """
+    Canonical form of a scanned or imported barcode: digits and letters only.
+    Spreadsheet floats such as 8.90167E+12 become 8901670000000. Blank values become None.
+    """
+    if value is None:
+        return None
+    if isinstance(value, float):
+        if value != value:  # NaN
+            return None
+        value = Decimal(repr(value))
+    text = str(value).strip()
+    if "e" in text.lower() or text.endswith(".0"):
+        try:
+            number = Decimal(text)
+            if number == number.to_integral_value():
+                text = str(int(number))
+        except InvalidOperation:
+            pass
+    text = "".join(ch for ch in text if ch.isalnum()).upper()
+    return text or None
+
+
 class Product(db.Model):
     __tablename__ = "products"
+    __table_args__ = (
+        # Scan lookups; barcodes are stored normalized (see normalize_barcode)
+        db.Index("ux_products_barcode", "barcode", unique=True),
+        # Low stock snapshot; only the few rows at or below their reorder level are indexed
+        db.Index(
+            "ix_products_low_stock", "id",
+            postgresql_where=db.text("reorder_level > 0 AND quantity_in_stock <= reorder_level")
+        ),
+        # Typeahead search (pg_trgm): substring, anchored prefix and similarity matches
+        db.Index("ix_products_name_trgm", "product_name", postgresql_using="gin",
+                 postgresql_ops={"product_name": "gin_trgm_ops"}),
+        db.Index("ix_products_sku_trgm", "sku", postgresql_using="gin", postgresql_ops={"sku": "gin_trgm_ops"}),
+        db.Index("ix_products_description_trgm", "description", postgresql_using="gin",
+                 postgresql_ops={"description": "gin_trgm_ops"}),
+    )
 
     # Product ID (Unique Identifier) (Primary key)
     id = db.Column(db.Integer, primary_key=True, autoincrement=False)
@@ -37,6 +76,9 @@ class Product(db.Model):
     # Quantity in Stock
     quantity_in_stock = db.Column(db.Integer, default=0, nullable=False)
     
+    # Reserved Quantity (held by active cart reservations)
+    reserved_quantity = db.Column(db.Integer, default=0, server_default="0", nullable=False)
+    
     # Reorder Level (Minimum Stock)
     reorder_level = db.Column(db.Integer, nullable=True)
     
@@ -59,4 +101,14 @@ class Product(db.Model):
     date_added = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Last Updated Date (automate only when updated)
-    last_updated = db.Column(db.DateTime, onupdate=datetime.utcnow)
\ No newline at end of file
+    last_updated = db.Column(db.DateTime, onupdate=datetime.utcnow)
+
+
+# The trigram indexes need the extension before the table is created
+event.listen(Product.__table__, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+
+
+@event.listens_for(Product, "before_insert")
+@event.listens_for(Product, "before_update")
+def _normalize_product_barcode(mapper, connection, target):
+    target.barcode = normalize_barcode(target.barcode)
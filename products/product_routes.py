@@ -1,10 +1,14 @@
-from flask import Blueprint, request, jsonify, send_file, make_response
+from flask import Blueprint, request, jsonify, send_file, make_response, Response, stream_with_context
 from src.extensions import db
 from products.product import Product
 from products.product_service import ProductService
+from products.catalog_cache import catalog_cache
+from products.scan_service import ScanService
+from products.product_search import product_search, DEFAULT_SEARCH_LIMIT
+from products.stock_alerts import stock_alert_broker, low_stock_snapshot
 from user.enhanced_auth_middleware import require_permission_jwt
 from user.audit_logger import audit_decorator
-import csv
+from src.uploads import iter_upload_rows, UPLOAD_EXTENSIONS
 import io
 import pandas as pd
 from datetime import datetime
@@ -99,40 +103,36 @@ def create_product():
 
 
 # -------------------------
-# Get low stock alerts (products with stock <= 100)
+# Get low stock alerts (products at or below their reorder level)
 # -------------------------
 @bp.route("/low-stock/", methods=["GET"])
 @require_permission_jwt('products', 'read')
 def get_low_stock_alerts():
-    try:
-        from category.category import Category
-    except ImportError:
-        Category = None
-    
-    products = Product.query.filter(Product.quantity_in_stock <= 100).order_by(Product.id.asc()).all()
-    result = []
-    for p in products:
-        category_name = None
-        if p.category_id and Category:
-            try:
-                category = Category.query.get(p.category_id)
-                category_name = category.name if category else None
-            except Exception:
-                category_name = None
-        
-        result.append({
-            "id": p.id,
-            "product_name": p.product_name,
-            "category_id": p.category_id,
-            "category_name": category_name,
-            "quantity_in_stock": p.quantity_in_stock,
-            "supplier_id": p.supplier_id,
-            "sku": p.sku,
-            "selling_price": str(p.selling_price),
-            "purchase_price": str(p.purchase_price),
-            "reorder_level": p.reorder_level
-        })
-    return jsonify(result), 200
+    threshold = request.args.get('threshold', type=int)
+    return jsonify(low_stock_snapshot(threshold)), 200
+
+
+# -------------------------
+# Push low stock / restocked alerts over server-sent events
+# -------------------------
+@bp.route("/low-stock/stream", methods=["GET"])
+@require_permission_jwt('products', 'read')
+def stream_low_stock_alerts():
+    subscription = stock_alert_broker.subscribe()
+    response = Response(
+        stream_with_context(stock_alert_broker.stream(subscription)),
+        mimetype="text/event-stream"
+    )
+    response.headers["Cache-Control"] = "no-cache"
+    # Stop reverse proxies from buffering the stream
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
+@bp.route("/low-stock/stream/stats", methods=["GET"])
+@require_permission_jwt('products', 'read')
+def get_low_stock_stream_stats():
+    return jsonify(stock_alert_broker.get_stats()), 200
 
 
 # -------------------------
@@ -141,67 +141,62 @@ def get_low_stock_alerts():
 @bp.route("/", methods=["GET"])
 @require_permission_jwt('products', 'read')
 def list_products():
-    query = Product.query
-
-    category_id = request.args.get('category_id', type=int)
-    if category_id:
-        query = query.filter(Product.category_id == category_id)
+    filters = {
+        "category_id": request.args.get('category_id', type=int),
+        "subcategory_id": request.args.get('subcategory_id', type=int)
+    }
+    fields = request.args.get('fields')
+    fields = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    limit = request.args.get('limit', type=int)
+    cursor = request.args.get('cursor', type=int)
+
+    # Unchanged catalogs are answered with 304 before any product rows are read
+    request_key = "&".join(f"{k}={v}" for k, v in sorted(request.args.items()))
+    etag = ProductService.get_catalog_etag(request_key, **filters)
+    if request.if_none_match.contains_weak(etag):
+        response = make_response("", 304)
+        response.set_etag(etag, weak=True)
+        return response
 
-    subcategory_id = request.args.get('subcategory_id', type=int)
-    if subcategory_id:
-        query = query.filter(Product.subcategory_id == subcategory_id)
+    try:
+        products, next_cursor = ProductService.get_catalog(fields=fields, limit=limit, cursor=cursor, **filters)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-    products = query.order_by(Product.id).all()
-    result = []
-    for p in products:
-        result.append({
-            "id": p.id,
-            "product_name": p.product_name,
-            "description": p.description,
-            "sku": p.sku,
-            "category_id": p.category_id,
-            "category_name": None,
-            "subcategory_id": p.subcategory_id,
-            "unit_of_measure": p.unit_of_measure,
-            "selling_price": str(p.selling_price),
-            "purchase_price": str(p.purchase_price),
-            "quantity_in_stock": p.quantity_in_stock,
-            "reorder_level": p.reorder_level,
-            "max_stock_level": p.max_stock_level,
-            "supplier_id": p.supplier_id,
-            "batch_number": p.batch_number,
-            "expiry_date": p.expiry_date.isoformat() if p.expiry_date else None,
-            "barcode": p.barcode,
-            "date_added": p.date_added.isoformat(),
-            "last_updated": p.last_updated.isoformat() if p.last_updated else None
-        })
-    return jsonify(result), 200
+    # The body stays a plain list; paging details travel in headers
+    response = make_response(jsonify(products), 200)
+    response.set_etag(etag, weak=True)
+    response.headers["Cache-Control"] = "private, no-cache"
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = str(next_cursor)
+    return response
 
 
 # -------------------------
-# Get single product by ID
+# Get products by supplier
 # -------------------------
 @bp.route("/supplier/<int:supplier_id>", methods=["GET"])
 @require_permission_jwt('products', 'read')
 def get_products_by_supplier(supplier_id):
-    products = Product.query.filter_by(supplier_id=supplier_id).order_by(Product.id).all()
+    from category.category import Category
+    rows = db.session.query(Product, Category) \
+        .outerjoin(Category, Category.id == Product.category_id) \
+        .filter(Product.supplier_id == supplier_id) \
+        .order_by(Product.id).all()
     
     result = []
-    for p in products:
-        # Get category details with GST and HSN
+    for p, category in rows:
+        # Category details with GST and HSN
         category_details = None
-        if p.category_id:
-            from category.category import Category
-            category = Category.query.get(p.category_id)
-            if category:
-                category_details = {
-                    "id": category.id,
-                    "name": category.name,
-                    "hsn_code": category.hsn_code,
-                    "cgst_rate": float(category.cgst_rate),
-                    "sgst_rate": float(category.sgst_rate),
-                    "igst_rate": float(category.igst_rate)
-                }
+        if category:
+            category_details = {
+                "id": category.id,
+                "name": category.name,
+                "hsn_code": category.hsn_code,
+                "cgst_rate": float(category.cgst_rate),
+                "sgst_rate": float(category.sgst_rate),
+                "igst_rate": float(category.igst_rate)
+            }
         
         result.append({
             "id": p.id,
@@ -218,6 +213,9 @@ def get_products_by_supplier(supplier_id):
     return jsonify(result), 200
 
 
+# -------------------------
+# Get single product by ID
+# -------------------------
 @bp.route("/<int:product_id>", methods=["GET"])
 @require_permission_jwt('products', 'read')
 def get_product(product_id):
@@ -391,109 +389,23 @@ def bulk_upload():
 
     file = request.files['file']
     filename = file.filename.lower()
-
-    if filename.endswith('.csv'):
-        stream = io.StringIO(file.stream.read().decode("UTF8"), newline=None)
-        reader = csv.DictReader(stream)
-        rows = list(reader)
-    elif filename.endswith('.xlsx'):
-        df = pd.read_excel(file)
-        rows = df.to_dict('records')
-    else:
+    if not filename.endswith(UPLOAD_EXTENSIONS):
         return jsonify({"error": "Only CSV and XLSX files supported"}), 400
 
-    created = []
-    skipped = []
-    errors = []
-
-    for i, row in enumerate(rows, 1):
-        if not all([row.get('id'), row.get('product_name'), row.get('sku'), row.get('purchase_price'), row.get('selling_price')]):
-            skipped.append({"row": i, "reason": "Missing required fields", "data": row})
-            continue
+    try:
+        result = ProductService.bulk_upsert(iter_upload_rows(file, filename))
+    except UnicodeDecodeError:
+        return jsonify({"error": "CSV file must be UTF-8 encoded"}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
 
-        try:
-            # Check if product with same SKU already exists
-            sku = str(row['sku'])
-            existing_product = Product.query.filter_by(sku=sku).first()
-            if existing_product:
-                # Update existing product instead of skipping
-                existing_product.product_name = str(row['product_name'])
-                existing_product.purchase_price = float(row['purchase_price'])
-                existing_product.quantity_in_stock = int(row['quantity_in_stock']) if row.get('quantity_in_stock') and pd.notna(row['quantity_in_stock']) else 0
-                db.session.commit()
-                created.append(existing_product.id)
-                continue
-            
-            # Validate foreign keys and set to null if not found
-            category_id = int(row['category_id']) if row.get('category_id') and pd.notna(row['category_id']) else None
-            supplier_id = int(row['supplier_id']) if row.get('supplier_id') and pd.notna(row['supplier_id']) else None
-            
-            # Check if category exists, set to null if not found
-            if category_id:
-                try:
-                    from category.category import Category
-                    if not Category.query.get(category_id):
-                        category_id = None
-                except ImportError:
-                    category_id = None
-            
-            # Check if supplier exists, set to null if not found
-            if supplier_id:
-                try:
-                    from suppliers.supplier import Supplier
-                    if not Supplier.query.get(supplier_id):
-                        supplier_id = None
-                except ImportError:
-                    supplier_id = None
-            
-            data = {
-                "id": int(row['id']),
-                "product_name": str(row['product_name']),
-                "sku": str(row['sku']),
-                "purchase_price": float(row['purchase_price']),
-                "selling_price": float(row['selling_price']),
-                "description": str(row['description']) if row.get('description') and pd.notna(row['description']) else None,
-                "category_id": category_id,
-                "subcategory_id": int(row['subcategory_id']) if row.get('subcategory_id') and pd.notna(row['subcategory_id']) else None,
-                "unit_of_measure": str(row['unit_of_measure']) if row.get('unit_of_measure') and pd.notna(row['unit_of_measure']) else None,
-                "quantity_in_stock": int(row['quantity_in_stock']) if row.get('quantity_in_stock') and pd.notna(row['quantity_in_stock']) else 0,
-                "reorder_level": int(row['reorder_level']) if row.get('reorder_level') and pd.notna(row['reorder_level']) else None,
-                "max_stock_level": int(row['max_stock_level']) if row.get('max_stock_level') and pd.notna(row['max_stock_level']) else None,
-                "supplier_id": supplier_id,
-                "batch_number": str(row['batch_number']) if row.get('batch_number') and pd.notna(row['batch_number']) else None,
-                "expiry_date": None,
-            }
-            
-            # Handle expiry_date separately
-            if row.get('expiry_date') and pd.notna(row['expiry_date']) and str(row['expiry_date']).strip():
-                try:
-                    date_str = str(row['expiry_date']).strip()
-                    if 'T' in date_str:
-                        data['expiry_date'] = datetime.fromisoformat(date_str.replace('Z', '+00:00')).date()
-                    elif '-' in date_str and len(date_str.split('-')) == 3:
-                        # Handle DD-MM-YYYY format
-                        parts = date_str.split('-')
-                        if len(parts[0]) == 2:  # DD-MM-YYYY
-                            data['expiry_date'] = datetime.strptime(date_str, '%d-%m-%Y').date()
-                        else:  # YYYY-MM-DD
-                            data['expiry_date'] = datetime.strptime(date_str, '%Y-%m-%d').date()
-                except ValueError:
-                    pass  # Keep as None if parsing fails
-            
-            data.update({
-                "barcode": str(row['barcode']) if row.get('barcode') and pd.notna(row['barcode']) else None
-            })
-            product, already_exists = ProductService.create_product(data)
-            created.append(product.id)
-        except Exception as e:
-            db.session.rollback()  # Rollback on error
-            errors.append({"row": i, "error": str(e), "data": row})
-            continue
-    
+    skipped = result["skipped"]
+    errors = result["errors"]
     response = {
-        "created": len(created), 
-        "ids": created,
-        "total_rows": len(rows),
+        "created": len(result["ids"]),
+        "ids": result["ids"],
+        "total_rows": result["total_rows"],
         "skipped": len(skipped),
         "errors": len(errors)
     }
@@ -518,4 +430,68 @@ def delete_product(product_id):
         return jsonify({"message": "Product deleted successfully"}), 200
     except Exception as e:
         db.session.rollback()
-        return jsonify({"error": str(e)}), 400
\ No newline at end of file
+        return jsonify({"error": str(e)}), 400
+
+@bp.route("/cache/stats", methods=["GET"])
+@require_permission_jwt('products', 'read')
+def get_catalog_cache_stats():
+    return jsonify(dict(catalog_cache.get_stats(), search=product_search.get_stats())), 200
+
+
+# -------------------------
+# Typeahead product search
+# -------------------------
+@bp.route("/search", methods=["GET"])
+@require_permission_jwt('products', 'read')
+def search_products():
+    try:
+        results = product_search.search(
+            request.args.get('q', ''),
+            request.args.get('limit', DEFAULT_SEARCH_LIMIT, type=int)
+        )
+        return jsonify(results), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# -------------------------
+# POS scan lookup by barcode or SKU
+# -------------------------
+@bp.route("/scan/<code>", methods=["GET"])
+@require_permission_jwt('products', 'read')
+def scan_product(code):
+    try:
+        quantity = int(request.args.get("quantity", 1))
+        result = ScanService.price_basket([{"code": code, "quantity": quantity}])
+        if not result["items"]:
+            return jsonify({"error": "No product with this barcode or SKU", "code": code}), 404
+        return jsonify(result["items"][0]), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@bp.route("/scan", methods=["POST"])
+@require_permission_jwt('products', 'read')
+def scan_products():
+    data = request.get_json() or {}
+    codes = data.get("codes")
+    if not isinstance(codes, list) or not codes:
+        return jsonify({"error": "codes must be a non-empty list"}), 400
+
+    lines = []
+    for entry in codes:
+        line = entry if isinstance(entry, dict) else {"code": entry}
+        if not isinstance(line.get("code"), (str, int)) or str(line["code"]).strip() == "":
+            return jsonify({"error": f"Invalid code entry: {entry}"}), 400
+        lines.append(line)
+
+    try:
+        return jsonify(ScanService.price_basket(lines)), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
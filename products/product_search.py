@@ -0,0 +1,171 @@
+import math
+import threading
+import time
+from datetime import date, timedelta
+from cachetools import TTLCache
+from sqlalchemy import func, or_
+from src.extensions import db
+from products.product import Product, normalize_barcode
+from products.catalog_cache import catalog_cache
+from reports.daily_sales_fact import DailySalesFact
+
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 50
+# Rows fetched by similarity before re-ranking with recent sales
+CANDIDATE_FACTOR = 5
+# Queries up to this long are the popular first keystrokes; their results are cached
+CACHED_PREFIX_LENGTH = 4
+PREFIX_CACHE_MAXSIZE = 5000
+PREFIX_CACHE_TTL = 300
+POPULARITY_DAYS = 30
+POPULARITY_TTL = 600
+# Weight of recent sales against text similarity (0..1) in the final score
+POPULARITY_WEIGHT = 0.3
+
+# Catalog fields only: results are shared across requests, so no stock levels
+RESULT_FIELDS = (
+    Product.id, Product.product_name, Product.sku, Product.barcode, Product.category_id,
+    Product.unit_of_measure, Product.selling_price
+)
+
+
+def _like_escape(value):
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+class ProductSearch:
+    """Typeahead over product_name, sku, description and barcode.
+
+    Candidates come from the pg_trgm GIN indexes on products, ranked by similarity,
+    then re-ranked with units sold in the last POPULARITY_DAYS days. Results of short
+    queries are cached per process and dropped on any product change, like the
+    catalog cache they build on.
+    """
+
+    def __init__(self):
+        self._prefix_cache = TTLCache(maxsize=PREFIX_CACHE_MAXSIZE, ttl=PREFIX_CACHE_TTL)
+        self._lock = threading.Lock()
+        # Bumped by every invalidation so a search racing a write never caches the old results
+        self._generation = 0
+        self._popularity = ({}, 0, 0.0)  # (units by product id, max units, loaded at)
+        self.stats = {"hits": 0, "misses": 0}
+        catalog_cache.on_invalidate(self._invalidated)
+
+    def search(self, q, limit=DEFAULT_SEARCH_LIMIT):
+        q = " ".join((q or "").split())
+        if not q:
+            raise ValueError("q is required")
+        limit = max(1, min(int(limit), MAX_SEARCH_LIMIT))
+        key = (q.lower(), limit)
+        cacheable = len(q) <= CACHED_PREFIX_LENGTH
+
+        if cacheable:
+            with self._lock:
+                cached = self._prefix_cache.get(key)
+                generation = self._generation
+                if cached is not None:
+                    self.stats["hits"] += 1
+                    return cached
+                self.stats["misses"] += 1
+
+        results = self._rank(q, self._candidates(q, limit * CANDIDATE_FACTOR))[:limit]
+
+        # Only cache while product invalidations reach this process
+        if cacheable and catalog_cache.listening:
+            with self._lock:
+                if self._generation == generation:
+                    self._prefix_cache[key] = results
+        return results
+
+    def _candidates(self, q, count):
+        prefix = _like_escape(q) + "%"
+        if len(q) < 3:
+            # Too short for a trigram of its own; anchored patterns still use the trigram index
+            match = or_(Product.product_name.ilike(prefix), Product.product_name.ilike("% " + prefix),
+                        Product.sku.ilike(prefix))
+            score = func.similarity(Product.product_name, q)
+        else:
+            contains = "%" + _like_escape(q) + "%"
+            match = or_(
+                Product.product_name.ilike(contains),
+                Product.sku.ilike(contains),
+                Product.description.ilike(contains),
+                # Misspellings: pg_trgm's similarity threshold (0.3 by default)
+                Product.product_name.op("%")(q)
+            )
+            score = func.greatest(func.similarity(Product.product_name, q), func.similarity(Product.sku, q))
+        barcode = normalize_barcode(q)
+        if barcode:
+            match = or_(match, Product.barcode == barcode)
+        return db.session.query(*RESULT_FIELDS, score.label("score")) \
+            .filter(match).order_by(score.desc(), Product.id.asc()).limit(count).all()
+
+    def _rank(self, q, rows):
+        units, max_units = self._recent_units()
+        categories = catalog_cache.get_categories({row.category_id for row in rows if row.category_id})
+        needle = q.lower()
+        barcode = normalize_barcode(q)
+        ranked = []
+        for row in rows:
+            name, sku = (row.product_name or "").lower(), (row.sku or "").lower()
+            relevance = float(row.score or 0)
+            if sku == needle or (barcode and row.barcode == barcode):
+                relevance += 1.0
+            elif name.startswith(needle) or sku.startswith(needle):
+                relevance += 0.5
+            elif (" " + needle) in (" " + name):
+                relevance += 0.25
+            sold = units.get(row.id, 0)
+            popularity = math.log1p(sold) / math.log1p(max_units) if max_units else 0.0
+            ranked.append((relevance + POPULARITY_WEIGHT * popularity, row, sold))
+        ranked.sort(key=lambda item: (-item[0], item[1].id))
+        return [{
+            "id": row.id,
+            "product_name": row.product_name,
+            "sku": row.sku,
+            "barcode": row.barcode,
+            "category_id": row.category_id,
+            "category_name": categories[row.category_id].name if row.category_id in categories else None,
+            "unit_of_measure": row.unit_of_measure,
+            "selling_price": str(row.selling_price),
+            "units_sold_recently": sold,
+            "score": round(score, 4)
+        } for score, row, sold in ranked]
+
+    def _recent_units(self):
+        """Units sold per product over the last POPULARITY_DAYS days, from the daily sales rollup."""
+        units, max_units, loaded_at = self._popularity
+        if time.monotonic() - loaded_at < POPULARITY_TTL:
+            return units, max_units
+        since = date.today() - timedelta(days=POPULARITY_DAYS)
+        units = {
+            product_id: int(quantity) for product_id, quantity in db.session.query(
+                DailySalesFact.product_id, func.sum(DailySalesFact.quantity_sold)
+            ).filter(
+                DailySalesFact.sale_date >= since,
+                DailySalesFact.product_id != 0
+            ).group_by(DailySalesFact.product_id).all()
+            if quantity and quantity > 0
+        }
+        max_units = max(units.values(), default=0)
+        self._popularity = (units, max_units, time.monotonic())
+        return units, max_units
+
+    def _invalidated(self, kind, ids):
+        if kind not in ("product", "category"):
+            return
+        with self._lock:
+            self._generation += 1
+            self._prefix_cache.clear()
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return dict(
+                self.stats,
+                cached_queries=len(self._prefix_cache),
+                hit_ratio=round(self.stats["hits"] / lookups, 4) if lookups else 0.0
+            )
+
+
+product_search = ProductSearch()
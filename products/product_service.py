@@ -1,6 +1,106 @@
+import hashlib
+import math
+from datetime import date, datetime
+from decimal import Decimal
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from src.extensions import db
-from products.product import Product
+from products.product import Product, normalize_barcode
 from suppliers.supplier import Supplier
+from category.category import Category
+from products.catalog_cache import catalog_cache, notify_catalog_change
+from products.stock_alerts import stock_alert, notify_stock_alerts
+from reports.dashboard_metrics import apply_metrics_delta, product_contribution
+
+# Fields the catalog can return, in response order
+CATALOG_FIELDS = {
+    "id": Product.id,
+    "product_name": Product.product_name,
+    "description": Product.description,
+    "sku": Product.sku,
+    "category_id": Product.category_id,
+    "category_name": Category.name,
+    "subcategory_id": Product.subcategory_id,
+    "unit_of_measure": Product.unit_of_measure,
+    "selling_price": Product.selling_price,
+    "purchase_price": Product.purchase_price,
+    "quantity_in_stock": Product.quantity_in_stock,
+    "reorder_level": Product.reorder_level,
+    "max_stock_level": Product.max_stock_level,
+    "supplier_id": Product.supplier_id,
+    "batch_number": Product.batch_number,
+    "expiry_date": Product.expiry_date,
+    "barcode": Product.barcode,
+    "date_added": Product.date_added,
+    "last_updated": Product.last_updated,
+}
+MAX_CATALOG_PAGE_SIZE = 5000
+
+BULK_REQUIRED_FIELDS = ("id", "product_name", "sku", "purchase_price", "selling_price")
+# Rows per INSERT ... ON CONFLICT statement (and per commit)
+BULK_UPSERT_CHUNK_SIZE = 1000
+# Columns an upload may change on a product whose SKU already exists
+BULK_UPDATE_FIELDS = ("product_name", "purchase_price", "quantity_in_stock")
+
+
+def _catalog_value(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def _cell(row, key):
+    """Uploaded cell value, or None for missing, blank and NaN cells."""
+    value = row.get(key)
+    if value is None or (isinstance(value, float) and math.isnan(value)) or str(value).strip() == "":
+        return None
+    return value
+
+
+def _parse_expiry_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    try:
+        date_str = str(value).strip()
+        if 'T' in date_str:
+            return datetime.fromisoformat(date_str.replace('Z', '+00:00')).date()
+        if '-' in date_str and len(date_str.split('-')) == 3:
+            if len(date_str.split('-')[0]) == 2:  # DD-MM-YYYY
+                return datetime.strptime(date_str, '%d-%m-%Y').date()
+            return datetime.strptime(date_str, '%Y-%m-%d').date()
+    except ValueError:
+        pass  # Keep as None if parsing fails
+    return None
+
+
+def _bulk_product_row(row):
+    """Column values for one uploaded row; raises ValueError on unconvertible values."""
+    def optional(key, convert):
+        value = _cell(row, key)
+        return convert(value) if value is not None else None
+
+    return {
+        "id": int(row['id']),
+        "product_name": str(row['product_name']),
+        "sku": str(row['sku']),
+        "purchase_price": float(row['purchase_price']),
+        "selling_price": float(row['selling_price']),
+        "description": optional('description', str),
+        "category_id": optional('category_id', int),
+        "subcategory_id": optional('subcategory_id', int),
+        "unit_of_measure": optional('unit_of_measure', str),
+        "quantity_in_stock": optional('quantity_in_stock', int) or 0,
+        "reorder_level": optional('reorder_level', int),
+        "max_stock_level": optional('max_stock_level', int),
+        "supplier_id": optional('supplier_id', int),
+        "batch_number": optional('batch_number', str),
+        "expiry_date": optional('expiry_date', _parse_expiry_date),
+        "barcode": normalize_barcode(_cell(row, 'barcode')),
+    }
 
 class ProductService:
     @staticmethod
@@ -39,3 +139,207 @@ class ProductService:
     @staticmethod
     def get_product_by_id(product_id):
         return Product.query.get(product_id)
+
+    @staticmethod
+    def _catalog_filters(category_id=None, subcategory_id=None, supplier_id=None):
+        filters = []
+        if category_id:
+            filters.append(Product.category_id == category_id)
+        if subcategory_id:
+            filters.append(Product.subcategory_id == subcategory_id)
+        if supplier_id:
+            filters.append(Product.supplier_id == supplier_id)
+        return filters
+
+    @staticmethod
+    def get_catalog(fields=None, limit=None, cursor=None, **filters):
+        """
+        Products ordered by id, selecting only the requested fields, with the category name
+        joined in the same query. Pass the returned next_cursor (last id) to get the next
+        page; limit=None returns everything after the cursor.
+        """
+        fields = fields or list(CATALOG_FIELDS)
+        unknown = [f for f in fields if f not in CATALOG_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(CATALOG_FIELDS)}")
+        if "id" not in fields:
+            fields = ["id"] + fields
+        if limit is not None and limit < 1:
+            raise ValueError("limit must be at least 1")
+
+        query = db.session.query(*[CATALOG_FIELDS[f].label(f) for f in fields]) \
+            .select_from(Product) \
+            .filter(*ProductService._catalog_filters(**filters))
+        if "category_name" in fields:
+            query = query.outerjoin(Category, Category.id == Product.category_id)
+        if cursor:
+            query = query.filter(Product.id > cursor)
+        query = query.order_by(Product.id)
+        if limit:
+            query = query.limit(min(limit, MAX_CATALOG_PAGE_SIZE) + 1)
+
+        rows = query.all()
+        next_cursor = None
+        if limit and len(rows) > min(limit, MAX_CATALOG_PAGE_SIZE):
+            rows = rows[:min(limit, MAX_CATALOG_PAGE_SIZE)]
+            next_cursor = rows[-1].id
+        products = [{f: _catalog_value(getattr(row, f)) for f in fields} for row in rows]
+        return products, next_cursor
+
+    @staticmethod
+    def get_catalog_etag(request_key, **filters):
+        """
+        Weak ETag for a catalog response: changes when any matching product is added,
+        removed or updated (last_updated, or date_added for never-updated rows), and when
+        any category is, since responses embed the category name.
+        """
+        count, last_change = db.session.query(
+            func.count(Product.id),
+            func.max(func.coalesce(Product.last_updated, Product.date_added))
+        ).filter(*ProductService._catalog_filters(**filters)).one()
+        category_count, category_change = db.session.query(
+            func.count(Category.id),
+            func.max(func.coalesce(Category.updated_at, Category.created_at))
+        ).one()
+        version = ":".join([
+            str(count), last_change.isoformat() if last_change else "",
+            str(category_count), category_change.isoformat() if category_change else "",
+            request_key
+        ])
+        return hashlib.md5(version.encode()).hexdigest()
+
+    @staticmethod
+    def bulk_upsert(rows, chunk_size=BULK_UPSERT_CHUNK_SIZE):
+        """
+        Create or update products from uploaded rows (dicts keyed by column name).
+
+        Rows are processed chunk by chunk: one set query each resolves existing SKUs,
+        taken ids, categories and suppliers, then one INSERT ... ON CONFLICT (sku) writes
+        the chunk and commits. Existing SKUs only get product_name, purchase_price and
+        quantity_in_stock updated; unknown category/supplier ids become NULL. A chunk that
+        fails as a whole is retried row by row so the error lands on the offending rows.
+        Returns {"ids", "total_rows", "skipped", "errors"}.
+        """
+        result = {"ids": [], "total_rows": 0, "skipped": [], "errors": []}
+        chunk = []
+        for i, row in enumerate(rows, 1):
+            result["total_rows"] += 1
+            if not all(_cell(row, f) is not None for f in BULK_REQUIRED_FIELDS):
+                result["skipped"].append({"row": i, "reason": "Missing required fields", "data": row})
+                continue
+            try:
+                chunk.append((i, row, _bulk_product_row(row)))
+            except (TypeError, ValueError) as e:
+                result["errors"].append({"row": i, "error": str(e), "data": row})
+                continue
+            if len(chunk) >= chunk_size:
+                ProductService._write_bulk_chunk(chunk, result)
+                chunk = []
+        if chunk:
+            ProductService._write_bulk_chunk(chunk, result)
+
+        result["ids"] = [product_id for _, product_id in sorted(result["ids"])]
+        return result
+
+    @staticmethod
+    def _write_bulk_chunk(chunk, result):
+        try:
+            written, changed_ids = ProductService._upsert_chunk(chunk)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            written, changed_ids = [], []
+            for entry in chunk:
+                try:
+                    row_written, row_changed = ProductService._upsert_chunk([entry])
+                    db.session.commit()
+                    written.extend(row_written)
+                    changed_ids.extend(row_changed)
+                except Exception as e:
+                    db.session.rollback()
+                    result["errors"].append({"row": entry[0], "error": str(e), "data": entry[1]})
+        result["ids"].extend(written)
+        # Commits above bypassed the ORM, so evict here rather than waiting for the NOTIFY
+        if changed_ids:
+            catalog_cache.invalidate("product", changed_ids)
+
+    @staticmethod
+    def _upsert_chunk(chunk):
+        """Write one chunk in the current transaction. Returns ([(row, product_id)], changed ids)."""
+        skus = {data["sku"] for _, _, data in chunk}
+        existing = {
+            row.sku: row for row in db.session.query(
+                Product.id, Product.sku, Product.quantity_in_stock, Product.purchase_price, Product.reorder_level
+            ).filter(Product.sku.in_(skus)).with_for_update()
+        }
+        new_ids = {data["id"] for _, _, data in chunk if data["sku"] not in existing}
+        taken_ids = {pid for (pid,) in db.session.query(Product.id).filter(Product.id.in_(new_ids))} if new_ids else set()
+        category_ids = {data["category_id"] for _, _, data in chunk if data["category_id"]}
+        supplier_ids = {data["supplier_id"] for _, _, data in chunk if data["supplier_id"]}
+        known_categories = {cid for (cid,) in db.session.query(Category.id).filter(Category.id.in_(category_ids))} \
+            if category_ids else set()
+        known_suppliers = {sid for (sid,) in db.session.query(Supplier.id).filter(Supplier.id.in_(supplier_ids))} \
+            if supplier_ids else set()
+
+        now = datetime.utcnow()
+        values_by_sku = {}
+        written = []
+        for i, _, data in chunk:
+            sku = data["sku"]
+            if sku in values_by_sku:
+                # Repeated SKU: later rows update the same product, as a row-by-row import would
+                values_by_sku[sku].update({f: data[f] for f in BULK_UPDATE_FIELDS})
+                written.append((i, values_by_sku[sku]["id"]))
+                continue
+            if sku not in existing and data["id"] in taken_ids:
+                # The id belongs to another product; it is reported but left unchanged
+                written.append((i, data["id"]))
+                continue
+            values = dict(data, date_added=now, last_updated=None)
+            if sku in existing:
+                values["id"] = existing[sku].id
+            if values["category_id"] not in known_categories:
+                values["category_id"] = None
+            if values["supplier_id"] not in known_suppliers:
+                values["supplier_id"] = None
+            values_by_sku[sku] = values
+            taken_ids.add(values["id"])
+            written.append((i, values["id"]))
+
+        if not values_by_sku:
+            return written, []
+
+        stmt = pg_insert(Product.__table__).values(list(values_by_sku.values()))
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["sku"],
+            set_=dict({f: stmt.excluded[f] for f in BULK_UPDATE_FIELDS}, last_updated=now)
+        )
+        db.session.execute(stmt)
+
+        # The statement bypasses the Product mapper events; apply their side effects here
+        stock_value = Decimal('0')
+        low_stock = 0
+        inserted = 0
+        alerts = []
+        for sku, values in values_by_sku.items():
+            reorder_level = existing[sku].reorder_level if sku in existing else values["reorder_level"]
+            new_value, new_low = product_contribution(values["quantity_in_stock"], values["purchase_price"], reorder_level)
+            if sku in existing:
+                old = existing[sku]
+                old_value, old_low = product_contribution(old.quantity_in_stock, old.purchase_price, old.reorder_level)
+                alerts.append(stock_alert(old.id, values["product_name"], values["quantity_in_stock"], reorder_level,
+                                          old.quantity_in_stock, old.reorder_level))
+            else:
+                old_value, old_low = Decimal('0'), 0
+                inserted += 1
+                alerts.append(stock_alert(values["id"], values["product_name"], values["quantity_in_stock"],
+                                          reorder_level, None, None))
+            stock_value += new_value - old_value
+            low_stock += new_low - old_low
+        connection = db.session.connection()
+        apply_metrics_delta(connection, product_count=inserted, stock_value=stock_value, low_stock_count=low_stock)
+        notify_stock_alerts(connection, alerts)
+        changed_ids = [values["id"] for values in values_by_sku.values()]
+        notify_catalog_change(connection, "product", changed_ids)
+        db.session.info.setdefault("report_cache_tables", set()).add("products")
+        return written, changed_ids
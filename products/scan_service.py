@@ -0,0 +1,184 @@
+import threading
+from decimal import Decimal
+from sqlalchemy import or_
+from src.extensions import db
+from products.product import Product, normalize_barcode
+from products.catalog_cache import catalog_cache
+
+MAX_SCAN_CODES = 500
+
+
+class ScanIndex:
+    """Process-local barcode -> product id and SKU -> product id maps.
+
+    Loaded in one query on first use and patched per product from catalog cache
+    invalidations, so a warm lookup touches no database at all.
+    """
+
+    def __init__(self):
+        self._by_barcode = {}
+        self._by_sku = {}
+        self._codes_by_id = {}
+        self._loaded = False
+        self._stale_ids = set()
+        self._generation = 0
+        self._lock = threading.Lock()
+        catalog_cache.on_invalidate(self._invalidated)
+
+    def _invalidated(self, kind, ids):
+        if kind != "product":
+            return
+        with self._lock:
+            self._generation += 1
+            if ids is None:
+                self._loaded = False
+                self._stale_ids.clear()
+            else:
+                self._stale_ids.update(ids)
+
+    def _refresh(self):
+        with self._lock:
+            loaded = self._loaded
+            stale_ids = set(self._stale_ids)
+            generation = self._generation
+        if loaded and not stale_ids:
+            return
+
+        query = db.session.query(Product.id, Product.barcode, Product.sku)
+        if loaded:
+            query = query.filter(Product.id.in_(stale_ids))
+        rows = query.all()
+
+        with self._lock:
+            if not loaded:
+                if self._generation != generation:
+                    return
+                self._by_barcode, self._by_sku, self._codes_by_id = {}, {}, {}
+                self._stale_ids.clear()
+            for product_id in stale_ids:
+                barcode, sku = self._codes_by_id.pop(product_id, (None, None))
+                if barcode and self._by_barcode.get(barcode) == product_id:
+                    del self._by_barcode[barcode]
+                if sku and self._by_sku.get(sku) == product_id:
+                    del self._by_sku[sku]
+            for product_id, barcode, sku in rows:
+                self._codes_by_id[product_id] = (barcode, sku)
+                if barcode:
+                    self._by_barcode[barcode] = product_id
+                self._by_sku[sku] = product_id
+            self._loaded = True
+            # Ids invalidated again while we queried stay stale for the next lookup
+            if self._generation == generation:
+                self._stale_ids -= stale_ids
+
+    def resolve(self, codes):
+        """{code: (product_id, matched_by)} for the codes that match a barcode or SKU."""
+        if not catalog_cache.listening:
+            return ScanIndex._resolve_from_db(codes)
+        self._refresh()
+        matches = {}
+        with self._lock:
+            for code in codes:
+                product_id = self._by_barcode.get(normalize_barcode(code))
+                if product_id is not None:
+                    matches[code] = (product_id, "barcode")
+                elif str(code).strip() in self._by_sku:
+                    matches[code] = (self._by_sku[str(code).strip()], "sku")
+        return matches
+
+    @staticmethod
+    def _resolve_from_db(codes):
+        barcodes = {normalize_barcode(code) for code in codes} - {None}
+        skus = {str(code).strip() for code in codes}
+        by_barcode, by_sku = {}, {}
+        for product_id, barcode, sku in db.session.query(Product.id, Product.barcode, Product.sku) \
+                .filter(or_(Product.barcode.in_(barcodes), Product.sku.in_(skus))):
+            if barcode:
+                by_barcode[barcode] = product_id
+            by_sku[sku] = product_id
+        matches = {}
+        for code in codes:
+            product_id = by_barcode.get(normalize_barcode(code))
+            if product_id is not None:
+                matches[code] = (product_id, "barcode")
+            elif str(code).strip() in by_sku:
+                matches[code] = (by_sku[str(code).strip()], "sku")
+        return matches
+
+
+scan_index = ScanIndex()
+
+
+class ScanService:
+    @staticmethod
+    def price_basket(lines):
+        """
+        Price scanned lines [{"code", "quantity"}] in one pass. Product and tax data come
+        from the in-process caches; stock is read live in a single primary-key query.
+        Tax follows invoices: IGST is the tax charged, CGST/SGST rates are informational.
+        """
+        if len(lines) > MAX_SCAN_CODES:
+            raise ValueError(f"At most {MAX_SCAN_CODES} codes per request")
+        codes = [line["code"] for line in lines]
+        matches = scan_index.resolve(set(codes))
+        product_ids = {product_id for product_id, _ in matches.values()}
+        products = catalog_cache.get_products(product_ids)
+        categories = catalog_cache.get_categories({p.category_id for p in products.values() if p.category_id})
+        stock = {
+            row.id: row for row in db.session.query(
+                Product.id, Product.quantity_in_stock, Product.reserved_quantity
+            ).filter(Product.id.in_(product_ids))
+        } if product_ids else {}
+
+        items = []
+        not_found = []
+        total_before_tax = Decimal("0.00")
+        total_tax = Decimal("0.00")
+        for line in lines:
+            code = line["code"]
+            match = matches.get(code)
+            product = products.get(match[0]) if match else None
+            if product is None:
+                not_found.append(code)
+                continue
+            qty = int(line.get("quantity", 1))
+            category = categories.get(product.category_id)
+            cgst_rate = Decimal(category.cgst_rate) if category else Decimal("0")
+            sgst_rate = Decimal(category.sgst_rate) if category else Decimal("0")
+            igst_rate = Decimal(category.igst_rate) if category else Decimal("0")
+            unit_price = Decimal(product.selling_price)
+            line_subtotal = (unit_price * qty).quantize(Decimal("0.01"))
+            tax_amount = (line_subtotal * igst_rate / Decimal("100.00")).quantize(Decimal("0.01"))
+            in_stock = stock[product.id].quantity_in_stock if product.id in stock else 0
+            reserved = stock[product.id].reserved_quantity if product.id in stock else 0
+            total_before_tax += line_subtotal
+            total_tax += tax_amount
+            items.append({
+                "code": code,
+                "matched_by": match[1],
+                "product_id": product.id,
+                "product_name": product.product_name,
+                "sku": product.sku,
+                "barcode": product.barcode,
+                "unit_of_measure": product.unit_of_measure,
+                "unit_price": str(unit_price),
+                "quantity": qty,
+                "quantity_in_stock": in_stock,
+                "reserved_quantity": reserved,
+                "available": in_stock - reserved >= qty,
+                "hsn_code": category.hsn_code if category else None,
+                "cgst_rate": str(cgst_rate),
+                "sgst_rate": str(sgst_rate),
+                "igst_rate": str(igst_rate),
+                "line_subtotal": str(line_subtotal),
+                "tax_amount": str(tax_amount),
+                "line_total": str(line_subtotal + tax_amount)
+            })
+
+        return {
+            "items": items,
+            "not_found": not_found,
+            "total_before_tax": str(total_before_tax),
+            "tax_amount": str(total_tax),
+            "grand_total": str(total_before_tax + total_tax)
+        }
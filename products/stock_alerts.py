@@ -0,0 +1,226 @@
+import json
+import queue
+import threading
+from datetime import datetime
+from sqlalchemy import event, inspect, text
+from src.extensions import db
+from src.pg_listener import PgListener
+from products.product import Product
+from products.catalog_cache import catalog_cache
+
+STOCK_ALERT_CHANNEL = "stock_alerts"
+LOW_STOCK = "low_stock"
+RESTOCKED = "restocked"
+REMOVED = "removed"
+# Alerts per NOTIFY, keeping each payload well under Postgres' 8000 byte limit
+ALERTS_PER_MESSAGE = 25
+# A client this far behind is told to resync instead of receiving every alert
+SUBSCRIBER_QUEUE_SIZE = 1000
+HEARTBEAT_SECONDS = 15
+
+
+def is_low(quantity, reorder_level):
+    """Matches the partial index ix_products_low_stock."""
+    return reorder_level is not None and reorder_level > 0 and (quantity or 0) <= reorder_level
+
+
+def stock_alert(product_id, product_name, quantity, reorder_level, old_quantity, old_reorder_level):
+    """The alert for a stock or reorder level change, or None when the product stays on the same side."""
+    was_low = is_low(old_quantity, old_reorder_level)
+    now_low = is_low(quantity, reorder_level)
+    if was_low == now_low:
+        return None
+    return {
+        "type": LOW_STOCK if now_low else RESTOCKED,
+        "product_id": product_id,
+        "product_name": product_name,
+        "quantity_in_stock": quantity,
+        "reorder_level": reorder_level
+    }
+
+
+def notify_stock_alerts(connection, alerts):
+    """
+    Publish alerts on connection's transaction; listeners receive them only if it commits.
+    Stock statements that bypass the Product mapper events must call this themselves.
+    """
+    alerts = [alert for alert in alerts if alert]
+    if not alerts:
+        return
+    at = datetime.utcnow().isoformat()
+    for alert in alerts:
+        alert.setdefault("at", at)
+    for start in range(0, len(alerts), ALERTS_PER_MESSAGE):
+        connection.execute(text("SELECT pg_notify(:channel, :payload)"), {
+            "channel": STOCK_ALERT_CHANNEL,
+            "payload": json.dumps(alerts[start:start + ALERTS_PER_MESSAGE], default=str)
+        })
+
+
+def low_stock_snapshot(threshold=None):
+    """
+    Every product currently at or below its reorder level, served by ix_products_low_stock.
+    With threshold, products with at most that many units instead (not indexed).
+    """
+    query = db.session.query(
+        Product.id, Product.product_name, Product.sku, Product.category_id, Product.supplier_id,
+        Product.quantity_in_stock, Product.reorder_level, Product.selling_price, Product.purchase_price
+    )
+    if threshold is None:
+        query = query.filter(Product.reorder_level > 0, Product.quantity_in_stock <= Product.reorder_level)
+    else:
+        query = query.filter(Product.quantity_in_stock <= threshold)
+    rows = query.order_by(Product.id.asc()).all()
+    categories = catalog_cache.get_categories({row.category_id for row in rows if row.category_id})
+    return [{
+        "id": row.id,
+        "product_name": row.product_name,
+        "category_id": row.category_id,
+        "category_name": categories[row.category_id].name if row.category_id in categories else None,
+        "quantity_in_stock": row.quantity_in_stock,
+        "supplier_id": row.supplier_id,
+        "sku": row.sku,
+        "selling_price": str(row.selling_price),
+        "purchase_price": str(row.purchase_price),
+        "reorder_level": row.reorder_level
+    } for row in rows]
+
+
+class _Subscription:
+    def __init__(self):
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.needs_resync = threading.Event()
+
+    def put(self, alerts):
+        try:
+            self.queue.put_nowait(alerts)
+        except queue.Full:
+            self.resync()
+
+    def resync(self):
+        self.needs_resync.set()
+        try:
+            # Wake the stream up; an empty batch only carries the resync flag
+            self.queue.put_nowait([])
+        except queue.Full:
+            pass
+
+
+class StockAlertBroker:
+    """Fans committed stock alerts out to this process's SSE clients.
+
+    One LISTEN connection per process receives every alert; each client gets a
+    bounded queue. Whenever alerts may have been lost (listener reconnect,
+    client too slow) the client is sent a fresh snapshot instead.
+    """
+
+    def __init__(self):
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+        self._listener = PgListener(STOCK_ALERT_CHANNEL, self._publish, self._resync_all, name="stock-alert-listener")
+
+    def subscribe(self):
+        self._listener.ensure_started()
+        subscription = _Subscription()
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def stream(self, subscription, heartbeat=HEARTBEAT_SECONDS):
+        """SSE events for one client: a snapshot, then alerts; a new snapshot after any gap."""
+        try:
+            yield "retry: 5000\n\n"
+            yield _sse("snapshot", self._snapshot(subscription))
+            while True:
+                try:
+                    alerts = subscription.queue.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                if subscription.needs_resync.is_set():
+                    yield _sse("snapshot", self._snapshot(subscription))
+                    continue
+                for alert in alerts:
+                    yield _sse(alert["type"], alert)
+        finally:
+            self.unsubscribe(subscription)
+
+    def get_stats(self):
+        with self._lock:
+            clients = len(self._subscriptions)
+        return {"clients": clients, "listening": self._listener.listening, "reconnects": self._listener.reconnects}
+
+    def _snapshot(self, subscription):
+        # Alerts queued before the snapshot are already reflected in it
+        subscription.needs_resync.clear()
+        while True:
+            try:
+                subscription.queue.get_nowait()
+            except queue.Empty:
+                break
+        try:
+            return {"listening": self._listener.listening, "products": low_stock_snapshot()}
+        finally:
+            # Do not hold a pooled connection for the life of the stream
+            db.session.close()
+
+    def _publish(self, payload):
+        alerts = json.loads(payload)
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            subscription.put(alerts)
+
+    def _resync_all(self):
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            subscription.resync()
+
+
+def _sse(event_name, data):
+    return f"event: {event_name}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+stock_alert_broker = StockAlertBroker()
+
+
+def _old_and_new(target, attr):
+    history = inspect(target).attrs[attr].history
+    new = getattr(target, attr)
+    old = history.deleted[0] if history.deleted else new
+    return old, new
+
+
+# ORM writes (product edits, purchases) announce their own crossings; the stock
+# engine and bulk upsert call notify_stock_alerts with the rows they changed
+@event.listens_for(Product, "after_insert")
+def _product_inserted(mapper, connection, target):
+    notify_stock_alerts(connection, [stock_alert(
+        target.id, target.product_name, target.quantity_in_stock, target.reorder_level, None, None
+    )])
+
+
+@event.listens_for(Product, "after_update")
+def _product_updated(mapper, connection, target):
+    old_qty, new_qty = _old_and_new(target, "quantity_in_stock")
+    old_reorder, new_reorder = _old_and_new(target, "reorder_level")
+    notify_stock_alerts(connection, [stock_alert(
+        target.id, target.product_name, new_qty, new_reorder, old_qty, old_reorder
+    )])
+
+
+@event.listens_for(Product, "after_delete")
+def _product_deleted(mapper, connection, target):
+    if is_low(target.quantity_in_stock, target.reorder_level):
+        notify_stock_alerts(connection, [{
+            "type": REMOVED,
+            "product_id": target.id,
+            "product_name": target.product_name,
+            "quantity_in_stock": target.quantity_in_stock,
+            "reorder_level": target.reorder_level
+        }])
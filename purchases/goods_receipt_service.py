@@ -0,0 +1,263 @@
+import math
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from sqlalchemy import or_, select, text
+from src.extensions import db
+from products.product import Product
+from products.catalog_cache import notify_catalog_change
+from reports.dashboard_metrics import apply_metrics_delta
+from stock_transactions.stock_engine import StockEngine, StockChange
+from stock_transactions.stock_batch_service import parse_batch_date
+from purchases.purchase_order import (
+    PurchaseOrder, PurchaseOrderItem, purchase_payment_status, purchase_number_seq
+)
+
+MAX_GRN_LINES = 10000
+# Accepted spellings of the cost column
+COST_COLUMNS = ("cost", "unit_cost", "purchase_price")
+GOODS_RECEIPT_REFERENCE_PREFIX = "GRN-"
+
+
+def goods_receipt_reference(purchase_id):
+    """reference_number of the Purchase ledger rows a goods receipt writes, one per line."""
+    return f"{GOODS_RECEIPT_REFERENCE_PREFIX}{purchase_id}"
+
+# New purchase prices for every product of a receipt in one statement, locking the rows
+# in id order like the stock engine does; RETURNING carries the old price for the metrics
+_UPDATE_COST_SQL = text("""
+    WITH old AS (
+        SELECT id, purchase_price FROM products
+        WHERE id = ANY(CAST(:ids AS integer[]))
+        ORDER BY id
+        FOR UPDATE
+    )
+    UPDATE products AS p
+    SET purchase_price = v.cost, last_updated = :now
+    FROM unnest(CAST(:ids AS integer[]), CAST(:costs AS numeric[])) AS v(id, cost), old
+    WHERE p.id = v.id AND old.id = v.id AND p.purchase_price IS DISTINCT FROM v.cost
+    RETURNING p.id, p.quantity_in_stock, old.purchase_price AS old_price, p.purchase_price
+""")
+
+
+def _cell(row, key):
+    """Uploaded cell value, or None for missing, blank and NaN cells."""
+    value = row.get(key)
+    if value is None or (isinstance(value, float) and math.isnan(value)) or str(value).strip() == "":
+        return None
+    return value
+
+
+def _whole_number(value, name):
+    number = float(value)
+    if not number.is_integer():
+        raise ValueError(f"{name} must be a whole number")
+    return int(number)
+
+
+def _amount(value, name):
+    """A form amount as Decimal; None for a blank value."""
+    if value is None or str(value).strip() == "":
+        return None
+    try:
+        amount = Decimal(str(value).strip()).quantize(Decimal("0.01"))
+    except InvalidOperation:
+        raise ValueError(f"{name} must be a number")
+    if amount < 0:
+        raise ValueError(f"{name} cannot be negative")
+    return amount
+
+
+def _grn_line(row):
+    """One uploaded line as {product_id, sku, quantity, cost, batch_number, expiry_date}."""
+    row = {str(k).strip().lower().replace(" ", "_"): v for k, v in row.items() if k is not None}
+    product_id = _cell(row, "product_id")
+    sku = _cell(row, "sku")
+    if product_id is None and sku is None:
+        raise ValueError("product_id or sku is required")
+    if _cell(row, "quantity") is None:
+        raise ValueError("quantity is required")
+    quantity = _whole_number(row["quantity"], "quantity")
+    if quantity <= 0:
+        raise ValueError("quantity must be positive")
+    cost = next((_cell(row, c) for c in COST_COLUMNS if _cell(row, c) is not None), None)
+    if cost is not None:
+        try:
+            cost = Decimal(str(cost)).quantize(Decimal("0.01"))
+        except InvalidOperation:
+            raise ValueError("cost must be a number")
+        if cost < 0:
+            raise ValueError("cost cannot be negative")
+    batch_number = _cell(row, "batch_number")
+    return {
+        "product_id": _whole_number(product_id, "product_id") if product_id is not None else None,
+        "sku": str(sku).strip() if sku is not None else None,
+        "quantity": quantity,
+        "cost": cost,
+        "batch_number": str(batch_number).strip() if batch_number is not None else None,
+        "expiry_date": parse_batch_date(_cell(row, "expiry_date")) if batch_number is not None else None
+    }
+
+
+class GoodsReceiptError(ValueError):
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(f"{len(errors)} line(s) could not be received; nothing was posted")
+
+
+class GoodsReceiptService:
+    @staticmethod
+    def parse(rows):
+        """Validate uploaded rows. Returns (lines, errors); errors are [{row, error, data}]."""
+        lines, errors = [], []
+        for i, row in enumerate(rows, 1):
+            if i > MAX_GRN_LINES:
+                raise ValueError(f"A goods receipt can have at most {MAX_GRN_LINES} lines")
+            try:
+                lines.append(dict(_grn_line(row), row=i))
+            except (TypeError, ValueError) as e:
+                errors.append({"row": i, "error": str(e), "data": {k: str(v) for k, v in row.items() if v is not None}})
+        return lines, errors
+
+    @staticmethod
+    def _resolve(lines):
+        """Match every line to a product with one query, by product_id or else by SKU."""
+        ids = {line["product_id"] for line in lines if line["product_id"] is not None}
+        skus = {line["sku"] for line in lines if line["product_id"] is None}
+        conditions = []
+        if ids:
+            conditions.append(Product.id.in_(ids))
+        if skus:
+            conditions.append(Product.sku.in_(skus))
+        found = db.session.query(
+            Product.id, Product.sku, Product.product_name, Product.purchase_price
+        ).filter(or_(*conditions)).all()
+        by_id = {p.id: p for p in found}
+        by_sku = {p.sku: p for p in found}
+
+        errors = []
+        for line in lines:
+            product = by_id.get(line["product_id"]) if line["product_id"] is not None else by_sku.get(line["sku"])
+            if product is None:
+                errors.append({"row": line["row"], "error": (
+                    f"Product {line['product_id']} not found" if line["product_id"] is not None
+                    else f"SKU {line['sku']} not found"
+                )})
+            line["product"] = product
+        return errors
+
+    @staticmethod
+    def _update_costs(lines):
+        """Set purchase_price from the lines' costs (the last line wins for a repeated product)."""
+        costs = {line["product"].id: line["cost"] for line in lines if line["cost"] is not None}
+        if not costs:
+            return []
+        ids = sorted(costs)
+        rows = db.session.execute(_UPDATE_COST_SQL, {
+            "ids": ids, "costs": [costs[pid] for pid in ids], "now": datetime.utcnow()
+        }).fetchall()
+        if not rows:
+            return []
+
+        # The statement bypasses the Product mapper events; apply their side effects here
+        connection = db.session.connection()
+        stock_value = sum((
+            Decimal(row.quantity_in_stock or 0) * (Decimal(row.purchase_price) - Decimal(row.old_price or 0))
+            for row in rows
+        ), Decimal('0'))
+        apply_metrics_delta(connection, stock_value=stock_value)
+        changed_ids = [row.id for row in rows]
+        notify_catalog_change(connection, "product", changed_ids)
+        db.session.info.setdefault("catalog_cache_keys", set()).update(("product", pid) for pid in changed_ids)
+        db.session.info.setdefault("report_cache_tables", set()).add("products")
+        return [{"product_id": row.id, "old_purchase_price": str(row.old_price),
+                 "new_purchase_price": str(row.purchase_price)} for row in rows]
+
+    @staticmethod
+    def receive(rows, supplier_id, reference_number=None, notes=None, total_amount=None, payment_amount=0,
+                payment_method=None, transaction_reference=None, update_cost=False):
+        """
+        Post a supplier delivery from uploaded lines (product_id or sku, quantity, optional
+        cost, batch_number, expiry_date) as one purchase, all or nothing.
+
+        Products are resolved with one query and the stock of all of them moves in one
+        statement through the stock engine, which writes one Purchase ledger row per line
+        referenced goods_receipt_reference(purchase_id); the order has no stock_transaction_id.
+        The purchase order and its lines are written in the same transaction. A line without a cost is valued at
+        the product's purchase_price; with update_cost, lines with a cost set it.
+        Raises GoodsReceiptError listing the failing rows when any line is invalid, and
+        ValueError for a malformed total_amount or payment_amount.
+        """
+        total_amount = _amount(total_amount, "total_amount")
+        payment_amount = _amount(payment_amount, "payment_amount")
+        lines, errors = GoodsReceiptService.parse(rows)
+        if not lines and not errors:
+            raise ValueError("The file has no lines")
+        if lines:
+            errors.extend(GoodsReceiptService._resolve(lines))
+        if errors:
+            raise GoodsReceiptError(sorted(errors, key=lambda e: e["row"]))
+
+        try:
+            cost_updates = GoodsReceiptService._update_costs(lines) if update_cost else []
+            # Numbered up front so the ledger rows can name the purchase they belong to
+            purchase_id = db.session.execute(select(purchase_number_seq.next_value())).scalar()
+            stock = StockEngine.apply([StockChange(
+                line["product"].id, line["quantity"], "Purchase",
+                supplier_id=supplier_id, reference_number=goods_receipt_reference(purchase_id), notes=notes,
+                batch_number=line["batch_number"], expiry_date=line["expiry_date"], unit_cost=line["cost"]
+            ) for line in lines])
+
+            items = []
+            for line in lines:
+                product = line["product"]
+                price = line["cost"] if line["cost"] is not None else Decimal(product.purchase_price)
+                items.append(PurchaseOrderItem(
+                    product_id=product.id,
+                    product_name=product.product_name,
+                    sku=product.sku,
+                    quantity=line["quantity"],
+                    purchase_price=price,
+                    amount=price * line["quantity"],
+                    new_stock=stock.get(product.id),
+                    batch_number=line["batch_number"],
+                    expiry_date=line["expiry_date"]
+                ))
+
+            total_amt = total_amount if total_amount else sum((item.amount for item in items), Decimal('0'))
+            paid_amt = payment_amount or Decimal('0')
+            purchase_order = PurchaseOrder(
+                id=purchase_id,
+                supplier_id=supplier_id,
+                reference_number=reference_number,
+                total_amount=total_amt,
+                paid_amount=paid_amt,
+                payment_status=purchase_payment_status(total_amt, paid_amt),
+                payment_method=payment_method,
+                transaction_reference=transaction_reference,
+                notes=notes,
+                items=items
+            )
+            db.session.add(purchase_order)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        return {
+            "purchase_id": purchase_order.id,
+            "reference_number": reference_number,
+            "payment_details": {
+                "total_amount": f"{total_amt:.2f}",
+                "payment_amount": f"{paid_amt:.2f}",
+                "payment_method": payment_method,
+                "payment_status": purchase_order.payment_status,
+                "transaction_reference": transaction_reference,
+                "balance_due": f"{max(Decimal('0'), total_amt - paid_amt):.2f}"
+            },
+            "purchase_summary": {
+                "total_lines": len(items),
+                "total_products": len({item.product_id for item in items}),
+                "total_quantity": sum(item.quantity for item in items)
+            },
+            "cost_updates": cost_updates
+        }
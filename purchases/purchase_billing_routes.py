@@ -21,6 +21,7 @@ def create_damage_record():
     from src.extensions import db
     from purchases.supplier_damage import SupplierDamage
     from products.product import Product
+    from stock_transactions.stock_engine import StockEngine, StockChange, InsufficientStockError
     
     try:
         data = request.get_json(force=True)
@@ -38,15 +39,15 @@ def create_damage_record():
         if not product:
             return jsonify({"error": "Product not found"}), 400
         
-        quantity_damaged = data["quantity_damaged"]
+        quantity_damaged = int(data["quantity_damaged"])
         damage_type = data["damage_type"]
         
         # Calculate refund amount
         refund_amount = 0
+        new_stock = product.quantity_in_stock
         if damage_type == "refund":
-            if product.quantity_in_stock < quantity_damaged:
-                return jsonify({"error": f"Insufficient stock. Available: {product.quantity_in_stock}, Requested: {quantity_damaged}"}), 400
-            product.quantity_in_stock -= quantity_damaged
+            # Units reserved by carts are not available to send back; taken from batches first-expiry-first
+            new_stock = StockEngine.apply([StockChange(product.id, -quantity_damaged, None)])[product.id]
             refund_amount = product.purchase_price * quantity_damaged
         
         # For replacement: no stock change (just record the damage)
@@ -93,7 +94,7 @@ def create_damage_record():
                 "inventory_impact": {
                     "stock_reduced": True,
                     "quantity_returned": quantity_damaged,
-                    "new_stock_level": product.quantity_in_stock
+                    "new_stock_level": new_stock
                 }
             }
         else:
@@ -109,12 +110,16 @@ def create_damage_record():
                 "inventory_impact": {
                     "stock_reduced": False,
                     "awaiting_replacement": True,
-                    "current_stock_level": product.quantity_in_stock
+                    "current_stock_level": new_stock
                 }
             }
         
         return jsonify(result), 201
+    except InsufficientStockError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
+        db.session.rollback()
         return jsonify({"error": str(e)}), 400
 
 
@@ -200,6 +205,7 @@ def get_damage_details(damage_id):
 def return_stock_to_supplier():
     from src.extensions import db
     from stock_transactions.stock_transaction import StockTransaction
+    from stock_transactions.stock_engine import StockEngine, StockChange, InsufficientStockError
     from products.product import Product
     
     try:
@@ -217,10 +223,8 @@ def return_stock_to_supplier():
             return jsonify({"error": "Product not found"}), 400
         
         quantity = int(data["quantity"])
-        if product.quantity_in_stock < quantity:
-            return jsonify({"error": f"Insufficient stock. Available: {product.quantity_in_stock}, Requested: {quantity}"}), 400
-        
-        product.quantity_in_stock -= quantity
+        # Reserved units stay with their carts; the ledger row is written below so its id can be returned
+        new_stock = StockEngine.apply([StockChange(product.id, -quantity, None)])[product.id]
         return_amount = product.purchase_price * quantity
         
         return_transaction = StockTransaction(
@@ -249,10 +253,14 @@ def return_stock_to_supplier():
             },
             "inventory_impact": {
                 "stock_reduced": True,
-                "new_stock_level": product.quantity_in_stock
+                "new_stock_level": new_stock
             }
         }), 201
+    except InsufficientStockError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
+        db.session.rollback()
         return jsonify({"error": str(e)}), 400
 
 
@@ -293,139 +301,72 @@ def list_stock_returns():
     return jsonify(result), 200
 
 
+def _purchase_orders(payment_status=None, supplier_id=None):
+    """Purchases with their lines and supplier, filtered in SQL."""
+    from purchases.purchase_order import PurchaseOrder, normalize_payment_status
+    from sqlalchemy.orm import selectinload
+
+    query = PurchaseOrder.query.options(selectinload(PurchaseOrder.items), selectinload(PurchaseOrder.supplier))
+    if supplier_id is not None:
+        query = query.filter(PurchaseOrder.supplier_id == supplier_id)
+    if payment_status:
+        query = query.filter(PurchaseOrder.payment_status == normalize_payment_status(payment_status))
+    return query.order_by(PurchaseOrder.id.asc()).all()
+
+
+def _purchase_bill(p):
+    first_item = p.items[0] if p.items else None
+    return {
+        "purchase_id": p.id,
+        "reference_number": p.reference_number,
+        "supplier_id": p.supplier_id,
+        "supplier_name": p.supplier.name if p.supplier else None,
+        "product_id": first_item.product_id if first_item else None,
+        "product_name": first_item.product_name if first_item else None,
+        "quantity": p.total_quantity,
+        "transaction_date": p.purchase_date.isoformat(),
+        "total_amount": f"{Decimal(p.total_amount):.2f}",
+        "paid_amount": f"{Decimal(p.paid_amount):.2f}",
+        "balance_amount": f"{p.balance_due:.2f}",
+        "payment_status": p.payment_status,
+        "payment_method": p.payment_method,
+        "transaction_reference": p.transaction_reference
+    }
+
+
 @bp.route("/", methods=["GET"])
 @require_permission_jwt('purchases', 'read')
 def list_purchase_bills():
-    from stock_transactions.stock_transaction import StockTransaction
-    from suppliers.supplier import Supplier
-
     payment_status_filter = request.args.get('payment_status')
-    purchases = StockTransaction.query.filter_by(transaction_type='Purchase').all()
-    result = []
-
-    for p in purchases:
-        supplier = Supplier.query.get(p.supplier_id) if p.supplier_id else None
-
-        payment_status = "Pending"
-        payment_method = None
-        transaction_reference = None
-        paid_amount = Decimal('0')
-        total_amount = Decimal('0')
-
-        if p.notes and p.notes.startswith('{'):
-            try:
-                notes_data = json.loads(p.notes)
-                payment_status = notes_data.get('payment_status', 'Pending')
-                payment_method = notes_data.get('payment_method')
-                transaction_reference = notes_data.get('transaction_reference')
-                paid_amount = Decimal(notes_data.get('payment_amount', '0'))
-                total_amount = Decimal(notes_data.get('total_amount', '0'))
-            except:
-                payment_status = "Pending"
-
-        # Fallback calculation if no stored total amount
-        if total_amount == 0:
-            total_amount = Decimal(str(p.product.purchase_price)) * Decimal(str(p.quantity)) if p.product else Decimal(
-                '0')
-
-        balance_amount = max(Decimal('0'), total_amount - paid_amount)
-
-        # Update payment status based on actual balance
-        if balance_amount == 0:
-            payment_status = "Paid"
-        elif paid_amount > 0:
-            payment_status = "Partially Paid"
-        else:
-            payment_status = "Pending"
-
-        # Apply payment status filter if provided
-        if payment_status_filter and payment_status.lower() != payment_status_filter.lower():
-            continue
-
-        result.append({
-            "purchase_id": p.id,
-            "reference_number": p.reference_number,
-            "supplier_id": p.supplier_id,
-            "supplier_name": supplier.name if supplier else None,
-            "product_id": p.product_id,
-            "product_name": p.product.product_name if p.product else None,
-            "quantity": p.quantity,
-            "transaction_date": p.transaction_date.isoformat(),
-            "total_amount": f"{total_amount:.2f}",
-            "paid_amount": f"{paid_amount:.2f}",
-            "balance_amount": f"{balance_amount:.2f}",
-            "payment_status": payment_status,
-            "payment_method": payment_method,
-            "transaction_reference": transaction_reference
-        })
-
+    try:
+        result = [_purchase_bill(p) for p in _purchase_orders(payment_status=payment_status_filter)]
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     return jsonify(result), 200
 
 
 @bp.route("/supplier/<int:supplier_id>", methods=["GET"])
 @require_permission_jwt('purchases', 'read')
 def get_purchases_by_supplier(supplier_id):
-    from stock_transactions.stock_transaction import StockTransaction
     from suppliers.supplier import Supplier
 
     payment_status_filter = request.args.get('payment_status')
 
-    purchases = StockTransaction.query.filter_by(transaction_type='Purchase', supplier_id=supplier_id).all()
     supplier = Supplier.query.get(supplier_id)
 
     if not supplier:
         return jsonify({"error": "Supplier not found"}), 404
 
+    try:
+        purchases = _purchase_orders(payment_status=payment_status_filter, supplier_id=supplier_id)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
     result = []
     for p in purchases:
-        payment_status = "Pending"
-        payment_method = None
-        transaction_reference = None
-        paid_amount = Decimal('0')
-        total_amount = Decimal('0')
-
-        if p.notes and p.notes.startswith('{'):
-            try:
-                notes_data = json.loads(p.notes)
-                payment_status = notes_data.get('payment_status', 'Pending')
-                payment_method = notes_data.get('payment_method')
-                transaction_reference = notes_data.get('transaction_reference')
-                paid_amount = Decimal(notes_data.get('payment_amount', '0'))
-                total_amount = Decimal(notes_data.get('total_amount', '0'))
-            except:
-                payment_status = "Pending"
-
-        if total_amount == 0:
-            total_amount = Decimal(str(p.product.purchase_price)) * Decimal(str(p.quantity)) if p.product else Decimal(
-                '0')
-
-        balance_amount = max(Decimal('0'), total_amount - paid_amount)
-
-        if balance_amount == 0:
-            payment_status = "Paid"
-        elif paid_amount > 0:
-            payment_status = "Partially Paid"
-        else:
-            payment_status = "Pending"
-
-        # Apply payment status filter if provided
-        if payment_status_filter and payment_status.lower() != payment_status_filter.lower():
-            continue
-
-        result.append({
-            "purchase_id": p.id,
-            "reference_number": p.reference_number,
-            "product_id": p.product_id,
-            "product_name": p.product.product_name if p.product else None,
-            "quantity": p.quantity,
-            "transaction_date": p.transaction_date.isoformat(),
-            "total_amount": f"{total_amount:.2f}",
-            "paid_amount": f"{paid_amount:.2f}",
-            "balance_amount": f"{balance_amount:.2f}",
-            "payment_status": payment_status,
-            "payment_method": payment_method,
-            "transaction_reference": transaction_reference
-        })
+        bill = _purchase_bill(p)
+        del bill["supplier_id"], bill["supplier_name"]
+        result.append(bill)
 
     return jsonify({
         "supplier": {
@@ -798,6 +739,7 @@ def process_purchase_adjustment():
 
     from src.extensions import db
     from stock_transactions.stock_transaction import StockTransaction
+    from stock_transactions.stock_engine import StockEngine, StockChange, InsufficientStockError
     from products.product import Product
     import json
 
@@ -824,10 +766,11 @@ def process_purchase_adjustment():
     difference = new_total - old_total
 
     try:
-        # Update stock for old product (add back)
-        old_prod.quantity_in_stock += old_quantity
-        # Update stock for new product (remove)
-        new_prod.quantity_in_stock -= new_quantity
+        # Old product comes back, new product goes out; fails if the new one is not available
+        StockEngine.apply([
+            StockChange(old_prod.id, old_quantity, None),
+            StockChange(new_prod.id, -new_quantity, None)
+        ])
 
         # Create adjustment transaction with calculated amounts
         adjustment_notes = json.dumps({
@@ -897,7 +840,11 @@ def process_purchase_adjustment():
             result["supplier_pays_us"] = "0.00"
 
         return jsonify(result), 201
+    except InsufficientStockError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
+        db.session.rollback()
         return jsonify({"error": str(e)}), 500
 
 
@@ -966,61 +913,26 @@ def export_purchase_bills():
     try:
         format_type = request.args.get('format', 'csv').lower()
         
-        from stock_transactions.stock_transaction import StockTransaction
-        from suppliers.supplier import Supplier
-        
-        purchases = StockTransaction.query.filter_by(transaction_type='Purchase').all()
         data = []
-        
-        for p in purchases:
-            supplier = Supplier.query.get(p.supplier_id) if p.supplier_id else None
-            
-            payment_status = "Pending"
-            payment_method = None
-            transaction_reference = None
-            paid_amount = Decimal('0')
-            total_amount = Decimal('0')
-            
-            if p.notes and p.notes.startswith('{'):
-                try:
-                    notes_data = json.loads(p.notes)
-                    payment_status = notes_data.get('payment_status', 'Pending')
-                    payment_method = notes_data.get('payment_method')
-                    transaction_reference = notes_data.get('transaction_reference')
-                    paid_amount = Decimal(notes_data.get('payment_amount', '0'))
-                    total_amount = Decimal(notes_data.get('total_amount', '0'))
-                except:
-                    payment_status = "Pending"
-            
-            if total_amount == 0:
-                total_amount = Decimal(str(p.product.purchase_price)) * Decimal(str(p.quantity)) if p.product else Decimal('0')
-            
-            balance_amount = max(Decimal('0'), total_amount - paid_amount)
-            
-            if balance_amount == 0:
-                payment_status = "Paid"
-            elif paid_amount > 0:
-                payment_status = "Partially Paid"
-            else:
-                payment_status = "Pending"
-            
+        for p in _purchase_orders():
+            bill = _purchase_bill(p)
             data.append({
                 "Purchase ID": p.id,
                 "Reference Number": p.reference_number,
                 "Supplier ID": p.supplier_id or '',
-                "Supplier Name": supplier.name if supplier else '',
-                "Supplier Contact": supplier.contact_person if supplier else '',
-                "Supplier Phone": supplier.phone if supplier else '',
-                "Product ID": p.product_id,
-                "Product Name": p.product.product_name if p.product else '',
-                "Quantity": p.quantity,
-                "Transaction Date": p.transaction_date.strftime('%Y-%m-%d %H:%M:%S'),
-                "Total Amount": float(total_amount),
-                "Paid Amount": float(paid_amount),
-                "Balance Amount": float(balance_amount),
-                "Payment Status": payment_status,
-                "Payment Method": payment_method or '',
-                "Transaction Reference": transaction_reference or ''
+                "Supplier Name": p.supplier.name if p.supplier else '',
+                "Supplier Contact": p.supplier.contact_person if p.supplier else '',
+                "Supplier Phone": p.supplier.phone if p.supplier else '',
+                "Product ID": bill["product_id"] or '',
+                "Product Name": bill["product_name"] or '',
+                "Quantity": bill["quantity"],
+                "Transaction Date": p.purchase_date.strftime('%Y-%m-%d %H:%M:%S'),
+                "Total Amount": float(p.total_amount),
+                "Paid Amount": float(p.paid_amount),
+                "Balance Amount": float(p.balance_due),
+                "Payment Status": p.payment_status,
+                "Payment Method": p.payment_method or '',
+                "Transaction Reference": p.transaction_reference or ''
             })
         
         df = pd.DataFrame(data)
@@ -1196,6 +1108,7 @@ def export_purchase_billing_all():
 @bp.route("/return/<int:return_id>", methods=["GET"])
 @require_permission_jwt('purchases', 'read')
 def get_return_details(return_id):
+    from src.extensions import db
     from stock_transactions.stock_transaction import StockTransaction
     from suppliers.supplier import Supplier
     from products.product import Product
@@ -1208,11 +1121,13 @@ def get_return_details(return_id):
     product = Product.query.get(return_record.product_id) if return_record.product_id else None
     
     # Get original purchase details
-    original_purchase = StockTransaction.query.filter_by(
-        product_id=return_record.product_id,
-        supplier_id=return_record.supplier_id,
-        transaction_type='Purchase'
-    ).first()
+    from purchases.purchase_order import PurchaseOrder, PurchaseOrderItem
+    original_purchase = db.session.query(PurchaseOrder, PurchaseOrderItem.quantity).join(
+        PurchaseOrderItem, PurchaseOrderItem.purchase_order_id == PurchaseOrder.id
+    ).filter(
+        PurchaseOrderItem.product_id == return_record.product_id,
+        PurchaseOrder.supplier_id == return_record.supplier_id
+    ).order_by(PurchaseOrder.id.asc()).first()
     
     return_amount = abs(return_record.quantity) * product.purchase_price if product else 0
     
@@ -1233,10 +1148,10 @@ def get_return_details(return_id):
             "purchase_price": str(product.purchase_price)
         } if product else None,
         "original_purchase": {
-            "purchase_id": original_purchase.id,
-            "reference_number": original_purchase.reference_number,
-            "purchase_date": original_purchase.transaction_date.isoformat(),
-            "quantity_purchased": original_purchase.quantity
+            "purchase_id": original_purchase[0].id,
+            "reference_number": original_purchase[0].reference_number,
+            "purchase_date": original_purchase[0].purchase_date.isoformat(),
+            "quantity_purchased": original_purchase[1]
         } if original_purchase else None,
         "quantity_returned": abs(return_record.quantity),
         "return_amount": str(return_amount),
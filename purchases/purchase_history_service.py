@@ -0,0 +1,133 @@
+from datetime import timedelta
+from decimal import Decimal
+from sqlalchemy import func, or_, and_
+from src.extensions import db
+from purchases.purchase_order import PurchaseOrder, PurchaseOrderItem, normalize_payment_status
+from products.catalog_cache import catalog_cache
+from reports.stock_movement_service import encode_cursor, decode_cursor
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+class PurchaseHistoryService:
+    @staticmethod
+    def _filters(date_from=None, date_to=None, payment_status=None, supplier_id=None):
+        """Predicates shared by the page and summary queries; all served by purchase_orders indexes."""
+        filters = []
+        if payment_status:
+            filters.append(PurchaseOrder.payment_status == normalize_payment_status(payment_status))
+        if supplier_id is not None:
+            filters.append(PurchaseOrder.supplier_id == supplier_id)
+        if date_from:
+            filters.append(PurchaseOrder.purchase_date >= date_from)
+        if date_to:
+            # date_to is a calendar day at midnight; include everything purchased during it
+            filters.append(PurchaseOrder.purchase_date < date_to + timedelta(days=1))
+        return filters
+
+    @staticmethod
+    def get_history(date_from=None, date_to=None, payment_status=None, supplier_id=None,
+                    limit=DEFAULT_PAGE_SIZE, cursor=None):
+        """
+        One page of purchases, newest first, with their lines. Paged by (purchase_date, id)
+        keyset; pass the returned next_cursor to fetch the following page. Lines, suppliers,
+        products and categories are loaded with one query each for the whole page.
+        """
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        query = PurchaseOrder.query.filter(
+            *PurchaseHistoryService._filters(date_from, date_to, payment_status, supplier_id)
+        )
+        if cursor:
+            cursor_date, cursor_id = decode_cursor(cursor)
+            query = query.filter(or_(
+                PurchaseOrder.purchase_date < cursor_date,
+                and_(PurchaseOrder.purchase_date == cursor_date, PurchaseOrder.id < cursor_id)
+            ))
+        orders = query.order_by(PurchaseOrder.purchase_date.desc(), PurchaseOrder.id.desc()).limit(limit + 1).all()
+
+        has_more = len(orders) > limit
+        orders = orders[:limit]
+        next_cursor = encode_cursor(orders[-1].purchase_date, orders[-1].id) if has_more else None
+
+        items_by_order = {}
+        if orders:
+            for item in PurchaseOrderItem.query.filter(
+                PurchaseOrderItem.purchase_order_id.in_([order.id for order in orders])
+            ).order_by(PurchaseOrderItem.id).all():
+                items_by_order.setdefault(item.purchase_order_id, []).append(item)
+
+        from suppliers.supplier import Supplier
+        supplier_ids = {order.supplier_id for order in orders if order.supplier_id}
+        suppliers = {s.id: s for s in Supplier.query.filter(Supplier.id.in_(supplier_ids)).all()} if supplier_ids else {}
+        products = catalog_cache.get_products({item.product_id for items in items_by_order.values() for item in items})
+        categories = catalog_cache.get_categories({p.category_id for p in products.values() if p.category_id})
+
+        purchase_history = []
+        for order in orders:
+            supplier = suppliers.get(order.supplier_id)
+            product_details = []
+            for item in items_by_order.get(order.id, []):
+                product = products.get(item.product_id)
+                category = categories.get(product.category_id) if product and product.category_id else None
+                product_details.append({
+                    "product_id": item.product_id,
+                    "name": item.product_name,
+                    "sku": item.sku,
+                    "category_id": product.category_id if product else None,
+                    "category_name": category.name if category else None,
+                    "quantity_purchased": item.quantity,
+                    "purchase_price": str(item.purchase_price),
+                    "amount": str(item.amount)
+                })
+            purchase_history.append({
+                "purchase_id": order.id,
+                "reference_number": order.reference_number,
+                "purchase_date": order.purchase_date.isoformat(),
+                "supplier": {
+                    "id": supplier.id if supplier else None,
+                    "name": supplier.name if supplier else None,
+                    "contact_person": supplier.contact_person if supplier else None
+                },
+                "total_quantity": sum(pd["quantity_purchased"] for pd in product_details),
+                "payment_details": {
+                    "total_amount": f"{Decimal(order.total_amount):.2f}",
+                    "payment_amount": f"{Decimal(order.paid_amount):.2f}",
+                    "balance_due": f"{order.balance_due:.2f}",
+                    "payment_status": order.payment_status
+                },
+                "products": product_details,
+                "purchase_summary": {
+                    "total_products": len(product_details),
+                    "total_quantity": sum(pd["quantity_purchased"] for pd in product_details)
+                }
+            })
+        return purchase_history, next_cursor
+
+    @staticmethod
+    def last_suppliers(product_ids):
+        """{product_id: supplier_id} from each product's most recent purchase that names a supplier."""
+        product_ids = {int(pid) for pid in product_ids if pid is not None}
+        if not product_ids:
+            return {}
+        return dict(db.session.query(PurchaseOrderItem.product_id, PurchaseOrder.supplier_id)
+                    .join(PurchaseOrder, PurchaseOrder.id == PurchaseOrderItem.purchase_order_id)
+                    .filter(PurchaseOrderItem.product_id.in_(product_ids), PurchaseOrder.supplier_id.isnot(None))
+                    .distinct(PurchaseOrderItem.product_id)
+                    .order_by(PurchaseOrderItem.product_id, PurchaseOrder.purchase_date.desc(), PurchaseOrder.id.desc())
+                    .all())
+
+    @staticmethod
+    def get_summary(date_from=None, date_to=None, payment_status=None, supplier_id=None):
+        """Count and amounts over the whole filtered range, independent of paging."""
+        count, total, paid = db.session.query(
+            func.count(PurchaseOrder.id),
+            func.coalesce(func.sum(PurchaseOrder.total_amount), 0),
+            func.coalesce(func.sum(PurchaseOrder.paid_amount), 0)
+        ).filter(*PurchaseHistoryService._filters(date_from, date_to, payment_status, supplier_id)).one()
+        return {
+            "total_purchases": count,
+            "total_amount": f"{Decimal(total):.2f}",
+            "paid_amount": f"{Decimal(paid):.2f}",
+            "balance_due": f"{max(Decimal('0'), Decimal(total) - Decimal(paid)):.2f}"
+        }
@@ -0,0 +1,98 @@
+from datetime import datetime
+from decimal import Decimal
+from src.extensions import db
+
+
+PAYMENT_STATUSES = ("Paid", "Partially Paid", "Pending")
+
+
+def normalize_payment_status(value):
+    """A payment_status filter as stored, whatever its case, so it can use the status index."""
+    for status in PAYMENT_STATUSES:
+        if status.lower() == str(value).strip().lower():
+            return status
+    raise ValueError(f"payment_status must be one of: {', '.join(PAYMENT_STATUSES)}")
+
+
+def purchase_payment_status(total_amount, paid_amount):
+    if Decimal(paid_amount or 0) >= Decimal(total_amount or 0):
+        return "Paid"
+    if Decimal(paid_amount or 0) > 0:
+        return "Partially Paid"
+    return "Pending"
+
+
+# Purchase numbers, independent of the stock ledger's ids so receipts can be posted concurrently
+purchase_number_seq = db.Sequence("purchase_number_seq", start=5001, metadata=db.metadata)
+
+
+class PurchaseOrder(db.Model):
+    """One goods receipt from a supplier: header and payment state.
+
+    The lines are PurchaseOrderItem rows. The stock they brought in is in the ledger as
+    Purchase stock transactions: either one row per line (uploaded goods receipts, with
+    no stock_transaction_id), or one row on the first product holding the total quantity
+    (stock_transaction_id), which reconciliation and valuation re-attribute to the lines.
+    """
+    __tablename__ = "purchase_orders"
+    __table_args__ = (
+        # Purchase and payment history, newest first with (purchase_date, id) keyset paging:
+        # all purchases, one supplier's, or those in one payment status
+        db.Index("ix_purchase_orders_purchase_date", "purchase_date", "id"),
+        db.Index("ix_purchase_orders_supplier_date", "supplier_id", "purchase_date", "id"),
+        db.Index("ix_purchase_orders_status_date", "payment_status", "purchase_date", "id",
+                 postgresql_include=["total_amount", "paid_amount"]),
+    )
+
+    # The purchase number shown to users as purchase_id
+    id = db.Column(db.Integer, purchase_number_seq, primary_key=True,
+                   server_default=purchase_number_seq.next_value())
+    stock_transaction_id = db.Column(db.Integer, db.ForeignKey("stock_transactions.id", ondelete="SET NULL"),
+                                     nullable=True, unique=True)
+    supplier_id = db.Column(db.Integer, db.ForeignKey("suppliers.id"), nullable=True)
+    reference_number = db.Column(db.String(255), nullable=True)
+    purchase_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    total_amount = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    paid_amount = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    payment_status = db.Column(db.String(50), nullable=False, default="Pending")  # Paid / Partially Paid / Pending
+    payment_method = db.Column(db.String(50), nullable=True)
+    transaction_reference = db.Column(db.String(255), nullable=True)
+    notes = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    supplier = db.relationship("Supplier", lazy=True)
+    stock_transaction = db.relationship("StockTransaction", lazy=True)
+    items = db.relationship("PurchaseOrderItem", backref="purchase_order", lazy=True,
+                            cascade="all, delete-orphan", order_by="PurchaseOrderItem.id")
+
+    @property
+    def balance_due(self):
+        return max(Decimal('0'), Decimal(self.total_amount or 0) - Decimal(self.paid_amount or 0))
+
+    @property
+    def total_quantity(self):
+        return sum(item.quantity for item in self.items)
+
+
+class PurchaseOrderItem(db.Model):
+    __tablename__ = "purchase_order_items"
+    __table_args__ = (
+        db.Index("ix_purchase_order_items_order", "purchase_order_id"),
+        # Purchase history of a product
+        db.Index("ix_purchase_order_items_product", "product_id"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    purchase_order_id = db.Column(db.Integer, db.ForeignKey("purchase_orders.id", ondelete="CASCADE"), nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey("products.id"), nullable=False)
+    # Name and SKU as received, so the purchase reads the same after the product is edited
+    product_name = db.Column(db.String(255), nullable=True)
+    sku = db.Column(db.String(100), nullable=True)
+    quantity = db.Column(db.Integer, nullable=False)
+    purchase_price = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    amount = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    # Stock on hand right after this receipt
+    new_stock = db.Column(db.Integer, nullable=True)
+    batch_number = db.Column(db.String(120), nullable=True)
+    expiry_date = db.Column(db.Date, nullable=True)
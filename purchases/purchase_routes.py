@@ -1,5 +1,7 @@
 from flask import Blueprint, request, jsonify
 from purchases.purchase_service import PurchaseService
+from purchases.goods_receipt_service import GoodsReceiptService, GoodsReceiptError
+from src.uploads import iter_upload_rows, UPLOAD_EXTENSIONS
 from user.enhanced_auth_middleware import require_permission_jwt
 from user.audit_logger import audit_decorator
 from src.extensions import db
@@ -49,6 +51,51 @@ def add_stock_from_supplier():
         return jsonify({"error": str(e)}), 400
 
 
+@bp.route("/grn-import", methods=["POST"])
+@require_permission_jwt('purchases', 'write')
+@audit_decorator('purchases', 'GRN_IMPORT')
+def import_goods_receipt():
+    if 'file' not in request.files:
+        return jsonify({"error": "No file provided"}), 400
+
+    file = request.files['file']
+    filename = file.filename.lower()
+    if not filename.endswith(UPLOAD_EXTENSIONS):
+        return jsonify({"error": "Only CSV and XLSX files supported"}), 400
+
+    form = request.form
+    supplier_id = form.get("supplier_id", type=int)
+    if not supplier_id:
+        return jsonify({"error": "supplier_id required"}), 400
+
+    from suppliers.supplier import Supplier
+    if not Supplier.query.get(supplier_id):
+        return jsonify({"error": f"Supplier with ID {supplier_id} not found"}), 400
+
+    try:
+        result = GoodsReceiptService.receive(
+            iter_upload_rows(file, filename),
+            supplier_id=supplier_id,
+            reference_number=form.get("reference_number"),
+            notes=form.get("notes"),
+            total_amount=form.get("total_amount"),
+            payment_amount=form.get("payment_amount", 0),
+            payment_method=form.get("payment_method"),
+            transaction_reference=form.get("transaction_reference"),
+            update_cost=form.get("update_cost", "false").lower() in ("1", "true", "yes")
+        )
+        return jsonify(result), 201
+    except UnicodeDecodeError:
+        return jsonify({"error": "CSV file must be UTF-8 encoded"}), 400
+    except GoodsReceiptError as e:
+        return jsonify({"error": str(e), "error_rows": e.errors[:50], "total_errors": len(e.errors)}), 400
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+
 @bp.route("/update-payment/<int:purchase_id>", methods=["PUT"])
 @require_permission_jwt('purchases', 'write')
 @audit_decorator('purchases', 'UPDATE_PAYMENT')
@@ -74,12 +121,14 @@ def update_purchase_payment(purchase_id):
 @require_permission_jwt('purchases', 'write')
 @audit_decorator('purchases', 'DELETE')
 def delete_purchase(purchase_id):
-    from stock_transactions.stock_transaction import StockTransaction
-    p = StockTransaction.query.get(purchase_id)
+    from purchases.purchase_order import PurchaseOrder
+    p = PurchaseOrder.query.get(purchase_id)
     if not p:
         return jsonify({"error": "Purchase not found"}), 404
     
     try:
+        if p.stock_transaction:
+            db.session.delete(p.stock_transaction)
         db.session.delete(p)
         db.session.commit()
         return jsonify({"message": "Purchase deleted successfully"}), 200
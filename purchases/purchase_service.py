@@ -3,7 +3,8 @@ from decimal import Decimal
 from src.extensions import db
 from products.product import Product
 from stock_transactions.stock_transaction import StockTransaction
-from datetime import datetime
+from stock_transactions.stock_batch_service import StockBatchService, parse_batch_date
+from purchases.purchase_order import PurchaseOrder, PurchaseOrderItem, purchase_payment_status
 
 
 class PurchaseService:
@@ -17,10 +18,14 @@ class PurchaseService:
         if not products or len(products) == 0:
             raise ValueError("Products list cannot be empty")
 
-        # Generate base purchase ID starting from 5001
-        last_transaction = StockTransaction.query.filter_by(transaction_type="Purchase").order_by(
-            StockTransaction.id.desc()).first()
-        base_purchase_id = 5001 if not last_transaction else max(5001, (last_transaction.id or 0) + 1)
+        if not all(product_data.get("product_id") and product_data.get("quantity") for product_data in products):
+            raise ValueError("Each product must have product_id and quantity")
+
+        # Lock all products at once in id order, so concurrent receipts of the same
+        # products wait for each other instead of deadlocking
+        locked_products = {product.id: product for product in Product.query.filter(
+            Product.id.in_({int(product_data["product_id"]) for product_data in products})
+        ).order_by(Product.id).with_for_update().all()}
 
         # Calculate total amount if not provided
         calculated_total = Decimal('0')
@@ -28,31 +33,40 @@ class PurchaseService:
 
         # Create one purchase record with multiple items
         purchase_items = []
+        batch_receipts = []
 
         for product_data in products:
             product_id = product_data.get("product_id")
             quantity = product_data.get("quantity")
 
-            if not product_id or not quantity:
-                raise ValueError("Each product must have product_id and quantity")
-
-            product = Product.query.get(product_id)
+            product = locked_products.get(int(product_id))
             if not product:
                 raise ValueError(f"Product {product_id} not found")
 
             # Update product quantity
             product.quantity_in_stock += quantity
 
+            # Optional batch details, for first-expiry-first-out sales
+            batch_number = product_data.get("batch_number")
+            expiry_date = parse_batch_date(product_data.get("expiry_date")) if batch_number else None
+            if batch_number:
+                batch_receipts.append((product.id, batch_number, expiry_date, quantity))
+
             # Calculate amount for this product
             product_amount = Decimal(product.purchase_price) * quantity
             calculated_total += product_amount
 
-            purchase_items.append({
-                "product_id": product_id,
-                "quantity": quantity,
-                "product": product,
-                "amount": product_amount
-            })
+            purchase_items.append(PurchaseOrderItem(
+                product_id=product.id,
+                product_name=product.product_name,
+                sku=product.sku,
+                quantity=quantity,
+                purchase_price=product.purchase_price,
+                amount=product_amount,
+                new_stock=product.quantity_in_stock,
+                batch_number=batch_number,
+                expiry_date=expiry_date
+            ))
 
             product_details.append({
                 "product_id": product.id,
@@ -66,10 +80,9 @@ class PurchaseService:
 
         # Create one main purchase transaction record
         main_transaction = StockTransaction(
-            id=base_purchase_id,
-            product_id=purchase_items[0]["product_id"],  # Use first product as main
+            product_id=purchase_items[0].product_id,  # Use first product as main
             transaction_type="Purchase",
-            quantity=sum(item["quantity"] for item in purchase_items),  # Total quantity
+            quantity=sum(item.quantity for item in purchase_items),  # Total quantity
             supplier_id=supplier_id,
             reference_number=reference_number,
             notes=notes
@@ -79,27 +92,23 @@ class PurchaseService:
         # Use provided total or calculated total
         total_amt = Decimal(total_amount) if total_amount else calculated_total
         paid_amt = Decimal(payment_amount)
+        payment_status = purchase_payment_status(total_amt, paid_amt)
 
-        # Calculate payment status
-        if paid_amt >= total_amt:
-            payment_status = "Paid"
-        elif paid_amt > 0:
-            payment_status = "Partially Paid"
-        else:
-            payment_status = "Pending"
+        purchase_order = PurchaseOrder(
+            stock_transaction=main_transaction,
+            supplier_id=supplier_id,
+            reference_number=reference_number,
+            total_amount=total_amt,
+            paid_amount=paid_amt,
+            payment_status=payment_status,
+            payment_method=payment_method,
+            transaction_reference=transaction_reference,
+            notes=notes,
+            items=purchase_items
+        )
+        db.session.add(purchase_order)
 
-        # Store payment info and product details in transaction notes
-        import json
-        payment_info = {
-            "payment_amount": str(paid_amt),
-            "payment_method": payment_method,
-            "payment_status": payment_status,
-            "transaction_reference": transaction_reference,
-            "total_amount": str(total_amt),
-            "products": product_details,
-            "created_at": datetime.now().isoformat()
-        }
-        main_transaction.notes = json.dumps(payment_info)
+        StockBatchService.receive(batch_receipts)
 
         # Get supplier details
         from suppliers.supplier import Supplier
@@ -110,7 +119,7 @@ class PurchaseService:
         balance_due = max(Decimal('0'), total_amt - paid_amt)  # Prevent negative balance
 
         return {
-            "purchase_id": base_purchase_id,
+            "purchase_id": purchase_order.id,
             "payment_details": {
                 "total_amount": f"{total_amt:.2f}",
                 "payment_amount": f"{paid_amt:.2f}",
@@ -141,7 +150,7 @@ class PurchaseService:
         """
         Add stock from supplier and update product quantity.
         """
-        product = Product.query.get(product_id)
+        product = Product.query.with_for_update().get(product_id)
         if not product:
             raise ValueError("Product not found")
 
@@ -152,25 +161,14 @@ class PurchaseService:
         if purchase_price:
             product.purchase_price = Decimal(purchase_price)
 
-        # Generate purchase ID starting from 5001
-        last_transaction = StockTransaction.query.filter_by(transaction_type="Purchase").order_by(
-            StockTransaction.id.desc()).first()
-        purchase_id = 5001 if not last_transaction else max(5001, (last_transaction.id or 0) + 1)
-
         # Calculate payment status
-        total_amt = Decimal(total_amount) if total_amount else Decimal(purchase_price or 0) * quantity
+        product_amount = Decimal(product.purchase_price) * quantity
+        total_amt = Decimal(total_amount) if total_amount else product_amount
         paid_amt = Decimal(payment_amount)
-
-        if paid_amt >= total_amt:
-            payment_status = "Paid"
-        elif paid_amt > 0:
-            payment_status = "Partially Paid"
-        else:
-            payment_status = "Pending"
+        payment_status = purchase_payment_status(total_amt, paid_amt)
 
         # Create stock transaction record
         stock_transaction = StockTransaction(
-            id=purchase_id,
             product_id=product_id,
             transaction_type="Purchase",
             quantity=quantity,
@@ -179,22 +177,40 @@ class PurchaseService:
             notes=notes
         )
 
-        db.session.add(stock_transaction)
-        db.session.flush()  # Get the ID
+        purchase_order = PurchaseOrder(
+            stock_transaction=stock_transaction,
+            supplier_id=supplier_id,
+            reference_number=reference_number,
+            total_amount=total_amt,
+            paid_amount=paid_amt,
+            payment_status=payment_status,
+            payment_method=payment_method,
+            transaction_reference=transaction_reference,
+            notes=notes,
+            items=[PurchaseOrderItem(
+                product_id=product.id,
+                product_name=product.product_name,
+                sku=product.sku,
+                quantity=quantity,
+                purchase_price=product.purchase_price,
+                amount=product_amount,
+                new_stock=product.quantity_in_stock
+            )]
+        )
+        db.session.add(purchase_order)
+        db.session.flush()  # Get the purchase number
 
         # Get comprehensive details
         from suppliers.supplier import Supplier
-        from category.category import Category
 
         supplier = Supplier.query.get(supplier_id)
-        category = Category.query.get(product.category_id) if product.category_id else None
 
         db.session.commit()
 
         balance_due = max(Decimal('0'), total_amt - paid_amt)  # Prevent negative balance
 
         return {
-            "purchase_id": purchase_id,
+            "purchase_id": purchase_order.id,
             "transaction_id": stock_transaction.id,
             "payment_details": {
                 "total_amount": f"{total_amt:.2f}",
@@ -229,50 +245,22 @@ class PurchaseService:
         """
         Update payment for existing purchase - adds to existing payment amount
         """
-        transaction = StockTransaction.query.get(purchase_id)
-        if not transaction or transaction.transaction_type != "Purchase":
+        # Locked so two payments recorded at once both count
+        order = PurchaseOrder.query.with_for_update().get(purchase_id)
+        if not order:
             raise ValueError("Purchase not found")
 
-        # Only use the specific transaction for this purchase ID
-        related_transactions = [transaction]
-
-        # Get total amount from stored payment info (original purchase amount)
-        total_amt = Decimal('0')
-        if transaction.notes:
-            try:
-                import json
-                payment_info = json.loads(transaction.notes)
-                total_amt = Decimal(payment_info.get("total_amount", "0"))
-            except json.JSONDecodeError:
-                pass
+        total_amt = Decimal(order.total_amount or 0)
 
         # Fallback: calculate from current product prices if no stored amount
         if total_amt == 0:
-            product_groups = {}
-            for trans in related_transactions:
-                product_id = trans.product_id
-                if product_id in product_groups:
-                    product_groups[product_id]['quantity'] += trans.quantity
-                else:
-                    product_groups[product_id] = {
-                        'quantity': trans.quantity
-                    }
-
-            for product_id, group_data in product_groups.items():
-                product = Product.query.get(product_id)
-                total_qty = group_data['quantity']
-                product_amount = Decimal(str(product.purchase_price)) * Decimal(str(total_qty))
-                total_amt += product_amount
-
-        # Get existing payment amount from the same stored info
-        existing_paid_amt = Decimal("0")
-        if transaction.notes:
-            try:
-                import json
-                existing_payment = json.loads(transaction.notes)
-                existing_paid_amt = Decimal(existing_payment.get("payment_amount", "0"))
-            except json.JSONDecodeError:
-                pass
+            prices = dict(db.session.query(Product.id, Product.purchase_price).filter(
+                Product.id.in_({item.product_id for item in order.items})
+            ).all())
+            for item in order.items:
+                total_amt += Decimal(str(prices.get(item.product_id) or 0)) * Decimal(str(item.quantity))
+
+        existing_paid_amt = Decimal(order.paid_amount or 0)
 
         # Check if already fully paid (balance <= 0.01 to handle precision)
         current_balance = total_amt - existing_paid_amt
@@ -296,18 +284,11 @@ class PurchaseService:
         else:
             payment_status = "Pending"
 
-        # Store payment info in notes
-        payment_info = {
-            "payment_amount": str(total_paid_amt),
-            "payment_method": payment_method,
-            "payment_status": payment_status,
-            "transaction_reference": transaction_reference,
-            "total_amount": str(total_amt),
-            "updated_at": datetime.now().isoformat()
-        }
-
-        import json
-        transaction.notes = json.dumps(payment_info)
+        order.total_amount = total_amt
+        order.paid_amount = total_paid_amt
+        order.payment_status = payment_status
+        order.payment_method = payment_method
+        order.transaction_reference = transaction_reference
         db.session.commit()
 
         balance_due = max(Decimal('0'), balance_amt)  # Prevent negative balance
@@ -329,123 +310,84 @@ class PurchaseService:
         """
         Get complete purchase details by ID including all products from same purchase
         """
-        transaction = StockTransaction.query.get(purchase_id)
-        if not transaction:
-            # Debug: Check what purchase transactions exist
-            existing_purchases = StockTransaction.query.filter_by(transaction_type="Purchase").all()
-            print(f"Available purchase IDs: {[t.id for t in existing_purchases]}")
-            return None
-        if transaction.transaction_type != "Purchase":
+        order = PurchaseOrder.query.get(purchase_id)
+        if not order:
             return None
 
         # Get related data
         from suppliers.supplier import Supplier
         from category.category import Category
-        import json
 
-        supplier = Supplier.query.get(transaction.supplier_id)
+        supplier = Supplier.query.get(order.supplier_id) if order.supplier_id else None
 
-        # Get payment info from notes
-        payment_info = {}
-        if transaction.notes:
-            try:
-                payment_info = json.loads(transaction.notes)
-            except:
-                pass
+        products = {p.id: p for p in Product.query.filter(
+            Product.id.in_({item.product_id for item in order.items})
+        ).all()}
+        categories = {c.id: c for c in Category.query.filter(
+            Category.id.in_({p.category_id for p in products.values() if p.category_id})
+        ).all()}
 
-        # Use stored product details from notes if available
         products_details = []
-        if payment_info.get("products"):
-            for stored_product in payment_info["products"]:
-                product = Product.query.get(stored_product["product_id"])
-                category = Category.query.get(product.category_id) if product and product.category_id else None
-
-                products_details.append({
-                    "transaction_id": transaction.id,
-                    "product_details": {
-                        "product_id": stored_product["product_id"],
-                        "id": stored_product["product_id"],
-                        "name": stored_product["name"],
-                        "sku": stored_product["sku"],
-                        "description": product.description if product else None,
-                        "purchase_price": stored_product["purchase_price"],
-                        "unit_of_measure": product.unit_of_measure if product else None,
-                        "barcode": product.barcode if product else None,
-                        "batch_number": product.batch_number if product else None,
-                        "category_id": product.category_id if product else None,
-                        "subcategory_id": product.subcategory_id if product else None
-                    },
-                    "category_details": {
-                        "id": category.id,
-                        "name": category.name,
-                        "description": category.description
-                    } if category else None,
-                    "subcategory_details": {
-                        "id": product.subcategory_id if product else None,
-                        "name": category.subcategory_name if category else None,
-                        "description": None
-                    } if product and product.subcategory_id else None,
-                    "purchase_details": {
-                        "quantity_purchased": stored_product["quantity_added"],
-                        "product_amount": stored_product["amount"],
-                        "purchase_date": transaction.transaction_date.isoformat()
-                    },
-                    "stock_summary": {
-                        "previous_stock": stored_product["new_stock"] - stored_product["quantity_added"],
-                        "added_quantity": stored_product["quantity_added"],
-                        "new_stock_quantity": stored_product["new_stock"],
-                        "reorder_level": product.reorder_level if product else None,
-                        "max_stock_level": product.max_stock_level if product else None
-                    }
-                })
-        else:
-            # Fallback to single product from transaction
-            product = Product.query.get(transaction.product_id)
-            category = Category.query.get(product.category_id) if product.category_id else None
+        for item in order.items:
+            product = products.get(item.product_id)
+            category = categories.get(product.category_id) if product and product.category_id else None
 
             products_details.append({
-                "transaction_id": transaction.id,
+                "transaction_id": order.stock_transaction_id,
                 "product_details": {
-                    "product_id": product.id,
-                    "id": product.id,
-                    "name": product.product_name,
-                    "sku": product.sku,
-                    "description": product.description,
-                    "purchase_price": str(product.purchase_price),
-                    "unit_of_measure": product.unit_of_measure,
-                    "barcode": product.barcode,
-                    "batch_number": product.batch_number,
-                    "category_id": product.category_id,
-                    "subcategory_id": product.subcategory_id
+                    "product_id": item.product_id,
+                    "id": item.product_id,
+                    "name": item.product_name,
+                    "sku": item.sku,
+                    "description": product.description if product else None,
+                    "purchase_price": str(item.purchase_price),
+                    "unit_of_measure": product.unit_of_measure if product else None,
+                    "barcode": product.barcode if product else None,
+                    "batch_number": item.batch_number or (product.batch_number if product else None),
+                    "category_id": product.category_id if product else None,
+                    "subcategory_id": product.subcategory_id if product else None
                 },
+                "category_details": {
+                    "id": category.id,
+                    "name": category.name,
+                    "description": category.description
+                } if category else None,
+                "subcategory_details": {
+                    "id": product.subcategory_id if product else None,
+                    "name": category.subcategory_name if category else None,
+                    "description": None
+                } if product and product.subcategory_id else None,
                 "purchase_details": {
-                    "quantity_purchased": transaction.quantity,
-                    "product_amount": str(Decimal(product.purchase_price) * transaction.quantity),
-                    "purchase_date": transaction.transaction_date.isoformat()
+                    "quantity_purchased": item.quantity,
+                    "product_amount": str(item.amount),
+                    "purchase_date": order.purchase_date.isoformat()
+                },
+                "stock_summary": {
+                    "previous_stock": item.new_stock - item.quantity if item.new_stock is not None else None,
+                    "added_quantity": item.quantity,
+                    "new_stock_quantity": item.new_stock,
+                    "reorder_level": product.reorder_level if product else None,
+                    "max_stock_level": product.max_stock_level if product else None
                 }
             })
 
-        paid_amt = Decimal(payment_info.get("payment_amount", "0"))
-        payment_method = payment_info.get("payment_method")
-        transaction_reference = payment_info.get("transaction_reference")
-        total_purchase_amount = Decimal(payment_info.get("total_amount", "0"))
-
+        paid_amt = Decimal(order.paid_amount or 0)
+        total_purchase_amount = Decimal(order.total_amount or 0)
         balance_amt = total_purchase_amount - paid_amt
-        payment_status = payment_info.get("payment_status", "Pending")
 
         # Get first product for template compatibility
         first_product = products_details[0] if products_details else {}
 
         return {
             "purchase_id": purchase_id,
-            "reference_number": transaction.reference_number,
+            "reference_number": order.reference_number,
             "payment_details": {
                 "grand_total": f"{total_purchase_amount:.2f}",
                 "payment_amount": f"{paid_amt:.2f}",
                 "balance_amount": f"{max(Decimal('0'), balance_amt):.2f}",
-                "payment_method": payment_method,
-                "payment_status": payment_status,
-                "transaction_reference": transaction_reference
+                "payment_method": order.payment_method,
+                "payment_status": order.payment_status,
+                "transaction_reference": order.transaction_reference
             },
             "supplier_details": {
                 "supplier_id": supplier.id,
@@ -459,19 +401,20 @@ class PurchaseService:
                 "payment_terms": supplier.payment_terms
             } if supplier else None,
             "purchase_details": {
-                "reference_number": transaction.reference_number,
-                "purchase_date": transaction.transaction_date.isoformat(),
+                "reference_number": order.reference_number,
+                "purchase_date": order.purchase_date.isoformat(),
                 "quantity_purchased": first_product.get("purchase_details", {}).get("quantity_purchased", 0)
             },
             "product_details": first_product.get("product_details", {}),
             "stock_transaction": {
-                "notes": transaction.notes
+                "id": order.stock_transaction_id,
+                "notes": order.notes
             },
             "purchase_summary": {
                 "total_products": len(products_details),
                 "total_quantity": sum(int(p["purchase_details"]["quantity_purchased"]) for p in products_details),
-                "purchase_date": transaction.transaction_date.isoformat(),
-                "notes": transaction.notes
+                "purchase_date": order.purchase_date.isoformat(),
+                "notes": order.notes
             },
             "products": products_details
-        }
\ No newline at end of file
+        }
@@ -9,7 +9,7 @@ class SupplierDamage(db.Model):
     damage_number = db.Column(db.String(100), unique=True, nullable=False)
     
     # Purchase reference
-    purchase_id = db.Column(db.Integer, db.ForeignKey("stock_transactions.id"), nullable=False)
+    purchase_id = db.Column(db.Integer, db.ForeignKey("purchase_orders.id"), nullable=False)
     supplier_id = db.Column(db.Integer, db.ForeignKey("suppliers.id"), nullable=False)
     product_id = db.Column(db.Integer, db.ForeignKey("products.id"), nullable=False)
     
@@ -43,7 +43,7 @@ class SupplierDamage(db.Model):
     updated_at = db.Column(db.DateTime, onupdate=datetime.utcnow)
 
     # Relationships
-    purchase = relationship("StockTransaction", foreign_keys=[purchase_id])
+    purchase = relationship("PurchaseOrder", foreign_keys=[purchase_id])
     supplier = relationship("Supplier", foreign_keys=[supplier_id])
     product = relationship("Product", foreign_keys=[product_id])
 
@@ -0,0 +1,221 @@
+import glob
+import json
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import select, func, tuple_, Integer, BigInteger, Numeric, DateTime, Date, Boolean, JSON
+from src.extensions import db
+from invoices.invoice import Invoice
+from invoices.invoice_item import InvoiceItem
+from payments.payment import Payment
+from stock_transactions.stock_transaction import StockTransaction
+from sales_no_invoice.sale_no_invoice import SaleNoInvoice
+from purchases.purchase_bill import PurchaseBill
+from purchases.purchase_order import PurchaseOrder, PurchaseOrderItem
+from returns.product_return import ProductReturn
+
+# Exported tables with their change-tracking column and the column standing in for it
+# while it is still NULL. Tables without one are append-only extracts watermarked by id.
+EXPORT_TABLES = {
+    "invoices": (Invoice, "updated_at", "created_at"),
+    "invoice_items": (InvoiceItem, None, None),
+    "payments": (Payment, "updated_at", "payment_date"),
+    "stock_transactions": (StockTransaction, None, None),
+    "sales_no_invoice": (SaleNoInvoice, None, None),
+    "purchase_bills": (PurchaseBill, "updated_at", "created_at"),
+    # Payment state changes on the order; lines are written once with it
+    "purchase_orders": (PurchaseOrder, "updated_at", "created_at"),
+    "purchase_order_items": (PurchaseOrderItem, None, None),
+    "product_returns": (ProductReturn, "updated_at", "created_at"),
+}
+
+ROW_GROUP_SIZE = 50000
+WATERMARK_FILE = "_watermarks.json"
+# Rows changed in the last few minutes may belong to transactions that have not
+# committed yet; leave them for the next run so no watermark skips them. Id-tracked
+# tables export up to the highest id a run at least this long ago saw (the horizon).
+SETTLE_SECONDS = 300
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+        return pyarrow, pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("Analytics export requires pyarrow: pip install pyarrow")
+
+
+def _arrow_type(pa, column):
+    """Map a SQLAlchemy column type to the Arrow type written to Parquet."""
+    column_type = column.type
+    if isinstance(column_type, BigInteger):
+        return pa.int64()
+    if isinstance(column_type, Integer):
+        return pa.int32()
+    if isinstance(column_type, Numeric):
+        return pa.decimal128(column_type.precision or 38, column_type.scale or 0)
+    if isinstance(column_type, DateTime):
+        return pa.timestamp("us")
+    if isinstance(column_type, Date):
+        return pa.date32()
+    if isinstance(column_type, Boolean):
+        return pa.bool_()
+    return pa.string()
+
+
+class AnalyticsExportService:
+    @staticmethod
+    def export(output_dir, tables=None, full=False):
+        """
+        Write new and changed rows of each table to <output_dir>/<table>/<table>-<run>.parquet.
+        Rows are streamed from a server-side cursor and written one row group at a time.
+        Watermarks are kept in <output_dir>/_watermarks.json; full=True ignores them and
+        replaces each table's earlier parts. For tables tracked by updated_at a changed row
+        appears again in a later part, so readers keep the last row per id. Id-tracked
+        tables lag one run behind (see SETTLE_SECONDS). Returns {table: rows_written}.
+        """
+        pa, pq = _require_pyarrow()
+        tables = tables or list(EXPORT_TABLES)
+        unknown = [t for t in tables if t not in EXPORT_TABLES]
+        if unknown:
+            raise ValueError(f"Unknown export tables: {', '.join(unknown)}")
+
+        os.makedirs(output_dir, exist_ok=True)
+        previous = AnalyticsExportService._load_watermarks(output_dir)
+        watermarks = {} if full else dict(previous)
+        now = datetime.utcnow()
+        run_id = now.strftime("%Y%m%dT%H%M%S")
+        settled_before = now - timedelta(seconds=SETTLE_SECONDS)
+
+        written = {}
+        for name in tables:
+            model, tracked_by, created_by = EXPORT_TABLES[name]
+            table = model.__table__
+            watermark = watermarks.get(name)
+            if not tracked_by:
+                # A full export still waits on the horizon the previous run recorded
+                watermark = AnalyticsExportService._settle_horizon(
+                    table, previous.get(name), now, settled_before, full
+                )
+            rows, watermark = AnalyticsExportService._export_table(
+                pa, pq, output_dir, run_id, name, table, tracked_by, created_by, watermark, settled_before
+            )
+            if full:
+                AnalyticsExportService._remove_old_parts(output_dir, name, run_id)
+            written[name] = rows
+            if watermark:
+                watermarks[name] = watermark
+            AnalyticsExportService._save_watermarks(output_dir, watermarks)
+        return written
+
+    @staticmethod
+    def _settle_horizon(table, watermark, now, settled_before, full):
+        """
+        Watermark of an id-tracked table with the id this run may export up to. Ids are
+        handed out before commit, so a lower id can still appear after a higher one was
+        seen; only ids a run saw at least SETTLE_SECONDS ago are exported.
+        """
+        watermark = watermark or {}
+        horizon = watermark.get("horizon")
+        settled = bool(horizon) and datetime.fromisoformat(horizon["seen_at"]) <= settled_before
+        with db.engine.connect() as connection:
+            current = {"id": connection.execute(select(func.coalesce(func.max(table.c.id), 0))).scalar(),
+                       "seen_at": now.isoformat()}
+        if settled:
+            export_to = horizon["id"]
+        elif full:
+            # Ids already exported were settled then; with no earlier run there is nothing to wait for
+            export_to = watermark.get("id") or current["id"]
+        else:
+            export_to = watermark.get("id", 0)
+        settling = {"export_to": export_to, "horizon": horizon if horizon and not settled else current}
+        if not full and watermark.get("id"):
+            settling["id"] = watermark["id"]
+        return settling
+
+    @staticmethod
+    def _remove_old_parts(output_dir, name, run_id):
+        """After a full export, drop the table's earlier parts so rows are not duplicated."""
+        keep = os.path.join(output_dir, name, f"{name}-{run_id}.parquet")
+        for path in glob.glob(os.path.join(output_dir, name, f"{name}-*.parquet")):
+            if path != keep:
+                os.remove(path)
+
+    @staticmethod
+    def _export_table(pa, pq, output_dir, run_id, name, table, tracked_by, created_by, watermark, settled_before):
+        columns = list(table.columns)
+        schema = pa.schema([pa.field(c.name, _arrow_type(pa, c)) for c in columns])
+        query = select(*columns)
+
+        if tracked_by:
+            # updated_at is only set on update (or was added later), so rows without one
+            # are tracked by their creation time
+            changed_at = func.coalesce(table.c[tracked_by], table.c[created_by])
+            query = query.add_columns(changed_at.label("_changed_at")) \
+                .where(changed_at < settled_before) \
+                .order_by(changed_at, table.c.id)
+            # An id-only watermark (payments before they were tracked by updated_at) starts over;
+            # readers keep the last row per id anyway
+            if watermark and "changed_at" in watermark:
+                query = query.where(tuple_(changed_at, table.c.id) > tuple_(
+                    datetime.fromisoformat(watermark["changed_at"]), watermark["id"]
+                ))
+        else:
+            query = query.order_by(table.c.id).where(table.c.id <= watermark["export_to"])
+            if watermark.get("id"):
+                query = query.where(table.c.id > watermark["id"])
+
+        json_columns = {c.name for c in columns if isinstance(c.type, JSON)}
+        path = os.path.join(output_dir, name, f"{name}-{run_id}.parquet")
+        writer = None
+        rows_written = 0
+        last = None
+
+        try:
+            with db.engine.connect() as connection:
+                result = connection.execution_options(stream_results=True, yield_per=ROW_GROUP_SIZE).execute(query)
+                for partition in result.partitions(ROW_GROUP_SIZE):
+                    arrays = []
+                    for index, column in enumerate(columns):
+                        values = [row[index] for row in partition]
+                        if column.name in json_columns:
+                            values = [json.dumps(v) if v is not None else None for v in values]
+                        arrays.append(pa.array(values, type=schema.field(column.name).type))
+                    if writer is None:
+                        os.makedirs(os.path.dirname(path), exist_ok=True)
+                        writer = pq.ParquetWriter(path, schema, compression="zstd")
+                    writer.write_table(pa.Table.from_arrays(arrays, schema=schema), row_group_size=ROW_GROUP_SIZE)
+                    rows_written += len(partition)
+                    last = partition[-1]._mapping
+        except Exception:
+            # Never leave a partial part behind; the watermark has not moved, so the next run retries
+            if writer is not None:
+                writer.close()
+                os.remove(path)
+            raise
+
+        if not tracked_by:
+            # Everything up to the horizon is exported now, whether or not rows exist there
+            watermark = {"id": max(watermark.get("id", 0), watermark["export_to"]), "horizon": watermark.get("horizon")}
+        if writer is None:
+            return 0, watermark
+        writer.close()
+
+        if tracked_by:
+            return rows_written, {"changed_at": last["_changed_at"].isoformat(), "id": last["id"]}
+        return rows_written, watermark
+
+    @staticmethod
+    def _load_watermarks(output_dir):
+        path = os.path.join(output_dir, WATERMARK_FILE)
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    @staticmethod
+    def _save_watermarks(output_dir, watermarks):
+        path = os.path.join(output_dir, WATERMARK_FILE)
+        with open(path + ".tmp", "w") as f:
+            json.dump(watermarks, f, indent=2)
+        os.replace(path + ".tmp", path)
@@ -0,0 +1,302 @@
+from datetime import datetime, date
+from decimal import Decimal
+from src.extensions import db
+from sqlalchemy import event, inspect, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from products.product import Product
+from customers.customer import Customer
+from invoices.invoice import Invoice
+from invoices.invoice_item import InvoiceItem
+from sales_no_invoice.sale_no_invoice import SaleNoInvoice
+from returns.product_return import ProductReturn, DamagedProduct
+from reports.sales_timeseries_bucket import invalidate_buckets_for_date
+
+# Sales channels
+CHANNEL_INVOICE = "invoice"
+CHANNEL_DIRECT = "direct"
+CHANNEL_DAMAGE = "damage"
+
+# Key placeholders so every key column stays NOT NULL for the unique constraint.
+# product_id 0 carries invoice-level charges (shipping, other charges, additional discount).
+NO_PRODUCT = 0
+NO_CATEGORY = 0
+NO_BRANCH = ""
+
+# Only completed returns count against profit, as in the profit & loss report
+COUNTED_RETURN_STATUS = "Completed"
+
+MEASURES = (
+    "transaction_count", "quantity_sold", "gross_amount", "discount_amount", "tax_amount",
+    "revenue", "cost_amount", "returns_quantity", "returns_amount", "returns_loss",
+    "damage_quantity", "damage_cost",
+)
+
+
+class DailySalesFact(db.Model):
+    """Daily sales rollup keyed by (date, product, category, customer branch, channel).
+
+    revenue follows the existing reports: invoice line totals (plus invoice-level charges
+    on the product 0 row) and total_amount for direct sales. gross_amount is selling
+    price * quantity, so gross_amount - cost_amount is the sales profit. Appended by
+    the mapper events below in the writing transaction; SalesFactService.backfill()
+    rebuilds any date range.
+    """
+    __tablename__ = "daily_sales_facts"
+    __table_args__ = (
+        db.UniqueConstraint("sale_date", "product_id", "category_id", "branch", "channel",
+                            name="uq_daily_sales_facts_key"),
+        db.Index("ix_daily_sales_facts_date_channel", "sale_date", "channel"),
+    )
+
+    id = db.Column(db.BigInteger, primary_key=True)
+    sale_date = db.Column(db.Date, nullable=False)
+    product_id = db.Column(db.Integer, nullable=False, default=NO_PRODUCT)
+    category_id = db.Column(db.Integer, nullable=False, default=NO_CATEGORY)
+    branch = db.Column(db.String(100), nullable=False, default=NO_BRANCH)
+    channel = db.Column(db.String(20), nullable=False)
+
+    transaction_count = db.Column(db.Integer, nullable=False, default=0)  # invoices or direct sales
+    quantity_sold = db.Column(db.Integer, nullable=False, default=0)
+    gross_amount = db.Column(db.Numeric(16, 2), nullable=False, default=0)
+    discount_amount = db.Column(db.Numeric(16, 2), nullable=False, default=0)
+    tax_amount = db.Column(db.Numeric(16, 2), nullable=False, default=0)
+    revenue = db.Column(db.Numeric(16, 2), nullable=False, default=0)
+    cost_amount = db.Column(db.Numeric(16, 2), nullable=False, default=0)
+    returns_quantity = db.Column(db.Integer, nullable=False, default=0)
+    returns_amount = db.Column(db.Numeric(16, 2), nullable=False, default=0)
+    returns_loss = db.Column(db.Numeric(16, 2), nullable=False, default=0)
+    damage_quantity = db.Column(db.Integer, nullable=False, default=0)
+    damage_cost = db.Column(db.Numeric(16, 2), nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+def upsert_sales_fact(connection, sale_date, product_id, category_id, branch, channel, **measures):
+    """Add measures to the fact row for the key, creating it if needed, on the caller's connection."""
+    measures = {k: v for k, v in measures.items() if v}
+    if not measures:
+        return
+    if isinstance(sale_date, datetime):
+        sale_date = sale_date.date()
+    table = DailySalesFact.__table__
+    row = {name: 0 for name in MEASURES}
+    row.update(measures)
+    stmt = pg_insert(table).values(
+        sale_date=sale_date or date.today(),
+        product_id=product_id or NO_PRODUCT,
+        category_id=category_id or NO_CATEGORY,
+        branch=branch or NO_BRANCH,
+        channel=channel,
+        updated_at=datetime.utcnow(),
+        **row
+    )
+    stmt = stmt.on_conflict_do_update(
+        constraint="uq_daily_sales_facts_key",
+        set_=dict(
+            {name: table.c[name] + stmt.excluded[name] for name in measures},
+            updated_at=stmt.excluded.updated_at
+        )
+    )
+    connection.execute(stmt)
+    invalidate_buckets_for_date(connection, sale_date)
+
+
+def _decimal(value):
+    return Decimal(str(value)) if value is not None else Decimal('0')
+
+
+def _product_info(connection, product_id):
+    """Return (category_id, purchase_price) for a product."""
+    row = connection.execute(
+        select(Product.category_id, Product.purchase_price).where(Product.id == product_id)
+    ).first()
+    return (row.category_id, _decimal(row.purchase_price)) if row else (None, Decimal('0'))
+
+
+def _customer_branch(connection, customer_id):
+    if not customer_id:
+        return None
+    return connection.execute(select(Customer.branch).where(Customer.id == customer_id)).scalar()
+
+
+def _snapshot(target, attrs, old):
+    """Attribute values before (old=True) or after the current flush."""
+    state = inspect(target)
+    values = {}
+    for attr in attrs:
+        history = state.attrs[attr].history
+        value = getattr(target, attr)
+        if old and history.deleted:
+            value = history.deleted[0]
+        values[attr] = value
+    return values
+
+
+def _negate(measures):
+    return {k: -v for k, v in measures.items()}
+
+
+# Invoice lines
+INVOICE_ITEM_ATTRS = ("invoice_id", "product_id", "quantity", "unit_price", "igst_amount", "total_price")
+
+
+def _record_invoice_item(connection, values, sign=1):
+    invoice = connection.execute(
+        select(Invoice.invoice_date, Invoice.customer_id).where(Invoice.id == values["invoice_id"])
+    ).first()
+    if invoice is None:
+        return
+    category_id, purchase_price = _product_info(connection, values["product_id"])
+    quantity = values["quantity"] or 0
+    gross = _decimal(values["unit_price"]) * quantity
+    tax = _decimal(values["igst_amount"])
+    total = _decimal(values["total_price"])
+    measures = dict(
+        quantity_sold=quantity,
+        gross_amount=gross,
+        discount_amount=gross + tax - total,
+        tax_amount=tax,
+        revenue=total,
+        cost_amount=purchase_price * quantity,
+    )
+    upsert_sales_fact(connection, invoice.invoice_date, values["product_id"], category_id,
+                      _customer_branch(connection, invoice.customer_id), CHANNEL_INVOICE,
+                      **(measures if sign > 0 else _negate(measures)))
+
+
+@event.listens_for(InvoiceItem, "after_insert")
+def _invoice_item_inserted(mapper, connection, target):
+    _record_invoice_item(connection, _snapshot(target, INVOICE_ITEM_ATTRS, old=False))
+
+
+@event.listens_for(InvoiceItem, "after_update")
+def _invoice_item_updated(mapper, connection, target):
+    _record_invoice_item(connection, _snapshot(target, INVOICE_ITEM_ATTRS, old=True), sign=-1)
+    _record_invoice_item(connection, _snapshot(target, INVOICE_ITEM_ATTRS, old=False))
+
+
+@event.listens_for(InvoiceItem, "after_delete")
+def _invoice_item_deleted(mapper, connection, target):
+    _record_invoice_item(connection, _snapshot(target, INVOICE_ITEM_ATTRS, old=False), sign=-1)
+
+
+# Invoice-level charges and invoice counts go to the product 0 row
+INVOICE_ATTRS = ("invoice_date", "customer_id", "shipping_charges", "other_charges", "additional_discount")
+
+
+def _record_invoice(connection, values, sign=1):
+    charges = _decimal(values["shipping_charges"]) + _decimal(values["other_charges"])
+    additional_discount = _decimal(values["additional_discount"])
+    measures = dict(
+        transaction_count=1,
+        discount_amount=additional_discount,
+        revenue=charges - additional_discount,
+    )
+    upsert_sales_fact(connection, values["invoice_date"], NO_PRODUCT, NO_CATEGORY,
+                      _customer_branch(connection, values["customer_id"]), CHANNEL_INVOICE,
+                      **(measures if sign > 0 else _negate(measures)))
+
+
+@event.listens_for(Invoice, "after_insert")
+def _invoice_inserted(mapper, connection, target):
+    _record_invoice(connection, _snapshot(target, INVOICE_ATTRS, old=False))
+
+
+@event.listens_for(Invoice, "after_update")
+def _invoice_updated(mapper, connection, target):
+    old = _snapshot(target, INVOICE_ATTRS, old=True)
+    new = _snapshot(target, INVOICE_ATTRS, old=False)
+    if old != new:
+        _record_invoice(connection, old, sign=-1)
+        _record_invoice(connection, new)
+
+
+@event.listens_for(Invoice, "after_delete")
+def _invoice_deleted(mapper, connection, target):
+    _record_invoice(connection, _snapshot(target, INVOICE_ATTRS, old=False), sign=-1)
+
+
+# Sales without invoice
+def _record_direct_sale(connection, sale, sign=1):
+    category_id, purchase_price = _product_info(connection, sale.product_id)
+    measures = dict(
+        transaction_count=1,
+        quantity_sold=sale.quantity,
+        gross_amount=_decimal(sale.total_amount),
+        discount_amount=_decimal(sale.discount_amount),
+        revenue=_decimal(sale.total_amount),
+        cost_amount=purchase_price * sale.quantity,
+    )
+    upsert_sales_fact(connection, sale.sale_date, sale.product_id, category_id,
+                      _customer_branch(connection, sale.customer_id), CHANNEL_DIRECT,
+                      **(measures if sign > 0 else _negate(measures)))
+
+
+@event.listens_for(SaleNoInvoice, "after_insert")
+def _direct_sale_inserted(mapper, connection, target):
+    _record_direct_sale(connection, target)
+
+
+@event.listens_for(SaleNoInvoice, "after_delete")
+def _direct_sale_deleted(mapper, connection, target):
+    _record_direct_sale(connection, target, sign=-1)
+
+
+# Returns count once they reach the completed status
+RETURN_ATTRS = ("status", "return_date", "customer_id", "product_id", "original_invoice_id",
+                "quantity_returned", "original_price", "refund_amount")
+
+
+def _record_return(connection, values, sign=1):
+    if values["status"] != COUNTED_RETURN_STATUS:
+        return
+    category_id, purchase_price = _product_info(connection, values["product_id"])
+    quantity = values["quantity_returned"] or 0
+    measures = dict(
+        returns_quantity=quantity,
+        returns_amount=_decimal(values["refund_amount"]),
+        returns_loss=(_decimal(values["original_price"]) - purchase_price) * quantity,
+    )
+    channel = CHANNEL_INVOICE if values["original_invoice_id"] else CHANNEL_DIRECT
+    upsert_sales_fact(connection, values["return_date"], values["product_id"], category_id,
+                      _customer_branch(connection, values["customer_id"]), channel,
+                      **(measures if sign > 0 else _negate(measures)))
+
+
+@event.listens_for(ProductReturn, "after_insert")
+def _return_inserted(mapper, connection, target):
+    _record_return(connection, _snapshot(target, RETURN_ATTRS, old=False))
+
+
+@event.listens_for(ProductReturn, "after_update")
+def _return_updated(mapper, connection, target):
+    old = _snapshot(target, RETURN_ATTRS, old=True)
+    new = _snapshot(target, RETURN_ATTRS, old=False)
+    if old != new:
+        _record_return(connection, old, sign=-1)
+        _record_return(connection, new)
+
+
+@event.listens_for(ProductReturn, "after_delete")
+def _return_deleted(mapper, connection, target):
+    _record_return(connection, _snapshot(target, RETURN_ATTRS, old=False), sign=-1)
+
+
+# Damaged stock is valued at cost
+def _record_damage(connection, damaged, sign=1):
+    category_id, purchase_price = _product_info(connection, damaged.product_id)
+    measures = dict(
+        damage_quantity=damaged.quantity,
+        damage_cost=purchase_price * damaged.quantity,
+    )
+    upsert_sales_fact(connection, damaged.damage_date, damaged.product_id, category_id,
+                      NO_BRANCH, CHANNEL_DAMAGE, **(measures if sign > 0 else _negate(measures)))
+
+
+@event.listens_for(DamagedProduct, "after_insert")
+def _damage_inserted(mapper, connection, target):
+    _record_damage(connection, target)
+
+
+@event.listens_for(DamagedProduct, "after_delete")
+def _damage_deleted(mapper, connection, target):
+    _record_damage(connection, target, sign=-1)
@@ -0,0 +1,201 @@
+from datetime import datetime
+from decimal import Decimal
+from src.extensions import db
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from products.product import Product
+from customers.customer import Customer
+from invoices.invoice import Invoice
+from payments.payment import Payment
+from sales_no_invoice.sale_no_invoice import SaleNoInvoice
+from purchases.purchase_order import PurchaseOrder
+
+DASHBOARD_METRICS_ROW_ID = 1
+
+
+class DashboardMetrics(db.Model):
+    """Single-row summary of the dashboard KPIs.
+
+    Kept current by the mapper events below and rebuilt in full by
+    DashboardService.rebuild() to correct drift from bulk statements.
+    """
+    __tablename__ = "dashboard_metrics"
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False, default=DASHBOARD_METRICS_ROW_ID)
+    invoice_sales_total = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    direct_sales_total = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    total_purchases = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    payments_received_total = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    stock_value = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    product_count = db.Column(db.Integer, nullable=False, default=0)
+    customer_count = db.Column(db.Integer, nullable=False, default=0)
+    invoice_count = db.Column(db.Integer, nullable=False, default=0)
+    payment_count = db.Column(db.Integer, nullable=False, default=0)
+    direct_sale_count = db.Column(db.Integer, nullable=False, default=0)
+    low_stock_count = db.Column(db.Integer, nullable=False, default=0)
+    rebuilt_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    @property
+    def total_sales(self):
+        return Decimal(self.invoice_sales_total or 0) + Decimal(self.direct_sales_total or 0)
+
+    @property
+    def pending_payments(self):
+        return max(Decimal('0'), Decimal(self.invoice_sales_total or 0) - Decimal(self.payments_received_total or 0))
+
+
+def apply_metrics_delta(connection, **deltas):
+    """
+    Add deltas to the metrics row in the writing transaction. They are summed on the
+    session and written in one UPDATE when it commits (see _write_metrics_deltas), so
+    the hot row is always the last lock a transaction takes and is held only briefly.
+    """
+    pending = db.session.info.setdefault("dashboard_metrics_deltas", {})
+    for name, delta in deltas.items():
+        if delta:
+            pending[name] = pending.get(name, 0) + delta
+
+
+def _decimal(value):
+    return Decimal(str(value)) if value is not None else Decimal('0')
+
+
+def _old_and_new(target, attr):
+    history = inspect(target).attrs[attr].history
+    new = getattr(target, attr)
+    old = history.deleted[0] if history.deleted else new
+    return old, new
+
+
+def product_contribution(quantity, purchase_price, reorder_level):
+    quantity = quantity or 0
+    return (
+        Decimal(quantity) * _decimal(purchase_price),
+        1 if reorder_level and quantity <= reorder_level else 0,
+    )
+
+
+# Products: stock value, product count and low stock alerts
+@event.listens_for(Product, "after_insert")
+def _product_inserted(mapper, connection, target):
+    value, low = product_contribution(target.quantity_in_stock, target.purchase_price, target.reorder_level)
+    apply_metrics_delta(connection, product_count=1, stock_value=value, low_stock_count=low)
+
+
+@event.listens_for(Product, "after_update")
+def _product_updated(mapper, connection, target):
+    old_qty, new_qty = _old_and_new(target, "quantity_in_stock")
+    old_price, new_price = _old_and_new(target, "purchase_price")
+    old_reorder, new_reorder = _old_and_new(target, "reorder_level")
+    old_value, old_low = product_contribution(old_qty, old_price, old_reorder)
+    new_value, new_low = product_contribution(new_qty, new_price, new_reorder)
+    apply_metrics_delta(connection, stock_value=new_value - old_value, low_stock_count=new_low - old_low)
+
+
+@event.listens_for(Product, "after_delete")
+def _product_deleted(mapper, connection, target):
+    value, low = product_contribution(target.quantity_in_stock, target.purchase_price, target.reorder_level)
+    apply_metrics_delta(connection, product_count=-1, stock_value=-value, low_stock_count=-low)
+
+
+# Customers
+@event.listens_for(Customer, "after_insert")
+def _customer_inserted(mapper, connection, target):
+    apply_metrics_delta(connection, customer_count=1)
+
+
+@event.listens_for(Customer, "after_delete")
+def _customer_deleted(mapper, connection, target):
+    apply_metrics_delta(connection, customer_count=-1)
+
+
+# Invoices: totals are finalised after the first flush, so updates carry the real amount
+@event.listens_for(Invoice, "after_insert")
+def _invoice_inserted(mapper, connection, target):
+    apply_metrics_delta(connection, invoice_count=1, invoice_sales_total=_decimal(target.grand_total))
+
+
+@event.listens_for(Invoice, "after_update")
+def _invoice_updated(mapper, connection, target):
+    old_total, new_total = _old_and_new(target, "grand_total")
+    apply_metrics_delta(connection, invoice_sales_total=_decimal(new_total) - _decimal(old_total))
+
+
+@event.listens_for(Invoice, "after_delete")
+def _invoice_deleted(mapper, connection, target):
+    apply_metrics_delta(connection, invoice_count=-1, invoice_sales_total=-_decimal(target.grand_total))
+
+
+# Invoice payments: the amount applied to the invoice excludes any excess
+def _applied_amount(amount_paid, excess_amount):
+    return _decimal(amount_paid) - _decimal(excess_amount)
+
+
+@event.listens_for(Payment, "after_insert")
+def _payment_inserted(mapper, connection, target):
+    apply_metrics_delta(connection, payment_count=1,
+                        payments_received_total=_applied_amount(target.amount_paid, target.excess_amount))
+
+
+@event.listens_for(Payment, "after_update")
+def _payment_updated(mapper, connection, target):
+    old_paid, new_paid = _old_and_new(target, "amount_paid")
+    old_excess, new_excess = _old_and_new(target, "excess_amount")
+    apply_metrics_delta(connection, payments_received_total=(
+        _applied_amount(new_paid, new_excess) - _applied_amount(old_paid, old_excess)))
+
+
+@event.listens_for(Payment, "after_delete")
+def _payment_deleted(mapper, connection, target):
+    apply_metrics_delta(connection, payment_count=-1,
+                        payments_received_total=-_applied_amount(target.amount_paid, target.excess_amount))
+
+
+# Sales without invoice
+@event.listens_for(SaleNoInvoice, "after_insert")
+def _sale_inserted(mapper, connection, target):
+    apply_metrics_delta(connection, direct_sale_count=1, direct_sales_total=_decimal(target.total_amount))
+
+
+@event.listens_for(SaleNoInvoice, "after_delete")
+def _sale_deleted(mapper, connection, target):
+    apply_metrics_delta(connection, direct_sale_count=-1, direct_sales_total=-_decimal(target.total_amount))
+
+
+# Purchases
+@event.listens_for(PurchaseOrder, "after_insert")
+def _purchase_inserted(mapper, connection, target):
+    apply_metrics_delta(connection, total_purchases=_decimal(target.total_amount))
+
+
+@event.listens_for(PurchaseOrder, "after_update")
+def _purchase_updated(mapper, connection, target):
+    old_total, new_total = _old_and_new(target, "total_amount")
+    apply_metrics_delta(connection, total_purchases=_decimal(new_total) - _decimal(old_total))
+
+
+@event.listens_for(PurchaseOrder, "after_delete")
+def _purchase_deleted(mapper, connection, target):
+    apply_metrics_delta(connection, total_purchases=-_decimal(target.total_amount))
+
+
+# Every transaction locks the metrics row last: products, invoices and the rest first
+@event.listens_for(Session, "before_commit")
+def _write_metrics_deltas(session):
+    # Flush here so the deltas of the commit's own flush are written too
+    session.flush()
+    deltas = {k: v for k, v in session.info.pop("dashboard_metrics_deltas", {}).items() if v}
+    if not deltas:
+        return
+    table = DashboardMetrics.__table__
+    values = {name: table.c[name] + delta for name, delta in deltas.items()}
+    values["updated_at"] = datetime.utcnow()
+    session.connection().execute(
+        table.update().where(table.c.id == DASHBOARD_METRICS_ROW_ID).values(**values)
+    )
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_metrics_deltas(session):
+    session.info.pop("dashboard_metrics_deltas", None)
@@ -0,0 +1,102 @@
+from datetime import datetime
+from sqlalchemy import func, and_, select
+from src.extensions import db
+from reports.dashboard_metrics import DashboardMetrics, DASHBOARD_METRICS_ROW_ID
+from products.product import Product
+from customers.customer import Customer
+from invoices.invoice import Invoice
+from payments.payment import Payment
+from sales_no_invoice.sale_no_invoice import SaleNoInvoice
+from purchases.purchase_order import PurchaseOrder
+
+
+class DashboardService:
+    @staticmethod
+    def get_metrics():
+        """Return the dashboard metrics row, building it the first time it is needed."""
+        metrics = DashboardMetrics.query.get(DASHBOARD_METRICS_ROW_ID)
+        if metrics is None:
+            metrics = DashboardService.rebuild()
+        return metrics
+
+    @staticmethod
+    def _aggregates(connection):
+        """Every metric computed from the source tables on connection."""
+        stock_value, product_count, low_stock_count = connection.execute(select(
+            func.coalesce(func.sum(Product.quantity_in_stock * Product.purchase_price), 0),
+            func.count(Product.id),
+            func.count(Product.id).filter(and_(
+                Product.reorder_level.isnot(None),
+                Product.reorder_level != 0,
+                Product.quantity_in_stock <= Product.reorder_level
+            ))
+        )).one()
+
+        invoice_sales_total, invoice_count = connection.execute(select(
+            func.coalesce(func.sum(Invoice.grand_total), 0),
+            func.count(Invoice.id)
+        )).one()
+
+        payments_received_total, payment_count = connection.execute(select(
+            func.coalesce(func.sum(Payment.amount_paid - func.coalesce(Payment.excess_amount, 0)), 0),
+            func.count(Payment.id)
+        )).one()
+
+        direct_sales_total, direct_sale_count = connection.execute(select(
+            func.coalesce(func.sum(SaleNoInvoice.total_amount), 0),
+            func.count(SaleNoInvoice.id)
+        )).one()
+
+        customer_count = connection.execute(select(func.count(Customer.id))).scalar()
+
+        total_purchases = connection.execute(select(func.coalesce(func.sum(PurchaseOrder.total_amount), 0))).scalar()
+
+        return {
+            "invoice_sales_total": invoice_sales_total,
+            "direct_sales_total": direct_sales_total,
+            "total_purchases": total_purchases,
+            "payments_received_total": payments_received_total,
+            "stock_value": stock_value,
+            "product_count": product_count,
+            "customer_count": customer_count,
+            "invoice_count": invoice_count,
+            "payment_count": payment_count,
+            "direct_sale_count": direct_sale_count,
+            "low_stock_count": low_stock_count
+        }
+
+    @staticmethod
+    def rebuild():
+        """
+        Recompute every dashboard metric from the source tables and overwrite the row.
+        Run periodically (src/rebuild_dashboard_metrics.py) to correct drift caused by
+        bulk statements that bypass the ORM write events.
+
+        The scan runs unlocked in a REPEATABLE READ snapshot that also reads the row.
+        Writers commit their rows and their delta together, so a delta the row gained
+        after the snapshot is one the scan missed; it is kept by locking the row only
+        to apply the difference between the scan and the snapshot's row.
+        """
+        table = DashboardMetrics.__table__
+        with db.engine.connect().execution_options(isolation_level="REPEATABLE READ") as connection:
+            with connection.begin():
+                seen = connection.execute(select(table).where(table.c.id == DASHBOARD_METRICS_ROW_ID)).first()
+                totals = DashboardService._aggregates(connection)
+
+        metrics = DashboardMetrics.query.with_for_update().get(DASHBOARD_METRICS_ROW_ID)
+        if metrics is None:
+            metrics = DashboardMetrics(id=DASHBOARD_METRICS_ROW_ID)
+            db.session.add(metrics)
+        for name, value in totals.items():
+            if seen is None:
+                # No row to have taken deltas before the snapshot; a concurrent first build wrote the same scan
+                setattr(metrics, name, value)
+            else:
+                setattr(metrics, name, getattr(metrics, name) + value - getattr(seen, name))
+
+        now = datetime.utcnow()
+        metrics.rebuilt_at = now
+        metrics.updated_at = now
+
+        db.session.commit()
+        return metrics
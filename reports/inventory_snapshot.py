@@ -0,0 +1,21 @@
+from datetime import datetime
+from src.extensions import db
+
+
+class InventorySnapshot(db.Model):
+    """Per-product stock quantity and value captured by the daily snapshot job.
+
+    Every row of one run shares snapshot_date and captured_at. Valuation as of any
+    date starts from the nearest run and applies the stock transactions in between.
+    """
+    __tablename__ = "inventory_snapshots"
+    __table_args__ = (
+        db.Index("ix_inventory_snapshots_captured_at", "captured_at"),
+    )
+
+    snapshot_date = db.Column(db.Date, primary_key=True)
+    product_id = db.Column(db.Integer, primary_key=True)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    unit_cost = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    stock_value = db.Column(db.Numeric(16, 2), nullable=False, default=0)
+    captured_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
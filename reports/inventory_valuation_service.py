@@ -0,0 +1,209 @@
+from datetime import datetime, date, timedelta
+from decimal import Decimal
+from sqlalchemy import func, select, literal
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from src.extensions import db
+from reports.inventory_snapshot import InventorySnapshot
+from products.product import Product
+from stock_transactions.stock_transaction import StockTransaction, signed_quantity
+from purchases.purchase_order import PurchaseOrder, PurchaseOrderItem
+
+
+class InventoryValuationService:
+    @staticmethod
+    def snapshot(snapshot_date=None):
+        """
+        Capture every product's quantity_in_stock and purchase_price in one INSERT ... SELECT.
+        Re-running on the same date replaces that day's snapshot. Returns the row count.
+        """
+        snapshot_date = snapshot_date or date.today()
+        captured_at = datetime.utcnow()
+        table = InventorySnapshot.__table__
+        source = select(
+            literal(snapshot_date).label("snapshot_date"),
+            Product.id.label("product_id"),
+            func.coalesce(Product.quantity_in_stock, 0).label("quantity"),
+            func.coalesce(Product.purchase_price, 0).label("unit_cost"),
+            (func.coalesce(Product.quantity_in_stock, 0) * func.coalesce(Product.purchase_price, 0)).label("stock_value"),
+            literal(captured_at).label("captured_at")
+        )
+        stmt = pg_insert(table).from_select(
+            ["snapshot_date", "product_id", "quantity", "unit_cost", "stock_value", "captured_at"], source
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["snapshot_date", "product_id"],
+            set_={name: stmt.excluded[name] for name in ("quantity", "unit_cost", "stock_value", "captured_at")}
+        )
+        result = db.session.execute(stmt)
+        db.session.commit()
+        return result.rowcount
+
+    @staticmethod
+    def _nearest_snapshot(moment):
+        """(snapshot_date, captured_at) of the run closest to moment, before or after it."""
+        before = db.session.query(InventorySnapshot.snapshot_date, InventorySnapshot.captured_at) \
+            .filter(InventorySnapshot.captured_at <= moment) \
+            .order_by(InventorySnapshot.captured_at.desc()).first()
+        after = db.session.query(InventorySnapshot.snapshot_date, InventorySnapshot.captured_at) \
+            .filter(InventorySnapshot.captured_at > moment) \
+            .order_by(InventorySnapshot.captured_at.asc()).first()
+        if before and after:
+            # Fewer ledger rows to replay from the closer one
+            return before if moment - before.captured_at <= after.captured_at - moment else after
+        return before or after
+
+    @staticmethod
+    def _stock_deltas(start, end):
+        """
+        Net stock change per product for transactions in [start, end), as
+        {product_id: (quantity, value, uncosted_quantity)}. value prices each movement at the
+        unit cost stored on its ledger row; uncosted_quantity is the part moved by rows
+        written before unit costs were recorded, which the caller values at its base cost.
+        """
+        in_range = (StockTransaction.transaction_date >= start, StockTransaction.transaction_date < end)
+        uncosted = StockTransaction.unit_cost.is_(None)
+        rows = db.session.query(
+            StockTransaction.product_id,
+            func.sum(signed_quantity()),
+            func.sum(signed_quantity() * StockTransaction.unit_cost),
+            func.sum(signed_quantity()).filter(uncosted)
+        ).filter(*in_range).group_by(StockTransaction.product_id).all()
+        deltas = {
+            product_id: [int(quantity or 0), Decimal(value or 0), int(uncosted_quantity or 0)]
+            for product_id, quantity, value, uncosted_quantity in rows
+        }
+
+        def add(product_id, quantity, value, uncosted_quantity):
+            delta = deltas.setdefault(product_id, [0, Decimal('0'), 0])
+            delta[0] += quantity
+            delta[1] += value
+            delta[2] += uncosted_quantity
+
+        # A purchase linked by stock_transaction_id is one ledger row on its first product holding
+        # the total quantity; re-attribute it to its order lines (as ledger reconciliation does),
+        # valued at the lines' purchase prices
+        header_quantity = func.abs(StockTransaction.quantity)
+        purchases = db.session.query(
+            StockTransaction.product_id,
+            func.sum(header_quantity),
+            func.sum(header_quantity * StockTransaction.unit_cost),
+            func.sum(header_quantity).filter(uncosted)
+        ).join(PurchaseOrder, PurchaseOrder.stock_transaction_id == StockTransaction.id) \
+            .filter(StockTransaction.transaction_type == "Purchase", *in_range) \
+            .group_by(StockTransaction.product_id).all()
+        lines = db.session.query(
+            PurchaseOrderItem.product_id,
+            func.sum(PurchaseOrderItem.quantity),
+            func.sum(PurchaseOrderItem.quantity * PurchaseOrderItem.purchase_price)
+        ).join(PurchaseOrder, PurchaseOrder.id == PurchaseOrderItem.purchase_order_id) \
+            .join(StockTransaction, StockTransaction.id == PurchaseOrder.stock_transaction_id) \
+            .filter(StockTransaction.transaction_type == "Purchase", *in_range) \
+            .group_by(PurchaseOrderItem.product_id).all()
+        for product_id, quantity, value, uncosted_quantity in purchases:
+            add(product_id, -int(quantity or 0), -Decimal(value or 0), -int(uncosted_quantity or 0))
+        for product_id, quantity, value in lines:
+            add(product_id, int(quantity or 0), Decimal(value or 0), 0)
+        return {product_id: tuple(delta) for product_id, delta in deltas.items() if any(delta)}
+
+    @staticmethod
+    def valuation_as_of(as_of_date, include_products=False):
+        """
+        Stock quantity and value at the end of as_of_date. Starts from the nearest snapshot
+        (or the live products table when no snapshot exists) and applies only the stock
+        transactions between that point and the end of the day. The base stock is valued at
+        the unit cost recorded in the snapshot and each movement at the unit cost on its
+        ledger row, so editing a product's price does not change past valuations.
+        """
+        moment = datetime.combine(as_of_date + timedelta(days=1), datetime.min.time())
+        nearest = InventoryValuationService._nearest_snapshot(moment)
+
+        if nearest:
+            base_date, base_time = nearest
+            base = {
+                row.product_id: (row.quantity, Decimal(row.unit_cost or 0))
+                for row in db.session.query(
+                    InventorySnapshot.product_id, InventorySnapshot.quantity, InventorySnapshot.unit_cost
+                ).filter(InventorySnapshot.snapshot_date == base_date)
+            }
+            source = f"snapshot {base_date.isoformat()}"
+        else:
+            base_time = datetime.utcnow()
+            base = {
+                row.id: (row.quantity_in_stock or 0, Decimal(row.purchase_price or 0))
+                for row in db.session.query(Product.id, Product.quantity_in_stock, Product.purchase_price)
+            }
+            source = "current stock"
+
+        # Roll forward from an earlier base, or back from a later one
+        if base_time <= moment:
+            deltas = InventoryValuationService._stock_deltas(base_time, moment)
+        else:
+            deltas = {
+                pid: (-quantity, -value, -uncosted_quantity)
+                for pid, (quantity, value, uncosted_quantity)
+                in InventoryValuationService._stock_deltas(moment, base_time).items()
+            }
+
+        missing_costs = [pid for pid, delta in deltas.items() if pid not in base and delta[2]]
+        if missing_costs:
+            # Uncosted movements of products created after the base point take their current cost
+            for pid, price in db.session.query(Product.id, Product.purchase_price).filter(Product.id.in_(missing_costs)):
+                base[pid] = (0, Decimal(price or 0))
+
+        total_quantity = 0
+        total_value = Decimal('0')
+        products = []
+        for pid in set(base) | set(deltas):
+            base_quantity, base_cost = base.get(pid, (0, Decimal('0')))
+            moved, moved_value, uncosted_quantity = deltas.get(pid, (0, Decimal('0'), 0))
+            # Not clamped: stock written off below zero was recorded that way in the snapshot too
+            quantity = base_quantity + moved
+            value = base_cost * (base_quantity + uncosted_quantity) + moved_value
+            total_quantity += quantity
+            total_value += value
+            if include_products and quantity:
+                products.append({
+                    "product_id": pid,
+                    "quantity": quantity,
+                    "unit_cost": float(value / quantity),
+                    "stock_value": float(value)
+                })
+
+        valuation = {
+            "as_of_date": as_of_date.isoformat(),
+            "based_on": source,
+            "base_captured_at": base_time.isoformat(),
+            "products_with_movements": len(deltas),
+            "total_quantity": total_quantity,
+            "total_stock_value": total_value
+        }
+        if include_products:
+            valuation["products"] = sorted(products, key=lambda p: p["stock_value"], reverse=True)
+        return valuation
+
+    @staticmethod
+    def stock_value_as_of(as_of_date):
+        return InventoryValuationService.valuation_as_of(as_of_date)["total_stock_value"]
+
+    @staticmethod
+    def purchase_total(start, end_exclusive=None):
+        """Purchase order totals dated in [start, end_exclusive), served by ix_purchase_orders_purchase_date."""
+        query = db.session.query(func.coalesce(func.sum(PurchaseOrder.total_amount), 0)).filter(
+            PurchaseOrder.purchase_date >= start
+        )
+        if end_exclusive:
+            query = query.filter(PurchaseOrder.purchase_date < end_exclusive)
+        return Decimal(query.scalar())
+
+    @staticmethod
+    def cost_of_goods_sold(start_date, end_date):
+        """Opening value + purchases - closing value over [start_date, end_date]."""
+        opening = InventoryValuationService.stock_value_as_of(start_date - timedelta(days=1))
+        closing = InventoryValuationService.stock_value_as_of(end_date)
+        purchases = InventoryValuationService.purchase_total(start_date, end_date + timedelta(days=1))
+        return {
+            "opening_stock_value": opening,
+            "purchases": purchases,
+            "closing_stock_value": closing,
+            "cost_of_goods_sold": opening + purchases - closing
+        }
@@ -0,0 +1,157 @@
+import math
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, cast, Date
+from src.extensions import db
+from products.product import Product
+from category.category import Category
+from suppliers.supplier import Supplier
+from stock_transactions.stock_transaction import StockTransaction
+
+DEFAULT_WINDOW_DAYS = 90
+DEFAULT_LEAD_TIME_DAYS = 7
+# Days of demand an order should cover beyond the lead time
+DEFAULT_REVIEW_DAYS = 14
+# z-score for ~95% cycle service level
+DEFAULT_SERVICE_LEVEL_Z = 1.65
+
+
+class ReorderService:
+    @staticmethod
+    def _load_products():
+        rows = db.session.query(
+            Product.id.label("product_id"),
+            Product.product_name,
+            Product.sku,
+            Product.unit_of_measure,
+            Product.quantity_in_stock,
+            Product.reorder_level,
+            Product.max_stock_level,
+            Product.purchase_price,
+            Product.supplier_id,
+            Category.name.label("category_name"),
+            Supplier.name.label("supplier_name")
+        ).outerjoin(Category, Category.id == Product.category_id) \
+            .outerjoin(Supplier, Supplier.id == Product.supplier_id).all()
+        columns = ["product_id", "product_name", "sku", "unit_of_measure", "quantity_in_stock", "reorder_level",
+                   "max_stock_level", "purchase_price", "supplier_id", "category_name", "supplier_name"]
+        return pd.DataFrame.from_records(rows, columns=columns)
+
+    @staticmethod
+    def _load_daily_sales(since):
+        """Units sold per product per day. Sale rows are stored with either sign, so use abs()."""
+        day = cast(StockTransaction.transaction_date, Date)
+        rows = db.session.query(
+            StockTransaction.product_id,
+            day.label("day"),
+            func.sum(func.abs(StockTransaction.quantity)).label("units")
+        ).filter(
+            StockTransaction.transaction_type == "Sale",
+            StockTransaction.transaction_date >= since
+        ).group_by(StockTransaction.product_id, day).all()
+        return pd.DataFrame.from_records(rows, columns=["product_id", "day", "units"])
+
+    @staticmethod
+    def compute_suggestions(window_days=DEFAULT_WINDOW_DAYS, lead_time_days=DEFAULT_LEAD_TIME_DAYS,
+                            review_days=DEFAULT_REVIEW_DAYS, service_level_z=DEFAULT_SERVICE_LEVEL_Z):
+        """
+        Reorder suggestions from trailing sales velocity.
+
+        For each product: velocity (units/day) and its daily standard deviation over the
+        window, days of cover, safety stock = z * std * sqrt(lead time), and a reorder
+        point of lead-time demand plus safety stock (never below reorder_level). Products
+        at or below their reorder point are topped up to cover lead time + review period,
+        never past max_stock_level. Returns (items, draft purchase orders by supplier).
+        """
+        if window_days < 2:
+            raise ValueError("window_days must be at least 2")
+        products = ReorderService._load_products()
+        if products.empty:
+            return [], []
+        since = datetime.combine(datetime.utcnow().date() - timedelta(days=window_days - 1), datetime.min.time())
+        sales = ReorderService._load_daily_sales(since)
+
+        # Sum and sum of squares of daily units; days without sales count as zeros
+        sales["units"] = sales["units"].astype(float)
+        sales["units_sq"] = sales["units"] ** 2
+        demand = sales.groupby("product_id")[["units", "units_sq"]].sum()
+        products = products.join(demand, on="product_id")
+        products[["units", "units_sq"]] = products[["units", "units_sq"]].fillna(0.0)
+
+        n = float(window_days)
+        stock = products["quantity_in_stock"].fillna(0).astype(float)
+        reorder_level = products["reorder_level"].fillna(0).astype(float)
+        max_stock = products["max_stock_level"].astype(float)  # NaN when unset
+        price = products["purchase_price"].fillna(0).astype(float)
+
+        velocity = products["units"] / n
+        variance = ((products["units_sq"] - n * velocity ** 2) / (n - 1)).clip(lower=0)
+        demand_std = np.sqrt(variance)
+        safety_stock = service_level_z * demand_std * math.sqrt(lead_time_days)
+        reorder_point = np.maximum(velocity * lead_time_days + safety_stock, reorder_level)
+        days_of_cover = (stock / velocity).where(velocity > 0)
+
+        # Order up to lead time + review demand; products with little demand still get
+        # the previous rule's top-up of max(shortage, reorder_level)
+        demand_target = velocity * (lead_time_days + review_days) + safety_stock
+        legacy_target = stock + np.maximum(reorder_level - stock, reorder_level)
+        target = np.maximum(demand_target, legacy_target)
+        target = target.where(max_stock.isna(), np.minimum(target, max_stock))
+
+        needs_reorder = (stock <= reorder_point) & ((reorder_level > 0) | (velocity > 0))
+        suggested = np.ceil(target - stock).clip(lower=0).where(needs_reorder, 0).astype(int)
+
+        products = products.assign(
+            velocity=velocity, demand_std=demand_std, safety_stock=safety_stock, reorder_point=reorder_point,
+            days_of_cover=days_of_cover, suggested_order_qty=suggested, order_value=suggested * price,
+            shortage=(reorder_point - stock).clip(lower=0), purchase_price=price, stock=stock
+        )
+        selected = products[needs_reorder & (suggested > 0)] \
+            .sort_values(["days_of_cover", "shortage"], ascending=[True, False], na_position="last")
+
+        items = [{
+            "product_id": int(row.product_id),
+            "product_name": row.product_name,
+            "sku": row.sku,
+            "category_name": row.category_name,
+            "supplier_id": int(row.supplier_id) if pd.notna(row.supplier_id) else None,
+            "supplier_name": row.supplier_name,
+            "current_stock": int(row.stock),
+            "reorder_level": int(row.reorder_level) if pd.notna(row.reorder_level) else None,
+            "max_stock_level": int(row.max_stock_level) if pd.notna(row.max_stock_level) else None,
+            "sales_velocity_per_day": round(float(row.velocity), 3),
+            "demand_std_per_day": round(float(row.demand_std), 3),
+            "days_of_cover": round(float(row.days_of_cover), 1) if pd.notna(row.days_of_cover) else None,
+            "safety_stock": math.ceil(row.safety_stock),
+            "reorder_point": math.ceil(row.reorder_point),
+            "shortage": math.ceil(row.shortage),
+            "suggested_order_qty": int(row.suggested_order_qty),
+            "purchase_price": float(row.purchase_price),
+            "order_value": round(float(row.order_value), 2),
+            "unit_of_measure": row.unit_of_measure
+        } for row in selected.itertuples(index=False)]
+
+        orders = {}
+        for item in items:
+            order = orders.setdefault(item["supplier_id"], {
+                "supplier_id": item["supplier_id"],
+                "supplier_name": item["supplier_name"],
+                "status": "Draft",
+                "total_quantity": 0,
+                "total_value": 0.0,
+                "items": []
+            })
+            order["items"].append({
+                "product_id": item["product_id"],
+                "product_name": item["product_name"],
+                "sku": item["sku"],
+                "quantity": item["suggested_order_qty"],
+                "unit_price": item["purchase_price"],
+                "line_total": item["order_value"]
+            })
+            order["total_quantity"] += item["suggested_order_qty"]
+            order["total_value"] = round(order["total_value"] + item["order_value"], 2)
+
+        draft_orders = sorted(orders.values(), key=lambda o: o["total_value"], reverse=True)
+        return items, draft_orders
@@ -1,12 +1,20 @@
-from extensions import db
+from src.extensions import db
 from datetime import datetime
 from sqlalchemy import Numeric
 
+# Report job statuses
+REPORT_STATUS_PENDING = 'Pending'
+REPORT_STATUS_RUNNING = 'Running'
+REPORT_STATUS_COMPLETED = 'Completed'
+REPORT_STATUS_FAILED = 'Failed'
+
 class Report(db.Model):
     __tablename__ = 'reports'
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     report_name = db.Column(db.String(100), nullable=False)
+    report_type = db.Column(db.String(50), nullable=True)  # sales / stock / profit_loss
+    status = db.Column(db.String(20), nullable=False, default=REPORT_STATUS_PENDING)
     generated_by = db.Column(db.String(50), default='Admin')
     date_range_start = db.Column(db.Date, nullable=False)
     date_range_end = db.Column(db.Date, nullable=False)
@@ -16,6 +24,13 @@ class Report(db.Model):
     closing_stock_value = db.Column(Numeric(15,2), default=0.00)
     profit_loss_amount = db.Column(Numeric(15,2), default=0.00)
     generated_date = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    completed_at = db.Column(db.DateTime, nullable=True)
+    duration_ms = db.Column(db.Integer, nullable=True)
+    # Touched periodically by the process holding a Pending/Running job; see ReportJobService
+    heartbeat_at = db.Column(db.DateTime, nullable=True, default=datetime.utcnow)
+    error_message = db.Column(db.Text, nullable=True)
     report_data = db.Column(db.JSON)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
\ No newline at end of file
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
@@ -0,0 +1,205 @@
+import threading
+from functools import wraps
+from cachetools import TTLCache
+from flask import Response, request
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+from src.pg_listener import PgListener
+
+# How long a report result may be served without any write invalidating it
+REPORT_CACHE_TTL = 300
+REPORT_CACHE_MAXSIZE = 256
+# How long a request waits for an identical in-flight computation before computing itself
+INFLIGHT_WAIT_SECONDS = 60
+NOTIFY_CHANNEL = "report_cache_changes"
+# Keeps each NOTIFY payload well under Postgres' 8000 byte limit
+NOTIFY_TAGS_PER_MESSAGE = 200
+
+
+class ReportCache:
+    """Process-local cache of rendered report responses.
+
+    Entries are keyed by endpoint name plus normalized query parameters and tagged
+    with the table names the report reads. A commit writing to a tagged table sends
+    the tags on a NOTIFY, so every worker drops the entries carrying them. While
+    this process is not listening nothing is cached. TTL bounds staleness from
+    writes that are not tagged. Identical concurrent misses share one computation.
+    """
+
+    def __init__(self, maxsize=REPORT_CACHE_MAXSIZE, ttl=REPORT_CACHE_TTL):
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._keys_by_tag = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.ttl = ttl
+        self._listener = PgListener(NOTIFY_CHANNEL, self._apply, self.clear, name="report-cache-listener")
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "invalidations": 0}
+
+    @staticmethod
+    def make_key(name, params):
+        normalized = sorted(
+            (k.lower(), str(v).strip().lower()) for k, v in params.items()
+            if v is not None and str(v).strip() != ""
+        )
+        return name + "?" + "&".join(f"{k}={v}" for k, v in normalized)
+
+    def get_or_compute(self, key, tags, compute):
+        """Return (value, status) where status is HIT, MISS or COALESCED."""
+        self._listener.ensure_started()
+        with self._lock:
+            if key in self._entries:
+                self.stats["hits"] += 1
+                return self._entries[key], "HIT"
+            waiter = self._inflight.get(key)
+            if waiter is None:
+                waiter = self._inflight[key] = threading.Event()
+                for tag in tags:
+                    self._keys_by_tag.setdefault(tag, set()).add(key)
+                leader = True
+            else:
+                leader = False
+
+        if not leader:
+            waiter.wait(INFLIGHT_WAIT_SECONDS)
+            with self._lock:
+                if key in self._entries:
+                    self.stats["coalesced"] += 1
+                    return self._entries[key], "COALESCED"
+            # The leader failed or produced an uncacheable result; compute independently
+            with self._lock:
+                self.stats["misses"] += 1
+            return compute(), "MISS"
+
+        try:
+            with self._lock:
+                self.stats["misses"] += 1
+            value, cacheable = compute()
+            if cacheable:
+                with self._lock:
+                    # A write may have invalidated the tags while we computed; only
+                    # store if this computation still owns the in-flight slot
+                    if self._inflight.get(key) is waiter and self._listener.listening:
+                        self._entries[key] = (value, cacheable)
+                        self._prune_tag_index()
+            return (value, cacheable), "MISS"
+        finally:
+            with self._lock:
+                if self._inflight.get(key) is waiter:
+                    del self._inflight[key]
+            waiter.set()
+
+    def invalidate(self, *tags):
+        with self._lock:
+            for tag in tags:
+                for key in self._keys_by_tag.pop(tag, ()):
+                    if self._entries.pop(key, None) is not None:
+                        self.stats["invalidations"] += 1
+                    # A result computed from pre-write data must not be stored afterwards
+                    self._inflight.pop(key, None)
+
+    def _prune_tag_index(self):
+        # Expiry and eviction in the TTLCache do not touch the tag index; once it holds
+        # well over a cache's worth of keys, drop those with no entry or computation left
+        if sum(len(keys) for keys in self._keys_by_tag.values()) <= 2 * self._entries.maxsize:
+            return
+        for tag in list(self._keys_by_tag):
+            live = {key for key in self._keys_by_tag[tag] if key in self._entries or key in self._inflight}
+            if live:
+                self._keys_by_tag[tag] = live
+            else:
+                del self._keys_by_tag[tag]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_tag.clear()
+            self._inflight.clear()
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"] + self.stats["coalesced"]
+            served_from_cache = self.stats["hits"] + self.stats["coalesced"]
+            return dict(
+                self.stats,
+                entries=len(self._entries),
+                inflight=len(self._inflight),
+                reconnects=self._listener.reconnects,
+                listening=self._listener.listening,
+                ttl_seconds=self.ttl,
+                hit_ratio=round(served_from_cache / lookups, 4) if lookups else 0.0
+            )
+
+    def _apply(self, payload):
+        self.invalidate(*[tag for tag in payload.split(",") if tag])
+
+
+report_cache = ReportCache()
+
+
+def notify_report_change(connection, tags):
+    """
+    Announce written tags on connection's transaction; Postgres delivers them to every
+    worker once it commits. Sent for every commit that collected report_cache_tables.
+    """
+    tags = sorted(tags)
+    for start in range(0, len(tags), NOTIFY_TAGS_PER_MESSAGE):
+        connection.execute(text("SELECT pg_notify(:channel, :payload)"), {
+            "channel": NOTIFY_CHANNEL, "payload": ",".join(tags[start:start + NOTIFY_TAGS_PER_MESSAGE])
+        })
+
+
+def cached_report(name, tags, params=()):
+    """
+    Cache a report view's 200 responses under name + the given query parameters.
+    Apply below require_permission_jwt so permissions are checked on every request.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = ReportCache.make_key(name, {p: request.args.get(p) for p in params})
+
+            def compute():
+                result = view(*args, **kwargs)
+                response, status = result if isinstance(result, tuple) else (result, 200)
+                return (response.get_data(), response.mimetype, status), status == 200
+
+            (cached, _), cache_status = report_cache.get_or_compute(key, tags, compute)
+            body, mimetype, status = cached
+            response = Response(body, status=status, mimetype=mimetype)
+            response.headers["X-Report-Cache"] = cache_status
+            return response
+        return wrapper
+    return decorator
+
+
+# Collect the tables touched by each flush and invalidate once the transaction commits
+@event.listens_for(Session, "after_flush")
+def _collect_written_tables(session, flush_context):
+    tables = session.info.setdefault("report_cache_tables", set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        table = getattr(obj, "__tablename__", None)
+        if table:
+            tables.add(table)
+
+
+# Bulk statements that bypass the ORM add their tables to session.info["report_cache_tables"]
+@event.listens_for(Session, "before_commit")
+def _announce_written_tables(session):
+    # Flush here so the tags of the commit's own flush are announced too
+    session.flush()
+    tables = session.info.get("report_cache_tables")
+    if tables:
+        notify_report_change(session.connection(), tables)
+
+
+# The NOTIFY reaches this process too, but evict at once rather than a poll later
+@event.listens_for(Session, "after_commit")
+def _invalidate_written_tables(session):
+    tables = session.info.pop("report_cache_tables", None)
+    if tables:
+        report_cache.invalidate(*tables)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_written_tables(session):
+    session.info.pop("report_cache_tables", None)
@@ -0,0 +1,208 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import json
+from sqlalchemy import func
+from src.extensions import db
+from reports.report import (
+    Report, REPORT_STATUS_PENDING, REPORT_STATUS_RUNNING, REPORT_STATUS_COMPLETED, REPORT_STATUS_FAILED
+)
+from reports.report_service import ReportService
+from reports.sales_fact_service import SalesFactService
+from reports.daily_sales_fact import CHANNEL_INVOICE, CHANNEL_DIRECT
+from reports.inventory_valuation_service import InventoryValuationService
+
+REPORT_TYPES = {
+    "sales": "Sales Report",
+    "stock": "Stock Report",
+    "profit_loss": "Profit & Loss Report",
+}
+
+logger = logging.getLogger(__name__)
+
+# Jobs run off the request thread; two workers keep long reports from starving the database
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="report-job")
+# The process holding a job, queued or running, touches its heartbeat this often; a job
+# whose heartbeat is older than STALE_JOB_AFTER lost its process to a restart or crash
+HEARTBEAT_SECONDS = 60
+STALE_JOB_AFTER = timedelta(minutes=5)
+
+# Ids of the jobs this process has queued and not finished
+_held_jobs = set()
+_monitor_lock = threading.Lock()
+_monitor_pid = None
+
+
+class ReportJobService:
+    @staticmethod
+    def submit(app, report_type, start_date, end_date, generated_by='Admin'):
+        """Create a Pending Report row and queue its generation. Returns the row."""
+        if report_type not in REPORT_TYPES:
+            raise ValueError(f"Invalid report_type. Use one of: {', '.join(REPORT_TYPES)}")
+        if start_date > end_date:
+            raise ValueError("start_date must be on or before end_date")
+
+        report = Report(
+            report_name=REPORT_TYPES[report_type],
+            report_type=report_type,
+            status=REPORT_STATUS_PENDING,
+            generated_by=generated_by,
+            date_range_start=start_date,
+            date_range_end=end_date
+        )
+        db.session.add(report)
+        db.session.commit()
+
+        ReportJobService.ensure_monitor(app)
+        with _monitor_lock:
+            _held_jobs.add(report.id)
+        _executor.submit(ReportJobService._run, app, report.id)
+        return report
+
+    @staticmethod
+    def ensure_monitor(app):
+        """Start this process's heartbeat and stale-job sweep unless it is already running."""
+        global _monitor_pid
+        # Threads do not survive gunicorn's fork of a preloaded app
+        pid = os.getpid()
+        if _monitor_pid == pid:
+            return
+        with _monitor_lock:
+            if _monitor_pid == pid:
+                return
+            _monitor_pid = pid
+            _held_jobs.clear()
+        threading.Thread(target=ReportJobService._monitor, args=(app,), name="report-job-monitor",
+                         daemon=True).start()
+
+    @staticmethod
+    def _monitor(app):
+        while True:
+            try:
+                with app.app_context():
+                    ReportJobService.heartbeat()
+                    ReportJobService.fail_stale()
+            except Exception:
+                logger.exception("Report job heartbeat failed")
+            time.sleep(HEARTBEAT_SECONDS)
+
+    @staticmethod
+    def heartbeat(now=None):
+        """Touch the heartbeat of every job this process holds."""
+        with _monitor_lock:
+            held = list(_held_jobs)
+        if held:
+            Report.query.filter(Report.id.in_(held)).update(
+                {Report.heartbeat_at: now or datetime.utcnow()}, synchronize_session=False
+            )
+            db.session.commit()
+
+    @staticmethod
+    def fail_stale(now=None):
+        """Mark Pending/Running jobs whose heartbeat stopped as Failed. Returns the count."""
+        now = now or datetime.utcnow()
+        count = Report.query.filter(
+            Report.status.in_([REPORT_STATUS_PENDING, REPORT_STATUS_RUNNING]),
+            func.coalesce(Report.heartbeat_at, Report.created_at) < now - STALE_JOB_AFTER
+        ).update({
+            Report.status: REPORT_STATUS_FAILED,
+            Report.error_message: "Report job was interrupted before it finished",
+            Report.completed_at: now,
+            Report.generated_date: now
+        }, synchronize_session=False)
+        if count:
+            db.session.commit()
+        else:
+            db.session.rollback()
+        return count
+
+    @staticmethod
+    def _run(app, report_id):
+        try:
+            ReportJobService._generate(app, report_id)
+        finally:
+            with _monitor_lock:
+                _held_jobs.discard(report_id)
+
+    @staticmethod
+    def _generate(app, report_id):
+        with app.app_context():
+            report = Report.query.get(report_id)
+            if report is None:
+                return
+            report.status = REPORT_STATUS_RUNNING
+            report.started_at = datetime.utcnow()
+            db.session.commit()
+
+            started = time.monotonic()
+            try:
+                start_date, end_date = report.date_range_start, report.date_range_end
+                if report.report_type == "sales":
+                    report_data = ReportService.generate_sales_report(start_date, end_date)
+                elif report.report_type == "stock":
+                    report_data = ReportService.generate_stock_report()
+                else:
+                    report_data = ReportService.generate_profit_loss_report(start_date, end_date)
+                # Round-trip through Flask's encoder so Decimals and dates fit the JSON column
+                report.report_data = json.loads(json.dumps(report_data))
+
+                for column, value in ReportJobService.summary_columns(start_date, end_date).items():
+                    setattr(report, column, value)
+                report.status = REPORT_STATUS_COMPLETED
+                report.error_message = None
+            except Exception as e:
+                db.session.rollback()
+                report = Report.query.get(report_id)
+                report.status = REPORT_STATUS_FAILED
+                report.error_message = str(e)
+            finally:
+                report.completed_at = datetime.utcnow()
+                report.generated_date = report.completed_at
+                report.duration_ms = int((time.monotonic() - started) * 1000)
+                db.session.commit()
+
+    @staticmethod
+    def summary_columns(start_date, end_date):
+        """Headline figures stored on the Report row; stock values come from inventory snapshots."""
+        totals = SalesFactService.summarize(start_date, end_date)[0]
+        sales = SalesFactService.summarize(start_date, end_date, channel=[CHANNEL_INVOICE, CHANNEL_DIRECT])[0]
+        stock = InventoryValuationService.cost_of_goods_sold(start_date, end_date)
+
+        return {
+            "total_sales_amount": sales["revenue"],
+            "total_purchases_amount": stock["purchases"],
+            "profit_loss_amount": totals["gross_amount"] - totals["cost_amount"]
+                                  - totals["returns_loss"] - totals["damage_cost"],
+            "opening_stock_value": stock["opening_stock_value"],
+            "closing_stock_value": stock["closing_stock_value"],
+        }
+
+    @staticmethod
+    def to_response(report, include_data=True):
+        data = {
+            "id": report.id,
+            "report_name": report.report_name,
+            "report_type": report.report_type,
+            "status": report.status,
+            "generated_by": report.generated_by,
+            "date_range": {
+                "start_date": report.date_range_start.isoformat() if report.date_range_start else None,
+                "end_date": report.date_range_end.isoformat() if report.date_range_end else None
+            },
+            "total_sales_amount": float(report.total_sales_amount or 0),
+            "total_purchases_amount": float(report.total_purchases_amount or 0),
+            "opening_stock_value": float(report.opening_stock_value or 0),
+            "closing_stock_value": float(report.closing_stock_value or 0),
+            "profit_loss_amount": float(report.profit_loss_amount or 0),
+            "generated_date": report.generated_date.isoformat() if report.generated_date else None,
+            "started_at": report.started_at.isoformat() if report.started_at else None,
+            "completed_at": report.completed_at.isoformat() if report.completed_at else None,
+            "duration_ms": report.duration_ms,
+            "error": report.error_message
+        }
+        if include_data:
+            data["report_data"] = report.report_data
+        return data
@@ -1,8 +1,10 @@
 from flask import Blueprint, request, jsonify
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from src.extensions import db
 from reports.report import Report
 from reports.report_service import ReportService
+from reports.report_cache import report_cache, cached_report
+from reports.stock_movement_service import StockMovementService, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 from products.product import Product
 from invoices.invoice import Invoice
 from customers.customer import Customer
@@ -17,13 +19,22 @@ bp = Blueprint("reports", __name__)
 @require_permission_jwt('reports', 'read')
 def get_sales_report():
     try:
-        report_data = ReportService.generate_sales_report()
+        start_date = request.args.get('start_date')
+        end_date = request.args.get('end_date')
+        
+        if start_date:
+            start_date = datetime.strptime(start_date, "%Y-%m-%d").date()
+        if end_date:
+            end_date = datetime.strptime(end_date, "%Y-%m-%d").date()
+            
+        report_data = ReportService.generate_sales_report(start_date, end_date)
         return jsonify(report_data), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @bp.route("/stock", methods=["GET"])
 @require_permission_jwt('reports', 'read')
+@cached_report("stock", tags=("products", "categories", "damaged_products"))
 def get_stock_report():
     try:
         report_data = ReportService.generate_stock_report()
@@ -33,6 +44,9 @@ def get_stock_report():
 
 @bp.route("/profit-loss", methods=["GET"])
 @require_permission_jwt('reports', 'read')
+@cached_report("profit-loss", params=("start_date", "end_date"),
+               tags=("invoices", "invoice_items", "sales_no_invoice", "product_returns",
+                     "damaged_products", "daily_sales_facts"))
 def get_profit_loss_report():
     try:
         # Get date parameters from query string
@@ -49,6 +63,109 @@ def get_profit_loss_report():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@bp.route("/sales-facts/backfill", methods=["POST"])
+@require_permission_jwt('reports', 'write')
+def backfill_sales_facts():
+    from reports.sales_fact_service import SalesFactService
+    data = request.get_json(silent=True) or {}
+    try:
+        start_date = datetime.strptime(data["start_date"], "%Y-%m-%d").date() if data.get("start_date") else None
+        end_date = datetime.strptime(data["end_date"], "%Y-%m-%d").date() if data.get("end_date") else None
+        SalesFactService.backfill(start_date, end_date)
+        return jsonify({
+            "message": "Daily sales facts rebuilt successfully",
+            "start_date": start_date.isoformat() if start_date else None,
+            "end_date": end_date.isoformat() if end_date else None
+        }), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+@bp.route("/sales-timeseries", methods=["GET"])
+@require_permission_jwt('reports', 'read')
+def get_sales_timeseries():
+    from reports.timeseries_service import TimeseriesService
+    try:
+        granularity = request.args.get('granularity', 'month').lower()
+        end_date = request.args.get('end_date')
+        start_date = request.args.get('start_date')
+        
+        end_date = datetime.strptime(end_date, "%Y-%m-%d").date() if end_date else date.today()
+        if start_date:
+            start_date = datetime.strptime(start_date, "%Y-%m-%d").date()
+        else:
+            start_date = end_date.replace(day=1, year=end_date.year - 1)
+        
+        series = TimeseriesService.get_sales_series(granularity, start_date, end_date)
+        return jsonify({
+            "report_name": "Sales Time Series",
+            "granularity": granularity,
+            "date_range": {
+                "start_date": series[0]["period_start"] if series else start_date.isoformat(),
+                "end_date": series[-1]["period_end"] if series else end_date.isoformat()
+            },
+            "totals": {
+                "revenue": round(sum(b["revenue"] for b in series), 2),
+                "tax_amount": round(sum(b["tax_amount"] for b in series), 2),
+                "invoice_count": sum(b["invoice_count"] for b in series),
+                "direct_sales_total": round(sum(b["direct_sales_total"] for b in series), 2)
+            },
+            "series": series
+        }), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+@bp.route("/stock-valuation", methods=["GET"])
+@require_permission_jwt('reports', 'read')
+def get_stock_valuation():
+    from reports.inventory_valuation_service import InventoryValuationService
+    try:
+        as_of = request.args.get('as_of')
+        start_date = request.args.get('start_date')
+        include_products = request.args.get('details', 'false').lower() == 'true'
+        
+        as_of = datetime.strptime(as_of, "%Y-%m-%d").date() if as_of else date.today()
+        valuation = InventoryValuationService.valuation_as_of(as_of, include_products=include_products)
+        valuation["total_stock_value"] = float(valuation["total_stock_value"])
+        
+        # COGS for [start_date, as_of] when a period start is given
+        if start_date:
+            start_date = datetime.strptime(start_date, "%Y-%m-%d").date()
+            if start_date > as_of:
+                return jsonify({"error": "start_date must be on or before as_of"}), 400
+            cogs = InventoryValuationService.cost_of_goods_sold(start_date, as_of)
+            valuation["period"] = {
+                "start_date": start_date.isoformat(),
+                "end_date": as_of.isoformat(),
+                **{name: float(value) for name, value in cogs.items()}
+            }
+        
+        return jsonify(valuation), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@bp.route("/inventory-snapshots", methods=["POST"])
+@require_permission_jwt('reports', 'write')
+def create_inventory_snapshot():
+    from reports.inventory_valuation_service import InventoryValuationService
+    try:
+        rows = InventoryValuationService.snapshot()
+        return jsonify({
+            "message": "Inventory snapshot captured",
+            "snapshot_date": date.today().isoformat(),
+            "products": rows
+        }), 201
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
 @bp.route("/dashboard-test", methods=["GET"])
 @require_permission_jwt('reports', 'read')
 def get_dashboard_test():
@@ -73,56 +190,63 @@ def get_dashboard_test():
 @bp.route("/dashboard", methods=["GET"])
 @require_permission_jwt('reports', 'read')
 def get_dashboard_report():
-    products_count = Product.query.count()
-    customers_count = Customer.query.count()
-    invoices_count = Invoice.query.count()
-    
-    total_sales = float(db.session.query(func.coalesce(func.sum(Invoice.grand_total), 0)).scalar())
-    
-    products = Product.query.all()
-    stock_value = sum([p.quantity_in_stock * float(p.purchase_price or 0) for p in products])
-    
-    from stock_transactions.stock_transaction import StockTransaction
-    import json
-    purchase_transactions = StockTransaction.query.filter_by(transaction_type="Purchase").all()
-    total_purchases = 0
-    for pt in purchase_transactions:
-        if pt.notes:
-            try:
-                payment_info = json.loads(pt.notes)
-                total_purchases += float(payment_info.get("total_amount", 0))
-            except:
-                pass
+    from reports.dashboard_service import DashboardService
+    metrics = DashboardService.get_metrics()
     
+    total_sales = float(metrics.invoice_sales_total)
+    total_purchases = float(metrics.total_purchases)
     net_amount = total_sales - total_purchases
     profit_loss_status = "Profit" if net_amount >= 0 else "Loss"
     
+    # Revenue for the last four months, oldest first
+    from reports.timeseries_service import TimeseriesService
+    today = date.today()
+    four_months_ago = (today.replace(day=1) - timedelta(days=80)).replace(day=1)
+    monthly_series = TimeseriesService.get_sales_series("month", four_months_ago, today)[-4:]
+    
     return jsonify({
         "dashboard_summary": {
             "report_id": f"DASH-{datetime.now().strftime('%Y-%m-%d')}",
             "generated_date": datetime.now().isoformat(),
-            "period": "Current Month"
+            "period": "Current Month",
+            "metrics_updated_at": metrics.updated_at.isoformat() if metrics.updated_at else None,
+            "metrics_rebuilt_at": metrics.rebuilt_at.isoformat() if metrics.rebuilt_at else None
         },
         "key_metrics": {
             "total_sales": f"{total_sales:.2f}",
             "total_purchases": f"{total_purchases:.2f}",
             "net_profit": f"{abs(net_amount):.2f}",
             "profit_loss_status": profit_loss_status,
-            "stock_value": f"{stock_value:.2f}"
+            "stock_value": f"{float(metrics.stock_value):.2f}"
         },
         "quick_stats": {
-            "active_customers": customers_count,
-            "total_products": products_count,
-            "pending_payments": "0.00",
-            "low_stock_alerts": len([p for p in products if p.reorder_level and p.quantity_in_stock <= p.reorder_level])
+            "active_customers": metrics.customer_count,
+            "total_products": metrics.product_count,
+            "pending_payments": f"{float(metrics.pending_payments):.2f}",
+            "low_stock_alerts": metrics.low_stock_count
         },
         "recent_activity": [],
         "charts_data": {
-            "monthly_sales": [0, 0, 0, f"{total_sales:.2f}"] if total_sales > 0 else [0, 0, 0, 0],
-            "payment_methods": {"cash": max(1, Payment.query.count())}
+            "monthly_sales": [f"{month['revenue']:.2f}" for month in monthly_series],
+            "payment_methods": {"cash": max(1, metrics.payment_count)}
         }
     }), 200
 
+
+@bp.route("/dashboard/rebuild", methods=["POST"])
+@require_permission_jwt('reports', 'write')
+def rebuild_dashboard_metrics():
+    from reports.dashboard_service import DashboardService
+    try:
+        metrics = DashboardService.rebuild()
+        return jsonify({
+            "message": "Dashboard metrics rebuilt successfully",
+            "rebuilt_at": metrics.rebuilt_at.isoformat()
+        }), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
 @bp.route("/", methods=["GET"])
 @require_permission_jwt('reports', 'read')
 def list_reports():
@@ -187,6 +311,7 @@ def get_sales_no_invoice_report():
 
 @bp.route("/invoices", methods=["GET"])
 @require_permission_jwt('reports', 'read')
+@cached_report("invoices", params=("details",), tags=("invoices", "payments", "customers"))
 def get_invoices_report():
     try:
         invoices = Invoice.query.all()
@@ -294,100 +419,47 @@ def get_stock_movement_report():
         location = request.args.get('location')
         date_from = request.args.get('date_from')
         date_to = request.args.get('date_to')
-        
-        from stock_transactions.stock_transaction import StockTransaction
-        from products.product import Product
-        from invoices.invoice_item import InvoiceItem
-        from customers.customer import Customer
-        from suppliers.supplier import Supplier
-        from datetime import datetime
-        from sqlalchemy import func, desc
+        limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+        cursor = request.args.get('cursor')
         
         # Get date range
         if date_from:
             date_from_obj = datetime.strptime(date_from, "%Y-%m-%d")
         else:
-            date_from_obj = datetime.now().replace(day=1)  # Start of current month
+            date_from_obj = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)  # Start of current month
             
         if date_to:
             date_to_obj = datetime.strptime(date_to, "%Y-%m-%d")
         else:
             date_to_obj = datetime.now()
+        # date_to is inclusive: include every transaction on that day
+        date_to_end = datetime.combine(date_to_obj.date(), datetime.min.time()) + timedelta(days=1)
         
-        # Get frequently sold products (top 10)
-        frequently_sold = db.session.query(
-            InvoiceItem.product_id,
-            func.sum(InvoiceItem.quantity).label('total_sold')
-        ).group_by(InvoiceItem.product_id).order_by(desc('total_sold')).limit(10).all()
-        
-        frequently_sold_ids = [item.product_id for item in frequently_sold]
+        frequently_sold = StockMovementService.get_frequently_sold()
+        frequently_sold_ids = {item.product_id for item in frequently_sold}
         
-        # Get stock transactions for the period
-        query = StockTransaction.query.filter(
-            StockTransaction.transaction_date >= date_from_obj,
-            StockTransaction.transaction_date <= date_to_obj
+        rows, next_cursor = StockMovementService.get_movements(
+            date_from_obj, date_to_end, location=location, limit=limit, cursor=cursor
         )
         
-        transactions = query.order_by(StockTransaction.transaction_date.desc()).all()
-        
-        stock_movements = []
-        filtered_transactions = []
-        
-        for t in transactions:
-            product = Product.query.get(t.product_id)
-            supplier = Supplier.query.get(t.supplier_id) if t.supplier_id else None
-            
-            # Get customer info from invoice if available
-            customer = None
-            customer_location = None
-            if t.invoice_id:
-                invoice = Invoice.query.get(t.invoice_id)
-                if invoice and invoice.customer_id:
-                    customer = Customer.query.get(invoice.customer_id)
-                    customer_location = customer.branch if customer and customer.branch else None
-            
-            # Apply location filter - Fixed logic
-            if location:
-                # If location filter is specified, only include transactions that match
-                if customer_location:
-                    # Case-insensitive exact match or contains match
-                    if location.lower() != customer_location.lower() and location.lower() not in customer_location.lower():
-                        continue
-                else:
-                    # Skip transactions without customer location when location filter is applied
-                    continue
-            
-            # Add to filtered transactions for summary calculation
-            filtered_transactions.append(t)
-            
-            is_frequent = t.product_id in frequently_sold_ids
-            
-            stock_movements.append({
-                "transaction_id": t.id,
-                "product_id": t.product_id,
-                "product_name": product.product_name if product else None,
-                "sku": product.sku if product else None,
-                "transaction_type": t.transaction_type,
-                "quantity": t.quantity,
-                "transaction_date": t.transaction_date.isoformat(),
-                "reference_number": t.reference_number,
-                "location": customer_location,
-                "customer_name": customer.contact_person if customer else None,
-                "supplier_name": supplier.name if supplier else None,
-                "current_stock": product.quantity_in_stock if product else None,
-                "is_frequently_sold": is_frequent
-            })
-        
-        # Summary statistics based on filtered transactions
-        total_in = sum(t.quantity for t in filtered_transactions if t.transaction_type == 'Purchase')
-        total_out = sum(t.quantity for t in filtered_transactions if t.transaction_type == 'Sale')
-        
-        # Get available locations for reference
-        available_locations = []
-        customers_with_locations = Customer.query.filter(Customer.branch.isnot(None)).all()
-        for customer in customers_with_locations:
-            if customer.branch and customer.branch not in available_locations:
-                available_locations.append(customer.branch)
+        stock_movements = [{
+            "transaction_id": t.id,
+            "product_id": t.product_id,
+            "product_name": t.product_name,
+            "sku": t.sku,
+            "transaction_type": t.transaction_type,
+            "quantity": t.quantity,
+            "transaction_date": t.transaction_date.isoformat(),
+            "reference_number": t.reference_number,
+            "location": t.location or None,
+            "customer_name": t.customer_name,
+            "supplier_name": t.supplier_name,
+            "current_stock": t.quantity_in_stock,
+            "is_frequently_sold": t.product_id in frequently_sold_ids
+        } for t in rows]
+        
+        summary = StockMovementService.get_summary(date_from_obj, date_to_end, location=location)
+        summary["filtered_by_location"] = bool(location)
         
         return jsonify({
             "report_name": "Stock Movement Report",
@@ -396,81 +468,79 @@ def get_stock_movement_report():
                 "to": date_to_obj.strftime("%Y-%m-%d")
             },
             "location_filter": location,
-            "available_locations": sorted(available_locations),
-            "summary": {
-                "total_transactions": len(filtered_transactions),
-                "total_stock_in": total_in,
-                "total_stock_out": total_out,
-                "net_movement": total_in - total_out,
-                "filtered_by_location": bool(location)
-            },
+            "available_locations": StockMovementService.get_available_locations(),
+            "summary": summary,
             "frequently_sold_products": [
                 {
                     "product_id": item.product_id,
-                    "product_name": Product.query.get(item.product_id).product_name,
+                    "product_name": item.product_name,
                     "total_sold": int(item.total_sold)
                 } for item in frequently_sold
             ],
-            "stock_movements": stock_movements
+            "stock_movements": stock_movements,
+            "pagination": {
+                "limit": max(1, min(limit, MAX_PAGE_SIZE)),
+                "next_cursor": next_cursor,
+                "has_more": next_cursor is not None
+            }
         }), 200
         
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @bp.route("/reorder", methods=["GET"])
 @require_permission_jwt('reports', 'read')
+@cached_report("reorder", params=("window_days", "lead_time_days", "review_days"),
+               tags=("products", "categories", "suppliers", "stock_transactions"))
 def get_reorder_report():
+    from reports.reorder_service import (
+        ReorderService, DEFAULT_WINDOW_DAYS, DEFAULT_LEAD_TIME_DAYS, DEFAULT_REVIEW_DAYS
+    )
     try:
-        from category.category import Category
-        from suppliers.supplier import Supplier
+        window_days = request.args.get('window_days', DEFAULT_WINDOW_DAYS, type=int)
+        lead_time_days = request.args.get('lead_time_days', DEFAULT_LEAD_TIME_DAYS, type=int)
+        review_days = request.args.get('review_days', DEFAULT_REVIEW_DAYS, type=int)
         
-        # Get products that need reordering
-        products = Product.query.filter(
-            Product.reorder_level.isnot(None),
-            Product.quantity_in_stock <= Product.reorder_level
-        ).all()
-        
-        reorder_items = []
-        total_reorder_value = 0
-        
-        for product in products:
-            category = Category.query.get(product.category_id) if product.category_id else None
-            supplier = Supplier.query.get(product.supplier_id) if product.supplier_id else None
-            
-            shortage = product.reorder_level - product.quantity_in_stock
-            suggested_order_qty = max(shortage, product.reorder_level)
-            order_value = suggested_order_qty * float(product.purchase_price or 0)
-            
-            reorder_items.append({
-                "product_id": product.id,
-                "product_name": product.product_name,
-                "sku": product.sku,
-                "category_name": category.name if category else None,
-                "supplier_name": supplier.name if supplier else None,
-                "current_stock": product.quantity_in_stock,
-                "reorder_level": product.reorder_level,
-                "shortage": shortage,
-                "suggested_order_qty": suggested_order_qty,
-                "purchase_price": float(product.purchase_price or 0),
-                "order_value": order_value,
-                "unit_of_measure": product.unit_of_measure
-            })
-            total_reorder_value += order_value
+        reorder_items, draft_orders = ReorderService.compute_suggestions(
+            window_days=window_days, lead_time_days=lead_time_days, review_days=review_days
+        )
         
         return jsonify({
             "report_name": "Reorder Report",
             "generated_date": datetime.now().isoformat(),
+            "parameters": {
+                "window_days": window_days,
+                "lead_time_days": lead_time_days,
+                "review_days": review_days
+            },
             "summary": {
                 "total_items_to_reorder": len(reorder_items),
-                "total_reorder_value": round(total_reorder_value, 2)
+                "total_reorder_value": round(sum(item["order_value"] for item in reorder_items), 2),
+                "suppliers_to_order_from": len(draft_orders)
             },
-            "reorder_items": sorted(reorder_items, key=lambda x: x['shortage'], reverse=True)
+            "reorder_items": reorder_items,
+            "draft_purchase_orders": draft_orders
         }), 200
         
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@bp.route("/cache/stats", methods=["GET"])
+@require_permission_jwt('reports', 'read')
+def get_report_cache_stats():
+    return jsonify(report_cache.get_stats()), 200
+
+@bp.route("/cache/clear", methods=["POST"])
+@require_permission_jwt('reports', 'write')
+def clear_report_cache():
+    report_cache.clear()
+    return jsonify({"message": "Report cache cleared"}), 200
+
 @bp.route("/debug/locations", methods=["GET"])
 @require_permission_jwt('reports', 'read')
 def debug_locations():
@@ -523,6 +593,9 @@ def debug_locations():
 @bp.route("/generate", methods=["POST"])
 @require_permission_jwt('reports', 'write')
 def generate_report():
+    from flask import current_app
+    from user.jwt_middleware import get_current_user
+    from reports.report_job_service import ReportJobService
     data = request.get_json() or {}
     report_type = data.get("report_type")
     start_date = data.get("start_date")
@@ -532,21 +605,43 @@ def generate_report():
         return jsonify({"error": "report_type, start_date, end_date required"}), 400
     
     try:
-        if report_type == "sales":
-            report_data = ReportService.generate_sales_report()
-        elif report_type == "stock":
-            report_data = ReportService.generate_stock_report()
-        else:
-            return jsonify({"error": "Invalid report_type. Use 'sales' or 'stock'"}), 400
+        start_date = datetime.strptime(start_date, "%Y-%m-%d").date()
+        end_date = datetime.strptime(end_date, "%Y-%m-%d").date()
+        current_user = get_current_user() or {}
+        
+        report = ReportJobService.submit(
+            current_app._get_current_object(), report_type, start_date, end_date,
+            generated_by=current_user.get('username', 'Admin')
+        )
         
         return jsonify({
-            "report_id": f"RPT-{datetime.now().strftime('%Y%m%d%H%M')}",
-            "message": f"{report_type.title()} report generated successfully",
-            "data": report_data
-        }), 201
+            "report_id": report.id,
+            "status": report.status,
+            "message": f"{report.report_name} queued for generation",
+            "status_url": f"/reports/{report.id}"
+        }), 202
         
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
+        db.session.rollback()
         return jsonify({"error": str(e)}), 400
+
+@bp.route("/<int:report_id>", methods=["GET"])
+@require_permission_jwt('reports', 'read')
+def get_report(report_id):
+    from flask import current_app
+    from reports.report_job_service import ReportJobService
+    # Jobs run in-process; the monitor fails those a restart stranded
+    ReportJobService.ensure_monitor(current_app._get_current_object())
+    r = Report.query.get(report_id)
+    if not r:
+        return jsonify({"error": "Report not found"}), 404
+    
+    # Poll without the payload until the job has finished
+    include_data = request.args.get('include_data', 'true').lower() == 'true'
+    return jsonify(ReportJobService.to_response(r, include_data=include_data)), 200
+
 @bp.route("/<int:report_id>", methods=["DELETE"])
 @require_permission_jwt('reports', 'write')
 def delete_report(report_id):
@@ -103,89 +103,67 @@ class ReportService:
     
     @staticmethod
     def generate_sales_report(start_date=None, end_date=None):
-        try:
-            if not start_date:
-                start_date = date.today().replace(day=1)
-            if not end_date:
-                end_date = date.today()
-                
-            sales = SaleNoInvoice.query.all()
-            total_sales = 0
-            
-            for s in sales:
-                if hasattr(s, 'total_amount') and s.total_amount:
-                    total_sales += s.total_amount
-            
-            return {
-                "report_id": f"RPT-{datetime.now().strftime('%Y-%m-%d-%H%M')}",
-                "report_name": "Sales Report",
-                "generated_by": "Admin",
-                "generated_date": datetime.now().isoformat(),
-                "date_range": {
-                    "start_date": start_date.isoformat(),
-                    "end_date": end_date.isoformat()
-                },
-                "summary": {
-                    "total_sales_amount": float(total_sales),
-                    "total_transactions": len(sales),
-                    "average_sale_value": float(total_sales / len(sales)) if sales else 0
-                }
-            }
-        except Exception as e:
-            return {
-                "report_id": f"RPT-{datetime.now().strftime('%Y-%m-%d-%H%M')}",
-                "report_name": "Sales Report",
-                "generated_by": "Admin",
-                "generated_date": datetime.now().isoformat(),
-                "error": "No sales data available",
-                "summary": {
-                    "total_sales_amount": 0.0,
-                    "total_transactions": 0,
-                    "average_sale_value": 0.0
-                }
+        if not start_date:
+            start_date = date.today().replace(day=1)
+        if not end_date:
+            end_date = date.today()
+        
+        from reports.sales_fact_service import SalesFactService
+        from reports.daily_sales_fact import CHANNEL_INVOICE, CHANNEL_DIRECT
+        
+        by_channel = {
+            row["channel"]: row for row in SalesFactService.summarize(
+                start_date, end_date, group_by=("channel",), channel=[CHANNEL_DIRECT, CHANNEL_INVOICE]
+            )
+        }
+        direct = by_channel.get(CHANNEL_DIRECT, {})
+        invoiced = by_channel.get(CHANNEL_INVOICE, {})
+        
+        total_sales = direct.get("revenue", 0)
+        total_transactions = int(direct.get("transaction_count", 0))
+        
+        return {
+            "report_id": f"RPT-{datetime.now().strftime('%Y-%m-%d-%H%M')}",
+            "report_name": "Sales Report",
+            "generated_by": "Admin",
+            "generated_date": datetime.now().isoformat(),
+            "date_range": {
+                "start_date": start_date.isoformat(),
+                "end_date": end_date.isoformat()
+            },
+            "summary": {
+                "total_sales_amount": float(total_sales),
+                "total_transactions": total_transactions,
+                "average_sale_value": float(total_sales / total_transactions) if total_transactions else 0
+            },
+            "channel_breakdown": {
+                channel: {
+                    "revenue": float(row.get("revenue", 0)),
+                    "transactions": int(row.get("transaction_count", 0)),
+                    "quantity_sold": int(row.get("quantity_sold", 0)),
+                    "tax_amount": float(row.get("tax_amount", 0)),
+                    "discount_amount": float(row.get("discount_amount", 0))
+                } for channel, row in ((CHANNEL_DIRECT, direct), (CHANNEL_INVOICE, invoiced))
             }
+        }
     
     @staticmethod
     def generate_dashboard_report():
         """Generate real-time dashboard data from database"""
         try:
-            # Key Metrics - Calculate total sales from both direct sales and invoices
-            direct_sales = db.session.query(func.sum(SaleNoInvoice.total_amount)).scalar() or 0
-            invoice_sales = db.session.query(func.sum(Invoice.grand_total)).scalar() or 0
-            total_sales = direct_sales + invoice_sales
-            
-            # Calculate purchases from StockTransaction since PurchaseBill might not exist
-            try:
-                from stock_transactions.stock_transaction import StockTransaction
-                import json
-                purchase_transactions = StockTransaction.query.filter_by(transaction_type="Purchase").all()
-                total_purchases = 0
-                for pt in purchase_transactions:
-                    if pt.notes:
-                        try:
-                            payment_info = json.loads(pt.notes)
-                            total_purchases += float(payment_info.get("total_amount", 0))
-                        except:
-                            pass
-            except:
-                total_purchases = 0
-            
-            # Stock value calculation
-            products = Product.query.all()
-            stock_value = sum([p.quantity_in_stock * float(p.purchase_price) for p in products if p.purchase_price]) or 0
+            # Key Metrics and Quick Stats - read from the incrementally maintained summary row
+            from reports.dashboard_service import DashboardService
+            metrics = DashboardService.get_metrics()
             
+            total_sales = metrics.total_sales
+            total_purchases = metrics.total_purchases
+            stock_value = metrics.stock_value
             net_profit = total_sales - total_purchases
             
-            # Quick Stats
-            active_customers = Customer.query.count()
-            total_products = Product.query.count()
-            
-            # Pending payments (invoices not fully paid)
-            pending_invoices = Invoice.query.filter(Invoice.status.in_(['Pending', 'Partially Paid'])).all()
-            pending_payments = sum([i.grand_total - sum([p.amount_paid for p in i.payments]) for i in pending_invoices])
-            
-            # Low stock alerts
-            low_stock_count = len([p for p in products if p.reorder_level and p.quantity_in_stock <= p.reorder_level])
+            active_customers = metrics.customer_count
+            total_products = metrics.product_count
+            pending_payments = metrics.pending_payments
+            low_stock_count = metrics.low_stock_count
             
             # Recent Activity (last 5 transactions)
             recent_sales = SaleNoInvoice.query.order_by(desc(SaleNoInvoice.sale_date)).limit(2).all()
@@ -214,25 +192,17 @@ class ReportService:
                     "date": invoice.invoice_date.strftime("%Y-%m-%d")
                 })
             
-            # Add purchases - using StockTransaction instead of PurchaseBill
+            # Add purchases
             try:
-                from stock_transactions.stock_transaction import StockTransaction
-                import json
-                recent_purchases = StockTransaction.query.filter_by(transaction_type="Purchase").order_by(desc(StockTransaction.transaction_date)).limit(2).all()
+                from purchases.purchase_order import PurchaseOrder
+                recent_purchases = PurchaseOrder.query.order_by(desc(PurchaseOrder.purchase_date)).limit(2).all()
                 for purchase in recent_purchases:
                     supplier_name = purchase.supplier.name if purchase.supplier else "Unknown Supplier"
-                    amount = 0
-                    if purchase.notes:
-                        try:
-                            payment_info = json.loads(purchase.notes)
-                            amount = float(payment_info.get("total_amount", 0))
-                        except:
-                            pass
                     recent_activity.append({
                         "type": "purchase",
-                        "amount": amount,
+                        "amount": float(purchase.total_amount or 0),
                         "supplier": supplier_name,
-                        "date": purchase.transaction_date.strftime("%Y-%m-%d")
+                        "date": purchase.purchase_date.strftime("%Y-%m-%d")
                     })
             except:
                 pass
@@ -245,19 +215,25 @@ class ReportService:
             payment_methods = {}
             
             # Count from direct sales
-            sales_payments = SaleNoInvoice.query.all()
-            for sale in sales_payments:
-                method = sale.payment_method.lower() if sale.payment_method else 'cash'
-                payment_methods[method] = payment_methods.get(method, 0) + 1
+            sales_methods = db.session.query(
+                func.lower(func.coalesce(func.nullif(SaleNoInvoice.payment_method, ''), 'cash')), func.count(SaleNoInvoice.id)
+            ).group_by(func.lower(func.coalesce(func.nullif(SaleNoInvoice.payment_method, ''), 'cash'))).all()
+            for method, count in sales_methods:
+                payment_methods[method] = payment_methods.get(method, 0) + count
             
             # Count from invoice payments
-            invoice_payments = Payment.query.all()
-            for payment in invoice_payments:
-                method = payment.payment_method.lower() if payment.payment_method else 'cash'
-                payment_methods[method] = payment_methods.get(method, 0) + 1
-            
-            # Monthly sales (mock data for chart - would need date-based queries for real implementation)
-            monthly_sales = [float(total_sales) * 0.3, float(total_sales) * 0.4, float(total_sales) * 0.35, float(total_sales)]
+            invoice_methods = db.session.query(
+                func.lower(func.coalesce(func.nullif(Payment.payment_method, ''), 'cash')), func.count(Payment.id)
+            ).group_by(func.lower(func.coalesce(func.nullif(Payment.payment_method, ''), 'cash'))).all()
+            for method, count in invoice_methods:
+                payment_methods[method] = payment_methods.get(method, 0) + count
+            
+            # Monthly sales for the last four months, oldest first
+            from reports.timeseries_service import TimeseriesService
+            from datetime import timedelta
+            today = date.today()
+            four_months_ago = (today.replace(day=1) - timedelta(days=80)).replace(day=1)
+            monthly_sales = [month["revenue"] for month in TimeseriesService.get_sales_series("month", four_months_ago, today)[-4:]]
             
             return {
                 "dashboard_summary": {
@@ -325,164 +301,79 @@ class ReportService:
     @staticmethod
     def generate_profit_loss_report(start_date=None, end_date=None):
         """Generate profit & loss report based on actual sales profit minus returns and damages"""
-        try:
-            if not start_date:
-                start_date = date.today().replace(day=1)
-            if not end_date:
-                end_date = date.today()
-            
-            from returns.product_return import ProductReturn, DamagedProduct
-            from invoices.invoice_item import InvoiceItem
-            
-            # Calculate profit from direct sales (selling_price - purchase_price) * quantity
-            direct_sales = SaleNoInvoice.query.filter(
-                SaleNoInvoice.sale_date >= start_date,
-                SaleNoInvoice.sale_date <= end_date
-            ).all()
-            
-            direct_sales_profit = 0
-            direct_sales_revenue = 0
-            for sale in direct_sales:
-                if sale.product and sale.product.purchase_price:
-                    profit_per_unit = float(sale.selling_price) - float(sale.product.purchase_price)
-                    direct_sales_profit += profit_per_unit * sale.quantity
-                direct_sales_revenue += float(sale.total_amount)
-            
-            # Calculate profit from invoice sales
-            invoices = Invoice.query.filter(
-                Invoice.invoice_date >= start_date,
-                Invoice.invoice_date <= end_date
-            ).all()
-            
-            invoice_sales_profit = 0
-            invoice_sales_revenue = 0
-            for invoice in invoices:
-                invoice_sales_revenue += float(invoice.grand_total)
-                for item in invoice.items:
-                    if item.product and item.product.purchase_price:
-                        profit_per_unit = float(item.unit_price) - float(item.product.purchase_price)
-                        invoice_sales_profit += profit_per_unit * item.quantity
-            
-            total_sales_profit = direct_sales_profit + invoice_sales_profit
-            total_sales_revenue = direct_sales_revenue + invoice_sales_revenue
-            
-            # If no data in date range, calculate all-time data instead
-            if total_sales_revenue == 0:
-                # Get all-time direct sales
-                all_direct_sales = SaleNoInvoice.query.all()
-                for sale in all_direct_sales:
-                    if sale.product and sale.product.purchase_price:
-                        profit_per_unit = float(sale.selling_price) - float(sale.product.purchase_price)
-                        direct_sales_profit += profit_per_unit * sale.quantity
-                    direct_sales_revenue += float(sale.total_amount)
-                
-                # Get all-time invoice sales
-                all_invoices = Invoice.query.all()
-                for invoice in all_invoices:
-                    invoice_sales_revenue += float(invoice.grand_total)
-                    for item in invoice.items:
-                        if item.product and item.product.purchase_price:
-                            profit_per_unit = float(item.unit_price) - float(item.product.purchase_price)
-                            invoice_sales_profit += profit_per_unit * item.quantity
-                
-                # Get all-time returns
-                all_returns = ProductReturn.query.filter(ProductReturn.status == 'Completed').all()
-                for return_item in all_returns:
-                    if return_item.product and return_item.product.purchase_price:
-                        profit_per_unit = float(return_item.original_price) - float(return_item.product.purchase_price)
-                        returns_loss += profit_per_unit * return_item.quantity_returned
-                    total_returned_quantity += return_item.quantity_returned
-                
-                # Get all-time damages
-                all_damages = DamagedProduct.query.all()
-                for damaged in all_damages:
-                    if damaged.product and damaged.product.purchase_price:
-                        damage_loss += float(damaged.product.purchase_price) * damaged.quantity
-                    total_damaged_quantity += damaged.quantity
-                
-                # Recalculate totals
-                total_sales_profit = direct_sales_profit + invoice_sales_profit
-                total_sales_revenue = direct_sales_revenue + invoice_sales_revenue
-            
-            all_time_data = {"note": "All-time data used" if total_sales_revenue > 0 and (start_date == date.today().replace(day=1)) else "Date range data used"}
-            
-            # Calculate losses from returns
-            returns = ProductReturn.query.filter(
-                ProductReturn.return_date >= start_date,
-                ProductReturn.return_date <= end_date,
-                ProductReturn.status == 'Completed'
-            ).all()
-            
-            returns_loss = 0
-            total_returned_quantity = 0
-            for return_item in returns:
-                if return_item.product and return_item.product.purchase_price:
-                    # Loss = (selling_price - purchase_price) * returned_quantity
-                    profit_per_unit = float(return_item.original_price) - float(return_item.product.purchase_price)
-                    returns_loss += profit_per_unit * return_item.quantity_returned
-                total_returned_quantity += return_item.quantity_returned
-            
-            # Calculate losses from damaged products
-            damaged_products = DamagedProduct.query.filter(
-                DamagedProduct.damage_date >= start_date,
-                DamagedProduct.damage_date <= end_date
-            ).all()
-            
-            damage_loss = 0
-            total_damaged_quantity = 0
-            for damaged in damaged_products:
-                if damaged.product and damaged.product.purchase_price:
-                    # Loss = purchase_price * damaged_quantity (full cost loss)
-                    damage_loss += float(damaged.product.purchase_price) * damaged.quantity
-                total_damaged_quantity += damaged.quantity
-            
-            # Net profit calculation
-            net_profit = total_sales_profit - returns_loss - damage_loss
-            profit_margin = (net_profit / total_sales_revenue * 100) if total_sales_revenue > 0 else 0
-            
-            return {
-                "report_id": f"RPT-{datetime.now().strftime('%Y-%m-%d-%H%M')}",
-                "report_name": "Profit & Loss Report",
-                "generated_by": "Admin",
-                "generated_date": datetime.now().isoformat(),
-                "date_range": {
-                    "start_date": start_date.isoformat(),
-                    "end_date": end_date.isoformat()
-                },
-                "sales_summary": {
-                    "total_sales_revenue": round(float(total_sales_revenue), 2),
-                    "direct_sales_profit": round(float(direct_sales_profit), 2),
-                    "invoice_sales_profit": round(float(invoice_sales_profit), 2),
-                    "total_sales_profit": round(float(total_sales_profit), 2)
-                },
-                "losses_summary": {
-                    "returns_loss": round(float(returns_loss), 2),
-                    "damage_loss": round(float(damage_loss), 2),
-                    "total_losses": round(float(returns_loss + damage_loss), 2)
-                },
-                "returns_damages_count": {
-                    "total_returned_products": total_returned_quantity,
-                    "total_damaged_products": total_damaged_quantity,
-                    "total_returns_count": len(returns),
-                    "total_damages_count": len(damaged_products)
-                },
-                "profit_loss_summary": {
-                    "net_profit": round(float(net_profit), 2),
-                    "profit_margin": round(float(profit_margin), 2),
-                    "status": "Profit" if net_profit >= 0 else "Loss"
-                },
-                "debug_info": all_time_data
+        if not start_date:
+            start_date = date.today().replace(day=1)
+        if not end_date:
+            end_date = date.today()
+        
+        from reports.sales_fact_service import SalesFactService
+        from reports.daily_sales_fact import CHANNEL_INVOICE, CHANNEL_DIRECT
+        
+        by_channel = {
+            row["channel"]: row for row in SalesFactService.summarize(start_date, end_date, group_by=("channel",))
+        }
+        
+        # Profit is (selling price - purchase price) * quantity, i.e. gross amount less cost
+        def sales_profit(channel):
+            row = by_channel.get(channel, {})
+            return float(row.get("gross_amount", 0)) - float(row.get("cost_amount", 0))
+        
+        direct_sales_profit = sales_profit(CHANNEL_DIRECT)
+        invoice_sales_profit = sales_profit(CHANNEL_INVOICE)
+        total_sales_profit = direct_sales_profit + invoice_sales_profit
+        total_sales_revenue = sum(float(by_channel.get(c, {}).get("revenue", 0)) for c in (CHANNEL_DIRECT, CHANNEL_INVOICE))
+        
+        # Losses from completed returns and damaged products in the range
+        returns_loss = sum(float(row.get("returns_loss", 0)) for row in by_channel.values())
+        total_returned_quantity = sum(int(row.get("returns_quantity", 0)) for row in by_channel.values())
+        damage_loss = sum(float(row.get("damage_cost", 0)) for row in by_channel.values())
+        total_damaged_quantity = sum(int(row.get("damage_quantity", 0)) for row in by_channel.values())
+        
+        # Record counts are not part of the daily rollup; count them with indexed range queries
+        from returns.product_return import ProductReturn, DamagedProduct
+        returns_count = ProductReturn.query.filter(
+            ProductReturn.return_date >= start_date,
+            ProductReturn.return_date <= end_date,
+            ProductReturn.status == 'Completed'
+        ).count()
+        damages_count = DamagedProduct.query.filter(
+            DamagedProduct.damage_date >= start_date,
+            DamagedProduct.damage_date <= end_date
+        ).count()
+        
+        # Net profit calculation
+        net_profit = total_sales_profit - returns_loss - damage_loss
+        profit_margin = (net_profit / total_sales_revenue * 100) if total_sales_revenue > 0 else 0
+        
+        return {
+            "report_id": f"RPT-{datetime.now().strftime('%Y-%m-%d-%H%M')}",
+            "report_name": "Profit & Loss Report",
+            "generated_by": "Admin",
+            "generated_date": datetime.now().isoformat(),
+            "date_range": {
+                "start_date": start_date.isoformat(),
+                "end_date": end_date.isoformat()
+            },
+            "sales_summary": {
+                "total_sales_revenue": round(float(total_sales_revenue), 2),
+                "direct_sales_profit": round(float(direct_sales_profit), 2),
+                "invoice_sales_profit": round(float(invoice_sales_profit), 2),
+                "total_sales_profit": round(float(total_sales_profit), 2)
+            },
+            "losses_summary": {
+                "returns_loss": round(float(returns_loss), 2),
+                "damage_loss": round(float(damage_loss), 2),
+                "total_losses": round(float(returns_loss + damage_loss), 2)
+            },
+            "returns_damages_count": {
+                "total_returned_products": total_returned_quantity,
+                "total_damaged_products": total_damaged_quantity,
+                "total_returns_count": returns_count,
+                "total_damages_count": damages_count
+            },
+            "profit_loss_summary": {
+                "net_profit": round(float(net_profit), 2),
+                "profit_margin": round(float(profit_margin), 2),
+                "status": "Profit" if net_profit >= 0 else "Loss"
             }
-            
-        except Exception as e:
-            return {
-                "report_id": f"RPT-{datetime.now().strftime('%Y-%m-%d-%H%M')}",
-                "report_name": "Profit & Loss Report",
-                "generated_by": "Admin",
-                "generated_date": datetime.now().isoformat(),
-                "error": str(e),
-                "sales_summary": {"total_sales_revenue": 0.00, "total_sales_profit": 0.00},
-                "losses_summary": {"returns_loss": 0.00, "damage_loss": 0.00, "total_losses": 0.00},
-                "returns_damages_count": {"total_returned_products": 0, "total_damaged_products": 0, "total_returns_count": 0, "total_damages_count": 0},
-                "profit_loss_summary": {"net_profit": 0.00, "profit_margin": 0.00, "status": "No Data"}
-            }
\ No newline at end of file
+        }
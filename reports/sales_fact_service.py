@@ -0,0 +1,194 @@
+from datetime import timedelta
+from sqlalchemy import func, cast, case, literal, select, Date
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from src.extensions import db
+from reports.daily_sales_fact import (
+    DailySalesFact, MEASURES, CHANNEL_INVOICE, CHANNEL_DIRECT, CHANNEL_DAMAGE,
+    NO_PRODUCT, NO_CATEGORY, NO_BRANCH, COUNTED_RETURN_STATUS
+)
+from reports.sales_timeseries_bucket import SalesTimeseriesBucket
+from products.product import Product
+from customers.customer import Customer
+from invoices.invoice import Invoice
+from invoices.invoice_item import InvoiceItem
+from sales_no_invoice.sale_no_invoice import SaleNoInvoice
+from returns.product_return import ProductReturn, DamagedProduct
+
+KEY_COLUMNS = ("sale_date", "product_id", "category_id", "branch", "channel")
+
+
+class SalesFactService:
+    @staticmethod
+    def backfill(start_date=None, end_date=None):
+        """
+        Rebuild daily_sales_facts for [start_date, end_date] (all history when omitted)
+        from invoices, sales without invoice, completed returns and damaged products.
+        Runs as one transaction: the range is deleted and re-aggregated set-based.
+        """
+        table = DailySalesFact.__table__
+
+        delete = table.delete()
+        if start_date:
+            delete = delete.where(table.c.sale_date >= start_date)
+        if end_date:
+            delete = delete.where(table.c.sale_date <= end_date)
+        db.session.execute(delete)
+
+        # Cached time-series buckets overlapping the range are stale after a rebuild
+        buckets = SalesTimeseriesBucket.__table__
+        stale = buckets.update().values(computed_at=None, version=buckets.c.version + 1)
+        if start_date:
+            stale = stale.where(buckets.c.bucket_start > start_date - timedelta(days=31))
+        if end_date:
+            stale = stale.where(buckets.c.bucket_start <= end_date)
+        db.session.execute(stale)
+
+        for source in SalesFactService._source_queries(start_date, end_date):
+            source = source.add_columns(func.now().label("updated_at"))
+            columns = [c.name for c in source.selected_columns]
+            stmt = pg_insert(table).from_select(columns, source)
+            measures = [c for c in columns if c in MEASURES]
+            stmt = stmt.on_conflict_do_update(
+                constraint="uq_daily_sales_facts_key",
+                set_=dict(
+                    {name: table.c[name] + stmt.excluded[name] for name in measures},
+                    updated_at=stmt.excluded.updated_at
+                )
+            )
+            db.session.execute(stmt)
+
+        # The rebuild bypasses the ORM, so tag cached reports built on the facts explicitly
+        db.session.info.setdefault("report_cache_tables", set()).add(DailySalesFact.__tablename__)
+        db.session.commit()
+
+    @staticmethod
+    def _source_queries(start_date, end_date):
+        def in_range(column):
+            day = cast(column, Date)
+            conditions = []
+            if start_date:
+                conditions.append(day >= start_date)
+            if end_date:
+                conditions.append(day <= end_date)
+            return conditions
+
+        branch = func.coalesce(Customer.branch, NO_BRANCH)
+        category = func.coalesce(Product.category_id, NO_CATEGORY)
+        cost_price = func.coalesce(Product.purchase_price, 0)
+
+        # Invoice lines
+        invoice_day = cast(Invoice.invoice_date, Date)
+        gross = InvoiceItem.unit_price * InvoiceItem.quantity
+        invoice_lines = select(
+            invoice_day.label("sale_date"),
+            InvoiceItem.product_id.label("product_id"),
+            category.label("category_id"),
+            branch.label("branch"),
+            literal(CHANNEL_INVOICE).label("channel"),
+            func.sum(InvoiceItem.quantity).label("quantity_sold"),
+            func.sum(gross).label("gross_amount"),
+            func.sum(gross + InvoiceItem.igst_amount - InvoiceItem.total_price).label("discount_amount"),
+            func.sum(InvoiceItem.igst_amount).label("tax_amount"),
+            func.sum(InvoiceItem.total_price).label("revenue"),
+            func.sum(cost_price * InvoiceItem.quantity).label("cost_amount"),
+        ).select_from(InvoiceItem).join(Invoice, Invoice.id == InvoiceItem.invoice_id) \
+            .outerjoin(Product, Product.id == InvoiceItem.product_id) \
+            .outerjoin(Customer, Customer.id == Invoice.customer_id) \
+            .where(*in_range(Invoice.invoice_date)) \
+            .group_by(invoice_day, InvoiceItem.product_id, category, branch)
+
+        # Invoice-level charges and invoice counts
+        charges = func.coalesce(Invoice.shipping_charges, 0) + func.coalesce(Invoice.other_charges, 0)
+        additional_discount = func.coalesce(Invoice.additional_discount, 0)
+        invoice_headers = select(
+            invoice_day.label("sale_date"),
+            literal(NO_PRODUCT).label("product_id"),
+            literal(NO_CATEGORY).label("category_id"),
+            branch.label("branch"),
+            literal(CHANNEL_INVOICE).label("channel"),
+            func.count(Invoice.id).label("transaction_count"),
+            func.sum(additional_discount).label("discount_amount"),
+            func.sum(charges - additional_discount).label("revenue"),
+        ).select_from(Invoice).outerjoin(Customer, Customer.id == Invoice.customer_id) \
+            .where(*in_range(Invoice.invoice_date)) \
+            .group_by(invoice_day, branch)
+
+        # Sales without invoice
+        sale_day = cast(SaleNoInvoice.sale_date, Date)
+        direct_sales = select(
+            sale_day.label("sale_date"),
+            SaleNoInvoice.product_id.label("product_id"),
+            category.label("category_id"),
+            branch.label("branch"),
+            literal(CHANNEL_DIRECT).label("channel"),
+            func.count(SaleNoInvoice.id).label("transaction_count"),
+            func.sum(SaleNoInvoice.quantity).label("quantity_sold"),
+            func.sum(SaleNoInvoice.total_amount).label("gross_amount"),
+            func.sum(func.coalesce(SaleNoInvoice.discount_amount, 0)).label("discount_amount"),
+            func.sum(SaleNoInvoice.total_amount).label("revenue"),
+            func.sum(cost_price * SaleNoInvoice.quantity).label("cost_amount"),
+        ).select_from(SaleNoInvoice) \
+            .outerjoin(Product, Product.id == SaleNoInvoice.product_id) \
+            .outerjoin(Customer, Customer.id == SaleNoInvoice.customer_id) \
+            .where(*in_range(SaleNoInvoice.sale_date)) \
+            .group_by(sale_day, SaleNoInvoice.product_id, category, branch)
+
+        # Completed returns
+        return_day = cast(ProductReturn.return_date, Date)
+        return_channel = case((ProductReturn.original_invoice_id.isnot(None), CHANNEL_INVOICE), else_=CHANNEL_DIRECT)
+        returns = select(
+            return_day.label("sale_date"),
+            ProductReturn.product_id.label("product_id"),
+            category.label("category_id"),
+            branch.label("branch"),
+            return_channel.label("channel"),
+            func.sum(ProductReturn.quantity_returned).label("returns_quantity"),
+            func.sum(func.coalesce(ProductReturn.refund_amount, 0)).label("returns_amount"),
+            func.sum((ProductReturn.original_price - cost_price) * ProductReturn.quantity_returned).label("returns_loss"),
+        ).select_from(ProductReturn) \
+            .outerjoin(Product, Product.id == ProductReturn.product_id) \
+            .outerjoin(Customer, Customer.id == ProductReturn.customer_id) \
+            .where(ProductReturn.status == COUNTED_RETURN_STATUS, *in_range(ProductReturn.return_date)) \
+            .group_by(return_day, ProductReturn.product_id, category, branch, return_channel)
+
+        # Damaged stock
+        damage_day = cast(DamagedProduct.damage_date, Date)
+        damages = select(
+            damage_day.label("sale_date"),
+            DamagedProduct.product_id.label("product_id"),
+            category.label("category_id"),
+            literal(NO_BRANCH).label("branch"),
+            literal(CHANNEL_DAMAGE).label("channel"),
+            func.sum(DamagedProduct.quantity).label("damage_quantity"),
+            func.sum(cost_price * DamagedProduct.quantity).label("damage_cost"),
+        ).select_from(DamagedProduct) \
+            .outerjoin(Product, Product.id == DamagedProduct.product_id) \
+            .where(*in_range(DamagedProduct.damage_date)) \
+            .group_by(damage_day, DamagedProduct.product_id, category)
+
+        return [invoice_lines, invoice_headers, direct_sales, returns, damages]
+
+    @staticmethod
+    def summarize(start_date=None, end_date=None, group_by=(), **filters):
+        """
+        Sum the fact measures over a date range, optionally grouped by key columns
+        (e.g. group_by=("channel",)) and filtered by key values (e.g. channel="direct").
+        Returns a list of dicts, one per group.
+        """
+        table = DailySalesFact.__table__
+        group_columns = [table.c[name] for name in group_by]
+        query = select(*group_columns, *[func.coalesce(func.sum(table.c[name]), 0).label(name) for name in MEASURES])
+        if start_date:
+            query = query.where(table.c.sale_date >= start_date)
+        if end_date:
+            query = query.where(table.c.sale_date <= end_date)
+        for name, value in filters.items():
+            if name not in KEY_COLUMNS:
+                raise ValueError(f"Unknown fact key: {name}")
+            if isinstance(value, (list, tuple, set)):
+                query = query.where(table.c[name].in_(list(value)))
+            else:
+                query = query.where(table.c[name] == value)
+        if group_columns:
+            query = query.group_by(*group_columns).order_by(*group_columns)
+        return [dict(row._mapping) for row in db.session.execute(query)]
@@ -0,0 +1,68 @@
+from datetime import datetime, date, timedelta
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from src.extensions import db
+
+GRANULARITIES = ("day", "week", "month")
+
+
+def bucket_start(day, granularity):
+    """First day of the bucket containing day (weeks start on Monday, as date_trunc does)."""
+    if granularity == "day":
+        return day
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    raise ValueError(f"Invalid granularity '{granularity}'. Use one of: {', '.join(GRANULARITIES)}")
+
+
+def next_bucket_start(start, granularity):
+    if granularity == "day":
+        return start + timedelta(days=1)
+    if granularity == "week":
+        return start + timedelta(days=7)
+    if granularity == "month":
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    raise ValueError(f"Invalid granularity '{granularity}'. Use one of: {', '.join(GRANULARITIES)}")
+
+
+class SalesTimeseriesBucket(db.Model):
+    """Cached totals for a closed day/week/month of sales.
+
+    Only buckets that ended before today are stored. A backdated write to
+    daily_sales_facts invalidates the buckets covering its date in the same transaction
+    by clearing computed_at and bumping version. A reader only stores its result if the
+    version it read is still current, so a total computed before a late fact arrived
+    is never cached after that fact's invalidation.
+    """
+    __tablename__ = "sales_timeseries_buckets"
+
+    granularity = db.Column(db.String(10), primary_key=True)
+    bucket_start = db.Column(db.Date, primary_key=True)
+    revenue = db.Column(db.Numeric(16, 2), nullable=False, default=0)
+    tax_amount = db.Column(db.Numeric(16, 2), nullable=False, default=0)
+    invoice_count = db.Column(db.Integer, nullable=False, default=0)
+    invoice_revenue = db.Column(db.Numeric(16, 2), nullable=False, default=0)
+    direct_sales_count = db.Column(db.Integer, nullable=False, default=0)
+    direct_sales_total = db.Column(db.Numeric(16, 2), nullable=False, default=0)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)  # NULL once invalidated
+    version = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+
+
+def invalidate_buckets_for_date(connection, day):
+    """Invalidate cached buckets that contain day; current (open) buckets are never cached."""
+    if isinstance(day, datetime):
+        day = day.date()
+    today = date.today()
+    table = SalesTimeseriesBucket.__table__
+    for granularity in GRANULARITIES:
+        start = bucket_start(day, granularity)
+        if start == bucket_start(today, granularity):
+            continue
+        # Leave a versioned tombstone even when nothing is cached yet, so a reader
+        # that saw no row cannot insert a total computed before this write
+        stmt = pg_insert(table).values(granularity=granularity, bucket_start=start, computed_at=None, version=1)
+        connection.execute(stmt.on_conflict_do_update(
+            index_elements=[table.c.granularity, table.c.bucket_start],
+            set_={"computed_at": None, "version": table.c.version + 1}
+        ))
@@ -0,0 +1,126 @@
+from datetime import datetime
+from sqlalchemy import func, desc, or_, and_, select
+from src.extensions import db
+from stock_transactions.stock_transaction import StockTransaction
+from products.product import Product
+from invoices.invoice import Invoice
+from invoices.invoice_item import InvoiceItem
+from customers.customer import Customer
+from suppliers.supplier import Supplier
+
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(transaction_date, transaction_id):
+    return f"{transaction_date.isoformat()}_{transaction_id}"
+
+
+def decode_cursor(cursor):
+    """Split a '<transaction_date iso>_<id>' cursor into (datetime, id)."""
+    try:
+        timestamp, transaction_id = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(timestamp), int(transaction_id)
+    except (AttributeError, ValueError):
+        raise ValueError("Invalid cursor")
+
+
+class StockMovementService:
+    @staticmethod
+    def _filters(date_from, date_to, location):
+        """Date range and customer-branch predicates shared by the page and summary queries."""
+        filters = [
+            StockTransaction.transaction_date >= date_from,
+            StockTransaction.transaction_date < date_to,
+        ]
+        if location:
+            # Same rule as before: case-insensitive exact or substring match on the
+            # customer's branch; transactions without a customer branch are excluded
+            filters.append(func.lower(Customer.branch).contains(location.lower(), autoescape=True))
+        return filters
+
+    @staticmethod
+    def get_movements(date_from, date_to, location=None, limit=DEFAULT_PAGE_SIZE, cursor=None):
+        """
+        One page of stock transactions (newest first) with product, supplier and customer
+        columns joined in. Paged by (transaction_date, id) keyset; pass the returned
+        next_cursor to fetch the following page.
+        """
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+
+        query = db.session.query(
+            StockTransaction.id,
+            StockTransaction.product_id,
+            StockTransaction.transaction_type,
+            StockTransaction.quantity,
+            StockTransaction.transaction_date,
+            StockTransaction.reference_number,
+            Product.product_name,
+            Product.sku,
+            Product.quantity_in_stock,
+            Supplier.name.label("supplier_name"),
+            Customer.contact_person.label("customer_name"),
+            Customer.branch.label("location")
+        ).select_from(StockTransaction) \
+            .outerjoin(Product, Product.id == StockTransaction.product_id) \
+            .outerjoin(Supplier, Supplier.id == StockTransaction.supplier_id) \
+            .outerjoin(Invoice, Invoice.id == StockTransaction.invoice_id) \
+            .outerjoin(Customer, Customer.id == Invoice.customer_id) \
+            .filter(*StockMovementService._filters(date_from, date_to, location))
+
+        if cursor:
+            cursor_date, cursor_id = decode_cursor(cursor)
+            query = query.filter(or_(
+                StockTransaction.transaction_date < cursor_date,
+                and_(StockTransaction.transaction_date == cursor_date, StockTransaction.id < cursor_id)
+            ))
+
+        rows = query.order_by(
+            StockTransaction.transaction_date.desc(), StockTransaction.id.desc()
+        ).limit(limit + 1).all()
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].transaction_date, rows[-1].id) if has_more else None
+        return rows, next_cursor
+
+    @staticmethod
+    def get_summary(date_from, date_to, location=None):
+        """Totals over the whole filtered range, independent of paging."""
+        query = db.session.query(
+            func.count(StockTransaction.id),
+            func.coalesce(func.sum(StockTransaction.quantity).filter(StockTransaction.transaction_type == 'Purchase'), 0),
+            func.coalesce(func.sum(StockTransaction.quantity).filter(StockTransaction.transaction_type == 'Sale'), 0)
+        ).select_from(StockTransaction)
+        if location:
+            query = query.join(Invoice, Invoice.id == StockTransaction.invoice_id) \
+                .join(Customer, Customer.id == Invoice.customer_id)
+        total_transactions, total_in, total_out = query.filter(
+            *StockMovementService._filters(date_from, date_to, location)
+        ).one()
+        return {
+            "total_transactions": total_transactions,
+            "total_stock_in": int(total_in),
+            "total_stock_out": int(total_out),
+            "net_movement": int(total_in) - int(total_out)
+        }
+
+    @staticmethod
+    def get_available_locations():
+        rows = db.session.execute(
+            select(Customer.branch).distinct()
+            .where(Customer.branch.isnot(None), Customer.branch != '')
+            .order_by(Customer.branch)
+        )
+        return [branch for (branch,) in rows]
+
+    @staticmethod
+    def get_frequently_sold(limit=10):
+        total_sold = func.sum(InvoiceItem.quantity).label('total_sold')
+        return db.session.query(
+            InvoiceItem.product_id,
+            Product.product_name,
+            total_sold
+        ).outerjoin(Product, Product.id == InvoiceItem.product_id) \
+            .group_by(InvoiceItem.product_id, Product.product_name) \
+            .order_by(desc('total_sold')).limit(limit).all()
@@ -0,0 +1,114 @@
+from datetime import datetime, date, timedelta
+from decimal import Decimal
+from sqlalchemy import func, cast, select, Date
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from src.extensions import db
+from reports.daily_sales_fact import DailySalesFact, CHANNEL_INVOICE, CHANNEL_DIRECT
+from reports.sales_timeseries_bucket import (
+    SalesTimeseriesBucket, GRANULARITIES, bucket_start, next_bucket_start
+)
+
+SERIES_METRICS = ("revenue", "tax_amount", "invoice_count", "invoice_revenue", "direct_sales_count", "direct_sales_total")
+
+
+class TimeseriesService:
+    @staticmethod
+    def get_sales_series(granularity, start_date, end_date):
+        """
+        Sales totals per day/week/month between start_date and end_date (widened to whole
+        buckets). Closed buckets come from sales_timeseries_buckets; missing or invalidated
+        ones and the current bucket are aggregated from daily_sales_facts with date_trunc, and
+        the closed ones are stored for next time unless a fact write invalidated them meanwhile.
+        """
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Invalid granularity '{granularity}'. Use one of: {', '.join(GRANULARITIES)}")
+        if start_date > end_date:
+            raise ValueError("start_date must be on or before end_date")
+
+        first = bucket_start(start_date, granularity)
+        last = bucket_start(end_date, granularity)
+        current = bucket_start(date.today(), granularity)
+
+        starts = []
+        cursor = first
+        while cursor <= last:
+            starts.append(cursor)
+            cursor = next_bucket_start(cursor, granularity)
+
+        cached = {}
+        versions = {}
+        for b in SalesTimeseriesBucket.query.filter(
+            SalesTimeseriesBucket.granularity == granularity,
+            SalesTimeseriesBucket.bucket_start >= first,
+            SalesTimeseriesBucket.bucket_start <= last
+        ):
+            versions[b.bucket_start] = b.version
+            if b.computed_at is not None:
+                cached[b.bucket_start] = {name: getattr(b, name) for name in SERIES_METRICS}
+
+        missing = [s for s in starts if s not in cached]
+        computed = {}
+        if missing:
+            computed = TimeseriesService._aggregate(
+                granularity, missing[0], next_bucket_start(missing[-1], granularity)
+            )
+            closed = [s for s in missing if s < current]
+            if closed:
+                table = SalesTimeseriesBucket.__table__
+                now = datetime.utcnow()
+                rows = [dict(granularity=granularity, bucket_start=s, computed_at=now, version=versions.get(s, 0),
+                             **computed.get(s, TimeseriesService._empty())) for s in closed]
+                stmt = pg_insert(table).values(rows)
+                # Store only over the version read above; a fact written since then bumped it
+                db.session.execute(stmt.on_conflict_do_update(
+                    index_elements=[table.c.granularity, table.c.bucket_start],
+                    set_=dict({name: stmt.excluded[name] for name in SERIES_METRICS}, computed_at=now),
+                    where=table.c.version == stmt.excluded.version
+                ))
+                db.session.commit()
+
+        series = []
+        for s in starts:
+            values = cached.get(s) or computed.get(s) or TimeseriesService._empty()
+            series.append({
+                "period_start": s.isoformat(),
+                "period_end": (next_bucket_start(s, granularity) - timedelta(days=1)).isoformat(),
+                "revenue": float(values["revenue"]),
+                "tax_amount": float(values["tax_amount"]),
+                "invoice_count": int(values["invoice_count"]),
+                "invoice_revenue": float(values["invoice_revenue"]),
+                "direct_sales_count": int(values["direct_sales_count"]),
+                "direct_sales_total": float(values["direct_sales_total"]),
+                "is_closed": s < current
+            })
+        return series
+
+    @staticmethod
+    def _empty():
+        return {name: 0 if name.endswith("_count") else Decimal('0') for name in SERIES_METRICS}
+
+    @staticmethod
+    def _aggregate(granularity, range_start, range_end_exclusive):
+        """Aggregate daily_sales_facts into buckets for [range_start, range_end_exclusive)."""
+        facts = DailySalesFact.__table__.c
+        bucket = cast(func.date_trunc(granularity, facts.sale_date), Date).label("bucket_start")
+        is_invoice = facts.channel == CHANNEL_INVOICE
+        is_direct = facts.channel == CHANNEL_DIRECT
+        query = select(
+            bucket,
+            func.coalesce(func.sum(facts.revenue).filter(is_invoice | is_direct), 0).label("revenue"),
+            func.coalesce(func.sum(facts.tax_amount).filter(is_invoice | is_direct), 0).label("tax_amount"),
+            func.coalesce(func.sum(facts.transaction_count).filter(is_invoice), 0).label("invoice_count"),
+            func.coalesce(func.sum(facts.revenue).filter(is_invoice), 0).label("invoice_revenue"),
+            func.coalesce(func.sum(facts.transaction_count).filter(is_direct), 0).label("direct_sales_count"),
+            func.coalesce(func.sum(facts.revenue).filter(is_direct), 0).label("direct_sales_total"),
+        ).where(
+            facts.sale_date >= range_start,
+            facts.sale_date < range_end_exclusive,
+            facts.channel.in_([CHANNEL_INVOICE, CHANNEL_DIRECT])
+        ).group_by(bucket)
+
+        return {
+            row.bucket_start: {name: getattr(row, name) for name in SERIES_METRICS}
+            for row in db.session.execute(query)
+        }
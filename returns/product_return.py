@@ -4,6 +4,9 @@ from sqlalchemy.orm import relationship
 
 class ProductReturn(db.Model):
     __tablename__ = "product_returns"
+    __table_args__ = (
+        db.Index("ix_product_returns_customer", "customer_id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=False)
     return_number = db.Column(db.String(100), unique=True, nullable=False)
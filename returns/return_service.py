@@ -2,8 +2,7 @@
 from datetime import datetime
 from src.extensions import db
 from returns.product_return import ProductReturn, DamagedProduct
-from products.product import Product
-from stock_transactions.stock_transaction import StockTransaction
+from stock_transactions.stock_engine import StockEngine, StockChange, InsufficientStockError
 from sqlalchemy.exc import SQLAlchemyError
 
 class ReturnService:
@@ -70,60 +69,42 @@ class ReturnService:
             db.session.commit()
             return {"success": True, "return_id": product_return.id, "return_number": product_return.return_number}
             
-        except SQLAlchemyError as e:
+        except (SQLAlchemyError, InsufficientStockError) as e:
             db.session.rollback()
             return {"success": False, "error": str(e)}
     
     @staticmethod
     def _process_refund_return(product_return):
         """Handle return with refund - add product back to stock"""
-        # Add product back to stock
-        product = Product.query.get(product_return.product_id)
-        product.quantity_in_stock += product_return.quantity_returned
-        
-        # Create stock transaction
-        stock_transaction = StockTransaction(
-            product_id=product_return.product_id,
-            transaction_type="Return",
-            quantity=product_return.quantity_returned,
+        # Add product back to stock and record the return
+        StockEngine.apply([StockChange(
+            product_return.product_id, product_return.quantity_returned, "Return",
             reference_number=product_return.return_number,
             notes=f"Product return - Refund: {product_return.refund_amount}"
-        )
-        db.session.add(stock_transaction)
+        )])
     
     @staticmethod
     def _process_exchange(product_return):
         """Handle product exchange - remove old, add new product"""
-        # Remove returned product from stock (if resaleable)
+        changes = []
+        # Put the returned product back in stock (if resaleable)
         if product_return.is_resaleable:
-            returned_product = Product.query.get(product_return.product_id)
-            returned_product.quantity_in_stock += product_return.quantity_returned
-            
-            # Create return stock transaction
-            return_transaction = StockTransaction(
-                product_id=product_return.product_id,
-                transaction_type="Return",
-                quantity=product_return.quantity_returned,
+            changes.append(StockChange(
+                product_return.product_id, product_return.quantity_returned, "Return",
                 reference_number=product_return.return_number,
                 notes="Product exchange - returned item"
-            )
-            db.session.add(return_transaction)
+            ))
         
-        # Remove new product from stock for exchange
+        # Remove new product from stock for exchange; fails if it is not available
         if product_return.exchange_product_id:
-            exchange_product = Product.query.get(product_return.exchange_product_id)
-            exchange_product.quantity_in_stock -= product_return.exchange_quantity
-            
-            # Create exchange stock transaction
-            exchange_transaction = StockTransaction(
-                product_id=product_return.exchange_product_id,
-                transaction_type="Sale",
+            changes.append(StockChange(
+                product_return.exchange_product_id, -product_return.exchange_quantity, "Sale",
                 sale_type="Exchange",
-                quantity=-product_return.exchange_quantity,
                 reference_number=product_return.return_number,
                 notes="Product exchange - new item sent"
-            )
-            db.session.add(exchange_transaction)
+            ))
+        
+        StockEngine.apply(changes)
     
     @staticmethod
     def _process_damage_return(product_return):
@@ -141,36 +122,24 @@ class ReturnService:
         
         if product_return.product_type == 'refund':
             # For refund: deduct stock (returned to supplier) and process refund
-            product = Product.query.get(product_return.product_id)
-            product.quantity_in_stock -= product_return.quantity_returned
-            
-            # Create stock transaction for refund (deduction)
-            stock_transaction = StockTransaction(
-                product_id=product_return.product_id,
-                transaction_type="Damage_Refund",
-                quantity=-product_return.quantity_returned,
+            StockEngine.apply([StockChange(
+                product_return.product_id, -product_return.quantity_returned, "Damage_Refund",
                 reference_number=product_return.return_number,
-                notes=f"Damage refund - returned to supplier. Level: {product_return.damage_level}"
-            )
-            db.session.add(stock_transaction)
+                notes=f"Damage refund - returned to supplier. Level: {product_return.damage_level}",
+                check_available=False
+            )])
             
             # Set status to Paid for P&L tracking
             product_return.status = 'Paid'
             
         elif product_return.product_type == 'replacement':
             # For replacement: don't affect stock, send replacement
-            product = Product.query.get(product_return.product_id)
-            product.quantity_in_stock -= product_return.quantity_returned
-            
-            # Create stock transaction for replacement
-            stock_transaction = StockTransaction(
-                product_id=product_return.product_id,
-                transaction_type="Damage_Replacement",
-                quantity=-product_return.quantity_returned,
+            StockEngine.apply([StockChange(
+                product_return.product_id, -product_return.quantity_returned, "Damage_Replacement",
                 reference_number=product_return.return_number,
-                notes=f"Damage replacement sent. Level: {product_return.damage_level}"
-            )
-            db.session.add(stock_transaction)
+                notes=f"Damage replacement sent. Level: {product_return.damage_level}",
+                check_available=False
+            )])
             
             # Set refund amount to 0 for replacement
             product_return.refund_amount = 0
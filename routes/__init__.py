@@ -47,6 +47,12 @@ def register_routes(app):
     except ImportError as e:
         print(f"Failed to import sale_no_invoice_routes: {e}")
     
+    try:
+        from stock_transactions.stock_routes import bp as stock_bp
+        app.register_blueprint(stock_bp, url_prefix="/stock")
+    except ImportError as e:
+        print(f"Failed to import stock_routes: {e}")
+    
     try:
         from purchases.purchase_routes import bp as purchase_bp
         app.register_blueprint(purchase_bp, url_prefix="/purchases")
@@ -22,7 +22,7 @@ def create_sale_no_invoice():
     if not product_id or not quantity or not payment_method:
         return jsonify({"error": "product_id, quantity and payment_method required"}), 400
     try:
-        sale = SaleNoInvoiceService.create_sale(product_id, quantity, discount_percentage, payment_method, customer_id, notes=payload.get("notes"))
+        sale = SaleNoInvoiceService.create_sale(product_id, quantity, discount_percentage, payment_method, customer_id, notes=payload.get("notes"), cart_id=payload.get("cart_id"))
         return jsonify({
             "sale_id": sale.id,
             "customer_id": sale.customer_id,
@@ -2,27 +2,25 @@
 from decimal import Decimal
 from src.extensions import db
 from sales_no_invoice.sale_no_invoice import SaleNoInvoice
-from products.product import Product
+from products.catalog_cache import catalog_cache
 from customers.customer import Customer
-from stock_transactions.stock_transaction import StockTransaction
+from stock_transactions.stock_engine import StockEngine, StockChange, InsufficientStockError
 
 class SaleNoInvoiceService:
     @staticmethod
-    def create_sale(product_id, quantity, discount_percentage, payment_method, customer_id=None, notes=None):
+    def create_sale(product_id, quantity, discount_percentage, payment_method, customer_id=None, notes=None, cart_id=None):
         """
         Create a sale without invoice:
          - fetch product and its selling_price
-         - reduce stock
+         - reduce stock (conditionally, consuming the cart's reservations)
          - create SaleNoInvoice record
          - create StockTransaction (sale_type Without Bill)
         """
-        product = Product.query.get(product_id)
+        product = catalog_cache.get_product(product_id)
         if not product:
             raise ValueError("Product not found")
 
         qty = int(quantity)
-        if product.quantity_in_stock < qty:
-            raise ValueError("Insufficient stock")
 
         unit_price = Decimal(product.selling_price)
         total_amount = (unit_price * qty).quantize(Decimal("0.01"))
@@ -30,8 +28,12 @@ class SaleNoInvoiceService:
         discount_amt = (total_amount * discount_pct / Decimal('100')).quantize(Decimal('0.01'))
         amount_after_discount = total_amount - discount_amt
 
-        # Deduct stock
-        product.quantity_in_stock -= qty
+        # Deduct stock and write the ledger row
+        try:
+            StockEngine.apply([StockChange(product.id, -qty, "Sale", sale_type="Without Bill")], cart_id=cart_id)
+        except InsufficientStockError:
+            db.session.rollback()
+            raise
 
         sale = SaleNoInvoice(
             product_id=product.id,
@@ -47,13 +49,5 @@ class SaleNoInvoiceService:
         )
         db.session.add(sale)
 
-        stock_txn = StockTransaction(
-            product_id=product.id,
-            transaction_type="Sale",
-            sale_type="Without Bill",
-            quantity=-qty,
-        )
-        db.session.add(stock_txn)
-
         db.session.commit()
         return sale
@@ -0,0 +1,186 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from sqlalchemy import func, select, text
+from src.extensions import db
+from products.product import Product
+from stock_transactions.stock_transaction import StockTransaction
+from purchases.purchase_order import PurchaseOrder, PurchaseOrderItem, purchase_payment_status
+from purchases.goods_receipt_service import GOODS_RECEIPT_REFERENCE_PREFIX
+from damage.supplier_return import SupplierReturn
+
+BATCH_SIZE = 1000
+
+
+def _decimal(value, default='0'):
+    try:
+        return Decimal(str(value)) if value not in (None, "") else Decimal(default)
+    except (InvalidOperation, ValueError):
+        return Decimal(default)
+
+
+def _purchase_info(notes):
+    """The payment and product JSON older purchases kept in the ledger notes, or None for plain text."""
+    if not notes or not notes.lstrip().startswith('{'):
+        return None
+    try:
+        info = json.loads(notes)
+    except ValueError:
+        return None
+    return info if isinstance(info, dict) else None
+
+
+def _order_rows(transaction, products):
+    info = _purchase_info(transaction.notes)
+    items = []
+    for stored in (info or {}).get("products") or []:
+        try:
+            quantity = int(stored["quantity_added"])
+            product_id = int(stored["product_id"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        items.append({
+            "product_id": product_id,
+            "product_name": stored.get("name"),
+            "sku": stored.get("sku"),
+            "quantity": quantity,
+            "purchase_price": _decimal(stored.get("purchase_price")),
+            "amount": _decimal(stored.get("amount")),
+            "new_stock": stored.get("new_stock")
+        })
+    if not items:
+        # Single-product purchase, or notes rewritten by a payment update: the ledger row is the line
+        product = products.get(transaction.product_id)
+        price = _decimal(product.purchase_price) if product else Decimal('0')
+        quantity = abs(transaction.quantity)
+        items.append({
+            "product_id": transaction.product_id,
+            "product_name": product.product_name if product else None,
+            "sku": product.sku if product else None,
+            "quantity": quantity,
+            "purchase_price": price,
+            "amount": price * quantity,
+            "new_stock": None
+        })
+
+    info = info or {}
+    total = _decimal(info.get("total_amount")) or sum((item["amount"] for item in items), Decimal('0'))
+    paid = _decimal(info.get("payment_amount", info.get("amount_paid")))
+    order = {
+        "id": transaction.id,
+        "stock_transaction_id": transaction.id,
+        "supplier_id": transaction.supplier_id,
+        "reference_number": transaction.reference_number,
+        "purchase_date": transaction.transaction_date or datetime.utcnow(),
+        "total_amount": total,
+        "paid_amount": paid,
+        "payment_status": info.get("payment_status") or purchase_payment_status(total, paid),
+        "payment_method": info.get("payment_method"),
+        "transaction_reference": info.get("transaction_reference"),
+        # JSON notes held no remarks of their own
+        "notes": None if info else transaction.notes,
+        "created_at": transaction.transaction_date,
+        "updated_at": datetime.utcnow()
+    }
+    for item in items:
+        item["purchase_order_id"] = transaction.id
+    return order, items
+
+
+def sync_purchase_sequences():
+    """
+    Purchases used to be numbered max(id) + 1 with explicit stock transaction ids, which the
+    ledger's own id sequence never saw. Move both sequences past the ids already taken.
+    """
+    db.session.execute(text("CREATE SEQUENCE IF NOT EXISTS purchase_number_seq START 5001"))
+    # Legacy purchases not backfilled yet keep their ledger id as purchase number too
+    db.session.execute(text("""
+        SELECT setval('purchase_number_seq', GREATEST(
+            (SELECT COALESCE(MAX(id), 0) FROM purchase_orders),
+            (SELECT COALESCE(MAX(id), 0) FROM stock_transactions WHERE transaction_type = 'Purchase'),
+            5000))
+    """))
+    db.session.execute(text("""
+        SELECT setval(pg_get_serial_sequence('stock_transactions', 'id'),
+                      GREATEST((SELECT COALESCE(MAX(id), 0) FROM stock_transactions), 1))
+    """))
+    db.session.commit()
+
+
+def backfill_purchase_orders():
+    """
+    Create a purchase order with its lines for every Purchase ledger row that has none,
+    from the JSON the row's notes carried; the order keeps the row's id as its purchase
+    number. Re-running only picks up rows still missing. Damage replacement receipts
+    (reference_number = a supplier return's number) are not purchases; they are first
+    relabelled Replacement_Received so they never become purchase orders. Goods receipts
+    post one unlinked Purchase row per line under their order's GRN- reference; those
+    already have their order and are skipped.
+    Inserted with Core statements, so the dashboard metrics are rebuilt at the end.
+    """
+    # Damage replacement receipts were written as Purchase rows until they got their own type
+    relabelled = db.session.execute(
+        StockTransaction.__table__.update().where(
+            StockTransaction.transaction_type == "Purchase",
+            ~select(PurchaseOrder.id).where(PurchaseOrder.stock_transaction_id == StockTransaction.id).exists(),
+            select(SupplierReturn.id).where(SupplierReturn.return_number == StockTransaction.reference_number).exists()
+        ).values(transaction_type="Replacement_Received")
+    ).rowcount
+    if relabelled:
+        db.session.info.setdefault("report_cache_tables", set()).add(StockTransaction.__tablename__)
+    db.session.commit()
+    if relabelled:
+        print(f"Relabelled {relabelled} damage replacement receipts as Replacement_Received")
+
+    pending = select(StockTransaction.id).where(
+        StockTransaction.transaction_type == "Purchase",
+        ~select(PurchaseOrder.id).where(PurchaseOrder.stock_transaction_id == StockTransaction.id).exists(),
+        # Goods receipt lines: their order exists and names them by reference (goods_receipt_reference)
+        ~select(PurchaseOrder.id).where(
+            StockTransaction.reference_number == func.concat(GOODS_RECEIPT_REFERENCE_PREFIX, PurchaseOrder.id)
+        ).exists()
+    ).order_by(StockTransaction.id)
+    ids = [row_id for (row_id,) in db.session.execute(pending)]
+
+    created = 0
+    for start in range(0, len(ids), BATCH_SIZE):
+        transactions = StockTransaction.query.filter(
+            StockTransaction.id.in_(ids[start:start + BATCH_SIZE])
+        ).order_by(StockTransaction.id).all()
+        products = {p.id: p for p in Product.query.filter(
+            Product.id.in_({t.product_id for t in transactions})
+        ).all()}
+        orders, items = [], []
+        for transaction in transactions:
+            order, order_items = _order_rows(transaction, products)
+            orders.append(order)
+            items.extend(order_items)
+        db.session.execute(PurchaseOrder.__table__.insert(), orders)
+        db.session.execute(PurchaseOrderItem.__table__.insert(), items)
+        db.session.info.setdefault("report_cache_tables", set()).update(
+            (PurchaseOrder.__tablename__, PurchaseOrderItem.__tablename__)
+        )
+        db.session.commit()
+        created += len(orders)
+        print(f"Backfilled {created}/{len(ids)} purchases")
+
+    sync_purchase_sequences()
+
+    from reports.dashboard_service import DashboardService
+    DashboardService.rebuild()
+    print(f"Created {created} purchase orders; purchase numbering synced and dashboard metrics rebuilt")
+
+
+# Usage: python src/backfill_purchase_orders.py
+# Run once after creating the purchase_orders and purchase_order_items tables, before
+# relying on purchase history, the dashboard total or ledger reconciliation. Safe to re-run;
+# it also brings purchase_number_seq and the stock transaction id sequence up to date.
+if __name__ == "__main__":
+    from main import create_app
+    app = create_app()
+    with app.app_context():
+        backfill_purchase_orders()
@@ -0,0 +1,18 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime
+from reports.sales_fact_service import SalesFactService
+
+def backfill_sales_facts(start_date=None, end_date=None):
+    SalesFactService.backfill(start_date, end_date)
+    print(f"Daily sales facts rebuilt for {start_date or 'beginning'} to {end_date or 'today'}")
+
+# Usage: python src/backfill_sales_facts.py [YYYY-MM-DD start] [YYYY-MM-DD end]
+if __name__ == "__main__":
+    from main import create_app
+    dates = [datetime.strptime(arg, "%Y-%m-%d").date() for arg in sys.argv[1:3]]
+    app = create_app()
+    with app.app_context():
+        backfill_sales_facts(*dates)
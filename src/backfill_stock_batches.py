@@ -0,0 +1,36 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime
+from sqlalchemy import text
+from src.extensions import db
+
+LEGACY_BATCH_NUMBER = "LEGACY"
+
+
+def backfill_stock_batches():
+    """
+    Seed stock_batches from the single batch_number / expiry_date stored on each product.
+    Products that already have batches are left alone, so the script can be re-run.
+    """
+    now = datetime.utcnow()
+    result = db.session.execute(text("""
+        INSERT INTO stock_batches (product_id, batch_number, expiry_date, quantity, received_at, last_updated)
+        SELECT p.id, COALESCE(NULLIF(TRIM(p.batch_number), ''), :legacy), p.expiry_date, p.quantity_in_stock, :now, :now
+        FROM products AS p
+        WHERE p.quantity_in_stock > 0
+          AND (NULLIF(TRIM(p.batch_number), '') IS NOT NULL OR p.expiry_date IS NOT NULL)
+          AND NOT EXISTS (SELECT 1 FROM stock_batches AS b WHERE b.product_id = p.id)
+    """), {"legacy": LEGACY_BATCH_NUMBER, "now": now})
+    db.session.commit()
+    print(f"Created {result.rowcount} stock batches from product batch details")
+
+
+# Usage: python src/backfill_stock_batches.py
+# Run once after creating the stock_batches table; products without batch details stay untracked.
+if __name__ == "__main__":
+    from main import create_app
+    app = create_app()
+    with app.app_context():
+        backfill_stock_batches()
@@ -0,0 +1,166 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import re
+import resource
+import subprocess
+import time
+from datetime import datetime
+from sqlalchemy import event, text
+from src.extensions import db
+
+# Parameterless GET endpoints matching these are benchmarked: reports, list endpoints and exports
+DEFAULT_INCLUDE = r"^/reports/|^/[a-z-]+/$|export"
+DEFAULT_EXCLUDE = r"/debug/|/cache/|/dashboard-test"
+# Extra query strings for endpoints whose interesting path needs parameters
+EXTRA_REQUESTS = [
+    "/reports/sales-timeseries?granularity=week",
+    "/reports/stock-movement?limit=500",
+    "/reports/stock-valuation?details=true",
+    "/reports/invoices?details=true",
+]
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def _peak_rss_mb():
+    # ru_maxrss is KB on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1)
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def discover_endpoints(app, include, exclude):
+    paths = []
+    for rule in app.url_map.iter_rules():
+        if "GET" not in rule.methods or rule.arguments:
+            continue
+        if re.search(include, rule.rule) and not re.search(exclude, rule.rule):
+            paths.append(rule.rule)
+    return sorted(set(paths)) + EXTRA_REQUESTS
+
+
+def dataset_counts():
+    tables = ["customers", "products", "invoices", "invoice_items", "payments", "stock_transactions",
+              "sales_no_invoice", "purchase_orders", "purchase_order_items", "stock_batches"]
+    return {t: db.session.execute(text(f"SELECT COUNT(*) FROM {t}")).scalar() for t in tables}
+
+
+def run(app, username, iterations, include, exclude, use_cache):
+    """
+    Call each endpoint through the test client and collect latency and query count.
+    ru_maxrss only ever grows, so each endpoint reports how far it raised the process
+    peak (rss_growth_mb) and the run reports the overall peak.
+    """
+    from user.user import User
+    from user.jwt_utils import generate_jwt_token
+    from reports.report_cache import report_cache
+
+    user = User.query.filter_by(username=username).first() if username else User.query.filter_by(role="admin").first()
+    if user is None:
+        raise RuntimeError("No user to authenticate as; pass --user or create an admin")
+    headers = {"Authorization": f"Bearer {generate_jwt_token(user)}"}
+
+    query_count = {"n": 0}
+
+    def count_query(*args):
+        query_count["n"] += 1
+
+    event.listen(db.engine, "before_cursor_execute", count_query)
+    client = app.test_client()
+    results = {}
+    try:
+        for path in discover_endpoints(app, include, exclude):
+            timings, queries, status = [], [], None
+            rss_before = _peak_rss_mb()
+            client.get(path, headers=headers)  # warm-up
+            for _ in range(iterations):
+                if not use_cache:
+                    report_cache.clear()
+                query_count["n"] = 0
+                started = time.perf_counter()
+                response = client.get(path, headers=headers)
+                timings.append((time.perf_counter() - started) * 1000)
+                queries.append(query_count["n"])
+                status = response.status_code
+            results[path] = {
+                "status": status,
+                "p50_ms": round(_percentile(timings, 50), 2),
+                "p95_ms": round(_percentile(timings, 95), 2),
+                "mean_ms": round(sum(timings) / len(timings), 2),
+                "queries": max(queries),
+                "rss_growth_mb": round(_peak_rss_mb() - rss_before, 1)
+            }
+            print(f"{status} {path}: p50 {results[path]['p50_ms']}ms, p95 {results[path]['p95_ms']}ms, "
+                  f"{results[path]['queries']} queries")
+    finally:
+        event.remove(db.engine, "before_cursor_execute", count_query)
+
+    return {
+        "generated_at": datetime.utcnow().isoformat(),
+        "git_commit": _git_commit(),
+        "iterations": iterations,
+        "report_cache": use_cache,
+        "dataset": dataset_counts(),
+        "peak_rss_mb": _peak_rss_mb(),
+        "endpoints": results
+    }
+
+
+def compare(current, baseline, tolerance):
+    """Endpoints whose p95 or query count grew beyond the tolerance versus the baseline."""
+    regressions = []
+    for path, now in current["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(path)
+        if not before:
+            continue
+        if now["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{path}: p95 {before['p95_ms']}ms -> {now['p95_ms']}ms")
+        if now["queries"] > before["queries"]:
+            regressions.append(f"{path}: queries {before['queries']} -> {now['queries']}")
+    return regressions
+
+
+# Usage: python src/benchmark_reports.py --output benchmarks/baseline.json
+#        python src/benchmark_reports.py --output run.json --compare benchmarks/baseline.json
+# Load data first with src/generate_synthetic_data.py against a local database.
+if __name__ == "__main__":
+    from main import create_app
+    parser = argparse.ArgumentParser(description="Benchmark report, list and export endpoints")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", help="Baseline JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed p95 growth (0.2 = 20%%)")
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--user", help="Username to authenticate as (default: first admin)")
+    parser.add_argument("--include", default=DEFAULT_INCLUDE)
+    parser.add_argument("--exclude", default=DEFAULT_EXCLUDE)
+    parser.add_argument("--use-cache", action="store_true", help="Keep the report cache warm between calls")
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        results = run(app, args.user, args.iterations, args.include, args.exclude, args.use_cache)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        sys.exit(1 if regressions else 0)
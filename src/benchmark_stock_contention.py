@@ -0,0 +1,196 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import func
+from sqlalchemy.exc import OperationalError
+from src.extensions import db
+from products.product import Product
+from customers.customer import Customer
+from invoices.invoice import Invoice
+from sales_no_invoice.sale_no_invoice import SaleNoInvoice
+from stock_transactions.stock_transaction import StockTransaction
+from stock_transactions.stock_engine import StockEngine, StockChange, InsufficientStockError
+
+SALE_TYPE = "Contention Benchmark"
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def create_products(count, stock):
+    start = (db.session.query(func.max(Product.id)).scalar() or 0) + 1
+    ids = list(range(start, start + count))
+    for pid in ids:
+        db.session.add(Product(id=pid, product_name=f"Benchmark product {pid}", sku=f"BENCH-{pid}",
+                               selling_price=10, purchase_price=5, quantity_in_stock=stock))
+    db.session.commit()
+    return ids
+
+
+def create_customer():
+    customer = Customer(contact_person="Benchmark customer", phone=f"BENCH-{time.time_ns()}")
+    db.session.add(customer)
+    db.session.commit()
+    return customer.id
+
+
+def remove_products(product_ids, customer_id=None):
+    StockTransaction.query.filter(StockTransaction.product_id.in_(product_ids)).delete(synchronize_session=False)
+    if customer_id is not None:
+        for record in Invoice.query.filter_by(customer_id=customer_id).all() + \
+                SaleNoInvoice.query.filter_by(customer_id=customer_id).all():
+            db.session.delete(record)
+        db.session.delete(Customer.query.get(customer_id))
+    for product in Product.query.filter(Product.id.in_(product_ids)).all():
+        db.session.delete(product)
+    db.session.commit()
+
+
+def sell_with_engine(basket, rng):
+    StockEngine.apply([StockChange(pid, -1, "Sale", sale_type=SALE_TYPE) for pid in basket])
+    db.session.commit()
+
+
+def sell_legacy(basket, rng):
+    # The previous pattern: read, check and decrement in Python without a lock
+    for pid in basket:
+        product = Product.query.get(pid)
+        if product.quantity_in_stock < 1:
+            raise InsufficientStockError([])
+        product.quantity_in_stock -= 1
+        db.session.add(StockTransaction(product_id=pid, transaction_type="Sale", sale_type=SALE_TYPE, quantity=-1))
+    db.session.commit()
+
+
+def sell_mixed(customer_id):
+    """Invoices and direct sales of the same products, the two checkout paths of the app."""
+    from invoices.invoice_service import InvoiceService
+    from sales_no_invoice.sale_no_invoice_service import SaleNoInvoiceService
+
+    def sell(basket, rng):
+        if rng.random() < 0.5:
+            InvoiceService.create_invoice(customer_id, [{"product_id": pid, "quantity": 1} for pid in basket])
+        else:
+            for pid in basket:
+                SaleNoInvoiceService.create_sale(pid, 1, 0, "Cash", customer_id=customer_id)
+    return sell
+
+
+def cashier(app, sell, product_ids, sales, basket_size, seed, results):
+    rng = random.Random(seed)
+    latencies, rejected, deadlocks, errors = [], 0, 0, 0
+    with app.app_context():
+        for _ in range(sales):
+            basket = rng.sample(product_ids, min(basket_size, len(product_ids)))
+            started = time.perf_counter()
+            try:
+                sell(basket, rng)
+                latencies.append((time.perf_counter() - started) * 1000)
+            except InsufficientStockError:
+                db.session.rollback()
+                rejected += 1
+            except OperationalError as e:
+                db.session.rollback()
+                if "deadlock detected" in str(e):
+                    deadlocks += 1
+                else:
+                    errors += 1
+            except Exception:
+                db.session.rollback()
+                errors += 1
+        db.session.remove()
+    results.append((latencies, rejected, errors, deadlocks))
+
+
+def run(app, mode, cashiers, sales, product_count, stock, basket_size, keep):
+    """Many concurrent cashiers selling one unit of a few hot products per sale."""
+    product_ids = create_products(product_count, stock)
+    customer_id = None
+    if mode == "mixed":
+        customer_id = create_customer()
+        sell = sell_mixed(customer_id)
+    else:
+        sell = sell_with_engine if mode == "engine" else sell_legacy
+    results = []
+    threads = [
+        threading.Thread(target=cashier, args=(app, sell, product_ids, sales, basket_size, n, results))
+        for n in range(cashiers)
+    ]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    latencies = [ms for r in results for ms in r[0]]
+    # Every sale moves one unit of each basket product and writes one ledger row for it
+    sold = dict(db.session.query(StockTransaction.product_id, func.count(StockTransaction.id)).filter(
+        StockTransaction.product_id.in_(product_ids), StockTransaction.transaction_type == "Sale"
+    ).group_by(StockTransaction.product_id).all())
+    final = dict(db.session.query(Product.id, Product.quantity_in_stock).filter(Product.id.in_(product_ids)).all())
+    # Units the ledger says were sold beyond the stock, and stock that disagrees with the ledger
+    oversold = sum(max(0, sold.get(pid, 0) - stock) for pid in product_ids)
+    lost_updates = sum(abs(final[pid] - (stock - sold.get(pid, 0))) for pid in product_ids)
+
+    if not keep:
+        remove_products(product_ids, customer_id)
+
+    return {
+        "generated_at": datetime.utcnow().isoformat(),
+        "mode": mode,
+        "cashiers": cashiers,
+        "sales_per_cashier": sales,
+        "products": product_count,
+        "initial_stock": stock,
+        "basket_size": basket_size,
+        "elapsed_seconds": round(elapsed, 3),
+        "completed_sales": len(latencies),
+        "sales_per_second": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "p50_ms": round(_percentile(latencies, 50), 2) if latencies else None,
+        "p95_ms": round(_percentile(latencies, 95), 2) if latencies else None,
+        "p99_ms": round(_percentile(latencies, 99), 2) if latencies else None,
+        "rejected_insufficient_stock": sum(r[1] for r in results),
+        "errors": sum(r[2] for r in results),
+        "deadlocks": sum(r[3] for r in results),
+        "oversold_units": oversold,
+        "lost_stock_updates": lost_updates
+    }
+
+
+# Usage: python src/benchmark_stock_contention.py --cashiers 32 --sales 200 --products 3 --stock 2000
+#        python src/benchmark_stock_contention.py --mode legacy ...   (the old read-check-write path)
+#        python src/benchmark_stock_contention.py --mode mixed ...    (invoices and direct sales together)
+# Runs against a local database: it creates BENCH-* products and removes them afterwards.
+# Run src/rebuild_dashboard_metrics.py afterwards if the legacy mode lost updates.
+if __name__ == "__main__":
+    from main import create_app
+    parser = argparse.ArgumentParser(description="Concurrent checkout benchmark for the stock engine")
+    parser.add_argument("--mode", choices=["engine", "legacy", "mixed"], default="engine")
+    parser.add_argument("--cashiers", type=int, default=16)
+    parser.add_argument("--sales", type=int, default=200, help="Sales per cashier")
+    parser.add_argument("--products", type=int, default=3, help="Hot products shared by all cashiers")
+    parser.add_argument("--stock", type=int, default=1000, help="Initial stock per product")
+    parser.add_argument("--basket", type=int, default=2, help="Products per sale")
+    parser.add_argument("--keep", action="store_true", help="Keep the benchmark products and ledger rows")
+    parser.add_argument("--output", help="Write the results as JSON")
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        results = run(app, args.mode, args.cashiers, args.sales, args.products, args.stock, args.basket, args.keep)
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,31 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from src.extensions import db
+
+CUSTOMER_INDEXES = (
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_invoices_customer_date ON invoices (customer_id, invoice_date, id)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_invoice_items_invoice ON invoice_items (invoice_id)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_payments_invoice ON payments (invoice_id)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_product_returns_customer ON product_returns (customer_id)",
+)
+
+
+def create_customer_indexes():
+    """Build the indexes behind the customer summary without blocking writes."""
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+    with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        for statement in CUSTOMER_INDEXES:
+            connection.execute(text(statement))
+            print(statement.split(" IF NOT EXISTS ")[1].split(" ON ")[0], "ready")
+
+
+# Usage: python src/create_customer_indexes.py
+# Run once on databases created before /customers/{id}/summary; new databases get the indexes from create_tables.py
+if __name__ == "__main__":
+    from main import create_app
+    app = create_app()
+    with app.app_context():
+        create_customer_indexes()
@@ -0,0 +1,31 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from src.extensions import db
+
+SEARCH_INDEXES = (
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_products_name_trgm ON products USING gin (product_name gin_trgm_ops)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_products_sku_trgm ON products USING gin (sku gin_trgm_ops)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_products_description_trgm ON products USING gin (description gin_trgm_ops)",
+)
+
+
+def create_search_indexes():
+    """Enable pg_trgm and build the product search indexes without blocking writes."""
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+    with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        for statement in SEARCH_INDEXES:
+            connection.execute(text(statement))
+            print(statement.split(" IF NOT EXISTS ")[1].split(" ON ")[0], "ready")
+
+
+# Usage: python src/create_search_indexes.py
+# Run once on databases created before /products/search; new databases get the indexes from create_tables.py
+if __name__ == "__main__":
+    from main import create_app
+    app = create_app()
+    with app.app_context():
+        create_search_indexes()
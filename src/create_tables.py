@@ -11,11 +11,18 @@ from invoices.invoice_item import InvoiceItem
 from payments.payment import Payment
 from products.product import Product
 from purchases.purchase_bill import PurchaseBill
+from purchases.purchase_order import PurchaseOrder, PurchaseOrderItem
 from purchases.supplier_damage import SupplierDamage
 from reports.report import Report
+from reports.dashboard_metrics import DashboardMetrics
+from reports.daily_sales_fact import DailySalesFact
+from reports.sales_timeseries_bucket import SalesTimeseriesBucket
+from reports.inventory_snapshot import InventorySnapshot
 from returns.product_return import ProductReturn, DamagedProduct
 from sales_no_invoice.sale_no_invoice import SaleNoInvoice
 from stock_transactions.stock_transaction import StockTransaction
+from stock_transactions.stock_reservation import StockReservation
+from stock_transactions.stock_batch import StockBatch
 from suppliers.supplier import Supplier
 from user.user import User, Permission, UserPermission, AuditLog
 from user.models import PasswordResetToken
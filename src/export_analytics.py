@@ -0,0 +1,26 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reports.analytics_export_service import AnalyticsExportService
+
+def export_analytics(output_dir, tables=None, full=False):
+    written = AnalyticsExportService.export(output_dir, tables=tables, full=full)
+    for table, rows in written.items():
+        print(f"{table}: {rows} rows")
+    print(f"Analytics export written to {output_dir}")
+
+# Usage: python src/export_analytics.py <output_dir> [--full] [table ...]
+# Requires pyarrow. Load the result with pandas.read_parquet("<output_dir>/invoices")
+# or DuckDB: SELECT * FROM '<output_dir>/invoices/*.parquet'
+if __name__ == "__main__":
+    from main import create_app
+    if len(sys.argv) < 2:
+        print("Usage: python src/export_analytics.py <output_dir> [--full] [table ...]")
+        sys.exit(1)
+    args = sys.argv[2:]
+    full = "--full" in args
+    tables = [arg for arg in args if arg != "--full"] or None
+    app = create_app()
+    with app.app_context():
+        export_analytics(sys.argv[1], tables=tables, full=full)
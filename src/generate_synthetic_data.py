@@ -0,0 +1,346 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import csv
+import io
+import random
+from datetime import datetime, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+from sqlalchemy import text
+from src.extensions import db
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+COPY_CHUNK_ROWS = 100000
+CENT = Decimal("0.01")
+
+PAYMENT_METHODS = ["Cash", "UPI", "Card", "Bank Transfer"]
+PAYMENT_TERMS = ["Immediate", "Net 15", "Net 30"]
+
+
+def _money(value):
+    return Decimal(value).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def _read_seed(name):
+    with open(os.path.join(DATA_DIR, name), newline="", encoding="utf-8-sig") as f:
+        return list(csv.DictReader(f))
+
+
+class CopyWriter:
+    """
+    Buffers rows as CSV and streams them into a table with COPY ... FROM STDIN.
+    Writers in depends_on are flushed first, so foreign keys find their rows.
+    """
+
+    def __init__(self, cursor, table, columns, depends_on=()):
+        self.cursor = cursor
+        self.table = table
+        self.columns = columns
+        self.depends_on = depends_on
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer)
+        self.pending = 0
+        self.total = 0
+
+    def write(self, row):
+        self.writer.writerow(row)
+        self.pending += 1
+        if self.pending >= COPY_CHUNK_ROWS:
+            self.flush()
+
+    def flush(self):
+        for writer in self.depends_on:
+            writer.flush()
+        if not self.pending:
+            return
+        self.buffer.seek(0)
+        sql = f"COPY {self.table} ({', '.join(self.columns)}) FROM STDIN WITH (FORMAT csv)"
+        if hasattr(self.cursor, "copy_expert"):
+            self.cursor.copy_expert(sql, self.buffer)  # psycopg2
+        else:
+            self.cursor.execute(sql, stream=self.buffer)  # pg8000
+        self.total += self.pending
+        self.pending = 0
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer)
+
+
+def _next_id(table, floor):
+    current = db.session.execute(text(f"SELECT COALESCE(MAX(id), 0) FROM {table}")).scalar()
+    return max(current + 1, floor)
+
+
+def generate(customers, products, suppliers, invoice_items, items_per_invoice, stock_transactions,
+             direct_sales, days, seed):
+    """
+    Scale the seed files in data/ to the requested sizes and bulk load them with COPY.
+    Rows are appended after the existing ids. Purchases are written as purchase orders with
+    their lines, batches and Purchase ledger rows. Derived tables (sales facts, dashboard
+    metrics, inventory snapshot) are rebuilt afterwards because COPY bypasses the ORM events.
+    """
+    from src.backfill_purchase_orders import sync_purchase_sequences
+    rng = random.Random(seed)
+    seed_categories = _read_seed("categories.csv")
+    seed_products = _read_seed("products.csv")
+    seed_customers = _read_seed("customers.csv")
+    branches = sorted({c["branch"] for c in seed_customers if c.get("branch")}) or ["Main"]
+    now = datetime.utcnow().replace(microsecond=0)
+    start = now - timedelta(days=days)
+
+    def random_time():
+        return start + timedelta(seconds=rng.randrange(days * 86400))
+
+    # Purchase numbers come after every number already taken, legacy ledger ids included
+    sync_purchase_sequences()
+    purchase_id = db.session.execute(text("SELECT last_value FROM purchase_number_seq")).scalar() + 1
+
+    raw = db.session.connection().connection
+    cursor = raw.cursor()
+
+    # Categories: the seed list, only where missing
+    existing_categories = {row[0] for row in db.session.execute(text("SELECT id FROM categories"))}
+    category_writer = CopyWriter(cursor, "categories", [
+        "id", "name", "description", "subcategory_id", "subcategory_name",
+        "cgst_rate", "sgst_rate", "igst_rate", "created_at"])
+    for c in seed_categories:
+        if int(c["id"]) not in existing_categories:
+            category_writer.write([c["id"], c["name"], c["description"], c["subcategory_id"] or None,
+                                   c["subcategory_name"] or None, 9, 9, 18, now])
+    category_writer.flush()
+    category_ids = [int(c["id"]) for c in seed_categories]
+
+    supplier_start = _next_id("suppliers", 6001)
+    supplier_ids = list(range(supplier_start, supplier_start + suppliers))
+    supplier_writer = CopyWriter(cursor, "suppliers", [
+        "id", "name", "contact_person", "email", "phone", "address", "payment_terms", "created_at"])
+    for sid in supplier_ids:
+        supplier_writer.write([sid, f"Supplier {sid}", f"Contact {sid}", f"supplier{sid}@example.com",
+                               f"70{sid:08d}", f"{sid} Industrial Area", rng.choice(PAYMENT_TERMS), now])
+    supplier_writer.flush()
+
+    customer_start = _next_id("customers", 8001)
+    customer_ids = list(range(customer_start, customer_start + customers))
+    customer_branch = {}
+    customer_writer = CopyWriter(cursor, "customers", [
+        "id", "contact_person", "business_name", "email", "phone", "billing_address", "shipping_address",
+        "gst_number", "branch", "payment_terms", "opening_balance", "created_at"])
+    for cid in customer_ids:
+        template = seed_customers[cid % len(seed_customers)]
+        branch = rng.choice(branches)
+        customer_branch[cid] = branch
+        customer_writer.write([cid, f"{template['contact_person']} {cid}", f"{template['business_name']} {cid}",
+                               f"customer{cid}@example.com", f"9{cid:09d}", f"{cid} Street, {branch}",
+                               f"{cid} Avenue, {branch}", f"GST{cid:08d}", branch, rng.choice(PAYMENT_TERMS),
+                               _money(rng.uniform(0, 20000)), random_time()])
+    customer_writer.flush()
+
+    product_start = _next_id("products", 7001)
+    product_ids = list(range(product_start, product_start + products))
+    product_price = {}
+    product_info = {}
+    unbatched_stock = {}
+    product_writer = CopyWriter(cursor, "products", [
+        "id", "product_name", "description", "sku", "category_id", "unit_of_measure", "selling_price",
+        "purchase_price", "quantity_in_stock", "reorder_level", "max_stock_level", "supplier_id",
+        "barcode", "date_added"])
+    for pid in product_ids:
+        template = seed_products[pid % len(seed_products)]
+        cost = _money(rng.uniform(20, 5000))
+        selling = _money(cost * Decimal(str(rng.uniform(1.1, 1.8))))
+        product_price[pid] = (selling, cost)
+        product_info[pid] = (f"{template['product_name']} #{pid}", f"SYN-{pid:08d}")
+        unbatched_stock[pid] = rng.randint(0, 500)
+        reorder_level = rng.randint(5, 50)
+        product_writer.write([pid, product_info[pid][0], template["description"],
+                              product_info[pid][1], rng.choice(category_ids), template["unit_of_measure"] or "Piece",
+                              selling, cost, unbatched_stock[pid], reorder_level,
+                              reorder_level * rng.randint(5, 20), rng.choice(supplier_ids),
+                              f"89{pid:011d}", random_time()])
+    product_writer.flush()
+
+    invoice_writer = CopyWriter(cursor, "invoices", [
+        "id", "invoice_number", "customer_id", "invoice_date", "due_date", "payment_terms", "currency",
+        "total_before_tax", "tax_amount", "cgst_amount", "sgst_amount", "igst_amount", "discount_amount",
+        "shipping_charges", "other_charges", "additional_discount", "grand_total", "status", "created_at"])
+    item_writer = CopyWriter(cursor, "invoice_items", [
+        "id", "invoice_id", "product_id", "quantity", "unit_price", "discount_per_item", "discount_type",
+        "tax_rate_per_item", "cgst_rate", "sgst_rate", "igst_rate", "cgst_amount", "sgst_amount",
+        "igst_amount", "total_price"], depends_on=(invoice_writer,))
+    payment_writer = CopyWriter(cursor, "payments", [
+        "id", "invoice_id", "customer_id", "amount_before_discount", "balance_amount", "excess_amount",
+        "payment_date", "payment_method", "amount_paid", "payment_status"], depends_on=(invoice_writer,))
+    transaction_writer = CopyWriter(cursor, "stock_transactions", [
+        "id", "product_id", "transaction_type", "sale_type", "quantity", "transaction_date",
+        "supplier_id", "invoice_id", "reference_number", "notes"], depends_on=(invoice_writer,))
+    order_writer = CopyWriter(cursor, "purchase_orders", [
+        "id", "stock_transaction_id", "supplier_id", "reference_number", "purchase_date", "total_amount",
+        "paid_amount", "payment_status", "payment_method", "created_at", "updated_at"],
+        depends_on=(transaction_writer,))
+    order_item_writer = CopyWriter(cursor, "purchase_order_items", [
+        "id", "purchase_order_id", "product_id", "product_name", "sku", "quantity", "purchase_price",
+        "amount", "batch_number", "expiry_date"], depends_on=(order_writer,))
+    batch_writer = CopyWriter(cursor, "stock_batches", [
+        "id", "product_id", "batch_number", "expiry_date", "quantity", "received_at", "last_updated"])
+    direct_writer = CopyWriter(cursor, "sales_no_invoice", [
+        "id", "product_id", "quantity", "selling_price", "total_amount", "sale_date", "discount_percentage",
+        "discount_amount", "amount_after_discount", "payment_method", "customer_id"])
+
+    invoice_id = _next_id("invoices", 4001)
+    item_id = _next_id("invoice_items", 1)
+    payment_id = _next_id("payments", 1)
+    transaction_id = _next_id("stock_transactions", 1)
+    direct_id = _next_id("sales_no_invoice", 1)
+    order_item_id = _next_id("purchase_order_items", 1)
+    batch_id = _next_id("stock_batches", 1)
+
+    # Invoices with their items, payments and sale transactions
+    items_left = invoice_items
+    while items_left > 0:
+        count = min(items_left, max(1, rng.randint(1, 2 * items_per_invoice - 1)))
+        items_left -= count
+        customer_id = rng.choice(customer_ids)
+        invoice_date = random_time()
+        subtotal = tax = Decimal("0")
+        for _ in range(count):
+            pid = rng.choice(product_ids)
+            selling, _cost = product_price[pid]
+            quantity = rng.randint(1, 10)
+            line = selling * quantity
+            line_tax = _money(line * Decimal("0.18"))
+            item_writer.write([item_id, invoice_id, pid, quantity, selling, 0, "percentage",
+                               18, 0, 0, 18, 0, 0, line_tax, line + line_tax])
+            transaction_writer.write([transaction_id, pid, "Sale", "With Bill", quantity, invoice_date,
+                                      None, invoice_id, f"INV-{invoice_id}", None])
+            item_id += 1
+            transaction_id += 1
+            subtotal += line
+            tax += line_tax
+        shipping = _money(rng.choice([0, 0, 50, 100]))
+        grand_total = subtotal + tax + shipping
+        paid = rng.random()
+        status = "Paid" if paid < 0.6 else ("Partially Paid" if paid < 0.8 else "Pending")
+        invoice_writer.write([invoice_id, f"INV-SYN-{invoice_id}", customer_id, invoice_date,
+                              invoice_date + timedelta(days=30), "Net 30", "INR", subtotal, tax, 0, 0, tax, 0,
+                              shipping, 0, 0, grand_total, status, invoice_date])
+        if status != "Pending":
+            amount = grand_total if status == "Paid" else _money(grand_total / 2)
+            payment_writer.write([payment_id, invoice_id, customer_id, grand_total, grand_total - amount, 0,
+                                  invoice_date + timedelta(days=rng.randint(0, 30)), rng.choice(PAYMENT_METHODS),
+                                  amount, "Successful"])
+            payment_id += 1
+        invoice_id += 1
+
+    # Sales without invoice
+    for _ in range(direct_sales):
+        pid = rng.choice(product_ids)
+        selling, _cost = product_price[pid]
+        quantity = rng.randint(1, 5)
+        total = selling * quantity
+        sale_date = random_time()
+        direct_writer.write([direct_id, pid, quantity, selling, total, sale_date, 0, 0, total,
+                             rng.choice(PAYMENT_METHODS), rng.choice(customer_ids)])
+        transaction_writer.write([transaction_id, pid, "Sale", "Without Bill", -quantity, sale_date,
+                                  None, None, f"SNI-{direct_id}", None])
+        direct_id += 1
+        transaction_id += 1
+
+    # Purchase orders fill the remaining stock transactions, one Purchase ledger row each on the
+    # first product holding the total. About half the lines carry a batch; batches never hold
+    # more than the product's stock, as the stock engine keeps them
+    for _ in range(max(0, stock_transactions - transaction_writer.total - transaction_writer.pending)):
+        purchase_date = random_time()
+        supplier_id = rng.choice(supplier_ids)
+        reference = f"PUR-SYN-{purchase_id}"
+        lines = rng.sample(product_ids, min(len(product_ids), rng.randint(1, 5)))
+        total_amount, total_quantity = Decimal("0"), 0
+        for line, pid in enumerate(lines, 1):
+            _selling, cost = product_price[pid]
+            quantity = rng.randint(10, 200)
+            batch_number = expiry_date = None
+            batched = min(quantity, unbatched_stock[pid])
+            if batched and rng.random() < 0.5:
+                batch_number = f"B{purchase_id}-{line}"
+                expiry_date = (purchase_date + timedelta(days=rng.randint(30, 720))).date()
+                unbatched_stock[pid] -= batched
+                batch_writer.write([batch_id, pid, batch_number, expiry_date, batched, purchase_date, purchase_date])
+                batch_id += 1
+            order_item_writer.write([order_item_id, purchase_id, pid, product_info[pid][0], product_info[pid][1],
+                                     quantity, cost, cost * quantity, batch_number, expiry_date])
+            order_item_id += 1
+            total_amount += cost * quantity
+            total_quantity += quantity
+        paid = rng.random()
+        status = "Paid" if paid < 0.7 else ("Partially Paid" if paid < 0.85 else "Pending")
+        paid_amount = {"Paid": total_amount, "Partially Paid": _money(total_amount / 2)}.get(status, 0)
+        transaction_writer.write([transaction_id, lines[0], "Purchase", None, total_quantity, purchase_date,
+                                  supplier_id, None, reference, None])
+        order_writer.write([purchase_id, transaction_id, supplier_id, reference, purchase_date, total_amount,
+                            paid_amount, status, rng.choice(PAYMENT_METHODS) if paid_amount else None,
+                            purchase_date, purchase_date])
+        transaction_id += 1
+        purchase_id += 1
+
+    writers = [invoice_writer, item_writer, payment_writer, transaction_writer, direct_writer,
+               order_writer, order_item_writer, batch_writer]
+    for writer in writers:
+        writer.flush()
+
+    # Explicit ids were copied into serial columns; move their sequences past them
+    for table in ("invoice_items", "payments", "stock_transactions", "sales_no_invoice",
+                  "purchase_order_items", "stock_batches"):
+        db.session.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT COALESCE(MAX(id), 1) FROM {table}))"
+        ))
+    db.session.execute(text(
+        "SELECT setval('customer_id_seq', GREATEST((SELECT COALESCE(MAX(id), 0) FROM customers), 8000))"
+    ))
+    db.session.commit()
+    sync_purchase_sequences()
+
+    counts = {"categories": category_writer.total, "suppliers": supplier_writer.total,
+              "customers": customer_writer.total, "products": product_writer.total}
+    counts.update({writer.table: writer.total for writer in writers})
+    return counts
+
+
+def rebuild_derived():
+    from reports.sales_fact_service import SalesFactService
+    from reports.dashboard_service import DashboardService
+    from reports.inventory_valuation_service import InventoryValuationService
+    SalesFactService.backfill()
+    DashboardService.rebuild()
+    InventoryValuationService.snapshot()
+
+
+# Usage: python src/generate_synthetic_data.py --customers 100000 --products 50000 \
+#            --invoice-items 2000000 --stock-transactions 5000000
+# Appends to the configured database; point it at a local benchmark database only.
+if __name__ == "__main__":
+    from main import create_app
+    parser = argparse.ArgumentParser(description="Bulk load synthetic data scaled from the seeds in data/")
+    parser.add_argument("--customers", type=int, default=10000)
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--suppliers", type=int, default=200)
+    parser.add_argument("--invoice-items", type=int, default=200000)
+    parser.add_argument("--items-per-invoice", type=int, default=4)
+    parser.add_argument("--stock-transactions", type=int, default=500000)
+    parser.add_argument("--direct-sales", type=int, default=50000)
+    parser.add_argument("--days", type=int, default=730, help="Spread dates over this many past days")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--skip-rebuild", action="store_true", help="Do not rebuild facts, metrics and snapshot")
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        started = datetime.utcnow()
+        counts = generate(args.customers, args.products, args.suppliers, args.invoice_items,
+                          args.items_per_invoice, args.stock_transactions, args.direct_sales,
+                          args.days, args.seed)
+        for table, rows in counts.items():
+            print(f"{table}: {rows} rows")
+        if not args.skip_rebuild:
+            rebuild_derived()
+            print("Rebuilt daily sales facts, dashboard metrics and inventory snapshot")
+        print(f"Done in {(datetime.utcnow() - started).total_seconds():.1f}s")
@@ -47,6 +47,14 @@ def create_app():
         from suppliers.supplier import Supplier
         from category.category import Category, SubCategory
         from stock_transactions.stock_transaction import StockTransaction
+        from reports.report import Report
+        from reports.dashboard_metrics import DashboardMetrics
+        from reports.daily_sales_fact import DailySalesFact
+        from reports.sales_timeseries_bucket import SalesTimeseriesBucket
+        from reports.inventory_snapshot import InventorySnapshot
+        from stock_transactions.stock_reservation import StockReservation
+        from stock_transactions.stock_batch import StockBatch
+        from purchases.purchase_order import PurchaseOrder, PurchaseOrderItem
 
     # register routes/blueprints
     register_routes(app)
@@ -0,0 +1,59 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+from sqlalchemy import text
+from src.extensions import db
+from products.product import Product, normalize_barcode
+from products.catalog_cache import notify_catalog_change
+
+
+def normalize_barcodes(clear_duplicates=False):
+    """
+    Rewrite stored barcodes in normalized form and create the unique scan index.
+    Duplicate barcodes are listed; with clear_duplicates the lowest product id keeps
+    the barcode and the others are set to NULL so the index can be built.
+    """
+    rows = db.session.query(Product.id, Product.barcode).filter(Product.barcode.isnot(None)) \
+        .order_by(Product.id).all()
+    owners = {}
+    updates = []
+    duplicates = []
+    for product_id, barcode in rows:
+        normalized = normalize_barcode(barcode)
+        if normalized and normalized in owners:
+            duplicates.append((product_id, barcode, owners[normalized]))
+            if clear_duplicates:
+                normalized = None
+        elif normalized:
+            owners[normalized] = product_id
+        if normalized != barcode:
+            updates.append({"id": product_id, "barcode": normalized})
+
+    for product_id, barcode, owner in duplicates:
+        print(f"Duplicate barcode {barcode!r} on product {product_id} (kept by product {owner})")
+    if duplicates and not clear_duplicates:
+        print("Unique index not created; fix the duplicates or re-run with --clear-duplicates")
+        return
+
+    if updates:
+        db.session.bulk_update_mappings(Product, updates)
+        db.session.info.setdefault("report_cache_tables", set()).add(Product.__tablename__)
+    db.session.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ux_products_barcode ON products (barcode)"))
+    notify_catalog_change(db.session.connection(), "product")
+    db.session.commit()
+    print(f"Normalized {len(updates)} barcodes; unique index ux_products_barcode is in place")
+
+
+# Usage: python src/normalize_barcodes.py [--clear-duplicates]
+# Run once before deploying the scan endpoint; new writes are normalized by the Product model.
+if __name__ == "__main__":
+    from main import create_app
+    parser = argparse.ArgumentParser(description="Normalize product barcodes and create the unique index")
+    parser.add_argument("--clear-duplicates", action="store_true")
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        normalize_barcodes(args.clear_duplicates)
@@ -0,0 +1,101 @@
+import logging
+import os
+import select
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# How often the listener wakes up to check for notifications and connection health
+LISTEN_POLL_SECONDS = 1.0
+LISTEN_RECONNECT_SECONDS = 5.0
+
+
+class PgListener:
+    """Background LISTEN on one Postgres channel, started lazily once per process.
+
+    on_payload(payload) is called for every notification. on_reset() is called
+    whenever notifications may have been missed: when the process starts
+    listening (including after a fork), on every (re)connect before listening
+    is set, and after every disconnect.
+    """
+
+    def __init__(self, channel, on_payload, on_reset, name=None):
+        self.channel = channel
+        self._on_payload = on_payload
+        self._on_reset = on_reset
+        self._name = name or f"{channel}-listener"
+        self._lock = threading.Lock()
+        self._pid = None
+        self._listening = False
+        self.reconnects = 0
+
+    @property
+    def listening(self):
+        """True while notifications reach this process. Does not start the listener."""
+        return self._pid == os.getpid() and self._listening
+
+    def ensure_started(self):
+        # Threads do not survive gunicorn's fork of a preloaded app
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            self._listening = False
+            self._on_reset()
+            self._pid = pid
+        from src.extensions import db
+        thread = threading.Thread(target=self._listen, args=(db.engine,), name=self._name, daemon=True)
+        thread.start()
+
+    def _listen(self, engine):
+        while True:
+            connection = None
+            try:
+                connection = engine.raw_connection()
+                # Keep the LISTEN connection out of the pool for good
+                connection.detach()
+                dbapi_connection = getattr(connection, "dbapi_connection", None) or connection.connection
+                dbapi_connection.autocommit = True
+                cursor = dbapi_connection.cursor()
+                cursor.execute(f"LISTEN {self.channel}")
+                # Anything sent before LISTEN took effect never reaches us
+                self._on_reset()
+                self._listening = True
+                self._receive(dbapi_connection, cursor)
+            except Exception:
+                logger.exception("Listener on %s lost its connection; reconnecting", self.channel)
+            finally:
+                self._listening = False
+                self.reconnects += 1
+                self._on_reset()
+                if connection is not None:
+                    try:
+                        connection.close()
+                    except Exception:
+                        pass
+            time.sleep(LISTEN_RECONNECT_SECONDS)
+
+    def _receive(self, dbapi_connection, cursor):
+        while True:
+            if hasattr(dbapi_connection, "notifies"):
+                # psycopg2: wait on the socket, then read what arrived
+                if select.select([dbapi_connection], [], [], LISTEN_POLL_SECONDS)[0]:
+                    dbapi_connection.poll()
+                while dbapi_connection.notifies:
+                    self._dispatch(dbapi_connection.notifies.pop(0).payload)
+            else:
+                # pg8000 only reads notifications while running a statement
+                cursor.execute("SELECT 1")
+                cursor.fetchall()
+                while dbapi_connection.notifications:
+                    self._dispatch(dbapi_connection.notifications.popleft()[2])
+                time.sleep(LISTEN_POLL_SECONDS)
+
+    def _dispatch(self, payload):
+        try:
+            self._on_payload(payload)
+        except Exception:
+            logger.exception("Could not handle %s notification %r", self.channel, payload)
@@ -0,0 +1,16 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reports.dashboard_service import DashboardService
+
+def rebuild_dashboard_metrics():
+    metrics = DashboardService.rebuild()
+    print(f"Dashboard metrics rebuilt at {metrics.rebuilt_at.isoformat()}")
+
+# Schedule periodically (e.g. hourly cron) to correct drift in the incremental counters
+if __name__ == "__main__":
+    from main import create_app
+    app = create_app()
+    with app.app_context():
+        rebuild_dashboard_metrics()
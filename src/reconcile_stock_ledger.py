@@ -0,0 +1,42 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+from stock_transactions.ledger_reconciliation import LedgerReconciliationService
+
+
+def reconcile_stock_ledger(app_factory, workers=None, fix=False, min_drift=1, output=None, show=20):
+    result = LedgerReconciliationService.reconcile(app_factory, workers=workers, fix=fix, min_drift=min_drift)
+    print(f"Checked {result['products']} products and {result['transactions']} transactions "
+          f"in {result['elapsed_seconds']}s ({result['workers']} workers, {result['shards']} shards)")
+    print(f"{result['drifting_products']} products drift from the ledger (net {result['net_drift']} units)")
+    for d in result["drifts"][:show]:
+        print(f"  product {d['product_id']} {d['product_name'] or ''}: stock {d['quantity_in_stock']}, "
+              f"ledger {d['ledger_quantity']}, drift {d['drift']:+d}")
+    if fix:
+        print(f"Wrote {result['corrections_written']} Adjustment transactions")
+    if output:
+        with open(output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Full report written to {output}")
+    return result
+
+
+# Usage: python src/reconcile_stock_ledger.py [--workers 8] [--fix] [--min-drift 1] [--output drift.json]
+# Read-only unless --fix. The first --fix run also records opening balances for stock that
+# entered without a ledger row (product creation, bulk uploads), so later runs show only new drift.
+if __name__ == "__main__":
+    from main import create_app
+    parser = argparse.ArgumentParser(description="Compare product stock with the stock transaction ledger")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: CPU count)")
+    parser.add_argument("--fix", action="store_true", help="Write correcting Adjustment transactions")
+    parser.add_argument("--min-drift", type=int, default=1, help="Ignore drifts smaller than this many units")
+    parser.add_argument("--output", help="Write the full report as JSON")
+    parser.add_argument("--show", type=int, default=20, help="Drifts to print")
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        reconcile_stock_ledger(create_app, args.workers, args.fix, args.min_drift, args.output, args.show)
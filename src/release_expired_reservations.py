@@ -0,0 +1,19 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.extensions import db
+from stock_transactions.stock_engine import StockEngine
+
+def release_expired_reservations():
+    products = StockEngine.release_expired()
+    db.session.commit()
+    print(f"Released expired cart reservations on {products} products")
+
+# Sales and reservations only sweep the products they touch; schedule every few minutes
+# (e.g. cron */5) so abandoned carts free stock on every other product
+if __name__ == "__main__":
+    from main import create_app
+    app = create_app()
+    with app.app_context():
+        release_expired_reservations()
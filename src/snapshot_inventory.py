@@ -0,0 +1,16 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reports.inventory_valuation_service import InventoryValuationService
+
+def snapshot_inventory():
+    rows = InventoryValuationService.snapshot()
+    print(f"Inventory snapshot captured for {rows} products")
+
+# Schedule daily (e.g. cron at 23:55) so point-in-time valuations only replay one day of transactions
+if __name__ == "__main__":
+    from main import create_app
+    app = create_app()
+    with app.app_context():
+        snapshot_inventory()
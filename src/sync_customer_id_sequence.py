@@ -0,0 +1,30 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from src.extensions import db
+
+
+def sync_customer_id_sequence():
+    """
+    Customers used to be numbered max(id) + 1 from 8001. Create customer_id_seq where
+    missing, make it the id column's default and move it past the ids already taken.
+    """
+    db.session.execute(text("CREATE SEQUENCE IF NOT EXISTS customer_id_seq START 8001"))
+    db.session.execute(text("ALTER TABLE customers ALTER COLUMN id SET DEFAULT nextval('customer_id_seq')"))
+    db.session.execute(text(
+        "SELECT setval('customer_id_seq', GREATEST((SELECT COALESCE(MAX(id), 0) FROM customers), 8000))"
+    ))
+    db.session.commit()
+
+
+# Usage: python src/sync_customer_id_sequence.py
+# Run once on databases created before customer_id_seq, before creating or importing
+# customers again. Safe to re-run.
+if __name__ == "__main__":
+    from main import create_app
+    app = create_app()
+    with app.app_context():
+        sync_customer_id_sequence()
+        print("customer_id_seq synced")
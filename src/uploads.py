@@ -0,0 +1,21 @@
+import codecs
+import csv
+from openpyxl import load_workbook
+
+UPLOAD_EXTENSIONS = ('.csv', '.xlsx')
+
+
+def iter_upload_rows(file, filename):
+    """Yield uploaded CSV/XLSX rows as dicts without loading the whole sheet into memory."""
+    if filename.endswith('.csv'):
+        yield from csv.DictReader(codecs.iterdecode(file.stream, "utf-8"))
+        return
+    workbook = load_workbook(file.stream, read_only=True, data_only=True)
+    try:
+        sheet_rows = workbook.active.iter_rows(values_only=True)
+        header = [str(h).strip() if h is not None else "" for h in next(sheet_rows, ())]
+        for values in sheet_rows:
+            if any(v is not None for v in values):
+                yield dict(zip(header, values))
+    finally:
+        workbook.close()
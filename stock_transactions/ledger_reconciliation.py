@@ -0,0 +1,168 @@
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+from sqlalchemy import and_, func, select, text
+from src.extensions import db
+from products.product import Product
+from stock_transactions.stock_transaction import StockTransaction, signed_quantity
+from purchases.purchase_order import PurchaseOrder, PurchaseOrderItem
+
+RECONCILIATION_REFERENCE = "RECON"
+# More shards than workers keeps every worker busy when a few products carry most of the ledger
+SHARDS_PER_WORKER = 4
+CORRECTION_BATCH_SIZE = 5000
+_SNAPSHOT_ID = re.compile(r"^[0-9A-F-]+$", re.IGNORECASE)
+
+_worker_app = None
+
+
+def _init_worker(app_factory):
+    # Each worker process gets its own app and connection pool
+    global _worker_app
+    _worker_app = app_factory()
+    _worker_app.app_context().push()
+
+
+def _reconcile_shard(snapshot_id, low, high):
+    """Ledger totals and stock of products low..high, read in the coordinator's snapshot."""
+    with db.engine.connect().execution_options(isolation_level="REPEATABLE READ") as connection:
+        with connection.begin():
+            connection.execute(text(f"SET TRANSACTION SNAPSHOT '{snapshot_id}'"))
+            in_shard = StockTransaction.product_id.between(low, high)
+            ledger = {}
+            rows = 0
+            for product_id, quantity, count in connection.execute(
+                select(StockTransaction.product_id, func.sum(signed_quantity()), func.count())
+                .where(in_shard)
+                .group_by(StockTransaction.product_id)
+            ):
+                ledger[product_id] = int(quantity or 0)
+                rows += count
+            stock = dict(connection.execute(
+                select(Product.id, Product.quantity_in_stock).where(Product.id.between(low, high))
+            ).all())
+            # A purchase linked by stock_transaction_id is one ledger row on its first product
+            # holding the total quantity; re-attribute it to the products of its order lines
+            purchases = StockTransaction.__table__.join(
+                PurchaseOrder.__table__, PurchaseOrder.stock_transaction_id == StockTransaction.id
+            )
+            is_purchase = and_(in_shard, StockTransaction.transaction_type == "Purchase")
+            moves = [(product_id, -abs(quantity)) for product_id, quantity in connection.execute(
+                select(StockTransaction.product_id, StockTransaction.quantity).select_from(purchases).where(is_purchase)
+            )]
+            moves.extend((product_id, quantity) for product_id, quantity in connection.execute(
+                select(PurchaseOrderItem.product_id, PurchaseOrderItem.quantity)
+                .select_from(purchases.join(PurchaseOrderItem.__table__,
+                                            PurchaseOrderItem.purchase_order_id == PurchaseOrder.id))
+                .where(is_purchase)
+            ))
+    return ledger, stock, moves, rows
+
+
+class LedgerReconciliationService:
+    @staticmethod
+    def _shards(connection, count):
+        """Product id ranges holding about the same number of products each."""
+        ids = [pid for (pid,) in connection.execute(select(Product.id).order_by(Product.id))]
+        if not ids:
+            return []
+        size = max(1, -(-len(ids) // count))
+        return [(ids[start], ids[min(start + size, len(ids)) - 1]) for start in range(0, len(ids), size)]
+
+    @staticmethod
+    def reconcile(app_factory, workers=None, fix=False, min_drift=1):
+        """
+        Compare every product's quantity_in_stock with the sum of its sign-normalized ledger
+        rows (see signed_quantity). Shards run in a process pool; all of them read one
+        exported snapshot, so the result is consistent while sales continue. With fix, an
+        Adjustment row per drifting product brings the ledger in line with the stock on hand.
+        """
+        started = time.perf_counter()
+        workers = workers or os.cpu_count() or 1
+        with db.engine.connect().execution_options(isolation_level="REPEATABLE READ") as connection:
+            with connection.begin():
+                snapshot_id = connection.execute(text("SELECT pg_export_snapshot()")).scalar()
+                if not _SNAPSHOT_ID.match(snapshot_id):
+                    raise ValueError(f"Unexpected snapshot id {snapshot_id!r}")
+                shards = LedgerReconciliationService._shards(connection, workers * SHARDS_PER_WORKER)
+
+                ledger, stock, moves, rows = {}, {}, [], 0
+                # The exporting transaction must stay open until every shard has imported the snapshot
+                with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"),
+                                         initializer=_init_worker, initargs=(app_factory,)) as pool:
+                    futures = [pool.submit(_reconcile_shard, snapshot_id, low, high) for low, high in shards]
+                    for future in futures:
+                        shard_ledger, shard_stock, shard_moves, shard_rows = future.result()
+                        ledger.update(shard_ledger)
+                        stock.update(shard_stock)
+                        moves.extend(shard_moves)
+                        rows += shard_rows
+
+        for product_id, quantity in moves:
+            ledger[product_id] = ledger.get(product_id, 0) + quantity
+
+        drifts = []
+        for product_id, quantity_in_stock in sorted(stock.items()):
+            expected = ledger.get(product_id, 0)
+            drift = (quantity_in_stock or 0) - expected
+            if abs(drift) >= min_drift:
+                drifts.append({
+                    "product_id": product_id,
+                    "quantity_in_stock": quantity_in_stock,
+                    "ledger_quantity": expected,
+                    "drift": drift
+                })
+
+        names = {}
+        drift_ids = [d["product_id"] for d in drifts]
+        for start in range(0, len(drift_ids), CORRECTION_BATCH_SIZE):
+            names.update(db.session.query(Product.id, Product.product_name).filter(
+                Product.id.in_(drift_ids[start:start + CORRECTION_BATCH_SIZE])
+            ).all())
+        for d in drifts:
+            d["product_name"] = names.get(d["product_id"])
+
+        corrections = LedgerReconciliationService._write_corrections(drifts) if fix and drifts else 0
+
+        return {
+            "generated_at": datetime.utcnow().isoformat(),
+            "workers": workers,
+            "shards": len(shards),
+            "products": len(stock),
+            "transactions": rows,
+            "purchase_moves": len(moves),
+            "drifting_products": len(drifts),
+            "net_drift": sum(d["drift"] for d in drifts),
+            "corrections_written": corrections,
+            "elapsed_seconds": round(time.perf_counter() - started, 2),
+            "drifts": drifts
+        }
+
+    @staticmethod
+    def _write_corrections(drifts):
+        """
+        One Adjustment row per drift, as of the snapshot. Later sales changed the stock
+        and the ledger together, so the drift, and with it the correction, still holds.
+        """
+        now = datetime.utcnow()
+        reference = f"{RECONCILIATION_REFERENCE}-{now:%Y%m%d%H%M%S}"
+        rows = [{
+            "product_id": d["product_id"],
+            "transaction_type": "Adjustment",
+            "quantity": d["drift"],
+            "transaction_date": now,
+            "reference_number": reference,
+            "notes": f"Ledger reconciliation: stock {d['quantity_in_stock']}, ledger {d['ledger_quantity']}"
+        } for d in drifts]
+        try:
+            for start in range(0, len(rows), CORRECTION_BATCH_SIZE):
+                db.session.execute(StockTransaction.__table__.insert(), rows[start:start + CORRECTION_BATCH_SIZE])
+            db.session.info.setdefault("report_cache_tables", set()).add(StockTransaction.__tablename__)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return len(rows)
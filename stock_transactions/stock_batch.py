@@ -0,0 +1,27 @@
+from datetime import datetime
+from src.extensions import db
+
+
+class StockBatch(db.Model):
+    """Units of a product received under one batch number.
+
+    quantity_in_stock on the product stays the total; batches account for the part
+    of it whose batch and expiry are known. Sales consume batches first-expiry-first.
+    """
+    __tablename__ = "stock_batches"
+    __table_args__ = (
+        db.UniqueConstraint("product_id", "batch_number", name="ux_stock_batches_product_batch"),
+        # Expiring-soon report; emptied batches drop out of the index
+        db.Index("ix_stock_batches_expiry_in_stock", "expiry_date", postgresql_where=db.text("quantity > 0")),
+        # FEFO allocation reads one product's non-empty batches in expiry order
+        db.Index("ix_stock_batches_product_expiry", "product_id", "expiry_date",
+                 postgresql_where=db.text("quantity > 0")),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey("products.id"), nullable=False)
+    batch_number = db.Column(db.String(120), nullable=False)
+    expiry_date = db.Column(db.Date, nullable=True)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    received_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_updated = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,206 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from sqlalchemy import func, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from src.extensions import db
+from products.product import Product
+from products.catalog_cache import catalog_cache
+from stock_transactions.stock_batch import StockBatch
+
+DEFAULT_EXPIRING_DAYS = 30
+
+# First-expiry-first-out for every product of a sale in one statement. Each batch sees
+# the units held by the batches ahead of it (preceding) and gives up what is still needed.
+# Unexpired batches go first, soonest expiry first; expired ones only when nothing else is left.
+_ALLOCATE_SQL = text("""
+    WITH wanted AS (
+        SELECT * FROM unnest(CAST(:ids AS integer[]), CAST(:units AS integer[])) AS w(product_id, units)
+    ), ordered AS (
+        SELECT b.id, b.quantity, w.units,
+               SUM(b.quantity) OVER (
+                   PARTITION BY b.product_id
+                   ORDER BY COALESCE(b.expiry_date < :today, FALSE), b.expiry_date NULLS LAST, b.id
+               ) - b.quantity AS preceding
+        FROM stock_batches AS b
+        JOIN wanted AS w ON w.product_id = b.product_id
+        WHERE b.quantity > 0
+    ), taken AS (
+        SELECT id, LEAST(quantity, units - preceding) AS units FROM ordered WHERE preceding < units
+    )
+    UPDATE stock_batches AS b
+    SET quantity = b.quantity - taken.units, last_updated = :now
+    FROM taken
+    WHERE b.id = taken.id
+    RETURNING b.product_id, b.batch_number, b.expiry_date, taken.units
+""")
+
+
+def parse_batch_date(value):
+    """expiry_date from a request or upload: a date, YYYY-MM-DD or ISO datetime; blank means none."""
+    if value in (None, ""):
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    date_str = str(value).strip()
+    try:
+        if 'T' in date_str:
+            return datetime.fromisoformat(date_str.replace('Z', '+00:00')).date()
+        return datetime.strptime(date_str, '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError("expiry_date must be in YYYY-MM-DD or ISO format")
+
+
+class StockBatchService:
+    @staticmethod
+    def receive(receipts):
+        """
+        Add received units to their batches in the caller's transaction; the caller commits.
+        receipts is [(product_id, batch_number, expiry_date, quantity)]. A known batch keeps
+        its expiry unless the receipt brings one.
+        """
+        merged = {}
+        for product_id, batch_number, expiry_date, quantity in receipts:
+            batch_number = str(batch_number).strip()
+            if not batch_number or int(quantity) <= 0:
+                continue
+            key = (int(product_id), batch_number)
+            if key in merged:
+                merged[key]["quantity"] += int(quantity)
+                merged[key]["expiry_date"] = expiry_date or merged[key]["expiry_date"]
+            else:
+                now = datetime.utcnow()
+                merged[key] = {
+                    "product_id": key[0], "batch_number": batch_number, "expiry_date": expiry_date,
+                    "quantity": int(quantity), "received_at": now, "last_updated": now
+                }
+        if not merged:
+            return
+        stmt = pg_insert(StockBatch.__table__).values(list(merged.values()))
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["product_id", "batch_number"],
+            set_={
+                "quantity": StockBatch.__table__.c.quantity + stmt.excluded.quantity,
+                "expiry_date": func.coalesce(stmt.excluded.expiry_date, StockBatch.__table__.c.expiry_date),
+                "last_updated": stmt.excluded.last_updated
+            }
+        )
+        db.session.execute(stmt)
+
+    @staticmethod
+    def allocate(units_by_product, today=None):
+        """
+        Take {product_id: units} out of batches, first expiry first, in one statement and in
+        the caller's transaction. The product rows must already be locked, as the stock engine
+        does, so concurrent sales of a product allocate one after the other. Units beyond the
+        batched stock come from untracked stock. Returns {product_id: [{batch_number, expiry_date, quantity}]}.
+        """
+        product_ids = sorted(pid for pid, units in units_by_product.items() if units > 0)
+        if not product_ids:
+            return {}
+        rows = db.session.execute(_ALLOCATE_SQL, {
+            "ids": product_ids,
+            "units": [units_by_product[pid] for pid in product_ids],
+            "today": today or date.today(),
+            "now": datetime.utcnow()
+        }).fetchall()
+        allocation = {}
+        for row in sorted(rows, key=lambda r: (r.product_id, r.expiry_date or date.max, r.batch_number)):
+            allocation.setdefault(row.product_id, []).append({
+                "batch_number": row.batch_number,
+                "expiry_date": row.expiry_date.isoformat() if row.expiry_date else None,
+                "quantity": int(row.units)
+            })
+        return allocation
+
+    @staticmethod
+    def register(product_id, batch_number, expiry_date, quantity):
+        """Record batch details for stock already on hand that no batch accounts for yet."""
+        quantity = int(quantity)
+        if quantity <= 0:
+            raise ValueError("quantity must be positive")
+        if not batch_number or not str(batch_number).strip():
+            raise ValueError("batch_number is required")
+        try:
+            product = Product.query.with_for_update().get(product_id)
+            if not product:
+                raise ValueError(f"Product {product_id} not found")
+            batched = db.session.query(func.coalesce(func.sum(StockBatch.quantity), 0)).filter(
+                StockBatch.product_id == product.id, StockBatch.quantity > 0
+            ).scalar()
+            untracked = product.quantity_in_stock - int(batched)
+            if quantity > untracked:
+                raise ValueError(
+                    f"Only {max(untracked, 0)} units of product {product.id} are not yet assigned to a batch"
+                )
+            StockBatchService.receive([(product.id, batch_number, expiry_date, quantity)])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return StockBatchService.get_batches(product.id)
+
+    @staticmethod
+    def get_batches(product_id):
+        product = catalog_cache.get_product(product_id)
+        if not product:
+            return None
+        batches = StockBatch.query.filter(
+            StockBatch.product_id == product_id, StockBatch.quantity > 0
+        ).order_by(StockBatch.expiry_date.asc().nullslast(), StockBatch.id.asc()).all()
+        quantity_in_stock = db.session.query(Product.quantity_in_stock).filter(Product.id == product_id).scalar()
+        batched = sum(b.quantity for b in batches)
+        return {
+            "product_id": product.id,
+            "product_name": product.product_name,
+            "quantity_in_stock": quantity_in_stock,
+            "untracked_quantity": max(quantity_in_stock - batched, 0),
+            "batches": [{
+                "batch_number": b.batch_number,
+                "expiry_date": b.expiry_date.isoformat() if b.expiry_date else None,
+                "quantity": b.quantity,
+                "received_at": b.received_at.isoformat() if b.received_at else None
+            } for b in batches]
+        }
+
+    @staticmethod
+    def get_expiring(days=DEFAULT_EXPIRING_DAYS, include_expired=True):
+        """Non-empty batches expiring within days, soonest first, served by ix_stock_batches_expiry_in_stock."""
+        today = date.today()
+        query = db.session.query(
+            StockBatch.product_id, StockBatch.batch_number, StockBatch.expiry_date, StockBatch.quantity
+        ).filter(
+            StockBatch.quantity > 0,
+            StockBatch.expiry_date <= today + timedelta(days=days)
+        )
+        if not include_expired:
+            query = query.filter(StockBatch.expiry_date >= today)
+        rows = query.order_by(StockBatch.expiry_date.asc(), StockBatch.product_id.asc()).all()
+        products = catalog_cache.get_products({row.product_id for row in rows})
+
+        items = []
+        total_value = Decimal('0')
+        for row in rows:
+            product = products.get(row.product_id)
+            value = Decimal(row.quantity) * Decimal(product.purchase_price) if product else Decimal('0')
+            total_value += value
+            items.append({
+                "product_id": row.product_id,
+                "product_name": product.product_name if product else None,
+                "sku": product.sku if product else None,
+                "batch_number": row.batch_number,
+                "expiry_date": row.expiry_date.isoformat(),
+                "days_to_expiry": (row.expiry_date - today).days,
+                "expired": row.expiry_date < today,
+                "quantity": row.quantity,
+                "stock_value": str(value)
+            })
+        return {
+            "as_of": today.isoformat(),
+            "days": days,
+            "batch_count": len(items),
+            "total_quantity": sum(item["quantity"] for item in items),
+            "total_stock_value": str(total_value),
+            "items": items
+        }
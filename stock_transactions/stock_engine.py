@@ -0,0 +1,346 @@
+import uuid
+from collections import namedtuple
+from datetime import datetime, timedelta
+from decimal import Decimal
+from sqlalchemy import text
+from src.extensions import db
+from products.product import Product
+from stock_transactions.stock_transaction import StockTransaction
+from stock_transactions.stock_batch_service import StockBatchService
+from stock_transactions.stock_reservation import (
+    StockReservation, RESERVATION_ACTIVE, RESERVATION_COMMITTED, RESERVATION_RELEASED, RESERVATION_EXPIRED
+)
+from products.stock_alerts import stock_alert, notify_stock_alerts
+from reports.dashboard_metrics import apply_metrics_delta, product_contribution
+
+# How long a cart holds stock without activity
+DEFAULT_RESERVATION_TTL_SECONDS = 900
+MAX_RESERVATION_TTL_SECONDS = 86400
+
+_CHANGE_FIELDS = ("product_id", "delta", "transaction_type", "recorded_quantity", "sale_type", "invoice_id",
+                  "supplier_id", "reference_number", "notes", "check_available", "batch_number", "expiry_date",
+                  "unit_cost")
+
+
+class StockChange(namedtuple("StockChange", _CHANGE_FIELDS)):
+    """
+    One stock movement. delta is the change to quantity_in_stock (negative removes stock).
+    recorded_quantity is what the ledger row stores (defaults to delta) so callers keep
+    their existing sign conventions. transaction_type None moves stock without a ledger row.
+    check_available=False lets a removal take stock below zero, as damage write-offs do.
+    An addition with batch_number is received into that batch (see StockBatchService).
+    unit_cost is stored on the ledger row; it defaults to the product's purchase_price.
+    """
+    __slots__ = ()
+
+    def __new__(cls, product_id, delta, transaction_type, recorded_quantity=None, sale_type=None, invoice_id=None,
+                supplier_id=None, reference_number=None, notes=None, check_available=True, batch_number=None,
+                expiry_date=None, unit_cost=None):
+        return super().__new__(cls, int(product_id), int(delta), transaction_type,
+                               int(delta) if recorded_quantity is None else int(recorded_quantity),
+                               sale_type, invoice_id, supplier_id, reference_number, notes, check_available,
+                               batch_number, expiry_date, unit_cost)
+
+
+class InsufficientStockError(ValueError):
+    def __init__(self, shortages):
+        self.shortages = shortages
+        super().__init__("; ".join(
+            f"Insufficient stock for product {s['product_name'] or s['product_id']}"
+            f" (requested {s['requested']}, available {s['available']})" if s["exists"]
+            else f"Product id {s['product_id']} not found"
+            for s in shortages
+        ))
+
+
+# One statement moves every product: rows failing the availability check are left
+# untouched and simply missing from RETURNING
+_APPLY_SQL = text("""
+    UPDATE products AS p
+    SET quantity_in_stock = p.quantity_in_stock + v.delta,
+        reserved_quantity = p.reserved_quantity - v.released,
+        last_updated = :now
+    FROM unnest(CAST(:ids AS integer[]), CAST(:deltas AS integer[]), CAST(:released AS integer[]),
+                CAST(:checked AS boolean[])) AS v(id, delta, released, checked)
+    WHERE p.id = v.id
+      AND p.reserved_quantity >= v.released
+      AND (NOT v.checked OR v.delta >= 0
+           OR p.quantity_in_stock + v.delta >= p.reserved_quantity - v.released)
+    RETURNING p.id, p.product_name, p.quantity_in_stock, p.purchase_price, p.reorder_level
+""")
+
+_RESERVE_SQL = text("""
+    UPDATE products AS p
+    SET reserved_quantity = p.reserved_quantity + v.quantity
+    FROM unnest(CAST(:ids AS integer[]), CAST(:quantities AS integer[])) AS v(id, quantity)
+    WHERE p.id = v.id
+      AND p.quantity_in_stock - p.reserved_quantity >= v.quantity
+    RETURNING p.id
+""")
+
+# Product rows are locked in id order before they are touched, like every other stock statement
+_RELEASE_EXPIRED_SQL = """
+    WITH expired AS (
+        UPDATE stock_reservations
+        SET status = :expired, resolved_at = :now
+        WHERE status = :active AND expires_at < :now{scope}
+        RETURNING product_id, quantity
+    ), totals AS (
+        SELECT product_id, SUM(quantity) AS quantity FROM expired GROUP BY product_id
+    ), locked AS (
+        SELECT id FROM products WHERE id IN (SELECT product_id FROM totals) ORDER BY id FOR UPDATE
+    )
+    UPDATE products AS p
+    SET reserved_quantity = GREATEST(p.reserved_quantity - totals.quantity, 0)
+    FROM totals, locked
+    WHERE p.id = totals.product_id AND locked.id = totals.product_id
+    RETURNING p.id
+"""
+_RELEASE_ALL_EXPIRED_SQL = text(_RELEASE_EXPIRED_SQL.format(scope=""))
+_RELEASE_EXPIRED_FOR_PRODUCTS_SQL = text(_RELEASE_EXPIRED_SQL.format(
+    scope="\n          AND product_id = ANY(CAST(:ids AS integer[]))"
+))
+
+
+class StockEngine:
+    @staticmethod
+    def _lock_in_order(product_ids):
+        # Concurrent multi-product sales lock rows in the same order, so they queue instead of deadlocking
+        if len(product_ids) > 1:
+            db.session.execute(
+                text("SELECT id FROM products WHERE id = ANY(CAST(:ids AS integer[])) ORDER BY id FOR UPDATE"),
+                {"ids": sorted(product_ids)}
+            )
+
+    @staticmethod
+    def _shortages(requested):
+        """Why each product in requested ({product_id: units}) could not be moved."""
+        found = {
+            row.id: row for row in db.session.query(
+                Product.id, Product.product_name, Product.quantity_in_stock, Product.reserved_quantity
+            ).filter(Product.id.in_(list(requested)))
+        }
+        return [{
+            "product_id": product_id,
+            "product_name": found[product_id].product_name if product_id in found else None,
+            "requested": units,
+            "available": (found[product_id].quantity_in_stock - found[product_id].reserved_quantity)
+            if product_id in found else 0,
+            "exists": product_id in found
+        } for product_id, units in sorted(requested.items())]
+
+    @staticmethod
+    def _after_stock_statement(product_ids):
+        session = db.session
+        # Loaded Product objects still hold the old quantities
+        for obj in list(session.identity_map.values()):
+            if isinstance(obj, Product) and obj.id in product_ids:
+                session.expire(obj, ["quantity_in_stock", "reserved_quantity", "last_updated"])
+        # Core statements never reach the report cache's flush hook
+        session.info.setdefault("report_cache_tables", set()).update({"products", "stock_transactions"})
+
+    @staticmethod
+    def release_expired(now=None, product_ids=None):
+        """
+        Expire overdue reservations and free their units. Runs in the caller's transaction.
+        With product_ids only those products' reservations are swept; the sweep over every
+        product is left to src/release_expired_reservations.py, off the checkout path.
+        """
+        params = {"now": now or datetime.utcnow(), "active": RESERVATION_ACTIVE, "expired": RESERVATION_EXPIRED}
+        if product_ids is None:
+            result = db.session.execute(_RELEASE_ALL_EXPIRED_SQL, params)
+        else:
+            result = db.session.execute(_RELEASE_EXPIRED_FOR_PRODUCTS_SQL, dict(params, ids=sorted(product_ids)))
+        return len(result.fetchall())
+
+    @staticmethod
+    def apply(changes, cart_id=None):
+        """
+        Apply stock changes atomically in the caller's transaction; the caller commits.
+
+        Changes are netted per product and applied with one conditional UPDATE ... RETURNING:
+        a product whose removal would dip into stock that is missing or reserved by other
+        carts is not updated, and InsufficientStockError is raised. The caller must then roll
+        back. Ledger rows are inserted with one multi-row INSERT. With cart_id, the cart's
+        active reservations are consumed: their units stop counting as reserved.
+        A product's net removal is taken from its batches first-expiry-first.
+        """
+        changes = list(changes)
+        if not changes and not cart_id:
+            return {}
+        now = datetime.utcnow()
+
+        released = {}
+        if cart_id:
+            # Overdue holds are not consumed; the sweep below frees them
+            for product_id, quantity in db.session.execute(text("""
+                UPDATE stock_reservations SET status = :committed, resolved_at = :now
+                WHERE cart_id = :cart_id AND status = :active AND expires_at >= :now
+                RETURNING product_id, quantity
+            """), {"committed": RESERVATION_COMMITTED, "now": now, "cart_id": cart_id, "active": RESERVATION_ACTIVE}):
+                released[product_id] = released.get(product_id, 0) + quantity
+
+        deltas = {}
+        checked = {}
+        for change in changes:
+            deltas[change.product_id] = deltas.get(change.product_id, 0) + change.delta
+            checked[change.product_id] = checked.get(change.product_id, False) or \
+                (change.check_available and change.delta < 0)
+        product_ids = sorted(set(deltas) | set(released))
+        if not product_ids:
+            return {}
+
+        StockEngine._lock_in_order(product_ids)
+        # Only the rows this change already holds; other products' expired holds are not touched
+        StockEngine.release_expired(now, product_ids)
+        rows = db.session.execute(_APPLY_SQL, {
+            "now": now,
+            "ids": product_ids,
+            "deltas": [deltas.get(pid, 0) for pid in product_ids],
+            "released": [released.get(pid, 0) for pid in product_ids],
+            "checked": [checked.get(pid, False) for pid in product_ids]
+        }).fetchall()
+        updated = {row.id: row for row in rows}
+        StockEngine._after_stock_statement(set(product_ids))
+
+        missing = [pid for pid in product_ids if pid not in updated]
+        if missing:
+            raise InsufficientStockError(StockEngine._shortages({pid: -deltas.get(pid, 0) for pid in missing}))
+
+        ledger = [{
+            "product_id": change.product_id,
+            "transaction_type": change.transaction_type,
+            "sale_type": change.sale_type,
+            "quantity": change.recorded_quantity,
+            "transaction_date": now,
+            "supplier_id": change.supplier_id,
+            "invoice_id": change.invoice_id,
+            "reference_number": change.reference_number,
+            "notes": change.notes,
+            "unit_cost": change.unit_cost if change.unit_cost is not None else updated[change.product_id].purchase_price
+        } for change in changes if change.transaction_type]
+        if ledger:
+            db.session.execute(StockTransaction.__table__.insert(), ledger)
+
+        receipts = [(c.product_id, c.batch_number, c.expiry_date, c.delta)
+                    for c in changes if c.batch_number and c.delta > 0]
+        StockBatchService.receive(receipts)
+        unbatched = {}
+        for change in changes:
+            if not (change.batch_number and change.delta > 0):
+                unbatched[change.product_id] = unbatched.get(change.product_id, 0) + change.delta
+        # Rows are locked by the UPDATE above, so concurrent allocations of a product queue
+        StockBatchService.allocate({pid: -delta for pid, delta in unbatched.items() if delta < 0})
+
+        # The statements bypass the Product and StockTransaction mapper events
+        stock_value = Decimal('0')
+        low_stock = 0
+        alerts = []
+        for pid, row in updated.items():
+            delta = deltas.get(pid, 0)
+            if not delta:
+                continue
+            old_value, old_low = product_contribution(row.quantity_in_stock - delta, row.purchase_price, row.reorder_level)
+            new_value, new_low = product_contribution(row.quantity_in_stock, row.purchase_price, row.reorder_level)
+            stock_value += new_value - old_value
+            low_stock += new_low - old_low
+            alerts.append(stock_alert(pid, row.product_name, row.quantity_in_stock, row.reorder_level,
+                                      row.quantity_in_stock - delta, row.reorder_level))
+        connection = db.session.connection()
+        apply_metrics_delta(connection, stock_value=stock_value, low_stock_count=low_stock)
+        notify_stock_alerts(connection, alerts)
+
+        return {pid: row.quantity_in_stock for pid, row in updated.items()}
+
+    @staticmethod
+    def reserve(items, cart_id=None, ttl_seconds=DEFAULT_RESERVATION_TTL_SECONDS):
+        """
+        Hold units for a cart: items is [{product_id, quantity}]. All or nothing; raises
+        InsufficientStockError when any product lacks unreserved stock. Reserving again
+        for the same cart adds to it and renews the expiry of everything it holds.
+        """
+        ttl_seconds = int(ttl_seconds)
+        if ttl_seconds <= 0 or ttl_seconds > MAX_RESERVATION_TTL_SECONDS:
+            raise ValueError(f"ttl_seconds must be between 1 and {MAX_RESERVATION_TTL_SECONDS}")
+        quantities = {}
+        for item in items:
+            quantity = int(item["quantity"])
+            if quantity <= 0:
+                raise ValueError("Reserved quantities must be positive")
+            product_id = int(item["product_id"])
+            quantities[product_id] = quantities.get(product_id, 0) + quantity
+        if not quantities:
+            raise ValueError("items list is required")
+
+        cart_id = cart_id or uuid.uuid4().hex
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=ttl_seconds)
+        try:
+            product_ids = sorted(quantities)
+            StockEngine._lock_in_order(product_ids)
+            StockEngine.release_expired(now, product_ids)
+            reserved = {row.id for row in db.session.execute(_RESERVE_SQL, {
+                "ids": product_ids, "quantities": [quantities[pid] for pid in product_ids]
+            })}
+            StockEngine._after_stock_statement(set(product_ids))
+            missing = {pid: quantities[pid] for pid in product_ids if pid not in reserved}
+            if missing:
+                raise InsufficientStockError(StockEngine._shortages(missing))
+
+            db.session.execute(StockReservation.__table__.insert(), [{
+                "cart_id": cart_id, "product_id": pid, "quantity": quantities[pid],
+                "status": RESERVATION_ACTIVE, "expires_at": expires_at, "created_at": now
+            } for pid in product_ids])
+            db.session.execute(
+                StockReservation.__table__.update()
+                .where(StockReservation.cart_id == cart_id, StockReservation.status == RESERVATION_ACTIVE)
+                .values(expires_at=expires_at)
+            )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return StockEngine.get_cart(cart_id)
+
+    @staticmethod
+    def release(cart_id):
+        """Give back everything an active cart holds. Returns the number of units released."""
+        try:
+            totals = {}
+            for product_id, quantity in db.session.execute(text("""
+                UPDATE stock_reservations SET status = :released, resolved_at = :now
+                WHERE cart_id = :cart_id AND status = :active
+                RETURNING product_id, quantity
+            """), {"released": RESERVATION_RELEASED, "now": datetime.utcnow(), "cart_id": cart_id,
+                   "active": RESERVATION_ACTIVE}):
+                totals[product_id] = totals.get(product_id, 0) + quantity
+            if totals:
+                product_ids = sorted(totals)
+                db.session.execute(text("""
+                    UPDATE products AS p
+                    SET reserved_quantity = GREATEST(p.reserved_quantity - v.quantity, 0)
+                    FROM unnest(CAST(:ids AS integer[]), CAST(:quantities AS integer[])) AS v(id, quantity)
+                    WHERE p.id = v.id
+                """), {"ids": product_ids, "quantities": [totals[pid] for pid in product_ids]})
+                StockEngine._after_stock_statement(set(product_ids))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return sum(totals.values())
+
+    @staticmethod
+    def get_cart(cart_id):
+        rows = db.session.query(
+            StockReservation.product_id,
+            db.func.sum(StockReservation.quantity),
+            db.func.max(StockReservation.expires_at)
+        ).filter(
+            StockReservation.cart_id == cart_id,
+            StockReservation.status == RESERVATION_ACTIVE
+        ).group_by(StockReservation.product_id).order_by(StockReservation.product_id).all()
+        return {
+            "cart_id": cart_id,
+            "expires_at": max(expires_at for _, _, expires_at in rows).isoformat() if rows else None,
+            "items": [{"product_id": product_id, "quantity": int(quantity)} for product_id, quantity, _ in rows]
+        }
@@ -0,0 +1,31 @@
+from datetime import datetime
+from src.extensions import db
+
+# Reservation statuses
+RESERVATION_ACTIVE = 'Active'
+RESERVATION_COMMITTED = 'Committed'
+RESERVATION_RELEASED = 'Released'
+RESERVATION_EXPIRED = 'Expired'
+
+
+class StockReservation(db.Model):
+    """Units held for a cart until checkout, release or expiry.
+
+    Active rows are mirrored in products.reserved_quantity, which the stock engine
+    keeps in step; available stock is quantity_in_stock - reserved_quantity.
+    """
+    __tablename__ = "stock_reservations"
+    __table_args__ = (
+        db.Index("ix_stock_reservations_cart_status", "cart_id", "status"),
+        # Expiry sweeps only look at active rows past their deadline
+        db.Index("ix_stock_reservations_status_expires", "status", "expires_at"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    cart_id = db.Column(db.String(64), nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey("products.id"), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default=RESERVATION_ACTIVE)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    resolved_at = db.Column(db.DateTime, nullable=True)
@@ -0,0 +1,101 @@
+from flask import Blueprint, request, jsonify
+from stock_transactions.stock_engine import StockEngine, InsufficientStockError, DEFAULT_RESERVATION_TTL_SECONDS
+from stock_transactions.stock_batch_service import StockBatchService, parse_batch_date, DEFAULT_EXPIRING_DAYS
+from user.enhanced_auth_middleware import require_permission_jwt
+
+bp = Blueprint("stock", __name__)
+
+# -------------------------
+# Cart reservations: hold stock while a cashier builds a basket
+# -------------------------
+@bp.route("/reservations", methods=["POST"])
+@require_permission_jwt('sales', 'write')
+def reserve_stock():
+    data = request.get_json() or {}
+    items = data.get("items")
+    if not items or not isinstance(items, list):
+        return jsonify({"error": "items list is required"}), 400
+    try:
+        cart = StockEngine.reserve(
+            items,
+            cart_id=data.get("cart_id"),
+            ttl_seconds=data.get("ttl_seconds", DEFAULT_RESERVATION_TTL_SECONDS)
+        )
+        return jsonify(cart), 201
+    except InsufficientStockError as e:
+        return jsonify({"error": str(e), "shortages": e.shortages}), 409
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@bp.route("/reservations/<cart_id>", methods=["GET"])
+@require_permission_jwt('sales', 'read')
+def get_reservation(cart_id):
+    try:
+        cart = StockEngine.get_cart(cart_id)
+        if not cart["items"]:
+            return jsonify({"error": "No active reservation for this cart"}), 404
+        return jsonify(cart), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@bp.route("/reservations/<cart_id>", methods=["DELETE"])
+@require_permission_jwt('sales', 'write')
+def release_reservation(cart_id):
+    try:
+        released = StockEngine.release(cart_id)
+        return jsonify({"cart_id": cart_id, "released_quantity": released}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# -------------------------
+# Stock batches: batch numbers and expiry dates for first-expiry-first-out sales
+# -------------------------
+@bp.route("/batches", methods=["POST"])
+@require_permission_jwt('products', 'write')
+def register_batch():
+    data = request.get_json() or {}
+    for field in ("product_id", "batch_number", "quantity"):
+        if not data.get(field):
+            return jsonify({"error": f"{field} is required"}), 400
+    try:
+        result = StockBatchService.register(
+            data["product_id"],
+            data["batch_number"],
+            parse_batch_date(data.get("expiry_date")),
+            data["quantity"]
+        )
+        return jsonify(result), 201
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@bp.route("/batches/<int:product_id>", methods=["GET"])
+@require_permission_jwt('products', 'read')
+def get_product_batches(product_id):
+    try:
+        result = StockBatchService.get_batches(product_id)
+        if result is None:
+            return jsonify({"error": "Product not found"}), 404
+        return jsonify(result), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@bp.route("/batches/expiring", methods=["GET"])
+@require_permission_jwt('products', 'read')
+def get_expiring_batches():
+    days = request.args.get('days', DEFAULT_EXPIRING_DAYS, type=int)
+    include_expired = request.args.get('include_expired', 'true').lower() != 'false'
+    if days < 0:
+        return jsonify({"error": "days must not be negative"}), 400
+    try:
+        return jsonify(StockBatchService.get_expiring(days, include_expired)), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
@@ -1,9 +1,17 @@
 from datetime import datetime
 from src.extensions import db
+from sqlalchemy import case, event, func, select
 import uuid
 
 class StockTransaction(db.Model):
     __tablename__ = "stock_transactions"
+    __table_args__ = (
+        # Keyset paging for the stock movement report
+        db.Index("ix_stock_transactions_date_id", "transaction_date", "id"),
+        # Per-product ledger totals (reconciliation) as index-only scans over a product id range
+        db.Index("ix_stock_transactions_product_ledger", "product_id",
+                 postgresql_include=["transaction_type", "quantity"]),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     product_id = db.Column(db.Integer, db.ForeignKey("products.id"), nullable=False)
@@ -17,5 +25,29 @@ class StockTransaction(db.Model):
     invoice_id = db.Column(db.Integer, db.ForeignKey("invoices.id"), nullable=True)
     reference_number = db.Column(db.String(255), nullable=True)
     notes = db.Column(db.Text, nullable=True)
+    # Cost per unit when the row was written, so past movements keep their value after price edits
+    unit_cost = db.Column(db.Numeric(12, 2), nullable=True)
 
     product = db.relationship("Product", overlaps="product_ref,stock_transactions")
+
+
+@event.listens_for(StockTransaction, "before_insert")
+def _record_unit_cost(mapper, connection, target):
+    if target.unit_cost is None and target.product_id is not None:
+        products = db.Model.metadata.tables["products"]
+        target.unit_cost = connection.execute(
+            select(products.c.purchase_price).where(products.c.id == target.product_id)
+        ).scalar()
+
+
+def signed_quantity():
+    """
+    SQL expression for the stock change of a transaction. Purchases and sales are
+    recorded with either sign depending on the code path, so they are normalized;
+    returns, adjustments and damage rows already carry the direction in their sign.
+    """
+    return case(
+        (StockTransaction.transaction_type == "Purchase", func.abs(StockTransaction.quantity)),
+        (StockTransaction.transaction_type == "Sale", -func.abs(StockTransaction.quantity)),
+        else_=StockTransaction.quantity
+    )
@@ -2,9 +2,13 @@ from flask import Blueprint, request, jsonify, make_response
 from src.extensions import db
 from suppliers.supplier import Supplier
 from customers.customer import Customer
-from stock_transactions.stock_transaction import StockTransaction
+from purchases.purchase_order import PurchaseOrder, normalize_payment_status
+from purchases.purchase_history_service import PurchaseHistoryService, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from products.catalog_cache import catalog_cache
 from user.enhanced_auth_middleware import require_permission_jwt
 from user.audit_logger import audit_decorator
+from sqlalchemy.orm import selectinload
+from decimal import Decimal
 import csv
 import io
 from datetime import datetime
@@ -106,60 +110,47 @@ def get_supplier(supplier_id):
     if not s:
         return jsonify({"error": "empty"}), 404
     
-    purchases = StockTransaction.query.filter_by(supplier_id=supplier_id, transaction_type="Purchase").all()
+    purchases = PurchaseOrder.query.options(selectinload(PurchaseOrder.items)).filter_by(
+        supplier_id=supplier_id).order_by(PurchaseOrder.id.asc()).all()
     purchase_transactions = []
     
+    from products.product import Product
+    from category.category import Category
+    
     for p in purchases:
-        import json
-        payment_info = {}
-        if p.notes:
-            try:
-                payment_info = json.loads(p.notes)
-            except:
-                pass
-        
-        from decimal import Decimal
-        total_amt = payment_info.get("total_amount", "0")
-        payment_amt = payment_info.get("payment_amount", "0")
-        
         # Get product details for this transaction
-        from products.product import Product
-        from category.category import Category
-        
         product_details = []
-        for product_info in payment_info.get("products", []):
-            product = Product.query.get(product_info["product_id"])
+        for item in p.items:
+            product = Product.query.get(item.product_id)
             category = Category.query.get(product.category_id) if product and product.category_id else None
             
             product_details.append({
-                "product_id": product_info["product_id"],
-                "name": product_info["name"],
-                "sku": product_info["sku"],
+                "product_id": item.product_id,
+                "name": item.product_name,
+                "sku": item.sku,
                 "category_id": product.category_id if product else None,
                 "category_name": category.name if category else None,
-                "quantity_purchased": product_info["quantity_added"],
-                "purchase_price": product_info["purchase_price"],
-                "amount": product_info["amount"],
+                "quantity_purchased": item.quantity,
+                "purchase_price": str(item.purchase_price),
+                "amount": str(item.amount),
                 "current_stock": product.quantity_in_stock if product else None,
                 "reorder_level": product.reorder_level if product else None,
                 "unit_of_measure": product.unit_of_measure if product else None,
                 "barcode": product.barcode if product else None
             })
         
-        balance_due = f"{max(Decimal('0'), Decimal(total_amt) - Decimal(payment_amt)):.2f}"
-        
         purchase_transactions.append({
             "id": p.id,
             "reference_number": p.reference_number,
-            "transaction_date": p.transaction_date.isoformat(),
-            "total_quantity": p.quantity,
+            "transaction_date": p.purchase_date.isoformat(),
+            "total_quantity": p.total_quantity,
             "payment_details": {
-                "total_amount": f"{Decimal(total_amt):.2f}",
-                "payment_amount": f"{Decimal(payment_amt):.2f}",
-                "balance_due": balance_due,
-                "payment_method": payment_info.get("payment_method"),
-                "payment_status": payment_info.get("payment_status", "Pending"),
-                "transaction_reference": payment_info.get("transaction_reference")
+                "total_amount": f"{Decimal(p.total_amount):.2f}",
+                "payment_amount": f"{Decimal(p.paid_amount):.2f}",
+                "balance_due": f"{p.balance_due:.2f}",
+                "payment_method": p.payment_method,
+                "payment_status": p.payment_status,
+                "transaction_reference": p.transaction_reference
             },
             "products": product_details,
             "purchase_summary": {
@@ -193,72 +184,59 @@ def get_supplier_purchase_history(supplier_id):
         return jsonify({"error": "Supplier not found"}), 404
     
     # Date and payment status filtering
-    from datetime import datetime
+    from datetime import datetime, timedelta
     date_from = request.args.get('date_from')
     date_to = request.args.get('date_to')
     payment_status = request.args.get('payment_status')
     
-    query = StockTransaction.query.filter_by(supplier_id=supplier_id, transaction_type="Purchase")
+    query = PurchaseOrder.query.options(selectinload(PurchaseOrder.items)).filter_by(supplier_id=supplier_id)
     
     if date_from:
         try:
             date_from_obj = datetime.strptime(date_from, '%Y-%m-%d')
-            query = query.filter(StockTransaction.transaction_date >= date_from_obj)
+            query = query.filter(PurchaseOrder.purchase_date >= date_from_obj)
         except ValueError:
             return jsonify({"error": "Invalid date_from format. Use YYYY-MM-DD"}), 400
     
     if date_to:
         try:
             date_to_obj = datetime.strptime(date_to, '%Y-%m-%d')
-            query = query.filter(StockTransaction.transaction_date <= date_to_obj)
+            query = query.filter(PurchaseOrder.purchase_date < date_to_obj + timedelta(days=1))
         except ValueError:
             return jsonify({"error": "Invalid date_to format. Use YYYY-MM-DD"}), 400
     
-    purchases = query.order_by(StockTransaction.transaction_date.desc()).all()
-    
-    # Filter by payment status if provided
     if payment_status:
-        filtered_purchases = []
-        for p in purchases:
-            import json
-            payment_info = {}
-            if p.notes:
-                try:
-                    payment_info = json.loads(p.notes)
-                except:
-                    pass
-            if payment_info.get("payment_status", "Pending").lower() == payment_status.lower():
-                filtered_purchases.append(p)
-        purchases = filtered_purchases
+        try:
+            query = query.filter(PurchaseOrder.payment_status == normalize_payment_status(payment_status))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+    
+    purchases = query.order_by(PurchaseOrder.purchase_date.desc(), PurchaseOrder.id.desc()).all()
     purchase_history = []
     
+    # Products (with their live stock) and categories for every line, one query each
+    from products.product import Product
+    product_ids = {item.product_id for p in purchases for item in p.items}
+    products = {row.id: row for row in db.session.query(
+        Product.id, Product.category_id, Product.quantity_in_stock, Product.unit_of_measure
+    ).filter(Product.id.in_(product_ids)).all()} if product_ids else {}
+    categories = catalog_cache.get_categories({p.category_id for p in products.values() if p.category_id})
+    
     for p in purchases:
-        import json
-        payment_info = {}
-        if p.notes:
-            try:
-                payment_info = json.loads(p.notes)
-            except:
-                pass
-        
-        from products.product import Product
-        from category.category import Category
-        from decimal import Decimal
-        
         product_details = []
-        for product_info in payment_info.get("products", []):
-            product = Product.query.get(product_info["product_id"])
-            category = Category.query.get(product.category_id) if product and product.category_id else None
+        for item in p.items:
+            product = products.get(item.product_id)
+            category = categories.get(product.category_id) if product and product.category_id else None
             
             product_details.append({
-                "product_id": product_info["product_id"],
-                "name": product_info["name"],
-                "sku": product_info["sku"],
+                "product_id": item.product_id,
+                "name": item.product_name,
+                "sku": item.sku,
                 "category_id": product.category_id if product else None,
                 "category_name": category.name if category else None,
-                "quantity_purchased": product_info["quantity_added"],
-                "purchase_price": product_info["purchase_price"],
-                "amount": product_info["amount"],
+                "quantity_purchased": item.quantity,
+                "purchase_price": str(item.purchase_price),
+                "amount": str(item.amount),
                 "current_stock": product.quantity_in_stock if product else None,
                 "unit_of_measure": product.unit_of_measure if product else None
             })
@@ -266,8 +244,8 @@ def get_supplier_purchase_history(supplier_id):
         purchase_history.append({
             "purchase_id": p.id,
             "reference_number": p.reference_number,
-            "purchase_date": p.transaction_date.isoformat(),
-            "total_quantity": p.quantity,
+            "purchase_date": p.purchase_date.isoformat(),
+            "total_quantity": p.total_quantity,
             "products": product_details,
             "purchase_summary": {
                 "total_products": len(product_details),
@@ -293,69 +271,47 @@ def get_supplier_payment_history(supplier_id):
         return jsonify({"error": "Supplier not found"}), 404
     
     # Date and payment status filtering
-    from datetime import datetime
+    from datetime import datetime, timedelta
     date_from = request.args.get('date_from')
     date_to = request.args.get('date_to')
     payment_status = request.args.get('payment_status')
     
-    query = StockTransaction.query.filter_by(supplier_id=supplier_id, transaction_type="Purchase")
+    query = PurchaseOrder.query.filter_by(supplier_id=supplier_id)
     
     if date_from:
         try:
             date_from_obj = datetime.strptime(date_from, '%Y-%m-%d')
-            query = query.filter(StockTransaction.transaction_date >= date_from_obj)
+            query = query.filter(PurchaseOrder.purchase_date >= date_from_obj)
         except ValueError:
             return jsonify({"error": "Invalid date_from format. Use YYYY-MM-DD"}), 400
     
     if date_to:
         try:
             date_to_obj = datetime.strptime(date_to, '%Y-%m-%d')
-            query = query.filter(StockTransaction.transaction_date <= date_to_obj)
+            query = query.filter(PurchaseOrder.purchase_date < date_to_obj + timedelta(days=1))
         except ValueError:
             return jsonify({"error": "Invalid date_to format. Use YYYY-MM-DD"}), 400
     
-    purchases = query.order_by(StockTransaction.transaction_date.desc()).all()
-    
-    # Filter by payment status if provided
     if payment_status:
-        filtered_purchases = []
-        for p in purchases:
-            import json
-            payment_info = {}
-            if p.notes:
-                try:
-                    payment_info = json.loads(p.notes)
-                except:
-                    pass
-            if payment_info.get("payment_status", "Pending").lower() == payment_status.lower():
-                filtered_purchases.append(p)
-        purchases = filtered_purchases
+        try:
+            query = query.filter(PurchaseOrder.payment_status == normalize_payment_status(payment_status))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+    
+    purchases = query.order_by(PurchaseOrder.purchase_date.desc(), PurchaseOrder.id.desc()).all()
     payment_history = []
     
     for p in purchases:
-        import json
-        payment_info = {}
-        if p.notes:
-            try:
-                payment_info = json.loads(p.notes)
-            except:
-                pass
-        
-        from decimal import Decimal
-        total_amt = payment_info.get("total_amount", "0")
-        payment_amt = payment_info.get("payment_amount", "0")
-        balance_due = f"{max(Decimal('0'), Decimal(total_amt) - Decimal(payment_amt)):.2f}"
-        
         payment_history.append({
             "purchase_id": p.id,
             "reference_number": p.reference_number,
-            "transaction_date": p.transaction_date.isoformat(),
-            "total_amount": f"{Decimal(total_amt):.2f}",
-            "payment_amount": f"{Decimal(payment_amt):.2f}",
-            "balance_due": balance_due,
-            "payment_method": payment_info.get("payment_method"),
-            "payment_status": payment_info.get("payment_status", "Pending"),
-            "transaction_reference": payment_info.get("transaction_reference")
+            "transaction_date": p.purchase_date.isoformat(),
+            "total_amount": f"{Decimal(p.total_amount):.2f}",
+            "payment_amount": f"{Decimal(p.paid_amount):.2f}",
+            "balance_due": f"{p.balance_due:.2f}",
+            "payment_method": p.payment_method,
+            "payment_status": p.payment_status,
+            "transaction_reference": p.transaction_reference
         })
     
     return jsonify({
@@ -371,173 +327,100 @@ def get_supplier_payment_history(supplier_id):
 @bp.route("/purchase-history", methods=["GET"])
 @require_permission_jwt('suppliers', 'read')
 def get_all_purchase_history():
-    from datetime import datetime
     date_from = request.args.get('date_from')
     date_to = request.args.get('date_to')
     payment_status = request.args.get('payment_status')
+    supplier_id = request.args.get('supplier_id', type=int)
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    cursor = request.args.get('cursor')
     
-    query = StockTransaction.query.filter_by(transaction_type="Purchase")
-    
+    date_from_obj = date_to_obj = None
     if date_from:
         try:
             date_from_obj = datetime.strptime(date_from, '%Y-%m-%d')
-            query = query.filter(StockTransaction.transaction_date >= date_from_obj)
         except ValueError:
             return jsonify({"error": "Invalid date_from format. Use YYYY-MM-DD"}), 400
     
     if date_to:
         try:
             date_to_obj = datetime.strptime(date_to, '%Y-%m-%d')
-            query = query.filter(StockTransaction.transaction_date <= date_to_obj)
         except ValueError:
             return jsonify({"error": "Invalid date_to format. Use YYYY-MM-DD"}), 400
     
-    purchases = query.order_by(StockTransaction.transaction_date.desc()).all()
-    
-    # Filter by payment status if provided
-    if payment_status:
-        filtered_purchases = []
-        for p in purchases:
-            import json
-            payment_info = {}
-            if p.notes:
-                try:
-                    payment_info = json.loads(p.notes)
-                except:
-                    pass
-            if payment_info.get("payment_status", "Pending").lower() == payment_status.lower():
-                filtered_purchases.append(p)
-        purchases = filtered_purchases
-    
-    purchase_history = []
-    
-    for p in purchases:
-        supplier = Supplier.query.get(p.supplier_id)
-        import json
-        payment_info = {}
-        if p.notes:
-            try:
-                payment_info = json.loads(p.notes)
-            except:
-                pass
-        
-        from products.product import Product
-        from category.category import Category
-        
-        product_details = []
-        for product_info in payment_info.get("products", []):
-            product = Product.query.get(product_info["product_id"])
-            category = Category.query.get(product.category_id) if product and product.category_id else None
-            
-            product_details.append({
-                "product_id": product_info["product_id"],
-                "name": product_info["name"],
-                "sku": product_info["sku"],
-                "category_id": product.category_id if product else None,
-                "category_name": category.name if category else None,
-                "quantity_purchased": product_info["quantity_added"],
-                "purchase_price": product_info["purchase_price"],
-                "amount": product_info["amount"]
-            })
-        
-        purchase_history.append({
-            "purchase_id": p.id,
-            "reference_number": p.reference_number,
-            "purchase_date": p.transaction_date.isoformat(),
-            "supplier": {
-                "id": supplier.id if supplier else None,
-                "name": supplier.name if supplier else None,
-                "contact_person": supplier.contact_person if supplier else None
-            },
-            "total_quantity": p.quantity,
-            "products": product_details,
-            "purchase_summary": {
-                "total_products": len(product_details),
-                "total_quantity": sum(int(pd["quantity_purchased"]) for pd in product_details)
-            }
-        })
+    try:
+        purchase_history, next_cursor = PurchaseHistoryService.get_history(
+            date_from_obj, date_to_obj, payment_status=payment_status, supplier_id=supplier_id,
+            limit=limit, cursor=cursor
+        )
+        summary = PurchaseHistoryService.get_summary(
+            date_from_obj, date_to_obj, payment_status=payment_status, supplier_id=supplier_id
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
-    return jsonify({"purchase_history": purchase_history}), 200
+    return jsonify({
+        "purchase_history": purchase_history,
+        "summary": summary,
+        "pagination": {
+            "limit": max(1, min(limit, MAX_PAGE_SIZE)),
+            "next_cursor": next_cursor,
+            "has_more": next_cursor is not None
+        }
+    }), 200
 
 @bp.route("/payment-history", methods=["GET"])
 @require_permission_jwt('suppliers', 'read')
 def get_all_payment_history():
-    from datetime import datetime
+    from datetime import datetime, timedelta
     date_from = request.args.get('date_from')
     date_to = request.args.get('date_to')
     payment_status = request.args.get('payment_status')
     
-    query = StockTransaction.query.filter_by(transaction_type="Purchase")
+    query = PurchaseOrder.query
     
     if date_from:
         try:
             date_from_obj = datetime.strptime(date_from, '%Y-%m-%d')
-            query = query.filter(StockTransaction.transaction_date >= date_from_obj)
+            query = query.filter(PurchaseOrder.purchase_date >= date_from_obj)
         except ValueError:
             return jsonify({"error": "Invalid date_from format. Use YYYY-MM-DD"}), 400
     
     if date_to:
         try:
             date_to_obj = datetime.strptime(date_to, '%Y-%m-%d')
-            query = query.filter(StockTransaction.transaction_date <= date_to_obj)
+            query = query.filter(PurchaseOrder.purchase_date < date_to_obj + timedelta(days=1))
         except ValueError:
             return jsonify({"error": "Invalid date_to format. Use YYYY-MM-DD"}), 400
     
-    purchases = query.order_by(StockTransaction.transaction_date.desc()).all()
-    
-    # Filter by payment status if provided
     if payment_status:
-        filtered_purchases = []
-        for p in purchases:
-            import json
-            payment_info = {}
-            if p.notes:
-                try:
-                    payment_info = json.loads(p.notes)
-                except:
-                    pass
-            if payment_info.get("payment_status", "Pending").lower() == payment_status.lower():
-                filtered_purchases.append(p)
-        purchases = filtered_purchases
+        try:
+            query = query.filter(PurchaseOrder.payment_status == normalize_payment_status(payment_status))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+    
+    purchases = query.order_by(PurchaseOrder.purchase_date.desc(), PurchaseOrder.id.desc()).all()
+    supplier_ids = {p.supplier_id for p in purchases if p.supplier_id}
+    suppliers = {x.id: x for x in Supplier.query.filter(Supplier.id.in_(supplier_ids)).all()} if supplier_ids else {}
     
     payment_history = []
     
     for p in purchases:
-        supplier = Supplier.query.get(p.supplier_id)
-        import json
-        payment_info = {}
-        if p.notes:
-            try:
-                payment_info = json.loads(p.notes)
-            except:
-                pass
-        
-        from decimal import Decimal
-        total_amt = payment_info.get("total_amount", "0")
-        payment_amt = payment_info.get("payment_amount", payment_info.get("amount_paid", "0"))
-        
-        # If payment_amount is still 0, calculate from products
-        if payment_amt == "0" and payment_info.get("products"):
-            calculated_total = sum(float(prod.get("amount", 0)) for prod in payment_info.get("products", []))
-            total_amt = str(calculated_total) if total_amt == "0" else total_amt
-        
-        balance_due = f"{max(Decimal('0'), Decimal(total_amt) - Decimal(payment_amt)):.2f}"
-        
+        supplier = suppliers.get(p.supplier_id)
         payment_history.append({
             "purchase_id": p.id,
             "reference_number": p.reference_number,
-            "transaction_date": p.transaction_date.isoformat(),
+            "transaction_date": p.purchase_date.isoformat(),
             "supplier": {
                 "id": supplier.id if supplier else None,
                 "name": supplier.name if supplier else None,
                 "contact_person": supplier.contact_person if supplier else None
             },
-            "total_amount": f"{Decimal(total_amt):.2f}",
-            "payment_amount": f"{Decimal(payment_amt):.2f}",
-            "balance_due": balance_due,
-            "payment_method": payment_info.get("payment_method"),
-            "payment_status": payment_info.get("payment_status", "Pending"),
-            "transaction_reference": payment_info.get("transaction_reference")
+            "total_amount": f"{Decimal(p.total_amount):.2f}",
+            "payment_amount": f"{Decimal(p.paid_amount):.2f}",
+            "balance_due": f"{p.balance_due:.2f}",
+            "payment_method": p.payment_method,
+            "payment_status": p.payment_status,
+            "transaction_reference": p.transaction_reference
         })
     
     return jsonify({"payment_history": payment_history}), 200